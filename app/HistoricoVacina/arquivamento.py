@@ -0,0 +1,83 @@
+"""Arquivamento de registros frios do histórico vacinal.
+
+Move para ``historico_vacinal_arquivado`` as doses canceladas e, se
+HISTORICO_RETENCAO_DIAS > 0, as doses aplicadas sem alteração há mais
+tempo que o horizonte de retenção. Doses pendentes ou atrasadas nunca são
+arquivadas.
+
+Cada lote é copiado e removido da tabela principal na mesma transação, então
+uma execução interrompida recomeça de onde parou sem perder nem duplicar
+registros. Os relatórios agregados continuam contando as doses arquivadas.
+"""
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import DateTime, and_, delete, literal, or_, select
+from sqlalchemy.orm import Session
+
+from app import cache, eventos
+from app.database import insert_com_conflito
+from app.HistoricoVacina.model import HistoricoVacinal, HistoricoVacinalArquivado, StatusDose
+from app.HistoricoVacina.sincronizacao import registrar_remocoes
+
+ARQUIVAMENTO_LOTE = int(os.getenv("ARQUIVAMENTO_LOTE", "1000"))
+HISTORICO_RETENCAO_DIAS = int(os.getenv("HISTORICO_RETENCAO_DIAS", "0"))
+
+
+def criterio_arquivamento(retencao_dias: int = HISTORICO_RETENCAO_DIAS,
+                          hoje: Optional[date] = None):
+    """Condição SQL dos registros que devem ir para o arquivo."""
+    canceladas = HistoricoVacinal.status == StatusDose.CANCELADA
+    if retencao_dias <= 0:
+        return canceladas
+    limite = datetime.combine((hoje or date.today()) - timedelta(days=retencao_dias), time.min)
+    return or_(canceladas, and_(
+        HistoricoVacinal.status == StatusDose.APLICADA,
+        HistoricoVacinal.updated_at < limite
+    ))
+
+
+def arquivar_lote(
+    db: Session,
+    lote: int = ARQUIVAMENTO_LOTE,
+    retencao_dias: int = HISTORICO_RETENCAO_DIAS
+) -> int:
+    """Arquiva até ``lote`` registros em uma transação; retorna quantos moveu."""
+    linhas = db.query(
+        HistoricoVacinal.id, HistoricoVacinal.usuario_id, HistoricoVacinal.local_aplicacao
+    ).filter(
+        criterio_arquivamento(retencao_dias)
+    ).order_by(HistoricoVacinal.id).limit(lote).with_for_update(skip_locked=True).all()
+    if not linhas:
+        return 0
+
+    ids = [historico_id for historico_id, _, _ in linhas]
+    colunas = list(HistoricoVacinal.__table__.columns)
+    origem = select(
+        *colunas, literal(datetime.utcnow(), DateTime)
+    ).where(HistoricoVacinal.id.in_(ids))
+    copia = insert_com_conflito(db)(HistoricoVacinalArquivado).from_select(
+        [coluna.name for coluna in colunas] + ["arquivado_em"], origem
+    )
+    db.execute(copia.on_conflict_do_nothing())
+    registrar_remocoes(db, HistoricoVacinal.id.in_(ids))
+    db.execute(delete(HistoricoVacinal).where(HistoricoVacinal.id.in_(ids)))
+    db.commit()
+
+    for usuario_id in {usuario_id for _, usuario_id, _ in linhas}:
+        cache.invalidar_historico(usuario_id)
+    eventos.publicar(*eventos.eventos_sincronizar(
+        (usuario_id, local) for _, usuario_id, local in linhas
+    ))
+    return len(ids)
+
+
+def arquivar_historico(db: Session, lote: int = ARQUIVAMENTO_LOTE) -> int:
+    """Arquiva lote a lote até não restar nada; retorna o total movido."""
+    total = 0
+    while True:
+        movidos = arquivar_lote(db, lote)
+        if not movidos:
+            return total
+        total += movidos
@@ -1,17 +1,58 @@
 """ Controlador para operações do histórico vacinal """
-from typing import List, Optional, Dict, Any
-from datetime import date
+import logging
+import os
+from collections import Counter
+from typing import List, Optional, Dict, Any, Sequence, Tuple
+from datetime import date, datetime, timedelta
 from dataclasses import dataclass
 
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, extract
+from sqlalchemy import and_, bindparam, extract, func, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
-from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
+from app.database import insert_com_conflito, so_colunas
+
+from app.HistoricoVacina.model import (
+    HistoricoVacinal,
+    HistoricoVacinalArquivado,
+    HistoricoVacinalRemovido,
+    PRIORIDADE_STATUS,
+    StatusDose,
+)
+from app.HistoricoVacina import sincronizacao
+from app.HistoricoVacina.sincronizacao import Posicao, registrar_remocoes
+from app.HistoricoVacina.unicidade import restricao_ativa
+from app.Vacina.controller import VACINA_POR_ID
 from app.Vacina.model import Vacina
+from app.Usuario.controller import USUARIO_POR_ID
 from app.Usuario.model import Usuario
 from app.schemas import HistoricoVacinalCreate
 from app.HistoricoVacina.email_services import email_service
+from app.Relatorios.controller import RelatoriosController, chave_aplicacao
+from app import cache, eventos
+from app.logs import amostrado
+from app.rastreamento import rastrear_metodos
+
+logger = logging.getLogger(__name__)
+
+# Pares por transação na aplicação em lote (0 = todos em uma transação)
+APLICACAO_TRANSACAO = int(os.getenv("APLICACAO_TRANSACAO", "0"))
+
+# Registro de um usuário pelo id, montado uma vez (reaproveita o SQL em cache)
+HISTORICO_DO_USUARIO = select(HistoricoVacinal).where(
+    HistoricoVacinal.id == bindparam("historico_id"),
+    HistoricoVacinal.usuario_id == bindparam("usuario_id")
+).limit(1)
+HISTORICO_DO_USUARIO_COM_VACINA = HISTORICO_DO_USUARIO.options(
+    joinedload(HistoricoVacinal.vacina)
+)
+
+def _tipo_alteracao(status_anterior: Optional[StatusDose], status_atual: StatusDose) -> str:
+    """Tipo do evento de uma dose alterada: aplicada agora ou só atualizada."""
+    if status_atual == StatusDose.APLICADA and status_anterior != StatusDose.APLICADA:
+        return "aplicado"
+    return "atualizado"
 
 # pylint: disable=too-many-instance-attributes, duplicate-code
 @dataclass
@@ -28,6 +69,15 @@ class HistoricoVacinalData:
     profissional: Optional[str] = None
     observacoes: Optional[str] = None
 
+def intervalo_periodo(ano: int, mes: Optional[int] = None) -> Tuple[date, date]:
+    """Datas [início, fim) do ano ou, com ``mes``, do mês do ano."""
+    if mes is None:
+        return date(ano, 1, 1), date(ano + 1, 1, 1)
+    if mes == 12:
+        return date(ano, 12, 1), date(ano + 1, 1, 1)
+    return date(ano, mes, 1), date(ano, mes + 1, 1)
+
+@rastrear_metodos
 class HistoricoVacinalController:
     """Controlador para operações do histórico vacinal."""
 
@@ -37,39 +87,55 @@ class HistoricoVacinalController:
         usuario_id: int,
         historico_data: HistoricoVacinalCreate
     ) -> HistoricoVacinal:
-        """Cria um novo registro de histórico vacinal."""
-        usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
+        """Cria o registro da dose ou, se ela já existir, completa-o.
+
+        Reenviar a mesma requisição não duplica a dose nem o e-mail, e a dose
+        existente nunca é rebaixada (ex.: de aplicada para pendente); para
+        substituí-la use ``registrar_dose`` com ``substituir``.
+        """
+        historico, _ = HistoricoVacinalController.registrar_dose(
+            db,
+            usuario_id,
+            historico_data.vacina_id,
+            historico_data.numero_dose,
+            historico_data.model_dump(exclude={"vacina_id", "numero_dose"}),
+            substituir=False
+        )
+        return historico
+
+    # pylint: disable=too-many-arguments, too-many-positional-arguments
+    @staticmethod
+    def registrar_dose(
+        db: Session,
+        usuario_id: int,
+        vacina_id: int,
+        numero_dose: int,
+        dados: Dict[str, Any],
+        substituir: bool = True
+    ) -> Tuple[HistoricoVacinal, bool]:
+        """Valida e grava a dose; retorna o registro e se ele foi criado."""
+        usuario = db.scalars(USUARIO_POR_ID, {"usuario_id": usuario_id}).first()
         if not usuario:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Usuário com ID {usuario_id} não encontrado"
             )
-        vacina = db.query(Vacina).filter(Vacina.id == historico_data.vacina_id).first()
+        vacina = db.scalars(VACINA_POR_ID, {"vacina_id": vacina_id}).first()
         if not vacina:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Vacina com ID {historico_data.vacina_id} não encontrada"
+                detail=f"Vacina com ID {vacina_id} não encontrada"
             )
-        if historico_data.numero_dose < 1 or historico_data.numero_dose > vacina.doses:
+        if numero_dose < 1 or numero_dose > vacina.doses:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Número da dose deve estar entre 1 e {vacina.doses}"
             )
-        historico = HistoricoVacinal(
-            usuario_id=usuario_id,
-            vacina_id=historico_data.vacina_id,
-            numero_dose=historico_data.numero_dose,
-            status=StatusDose(historico_data.status.value),
-            data_aplicacao=historico_data.data_aplicacao,
-            data_prevista=historico_data.data_prevista,
-            lote=historico_data.lote,
-            local_aplicacao=historico_data.local_aplicacao,
-            profissional=historico_data.profissional,
-            observacoes=historico_data.observacoes
+        historico, criado = HistoricoVacinalController.gravar_dose(
+            db, usuario_id, vacina_id, numero_dose, dados, substituir
         )
-        db.add(historico)
-        db.commit()
-        db.refresh(historico)
+        if not criado:
+            return historico, criado
 
     # Envia e-mail de confirmação
         try:
@@ -77,15 +143,130 @@ class HistoricoVacinalController:
                 destinatario=usuario.email,
                 nome_usuario=usuario.nome,
                 vacina=vacina.nome,
-                data=(historico_data.data_aplicacao or
-                historico_data.data_prevista).strftime("%d/%m/%Y")
+                data=(historico.data_aplicacao or
+                historico.data_prevista).strftime("%d/%m/%Y")
             )
             if sucesso:
-                print(f"✅ E-mail de confirmação enviado para {usuario.email}")
-        except Exception as e:
-            print(f"⚠️ Falha ao enviar e-mail para {usuario.email}: {e}")
+                logger.info("E-mail de confirmação enviado para %s", usuario.email,
+                            extra=amostrado())
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Falha ao enviar e-mail para %s", usuario.email)
 
-        return historico
+        return historico, criado
+
+    @staticmethod
+    def _valores_sobre_existente(
+        historico: HistoricoVacinal,
+        dados: Dict[str, Any],
+        substituir: bool
+    ) -> Dict[str, Any]:
+        """Valores a gravar sobre uma dose que já existe.
+
+        Sem ``substituir`` (POST repetido) a dose nunca é rebaixada: o status
+        só muda para um de maior prioridade e só colunas vazias são preenchidas.
+        """
+        if substituir:
+            return dados
+        valores = {
+            campo: valor for campo, valor in dados.items()
+            if campo != "status" and valor is not None and getattr(historico, campo) is None
+        }
+        if PRIORIDADE_STATUS[dados["status"]] > PRIORIDADE_STATUS[historico.status]:
+            valores["status"] = dados["status"]
+        return valores
+
+    @staticmethod
+    def gravar_dose(
+        db: Session,
+        usuario_id: int,
+        vacina_id: int,
+        numero_dose: int,
+        dados: Dict[str, Any],
+        substituir: bool = True
+    ) -> Tuple[HistoricoVacinal, bool]:
+        """Grava a dose na chave (usuário, vacina, dose), criando-a se preciso.
+
+        Quem cria é decidido pela restrição única (INSERT ... ON CONFLICT DO
+        NOTHING): entre escritas concorrentes da mesma dose só uma recebe a
+        linha de volta, então só ela conta a aplicação e envia o e-mail. As
+        demais releem a dose com bloqueio e a atualizam a partir dos valores
+        lidos. Com ``substituir`` os campos de ``dados`` substituem os da dose;
+        sem ele, veja ``_valores_sobre_existente``.
+
+        Em bancos ainda sem a restrição (veja ``app.HistoricoVacina.unicidade``)
+        não há ``ON CONFLICT``: a dose é lida com bloqueio e, se não existir,
+        inserida com um INSERT simples, sem proteção contra criações simultâneas.
+
+        A restrição única não cobre o arquivo: uma dose aplicada que já foi
+        arquivada é recusada com 409 em vez de ser registrada de novo.
+
+        Não valida usuário, vacina nem número da dose. Retorna o registro e
+        se ele foi criado (False quando a dose já existia).
+        """
+        chave = {"usuario_id": usuario_id, "vacina_id": vacina_id, "numero_dose": numero_dose}
+        if db.scalar(select(HistoricoVacinalArquivado.id).filter_by(
+            **chave, status=StatusDose.APLICADA
+        ).limit(1)) is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Esta dose já foi aplicada e está no arquivo do histórico"
+            )
+        situacao = dados.get("status") or StatusDose.PENDENTE
+        dados = {**dados, "status": StatusDose(getattr(situacao, "value", situacao))}
+        agora = datetime.utcnow()
+        com_restricao = restricao_ativa(db)
+        inserir = insert_com_conflito(db)(HistoricoVacinal).values(
+            **chave, **dados, created_at=agora, updated_at=agora
+        )
+        if com_restricao:
+            inserir = inserir.on_conflict_do_nothing(index_elements=list(chave))
+        inserir = inserir.returning(HistoricoVacinal)
+
+        while True:
+            if com_restricao:
+                historico = db.scalars(
+                    inserir, execution_options={"populate_existing": True}
+                ).first()
+                if historico is not None:
+                    criado, status_anterior, chave_anterior = True, None, None
+                    valores = dados
+                    break
+            historico = db.scalars(
+                select(HistoricoVacinal).filter_by(**chave).with_for_update(),
+                execution_options={"populate_existing": True}
+            ).first()
+            if historico is not None:
+                criado, status_anterior = False, historico.status
+                chave_anterior = chave_aplicacao(historico)
+                valores = HistoricoVacinalController._valores_sobre_existente(
+                    historico, dados, substituir
+                )
+                for campo, valor in valores.items():
+                    setattr(historico, campo, valor)
+                if valores:
+                    historico.updated_at = agora
+                break
+            if not com_restricao:
+                historico = db.scalars(
+                    inserir, execution_options={"populate_existing": True}
+                ).first()
+                criado, status_anterior, chave_anterior = True, None, None
+                valores = dados
+                break
+            # Removida entre o INSERT e a leitura: tenta inserir de novo
+
+        if StatusDose.APLICADA in (status_anterior, historico.status):
+            RelatoriosController.marcar_pendente(db, usuario_id, vacina_id)
+        RelatoriosController.ajustar_aplicacoes(db, chave_anterior, chave_aplicacao(historico))
+        db.commit()
+        db.refresh(historico)
+        if valores:
+            cache.invalidar_historico(usuario_id)
+            eventos.publicar(eventos.evento_do_registro(
+                "criado" if criado else _tipo_alteracao(status_anterior, historico.status),
+                historico
+            ))
+        return historico, criado
 
 # pylint: disable=too-many-arguments, too-many-positional-arguments
     #Lista o histórico vacinal de um usuário.
@@ -96,40 +277,196 @@ class HistoricoVacinalController:
         ano: Optional[int] = None,
         mes: Optional[int] = None,
         vacina_id: Optional[int] = None,
-        status_filtro: Optional[StatusDose] = None
+        status_filtro: Optional[StatusDose] = None,
+        incluir_arquivados: bool = False,
+        campos: Optional[Sequence[str]] = None
     ) -> List[HistoricoVacinal]:
-        """Lista o histórico vacinal de um usuário com filtros opcionais."""
-        query = db.query(HistoricoVacinal).options(
-            joinedload(HistoricoVacinal.vacina)
-        ).filter(HistoricoVacinal.usuario_id == usuario_id)
-
-        if ano:
-            query = query.filter(
-                extract('year', HistoricoVacinal.data_aplicacao) == ano
-            )
+        """Lista o histórico vacinal de um usuário com filtros opcionais.
+
+        Com ``incluir_arquivados``, os registros arquivados que atendem aos
+        mesmos filtros são intercalados na mesma ordenação. Com ``campos``,
+        só essas colunas são lidas, e a vacina só é carregada se algum campo
+        ``vacina_*`` for pedido.
+        """
+        if campos is not None and incluir_arquivados:
+            # Usados na intercalação feita em Python
+            campos = [*campos, "data_aplicacao", "created_at"]
+
+        def consultar(modelo):
+            opcoes = so_colunas(modelo, campos)
+            if campos is None or any(campo.startswith("vacina_") and campo != "vacina_id"
+                                     for campo in campos):
+                opcoes.append(joinedload(modelo.vacina))
+            query = db.query(modelo).options(*opcoes).filter(modelo.usuario_id == usuario_id)
+
+            if ano:
+                # Intervalo em vez de EXTRACT, para usar o índice de data_aplicacao
+                inicio, fim = intervalo_periodo(ano, mes)
+                query = query.filter(
+                    modelo.data_aplicacao >= inicio, modelo.data_aplicacao < fim
+                )
+            elif mes:
+                query = query.filter(
+                    extract('month', modelo.data_aplicacao) == mes
+                )
+
+            if vacina_id:
+                query = query.filter(modelo.vacina_id == vacina_id)
+
+            if status_filtro:
+                query = query.filter(modelo.status == status_filtro)
+
+            return query.order_by(
+                modelo.data_aplicacao.desc().nullslast(),
+                modelo.created_at.desc()
+            ).all()
+
+        historico = consultar(HistoricoVacinal)
+        if not incluir_arquivados:
+            return historico
+
+        arquivados = consultar(HistoricoVacinalArquivado)
+        if not arquivados:
+            return historico
+        # Mesma ordem do SQL: data de aplicação desc (nulas por último), criação desc
+        return sorted(
+            historico + arquivados,
+            key=lambda h: (h.data_aplicacao is not None,
+                           h.data_aplicacao or date.min, h.created_at),
+            reverse=True
+        )
 
-        if mes:
-            query = query.filter(
-                extract('month', HistoricoVacinal.data_aplicacao) == mes
-            )
+    @staticmethod
+    def listar_alteracoes(
+        db: Session,
+        usuario_id: int,
+        token: Optional[str] = None,
+        limite: int = sincronizacao.SYNC_LIMITE
+    ) -> Dict[str, Any]:
+        """Alterações e remoções do histórico posteriores ao token.
+
+        Sem token, entrega o histórico ativo inteiro (em páginas). Enquanto
+        ``tem_mais`` for verdadeiro, o cliente deve chamar de novo com o
+        token devolvido. Registros de vacinas alteradas desde o token são
+        reenviados, para que o cliente receba o nome novo.
+        """
+        # Lido antes das consultas: o que está abaixo dele já foi confirmado
+        horizonte = sincronizacao.horizonte_alteracoes(db)
+
+        def confirmadas(coluna):
+            return [] if horizonte is None else [coluna < horizonte]
+
+        agora = datetime.utcnow()
+        vacinas_versao = db.scalar(
+            select(func.coalesce(func.max(Vacina.versao), 0)).where(*confirmadas(Vacina.versao))
+        )
+        if token is None:
+            ultima_remocao = (horizonte, 0) if horizonte is not None else db.query(
+                HistoricoVacinalRemovido.versao, HistoricoVacinalRemovido.historico_id
+            ).filter(HistoricoVacinalRemovido.usuario_id == usuario_id).order_by(
+                HistoricoVacinalRemovido.versao.desc(),
+                HistoricoVacinalRemovido.historico_id.desc()
+            ).first()
+            posicao = Posicao(-1, 0, *(ultima_remocao or (-1, 0)), vacinas_versao, agora)
+        else:
+            posicao = sincronizacao.decodificar_token(token)
+            if posicao is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Token de sincronização inválido"
+                )
+            if posicao.emitido_em < agora - timedelta(days=sincronizacao.SYNC_RETENCAO_DIAS):
+                raise HTTPException(
+                    status_code=status.HTTP_410_GONE,
+                    detail="Token de sincronização expirado; sincronize novamente sem 'since'"
+                )
+
+        alterados = db.query(HistoricoVacinal).options(
+            joinedload(HistoricoVacinal.vacina)
+        ).filter(
+            HistoricoVacinal.usuario_id == usuario_id,
+            tuple_(HistoricoVacinal.versao, HistoricoVacinal.id)
+            > tuple_(posicao.alterado_versao, posicao.alterado_id),
+            *confirmadas(HistoricoVacinal.versao)
+        ).order_by(HistoricoVacinal.versao, HistoricoVacinal.id).limit(limite + 1).all()
+
+        removidos = db.query(
+            HistoricoVacinalRemovido.historico_id, HistoricoVacinalRemovido.versao
+        ).filter(
+            HistoricoVacinalRemovido.usuario_id == usuario_id,
+            tuple_(HistoricoVacinalRemovido.versao, HistoricoVacinalRemovido.historico_id)
+            > tuple_(posicao.removido_versao, posicao.removido_id),
+            *confirmadas(HistoricoVacinalRemovido.versao)
+        ).order_by(
+            HistoricoVacinalRemovido.versao, HistoricoVacinalRemovido.historico_id
+        ).limit(limite + 1).all()
+
+        mais_alterados = len(alterados) > limite
+        alterados = alterados[:limite]
+        mais_removidos = len(removidos) > limite
+        removidos = removidos[:limite]
+
+        def proxima(ultimo, atual, mais):
+            """Posição após a página: o último entregue ou, esgotada, o horizonte."""
+            if horizonte is not None and not mais:
+                return max(atual, (horizonte, 0))
+            return ultimo or atual
+
+        alterado = proxima(
+            alterados and (alterados[-1].versao, alterados[-1].id),
+            (posicao.alterado_versao, posicao.alterado_id), mais_alterados
+        )
+        removido = proxima(
+            removidos and (removidos[-1].versao, removidos[-1].historico_id),
+            (posicao.removido_versao, posicao.removido_id), mais_removidos
+        )
 
-        if vacina_id:
-            query = query.filter(HistoricoVacinal.vacina_id == vacina_id)
+        # Vacinas alteradas: reenvia os registros do usuário que as usam
+        vacinas_versao = max(vacinas_versao, posicao.vacinas_versao)
+        if vacinas_versao > posicao.vacinas_versao:
+            entregues = {historico.id for historico in alterados}
+            alterados += [
+                historico for historico in db.query(HistoricoVacinal).options(
+                    joinedload(HistoricoVacinal.vacina)
+                ).join(Vacina, HistoricoVacinal.vacina_id == Vacina.id).filter(
+                    HistoricoVacinal.usuario_id == usuario_id,
+                    Vacina.versao > posicao.vacinas_versao,
+                    Vacina.versao <= vacinas_versao
+                ).order_by(HistoricoVacinal.id)
+                if historico.id not in entregues
+            ]
 
-        if status_filtro:
-            query = query.filter(HistoricoVacinal.status == status_filtro)
+        return {
+            "alterados": alterados,
+            "removidos": [historico_id for historico_id, _ in removidos],
+            "token": sincronizacao.codificar_token(
+                Posicao(*alterado, *removido, vacinas_versao, agora)
+            ),
+            "tem_mais": mais_alterados or mais_removidos,
+        }
 
-        return query.order_by(
-            HistoricoVacinal.data_aplicacao.desc().nullslast(),
-            HistoricoVacinal.created_at.desc()
-        ).all()
+    @staticmethod
+    def versao_historico(db: Session, usuario_id: int) -> Tuple:
+        """Identifica a versão atual do histórico sem carregar os registros.
+
+        Retorna (total, maior id, maior updated_at, maior ``versao`` das
+        vacinas usadas), lidos do banco: vale igual em todos os workers e muda
+        quando uma vacina do usuário é renomeada.
+        """
+        return tuple(db.query(
+            func.count(HistoricoVacinal.id),
+            func.max(HistoricoVacinal.id),
+            func.max(HistoricoVacinal.updated_at),
+            func.max(Vacina.versao)
+        ).join(Vacina, HistoricoVacinal.vacina_id == Vacina.id).filter(
+            HistoricoVacinal.usuario_id == usuario_id
+        ).one())
 
     @staticmethod
     def buscar_por_id(db: Session, historico_id: int, usuario_id: int):
         """Busca um histórico pelo ID."""
-        historico = db.query(HistoricoVacinal).filter(
-            HistoricoVacinal.id == historico_id,
-            HistoricoVacinal.usuario_id == usuario_id
+        historico = db.scalars(
+            HISTORICO_DO_USUARIO, {"historico_id": historico_id, "usuario_id": usuario_id}
         ).first()
         if not historico:
             return None
@@ -144,24 +481,39 @@ class HistoricoVacinalController:
         update_data: Dict[str, Any]
     ) -> Optional[Dict[str, Any]]:
         """Atualiza um registro de histórico vacinal."""
-        historico = db.query(HistoricoVacinal).options(
-            joinedload(HistoricoVacinal.vacina)
-        ).filter(
-            and_(
-                HistoricoVacinal.id == historico_id,
-                HistoricoVacinal.usuario_id == usuario_id
-            )
+        historico = db.scalars(
+            HISTORICO_DO_USUARIO_COM_VACINA,
+            {"historico_id": historico_id, "usuario_id": usuario_id}
         ).first()
 
         if not historico:
             return None
 
+        status_anterior = historico.status
+        aplicacao_anterior = chave_aplicacao(historico)
+
         # Atualiza os campos
         for key, value in update_data.items():
             setattr(historico, key, value)
 
-        db.commit()
+        if StatusDose.APLICADA in (status_anterior, update_data.get("status")):
+            RelatoriosController.marcar_pendente(db, usuario_id, historico.vacina_id)
+        RelatoriosController.ajustar_aplicacoes(
+            db, aplicacao_anterior, chave_aplicacao(historico)
+        )
+        try:
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"O usuário já possui a dose {historico.numero_dose} desta vacina"
+            ) from e
         db.refresh(historico)
+        cache.invalidar_historico(usuario_id)
+        eventos.publicar(eventos.evento_do_registro(
+            _tipo_alteracao(status_anterior, historico.status), historico
+        ))
 
         # Retorna o formato esperado pelo response model
         return {
@@ -184,9 +536,8 @@ class HistoricoVacinalController:
     @staticmethod
     def deletar_registro(db: Session, historico_id: int, usuario_id: int) -> bool:
         """Deleta um registro do histórico vacinal."""
-        historico = db.query(HistoricoVacinal).filter(
-            HistoricoVacinal.id == historico_id,
-            HistoricoVacinal.usuario_id == usuario_id
+        historico = db.scalars(
+            HISTORICO_DO_USUARIO, {"historico_id": historico_id, "usuario_id": usuario_id}
         ).first()
 
         if not historico:
@@ -195,22 +546,51 @@ class HistoricoVacinalController:
                 detail=f"Registro com ID {historico_id} não encontrado"
             )
 
+        if historico.status == StatusDose.APLICADA:
+            RelatoriosController.marcar_pendente(db, usuario_id, historico.vacina_id)
+        RelatoriosController.ajustar_aplicacoes(db, chave_aplicacao(historico), None)
+        registrar_remocoes(db, HistoricoVacinal.id == historico.id)
+        removido = eventos.evento_do_registro("removido", historico)
         db.delete(historico)
         db.commit()
+        cache.invalidar_historico(usuario_id)
+        eventos.publicar(removido)
         return True
 
     @staticmethod
     def obter_estatisticas(db: Session, usuario_id: int) -> dict:
-        """ Obtem estatísticas do histórico vacinal."""
-        historico = db.query(HistoricoVacinal).filter(
+        """ Obtem estatísticas do histórico vacinal.
+
+        As doses aplicadas que foram para o arquivo continuam contando.
+        """
+        historico = db.query(HistoricoVacinal).options(
+            joinedload(HistoricoVacinal.vacina)
+        ).filter(
             HistoricoVacinal.usuario_id == usuario_id
         ).all()
+        historico += db.query(HistoricoVacinalArquivado).options(
+            joinedload(HistoricoVacinalArquivado.vacina)
+        ).filter(
+            HistoricoVacinalArquivado.usuario_id == usuario_id,
+            HistoricoVacinalArquivado.status == StatusDose.APLICADA
+        ).all()
 
-        total_doses = len(historico)
-        doses_aplicadas = len([h for h in historico if h.status == StatusDose.APLICADA])
-        doses_pendentes = len([h for h in historico if h.status == StatusDose.PENDENTE])
-        doses_atrasadas = len([h for h in historico if h.status == StatusDose.ATRASADA])
-        doses_canceladas = len([h for h in historico if h.status == StatusDose.CANCELADA])
+        proximas = db.query(HistoricoVacinal).options(
+            joinedload(HistoricoVacinal.vacina)
+        ).filter(
+            and_(
+                HistoricoVacinal.usuario_id == usuario_id,
+                HistoricoVacinal.status == StatusDose.PENDENTE,
+                HistoricoVacinal.data_prevista.isnot(None)
+            )
+        ).order_by(HistoricoVacinal.data_prevista).limit(5).all()
+
+        return HistoricoVacinalController.resumir(historico, proximas)
+
+    @staticmethod
+    def resumir(historico: List[HistoricoVacinal], proximas: List[HistoricoVacinal]) -> dict:
+        """Estatísticas de um histórico já carregado (com as vacinas)."""
+        contagem = Counter(h.status for h in historico)
 
         vacinas_dict = {}
         for h in historico:
@@ -224,36 +604,93 @@ class HistoricoVacinalController:
 
         vacinas_completas = sum(1 for v in vacinas_dict.values()
         if v['aplicadas'] >= v['total_doses'])
-        vacinas_incompletas = len(vacinas_dict) - vacinas_completas
 
-        proximas = db.query(HistoricoVacinal).options(
-            joinedload(HistoricoVacinal.vacina)
-        ).filter(
-            and_(
-                HistoricoVacinal.usuario_id == usuario_id,
-                HistoricoVacinal.status == StatusDose.PENDENTE,
-                HistoricoVacinal.data_prevista.isnot(None)
+        return {
+            "total_doses": len(historico),
+            "doses_aplicadas": contagem[StatusDose.APLICADA],
+            "doses_pendentes": contagem[StatusDose.PENDENTE],
+            "doses_atrasadas": contagem[StatusDose.ATRASADA],
+            "doses_canceladas": contagem[StatusDose.CANCELADA],
+            "vacinas_completas": vacinas_completas,
+            "vacinas_incompletas": len(vacinas_dict) - vacinas_completas,
+            "proximas_doses": [
+                {
+                    "vacina": h.vacina.nome,
+                    "dose": h.numero_dose,
+                    "data_prevista": h.data_prevista.isoformat()
+                }
+                for h in proximas[:5]
+            ]
+        }
+
+    @staticmethod
+    def obter_carteira(db: Session, usuario_id: int, so_do_usuario: bool = False) -> dict:
+        """Usuário, histórico agrupado por vacina, estatísticas e próximas doses.
+
+        São só três consultas: o usuário, as vacinas junto com as doses do
+        usuário (LEFT JOIN, ou INNER JOIN com ``so_do_usuario``) e as doses
+        aplicadas que foram para o arquivo. O resto é calculado sobre essas
+        linhas.
+        """
+        usuario = db.scalars(USUARIO_POR_ID, {"usuario_id": usuario_id}).first()
+        if not usuario:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Usuário com ID {usuario_id} não encontrado"
             )
-        ).order_by(HistoricoVacinal.data_prevista).limit(5).all()
 
-        proximas_doses = [
-            {
-                "vacina": h.vacina.nome,
-                "dose": h.numero_dose,
-                "data_prevista": h.data_prevista.isoformat()
-            }
-            for h in proximas
-        ]
+        juncao = and_(
+            HistoricoVacinal.vacina_id == Vacina.id,
+            HistoricoVacinal.usuario_id == usuario_id
+        )
+        consulta = select(Vacina, HistoricoVacinal)
+        consulta = (consulta.join(HistoricoVacinal, juncao) if so_do_usuario
+                    else consulta.outerjoin(HistoricoVacinal, juncao))
+        linhas = db.execute(
+            consulta.order_by(Vacina.id, HistoricoVacinal.numero_dose)
+        ).all()
+        arquivadas = db.execute(
+            select(Vacina, HistoricoVacinalArquivado).join(
+                HistoricoVacinalArquivado, HistoricoVacinalArquivado.vacina_id == Vacina.id
+            ).where(
+                HistoricoVacinalArquivado.usuario_id == usuario_id,
+                HistoricoVacinalArquivado.status == StatusDose.APLICADA
+            )
+        ).all()
 
+        vacinas: Dict[int, dict] = {}
+        historico = []
+        for vacina, registro in [*linhas, *arquivadas]:
+            grupo = vacinas.setdefault(vacina.id, {
+                "vacina_id": vacina.id,
+                "vacina_nome": vacina.nome,
+                "doses_totais": vacina.doses,
+                "doses_aplicadas": 0,
+                "doses": [],
+            })
+            if registro is None:
+                continue
+            # A vacina já está no mapa de identidade: registro.vacina não consulta
+            historico.append(registro)
+            grupo["doses"].append(registro)
+            if registro.status == StatusDose.APLICADA:
+                grupo["doses_aplicadas"] += 1
+
+        for grupo in vacinas.values():
+            grupo["doses"].sort(key=lambda registro: registro.numero_dose)
+            grupo["completa"] = grupo["doses_aplicadas"] >= grupo["doses_totais"]
+            grupo["progresso"] = round(min(grupo["doses_aplicadas"] / grupo["doses_totais"], 1), 4)
+
+        proximas = sorted(
+            (h for h in historico
+             if h.status == StatusDose.PENDENTE and h.data_prevista is not None),
+            key=lambda h: h.data_prevista
+        )
         return {
-            "total_doses": total_doses,
-            "doses_aplicadas": doses_aplicadas,
-            "doses_pendentes": doses_pendentes,
-            "doses_atrasadas": doses_atrasadas,
-            "doses_canceladas": doses_canceladas,
-            "vacinas_completas": vacinas_completas,
-            "vacinas_incompletas": vacinas_incompletas,
-            "proximas_doses": proximas_doses
+            "usuario": usuario,
+            "vacinas": sorted(vacinas.values(), key=lambda grupo: grupo["vacina_id"]),
+            "estatisticas": HistoricoVacinalController.resumir(historico, proximas),
+            "proximas_doses": proximas,
         }
 
 # pylint: disable=too-many-arguments, too-many-positional-arguments
@@ -268,26 +705,30 @@ class HistoricoVacinalController:
         profissional: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
         """Marca uma dose como aplicada."""
-        historico = db.query(HistoricoVacinal).options(
-            joinedload(HistoricoVacinal.vacina)
-        ).filter(
-            and_(
-                HistoricoVacinal.id == historico_id,
-                HistoricoVacinal.usuario_id == usuario_id
-            )
+        historico = db.scalars(
+            HISTORICO_DO_USUARIO_COM_VACINA,
+            {"historico_id": historico_id, "usuario_id": usuario_id}
         ).first()
 
         if not historico:
             return None
 
+        if historico.status != StatusDose.APLICADA:
+            RelatoriosController.marcar_pendente(db, usuario_id, historico.vacina_id)
+        aplicacao_anterior = chave_aplicacao(historico)
         historico.status = StatusDose.APLICADA
         historico.data_aplicacao = data_aplicacao
         historico.lote = lote
         historico.local_aplicacao = local_aplicacao
         historico.profissional = profissional
+        RelatoriosController.ajustar_aplicacoes(
+            db, aplicacao_anterior, chave_aplicacao(historico)
+        )
 
         db.commit()
         db.refresh(historico)
+        cache.invalidar_historico(usuario_id)
+        eventos.publicar(eventos.evento_do_registro("aplicado", historico))
 
         # Include vacina_nome at the root level
         return {
@@ -311,3 +752,90 @@ class HistoricoVacinalController:
                 "doses": historico.vacina.doses
             }
         }
+
+    @staticmethod
+    def _aplicar_lote(
+        db: Session,
+        pares: List[Tuple[int, int]],
+        dados: Dict[str, Any]
+    ) -> Dict[Tuple[int, int], str]:
+        """Aplica um lote com um UPDATE ... RETURNING; retorna o resultado por par.
+
+        Só altera doses ainda não aplicadas, então repetir o lote não muda
+        nada e os agregados recebem exatamente as doses que passaram a contar.
+        """
+        chave = tuple_(HistoricoVacinal.usuario_id, HistoricoVacinal.id)
+        aplicados = db.execute(
+            update(HistoricoVacinal).where(
+                # O filtro simples por usuário permite descartar partições
+                HistoricoVacinal.usuario_id.in_({usuario_id for usuario_id, _ in pares}),
+                chave.in_(pares),
+                HistoricoVacinal.status != StatusDose.APLICADA
+            ).values(
+                **dados, status=StatusDose.APLICADA, updated_at=datetime.utcnow()
+            ).returning(
+                HistoricoVacinal.usuario_id, HistoricoVacinal.id, HistoricoVacinal.vacina_id
+            ),
+            execution_options={"synchronize_session": False}
+        ).all()
+
+        resultados = {(usuario_id, historico_id): "aplicada"
+                      for usuario_id, historico_id, _ in aplicados}
+        restantes = [par for par in pares if par not in resultados]
+        if restantes:
+            for par in db.query(HistoricoVacinal.usuario_id, HistoricoVacinal.id).filter(
+                HistoricoVacinal.usuario_id.in_({usuario_id for usuario_id, _ in restantes}),
+                chave.in_(restantes)
+            ):
+                resultados[tuple(par)] = "ja_aplicada"
+
+        RelatoriosController.marcar_pendentes(
+            db, [(usuario_id, vacina_id) for usuario_id, _, vacina_id in aplicados]
+        )
+        # Todas as doses aplicadas caem na mesma linha diária de cada vacina
+        for vacina_id, quantidade in Counter(v for _, _, v in aplicados).items():
+            RelatoriosController.somar_aplicacoes(
+                db,
+                (dados["data_aplicacao"], vacina_id,
+                 dados["local_aplicacao"] or "", dados["profissional"] or ""),
+                quantidade
+            )
+        db.commit()
+
+        for usuario_id in {usuario_id for usuario_id, _, _ in aplicados}:
+            cache.invalidar_historico(usuario_id)
+        eventos.publicar(*[
+            eventos.evento("aplicado", usuario_id, historico_id, vacina_id,
+                           dados["local_aplicacao"])
+            for usuario_id, historico_id, vacina_id in aplicados
+        ])
+        return resultados
+
+    @staticmethod
+    def marcar_doses_como_aplicadas(
+        db: Session,
+        pares: List[Tuple[int, int]],
+        dados: Dict[str, Any],
+        por_transacao: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Marca como aplicadas várias doses (usuario_id, historico_id) com os mesmos dados.
+
+        ``dados`` tem data_aplicacao, lote, local_aplicacao e profissional.
+        Cada lote de ``por_transacao`` pares (padrão APLICACAO_TRANSACAO;
+        todos, se 0) é uma transação.
+        Resultado por par: ``aplicada``, ``ja_aplicada`` ou ``nao_encontrado``.
+        """
+        pares = list(dict.fromkeys(pares))
+        if por_transacao is None:
+            por_transacao = APLICACAO_TRANSACAO
+        tamanho = por_transacao if por_transacao > 0 else max(len(pares), 1)
+        resultados = {}
+        for inicio in range(0, len(pares), tamanho):
+            resultados.update(HistoricoVacinalController._aplicar_lote(
+                db, pares[inicio:inicio + tamanho], dados
+            ))
+        return [
+            {"usuario_id": usuario_id, "historico_id": historico_id,
+             "resultado": resultados.get((usuario_id, historico_id), "nao_encontrado")}
+            for usuario_id, historico_id in pares
+        ]
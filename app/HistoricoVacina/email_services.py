@@ -5,10 +5,12 @@ import os
 import smtplib
 from dotenv import load_dotenv
 
+from app.logs import amostrado
+from app.rastreamento import rastreado
+
 load_dotenv()
 
-logger = logging.getLogger("email_service")
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
 
 class EmailService:
     """Serviço para envio de e-mails."""
@@ -22,6 +24,7 @@ class EmailService:
         self.password = os.getenv("EMAIL_PASS")
         self.email_from = os.getenv("EMAIL_FROM", self.user)
 
+    @rastreado("EmailService.enviar_confirmacao_vacina")
     def enviar_confirmacao_vacina(self, destinatario, nome_usuario, vacina, data):
         """Envia e-mail de confirmação de registro de vacina."""
         assunto = f"Confirmação de Registro - {vacina}"
@@ -40,8 +43,9 @@ class EmailService:
 
         # 🚀 Modo Mock: apenas log
         if self.MOCK:
-            logger.info(f"[MOCK] E-mail para {destinatario} com assunto '{assunto}' enviado com sucesso!")
-            logger.info(f"[MOCK] Corpo do e-mail: {html}")
+            logger.info("[MOCK] E-mail para %s com assunto '%s' enviado com sucesso!",
+                        destinatario, assunto, extra=amostrado())
+            logger.debug("[MOCK] Corpo do e-mail: %s", html)
             return True
 
         # Envio real via SMTP (não funcionará no Render)
@@ -56,10 +60,10 @@ class EmailService:
                 server.starttls()
                 server.login(self.user, self.password)
                 server.send_message(msg)
-                logger.info(f"E-mail enviado para {destinatario}")
+                logger.info("E-mail enviado para %s", destinatario)
             return True
         except Exception as e:
-            logger.error(f"Falha ao enviar e-mail para {destinatario}: {e}")
+            logger.error("Falha ao enviar e-mail para %s: %s", destinatario, e)
             return False
 
 # Instância global
@@ -2,10 +2,13 @@
 from datetime import datetime
 import enum
 
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Enum, Text
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Date, DateTime, ForeignKey, Enum, Text,
+    UniqueConstraint, Index, case
+)
 from sqlalchemy.orm import relationship
 
-from app.database import Base
+from app.database import Base, SequenciaAlteracao
 
 
 class StatusDose(str, enum.Enum):
@@ -15,13 +18,33 @@ class StatusDose(str, enum.Enum):
     ATRASADA = "atrasada"
     CANCELADA = "cancelada"
 
+
+# Ordem de preferência entre registros da mesma dose: aplicada vence
+PRIORIDADE_STATUS = {
+    StatusDose.APLICADA: 3,
+    StatusDose.ATRASADA: 2,
+    StatusDose.PENDENTE: 1,
+    StatusDose.CANCELADA: 0,
+}
+
+
+def prioridade_status(modelo):
+    """Expressão SQL com a prioridade (``PRIORIDADE_STATUS``) do status do registro."""
+    return case(
+        *((modelo.status == situacao, prioridade)
+          for situacao, prioridade in PRIORIDADE_STATUS.items() if prioridade),
+        else_=0
+    )
+
+
 class HistoricoVacinal(Base):
     """Modelo de Histórico Vacinal."""
     __tablename__ = "historico_vacinal"
 
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
-    vacina_id = Column(Integer, ForeignKey('vacinas.id'), nullable=False)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id', ondelete='CASCADE'),
+                        nullable=False)
+    vacina_id = Column(Integer, ForeignKey('vacinas.id'), nullable=False, index=True)
     numero_dose = Column(Integer, nullable=False)
     status = Column(Enum(StatusDose), default=StatusDose.PENDENTE, nullable=False)
     data_aplicacao = Column(Date, nullable=True)
@@ -30,14 +53,32 @@ class HistoricoVacinal(Base):
     local_aplicacao = Column(String(100), nullable=True)
     profissional = Column(String(100), nullable=True)
     observacoes = Column(Text, nullable=True)
-    created_at = Column(Date, default=datetime.utcnow, nullable=False)
-    updated_at = Column(Date, default=datetime.utcnow,
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow,
     onupdate=datetime.utcnow, nullable=False)
+    # Número de alteração gerado pelo banco; cursor da sincronização incremental
+    versao = Column(BigInteger, nullable=False, server_default="0",
+                    default=SequenciaAlteracao("historico_vacinal"),
+                    onupdate=SequenciaAlteracao("historico_vacinal"))
 
     # Relacionamentos
     vacina = relationship("Vacina", back_populates="historico_vacinal")
     usuario = relationship("Usuario", back_populates="historico_vacinal")
 
+    # Um registro por dose; inclui usuario_id, exigência do particionamento
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "vacina_id", "numero_dose",
+                         name="uq_historico_usuario_vacina_dose"),
+        # Sincronização incremental: alterações do usuário em ordem de versão
+        Index("ix_historico_vacinal_usuario_versao", "usuario_id", "versao", "id"),
+        # Listagem do usuário (e filtro por período) já na ordem da resposta, sem Sort
+        Index("ix_historico_vacinal_usuario_aplicacao", "usuario_id",
+              data_aplicacao.desc().nullslast(), created_at.desc()).ddl_if(dialect="postgresql"),
+        # No SQLite, DESC já põe os nulos por último e NULLS LAST não é aceito em índices
+        Index("ix_historico_vacinal_usuario_aplicacao", "usuario_id",
+              data_aplicacao.desc(), created_at.desc()).ddl_if(dialect="sqlite"),
+    )
+
     def __repr__(self) -> str:
         return (f"<HistoricoVacinal(id={self.id}, usuario_id={self.usuario_id}, "
                 f"vacina_id={self.vacina_id}, dose={self.numero_dose}, status='{self.status}')>")
@@ -60,3 +101,59 @@ class HistoricoVacinal(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
+
+
+class HistoricoVacinalArquivado(Base):
+    """Registro movido para o arquivo pelo arquivador.
+
+    Mesmas colunas de ``HistoricoVacinal`` (com o mesmo ``id``), mais a data
+    do arquivamento. Registros arquivados são somente leitura.
+    """
+    __tablename__ = "historico_vacinal_arquivado"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id', ondelete='CASCADE'),
+                        nullable=False, index=True)
+    vacina_id = Column(Integer, ForeignKey('vacinas.id'), nullable=False, index=True)
+    numero_dose = Column(Integer, nullable=False)
+    status = Column(Enum(StatusDose), nullable=False)
+    data_aplicacao = Column(Date, nullable=True)
+    data_prevista = Column(Date, nullable=True)
+    lote = Column(String(50), nullable=True)
+    local_aplicacao = Column(String(100), nullable=True)
+    profissional = Column(String(100), nullable=True)
+    observacoes = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    versao = Column(BigInteger, nullable=False, server_default="0")
+    arquivado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    vacina = relationship("Vacina")
+
+    def __repr__(self) -> str:
+        return (f"<HistoricoVacinalArquivado(id={self.id}, usuario_id={self.usuario_id}, "
+                f"vacina_id={self.vacina_id}, dose={self.numero_dose})>")
+
+
+class HistoricoVacinalRemovido(Base):
+    """Marca de um registro que saiu do histórico ativo (excluído ou arquivado).
+
+    Permite que a sincronização incremental informe as remoções; as marcas
+    são descartadas após SYNC_RETENCAO_DIAS.
+    """
+    __tablename__ = "historico_vacinal_removido"
+
+    historico_id = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id', ondelete='CASCADE'),
+                        nullable=False)
+    removido_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+    versao = Column(BigInteger, nullable=False, server_default="0",
+                    default=SequenciaAlteracao("historico_vacinal_removido"))
+
+    __table_args__ = (
+        Index("ix_historico_removido_usuario_versao", "usuario_id", "versao", "historico_id"),
+    )
+
+    def __repr__(self) -> str:
+        return (f"<HistoricoVacinalRemovido(historico_id={self.historico_id}, "
+                f"usuario_id={self.usuario_id})>")
@@ -0,0 +1,147 @@
+"""Particionamento de ``historico_vacinal`` por hash de ``usuario_id`` (Postgres).
+
+Com HISTORICO_PARTICOES=N (N > 0), a tabela é convertida em uma tabela
+particionada com N partições ``historico_vacinal_p0..pN-1``. Todas as
+consultas por usuário (listagem, estatísticas, versão para ETag) filtram
+por ``usuario_id`` e o planejador descarta as demais partições.
+
+Na inicialização a conversão só é feita se a tabela estiver vazia. Para
+converter uma base já populada, rode em janela de manutenção::
+
+    HISTORICO_PARTICOES=16 python -m app.HistoricoVacina.particionamento
+
+A chave primária passa a ser (id, usuario_id), pois o Postgres exige que
+ela contenha a chave de partição; para o ORM a identidade continua sendo
+``id``, que segue único por vir da mesma sequência.
+"""
+import logging
+import os
+import sys
+from typing import List, Optional
+
+from sqlalchemy import UniqueConstraint, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import AddConstraint, CreateIndex
+
+from app.HistoricoVacina.model import HistoricoVacinal
+# Registram no metadata as tabelas referenciadas pelas chaves estrangeiras
+from app.Usuario import model as _usuario  # pylint: disable=unused-import
+from app.Vacina import model as _vacina  # pylint: disable=unused-import
+
+logger = logging.getLogger(__name__)
+
+HISTORICO_PARTICOES = int(os.getenv("HISTORICO_PARTICOES", "0"))
+CHAVE_PARTICAO = "usuario_id"
+
+
+def _compilar(restricao, dialeto) -> str:
+    """ALTER TABLE ADD CONSTRAINT sem retirar a restrição do CREATE TABLE do modelo."""
+    return str(AddConstraint(restricao, isolate_from_table=False).compile(dialect=dialeto))
+
+
+def comandos_particionamento(particoes: int, sequencia: Optional[str] = None) -> List[str]:
+    """Gera o DDL que converte a tabela atual em uma tabela particionada.
+
+    Os índices, chaves estrangeiras e restrições de unicidade são
+    recriados a partir do modelo.
+    """
+    if particoes < 1:
+        raise ValueError("O número de partições deve ser positivo")
+    tabela = HistoricoVacinal.__table__
+    nome = tabela.name
+    antiga = f"{nome}_antigo"
+    dialeto = postgresql.dialect()
+
+    comandos = [
+        f"ALTER TABLE {nome} RENAME TO {antiga}",
+        f"CREATE TABLE {nome} (LIKE {antiga} INCLUDING DEFAULTS) "
+        f"PARTITION BY HASH ({CHAVE_PARTICAO})",
+    ]
+    comandos += [
+        f"CREATE TABLE {nome}_p{resto} PARTITION OF {nome} "
+        f"FOR VALUES WITH (MODULUS {particoes}, REMAINDER {resto})"
+        for resto in range(particoes)
+    ]
+    comandos.append(f"INSERT INTO {nome} SELECT * FROM {antiga}")
+    if sequencia:
+        comandos.append(f"ALTER SEQUENCE {sequencia} OWNED BY NONE")
+    comandos.append(f"DROP TABLE {antiga}")
+    if sequencia:
+        comandos.append(f"ALTER SEQUENCE {sequencia} OWNED BY {nome}.id")
+
+    chave_primaria = [c.name for c in tabela.primary_key.columns]
+    if CHAVE_PARTICAO not in chave_primaria:
+        chave_primaria.append(CHAVE_PARTICAO)
+    comandos.append(f"ALTER TABLE {nome} ADD PRIMARY KEY ({', '.join(chave_primaria)})")
+
+    for restricao in sorted(tabela.constraints, key=lambda r: r.name or ""):
+        if isinstance(restricao, UniqueConstraint):
+            if CHAVE_PARTICAO not in restricao.columns:
+                raise ValueError(
+                    f"A restrição {restricao.name} precisa incluir {CHAVE_PARTICAO}"
+                )
+            comandos.append(_compilar(restricao, dialeto))
+    for chave in sorted(tabela.foreign_key_constraints, key=lambda c: c.column_keys):
+        comandos.append(_compilar(chave, dialeto))
+    for indice in sorted(tabela.indexes, key=lambda i: i.name):
+        condicao = indice._ddl_if  # pylint: disable=protected-access
+        if condicao is not None and condicao.dialect not in (None, dialeto.name):
+            continue
+        comandos.append(str(CreateIndex(indice).compile(dialect=dialeto)))
+    return comandos
+
+
+def esta_particionada(conexao: Connection) -> bool:
+    """Indica se a tabela do histórico já é particionada."""
+    return bool(conexao.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :tabela)"
+    ), {"tabela": HistoricoVacinal.__tablename__}).scalar())
+
+
+def particionar_historico(
+    engine: Engine,
+    particoes: int = HISTORICO_PARTICOES,
+    somente_vazia: bool = False
+) -> bool:
+    """Converte a tabela em uma transação; retorna True se converteu.
+
+    Não faz nada fora do Postgres, com ``particoes`` <= 0, se a tabela já
+    for particionada ou, com ``somente_vazia``, se ela tiver registros.
+    """
+    if particoes <= 0 or engine.dialect.name != "postgresql":
+        return False
+    with engine.begin() as conexao:
+        if esta_particionada(conexao):
+            return False
+        tabela = HistoricoVacinal.__tablename__
+        if somente_vazia and conexao.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {tabela})")
+        ).scalar():
+            logger.warning("%s já tem registros; rode 'python -m "
+                           "app.HistoricoVacina.particionamento' para particioná-la.", tabela)
+            return False
+        sequencia = conexao.execute(
+            text("SELECT pg_get_serial_sequence(:tabela, 'id')"), {"tabela": tabela}
+        ).scalar()
+        conexao.execute(text(f"LOCK TABLE {tabela} IN ACCESS EXCLUSIVE MODE"))
+        for comando in comandos_particionamento(particoes, sequencia):
+            conexao.exec_driver_sql(comando)
+    logger.info("Tabela %s particionada em %d partições", tabela, particoes)
+    return True
+
+
+def main():
+    """Converte a tabela existente (com dados) em tabela particionada."""
+    # pylint: disable=import-outside-toplevel
+    from app.database import engine
+
+    particoes = int(sys.argv[1]) if len(sys.argv) > 1 else HISTORICO_PARTICOES
+    if not particionar_historico(engine, particoes):
+        print("Nada a fazer (banco não é Postgres, partições não configuradas "
+              "ou tabela já particionada)")
+
+
+if __name__ == "__main__":
+    main()
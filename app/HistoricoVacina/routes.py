@@ -1,14 +1,37 @@
 """Rotas do histórico vacinal."""
 from datetime import date
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
-from fastapi import APIRouter, Depends, status, HTTPException, Path
+from fastapi import APIRouter, Depends, status, HTTPException, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
+from app import cache
+from app.eventos import Inscricao, transmitir
+from app.condicional import (
+    CACHE_CONTROL_PRIVADO,
+    cabecalhos_condicionais,
+    etag_corresponde,
+    gerar_etag,
+    nao_modificado,
+)
 from app.database import get_db
+from app.negociacao import (
+    RESPOSTAS_NEGOCIADAS,
+    campos_pedidos,
+    escolher_formato,
+    responder,
+    serializar,
+)
 from app.schemas import (
+    AlteracoesHistorico,
+    AplicacaoLoteResponse,
+    CarteiraResponse,
+    EscopoCarteira,
+    ItemAplicacaoLote,
     HistoricoVacinalCreate,
+    HistoricoVacinalDose,
     HistoricoVacinalUpdate,
     HistoricoVacinalResponse,
     HistoricoVacinalCompleto,
@@ -21,6 +44,11 @@ from app.HistoricoVacina.model import StatusDose
 from app.Usuario.model import Usuario
 
 router = APIRouter(prefix="/{usuario_id}/historico", tags=["Histórico Vacinal"])
+lote_router = APIRouter(prefix="/historico", tags=["Histórico Vacinal"])
+carteira_router = APIRouter(prefix="/usuarios", tags=["Histórico Vacinal"])
+
+# Máximo de itens por requisição de aplicação em lote
+APLICACAO_LOTE_MAXIMO = 5000
 
 class FiltrosHistorico(BaseModel):
     """Modelo para os parâmetros de filtro do histórico."""
@@ -28,6 +56,64 @@ class FiltrosHistorico(BaseModel):
     mes: Optional[int] = Field(None, ge=1, le=12, description="Mês para filtrar o histórico")
     vacina_id: Optional[int] = Field(None, description="ID da vacina para filtrar")
     status_filtro: Optional[StatusDoseEnum] = Field(None, description="Status da dose para filtrar")
+    incluir_arquivados: bool = Field(
+        False, description="Inclui registros movidos para o arquivo (canceladas e antigos)"
+    )
+    fields: Optional[str] = Field(
+        None, description="Campos de cada item, separados por vírgula (padrão: todos)"
+    )
+
+def _resposta_registro(registro) -> dict:
+    """Monta a resposta de escrita a partir do registro gravado."""
+    return {
+        "id": registro.id,
+        "usuario_id": registro.usuario_id,
+        "vacina_id": registro.vacina_id,
+        "vacina_nome": registro.vacina.nome,
+        "numero_dose": registro.numero_dose,
+        "status": registro.status,
+        "data_aplicacao": registro.data_aplicacao,
+        "data_prevista": registro.data_prevista,
+        "lote": registro.lote,
+        "local_aplicacao": registro.local_aplicacao,
+        "profissional": registro.profissional,
+        "observacoes": registro.observacoes,
+        "created_at": registro.created_at,
+        "updated_at": registro.updated_at,
+    }
+
+# Campos da listagem que vêm da vacina, e o atributo correspondente
+_CAMPOS_DA_VACINA = {"vacina_nome": "nome", "vacina_doses_totais": "doses"}
+
+def _registro_completo(registro, campos: Optional[Sequence[str]] = None) -> dict:
+    """Monta um item da listagem, com os dados da vacina.
+
+    Com ``campos``, só eles são lidos do registro (os demais podem nem ter
+    sido carregados).
+    """
+    if campos is not None:
+        return {
+            campo: (getattr(registro.vacina, _CAMPOS_DA_VACINA[campo])
+                    if campo in _CAMPOS_DA_VACINA else getattr(registro, campo))
+            for campo in campos
+        }
+    return {
+        "id": registro.id,
+        "usuario_id": registro.usuario_id,
+        "vacina_id": registro.vacina_id,
+        "vacina_nome": registro.vacina.nome,
+        "vacina_doses_totais": registro.vacina.doses,
+        "numero_dose": registro.numero_dose,
+        "status": registro.status,
+        "data_aplicacao": registro.data_aplicacao,
+        "data_prevista": registro.data_prevista,
+        "lote": registro.lote,
+        "local_aplicacao": registro.local_aplicacao,
+        "profissional": registro.profissional,
+        "observacoes": registro.observacoes,
+        "created_at": registro.created_at,
+        "updated_at": registro.updated_at
+    }
 
 class DadosAplicacao(BaseModel):
     """Modelo para os dados de aplicação da vacina."""
@@ -36,50 +122,67 @@ class DadosAplicacao(BaseModel):
     local_aplicacao: Optional[str] = Field(None, description="Local onde foi aplicada")
     profissional: Optional[str] = Field(None, description="Nome do profissional")
 
+class AplicacaoLote(BaseModel):
+    """Modelo para aplicar os mesmos dados a várias doses."""
+    itens: List[ItemAplicacaoLote] = Field(
+        ..., min_length=1, max_length=APLICACAO_LOTE_MAXIMO,
+        description="Doses a marcar como aplicadas"
+    )
+    dados: DadosAplicacao
+    itens_por_transacao: Optional[int] = Field(
+        None, ge=1, description="Confirma a cada N itens (padrão: APLICACAO_TRANSACAO)"
+    )
+
 # Listar histórico vacinal com filtros
 @router.get(
     "/",
     response_model=List[HistoricoVacinalCompleto],
     status_code=status.HTTP_200_OK,
+    responses=RESPOSTAS_NEGOCIADAS,
     summary="Listar histórico vacinal do usuário",
     description="Retorna o histórico vacinal completo do usuário com filtros opcionais"
 )
 async def listar_historico(
+    request: Request,
     usuario_id: int = Path(..., description="ID do usuário"),
     filtros: FiltrosHistorico = Depends(),
     db: Session = Depends(get_db)
 ):
     """Lista o histórico vacinal do usuário com filtros opcionais."""
+    campos_itens = campos_pedidos(filtros.fields, HistoricoVacinalCompleto)
+    # fields entra já normalizado: "lote,id" e "id, lote" dão a mesma chave e ETag
+    filtros_json = {**filtros.model_dump(mode="json", exclude={"fields"}), "fields": campos_itens}
+    versao = HistoricoVacinalController.versao_historico(db, usuario_id)
+    etag = gerar_etag(
+        "historico", usuario_id, versao, filtros_json,
+        escolher_formato(request.headers.get("accept"))
+    )
+    headers = cabecalhos_condicionais(etag, CACHE_CONTROL_PRIVADO, versao[2])
+    if etag_corresponde(request, etag):
+        return nao_modificado(headers)
+
+    campos = list(campos_itens or HistoricoVacinalCompleto.model_fields)
+    chave = cache.chave_historico(usuario_id, "lista", filtros_json)
+    linhas = cache.obter(chave)
+    if linhas is not None:
+        return responder(request, linhas, campos, headers)
+
     historico = HistoricoVacinalController.listar_por_usuario(
         db=db,
         usuario_id=usuario_id,
         ano=filtros.ano,
         mes=filtros.mes,
         vacina_id=filtros.vacina_id,
-        status_filtro=filtros.status_filtro
+        status_filtro=filtros.status_filtro,
+        incluir_arquivados=filtros.incluir_arquivados,
+        campos=campos_itens
     )
 
-    resultado = []
-    for h in historico:
-        resultado.append({
-            "id": h.id,
-            "usuario_id": h.usuario_id,
-            "vacina_id": h.vacina_id,
-            "vacina_nome": h.vacina.nome,
-            "vacina_doses_totais": h.vacina.doses,
-            "numero_dose": h.numero_dose,
-            "status": h.status,
-            "data_aplicacao": h.data_aplicacao,
-            "data_prevista": h.data_prevista,
-            "lote": h.lote,
-            "local_aplicacao": h.local_aplicacao,
-            "profissional": h.profissional,
-            "observacoes": h.observacoes,
-            "created_at": h.created_at,
-            "updated_at": h.updated_at
-        })
-
-    return resultado
+    resultado = [_registro_completo(h, campos_itens) for h in historico]
+
+    linhas = serializar(resultado, HistoricoVacinalCompleto, campos_itens)
+    cache.guardar(chave, linhas)
+    return responder(request, linhas, campos, headers)
 
 
 @router.get(
@@ -94,10 +197,61 @@ async def obter_estatisticas(
     db: Session = Depends(get_db)
 ):
     """obter estatisticas do historico"""
-    estatisticas = HistoricoVacinalController.obter_estatisticas(db, usuario_id)
+    chave = cache.chave_historico(usuario_id, "estatisticas")
+    estatisticas = cache.obter(chave)
+    if estatisticas is None:
+        estatisticas = HistoricoVacinalController.obter_estatisticas(db, usuario_id)
+        cache.guardar(chave, estatisticas)
     return estatisticas
 
 
+@router.get(
+    "/changes",
+    response_model=AlteracoesHistorico,
+    status_code=status.HTTP_200_OK,
+    responses={
+        400: {"model": ErrorResponse, "description": "Token inválido"},
+        410: {"model": ErrorResponse, "description": "Token expirado; sincronize do zero"}
+    },
+    summary="Sincronizar alterações do histórico",
+    description="Retorna só os registros criados, alterados ou removidos desde o token "
+                "'since'; sem ele, retorna o histórico ativo inteiro"
+)
+async def listar_alteracoes(
+    usuario_id: int,
+    since: Optional[str] = Query(None, description="Token devolvido na sincronização anterior"),
+    db: Session = Depends(get_db)
+):
+    """Sincronização incremental para clientes offline."""
+    alteracoes = HistoricoVacinalController.listar_alteracoes(db, usuario_id, since)
+    alteracoes["alterados"] = [_registro_completo(h) for h in alteracoes["alterados"]]
+    return alteracoes
+
+
+def _fluxo_eventos(request: Request, inscricao: Inscricao) -> StreamingResponse:
+    """Resposta text/event-stream da inscrição."""
+    return StreamingResponse(
+        transmitir(inscricao, request.is_disconnected),
+        media_type="text/event-stream",
+        # Sem cache e sem buffer no proxy (nginx), para entregar cada evento na hora
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get(
+    "/eventos",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    responses={200: {"content": {"text/event-stream": {}}}},
+    summary="Acompanhar alterações do histórico (SSE)",
+    description="Server-Sent Events com cada dose criada, atualizada, aplicada ou removida "
+                "do usuário; substitui o polling da listagem"
+)
+async def eventos_do_usuario(request: Request, usuario_id: int):
+    """Fluxo de eventos do histórico de um usuário."""
+    return _fluxo_eventos(request, Inscricao(usuario_id=usuario_id))
+
+
 @router.get(
     "/{historico_id}",
     response_model=HistoricoVacinalCompleto,
@@ -146,7 +300,9 @@ async def buscar_registro(
     status_code=status.HTTP_201_CREATED,
     responses={400: {"model": ErrorResponse}, 404: {"model": ErrorResponse}},
     summary="Adicionar registro ao histórico vacinal",
-    description="Cria um novo registro de dose no histórico vacinal do usuário"
+    description="Cria um registro de dose no histórico vacinal do usuário; se a dose "
+                "já existir, só os campos vazios são preenchidos e o status nunca é "
+                "rebaixado (para substituir a dose, use PUT /doses/{vacina}/{dose})"
 )
 async def criar_registro(
     usuario_id: int,
@@ -167,22 +323,37 @@ async def criar_registro(
         historico_data=historico_data,
     )
 
-    return {
-        "id": novo_registro.id,
-        "usuario_id": novo_registro.usuario_id,
-        "vacina_id": novo_registro.vacina_id,
-        "vacina_nome": novo_registro.vacina.nome,
-        "numero_dose": novo_registro.numero_dose,
-        "status": novo_registro.status,
-        "data_aplicacao": novo_registro.data_aplicacao,
-        "data_prevista": novo_registro.data_prevista,
-        "lote": novo_registro.lote,
-        "local_aplicacao": novo_registro.local_aplicacao,
-        "profissional": novo_registro.profissional,
-        "observacoes": novo_registro.observacoes,
-        "created_at": novo_registro.created_at,
-        "updated_at": novo_registro.updated_at,
-    }
+    return _resposta_registro(novo_registro)
+
+
+@router.put(
+    "/doses/{vacina_id}/{numero_dose}",
+    response_model=HistoricoVacinalResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        201: {"model": HistoricoVacinalResponse, "description": "Dose criada"},
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse}
+    },
+    summary="Gravar dose (idempotente)",
+    description="Cria ou substitui a dose indicada da vacina; repetir a requisição "
+                "não gera registros duplicados"
+)
+async def gravar_dose(
+    usuario_id: int,
+    vacina_id: int,
+    numero_dose: int,
+    dados: HistoricoVacinalDose,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """Grava a dose com upsert, respondendo 201 se ela foi criada."""
+    registro, criado = HistoricoVacinalController.registrar_dose(
+        db, usuario_id, vacina_id, numero_dose, dados.model_dump()
+    )
+    if criado:
+        response.status_code = status.HTTP_201_CREATED
+    return _resposta_registro(registro)
 
 
 @router.put(
@@ -276,3 +447,72 @@ async def deletar_registro(
     """deletar registro do historico"""
     HistoricoVacinalController.deletar_registro(db, historico_id, usuario_id)
     return None
+
+@lote_router.patch(
+    "/aplicar",
+    response_model=AplicacaoLoteResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Marcar doses como aplicadas em lote",
+    description="Marca como aplicadas várias doses de uma campanha com os mesmos dados; "
+                "doses inexistentes ou já aplicadas são informadas e não alteradas"
+)
+async def marcar_lote_como_aplicado(
+    corpo: AplicacaoLote,
+    db: Session = Depends(get_db)
+):
+    """Marcar várias doses como aplicadas"""
+    itens = HistoricoVacinalController.marcar_doses_como_aplicadas(
+        db,
+        [(item.usuario_id, item.historico_id) for item in corpo.itens],
+        corpo.dados.model_dump(),
+        corpo.itens_por_transacao
+    )
+    return {
+        "aplicadas": sum(item["resultado"] == "aplicada" for item in itens),
+        "itens": itens,
+    }
+
+
+@carteira_router.get(
+    "/{usuario_id}/carteira",
+    response_model=CarteiraResponse,
+    status_code=status.HTTP_200_OK,
+    responses={404: {"model": ErrorResponse}},
+    summary="Carteira de vacinação",
+    description="Usuário, histórico agrupado por vacina com o progresso, estatísticas e "
+                "próximas doses em uma só requisição (duas consultas ao banco)"
+)
+async def obter_carteira(
+    usuario_id: int,
+    vacinas: EscopoCarteira = Query(
+        EscopoCarteira.TODAS,
+        description="'todas' inclui o catálogo inteiro; 'do_usuario', só as vacinas "
+                    "com alguma dose registrada"
+    ),
+    db: Session = Depends(get_db)
+):
+    """Monta a carteira de vacinação do usuário."""
+    carteira = HistoricoVacinalController.obter_carteira(
+        db, usuario_id, so_do_usuario=vacinas == EscopoCarteira.DO_USUARIO
+    )
+    for grupo in carteira["vacinas"]:
+        grupo["doses"] = [_registro_completo(h) for h in grupo["doses"]]
+    carteira["proximas_doses"] = [_registro_completo(h) for h in carteira["proximas_doses"]]
+    return carteira
+
+
+@lote_router.get(
+    "/eventos",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    responses={200: {"content": {"text/event-stream": {}}}},
+    summary="Acompanhar alterações do histórico de uma clínica (SSE)",
+    description="Server-Sent Events das doses alteradas com o local de aplicação "
+                "informado (todas, se omitido)"
+)
+async def eventos_da_clinica(
+    request: Request,
+    local: Optional[str] = Query(None, description="Local de aplicação (clínica)")
+):
+    """Fluxo de eventos do histórico de um local de aplicação."""
+    return _fluxo_eventos(request, Inscricao(local=local))
@@ -0,0 +1,98 @@
+"""Apoio à sincronização incremental do histórico (clientes offline).
+
+O cliente guarda um token opaco com três posições: a do último registro
+alterado entregue, em ordem de (versao, id), a da última remoção entregue,
+em ordem de (versao, historico_id), e a maior ``versao`` de vacina já vista.
+Cada chamada devolve só o que veio depois dessas posições; quando uma vacina
+muda (ex.: é renomeada), os registros do usuário com ela são reenviados.
+
+A ``versao`` é gerada pelo banco na escrita (``SequenciaAlteracao``), e não
+pelo relógio da aplicação. No Postgres é o id da transação, e só entregamos
+versões abaixo do horizonte (o menor id de transação ainda em andamento):
+uma transação longa que confirme depois não fica para trás do token.
+
+Registros que saem do histórico ativo (excluídos, descartados por
+duplicidade ou arquivados) deixam uma marca em ``historico_vacinal_removido``
+por SYNC_RETENCAO_DIAS; um token mais antigo que isso expira e o cliente
+precisa sincronizar do zero.
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from sqlalchemy import DateTime, delete, literal, select, text
+from sqlalchemy.orm import Session
+
+from app.database import SequenciaAlteracao, insert_com_conflito
+from app.HistoricoVacina.model import HistoricoVacinal, HistoricoVacinalRemovido
+
+SYNC_LIMITE = int(os.getenv("SYNC_LIMITE", "500"))
+SYNC_RETENCAO_DIAS = int(os.getenv("SYNC_RETENCAO_DIAS", "30"))
+
+
+class Posicao(NamedTuple):
+    """Ponto do token até onde o cliente já recebeu alterações e remoções."""
+    alterado_versao: int
+    alterado_id: int
+    removido_versao: int
+    removido_id: int
+    vacinas_versao: int
+    emitido_em: datetime
+
+
+def codificar_token(posicao: Posicao) -> str:
+    """Serializa a posição em um token opaco, seguro para URLs."""
+    dados = [*posicao[:-1], posicao.emitido_em.isoformat()]
+    return base64.urlsafe_b64encode(json.dumps(dados).encode()).decode().rstrip("=")
+
+
+def decodificar_token(token: str) -> Optional[Posicao]:
+    """Lê a posição do token; retorna None se ele for inválido."""
+    try:
+        preenchimento = "=" * (-len(token) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(token + preenchimento))
+        *posicoes, emitido_em = dados
+        return Posicao(*(int(valor) for valor in posicoes),
+                       datetime.fromisoformat(emitido_em))
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def horizonte_alteracoes(db: Session) -> Optional[int]:
+    """Versão abaixo da qual todas as escritas já terminaram (None = sem limite).
+
+    No Postgres é o menor id de transação ainda em andamento. No SQLite, com
+    um único escritor, toda versão visível já foi confirmada em ordem.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    return db.execute(text("SELECT txid_snapshot_xmin(txid_current_snapshot())")).scalar()
+
+
+def registrar_remocoes(db: Session, *filtros):
+    """Marca como removidos os registros que atendem aos filtros.
+
+    Deve ser chamado na mesma transação e antes do DELETE correspondente.
+    """
+    stmt = insert_com_conflito(db)(HistoricoVacinalRemovido).from_select(
+        ["historico_id", "usuario_id", "removido_em", "versao"],
+        select(
+            HistoricoVacinal.id, HistoricoVacinal.usuario_id,
+            literal(datetime.utcnow(), DateTime),
+            SequenciaAlteracao(HistoricoVacinalRemovido.__tablename__)
+        ).where(*filtros)
+    )
+    db.execute(stmt.on_conflict_do_nothing())
+
+
+def limpar_remocoes(db: Session, retencao_dias: int = SYNC_RETENCAO_DIAS) -> int:
+    """Descarta marcas mais antigas que a retenção; retorna quantas."""
+    limite = datetime.utcnow() - timedelta(days=retencao_dias)
+    removidas = db.execute(delete(HistoricoVacinalRemovido).where(
+        HistoricoVacinalRemovido.removido_em < limite
+    )).rowcount
+    db.commit()
+    return removidas
@@ -3,7 +3,8 @@ import os
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.database import SessionLocal, Base, engine
+from app import cache
+from app.database import Base, engine
 
 ENV = os.getenv("ENV", "dev")
 
@@ -29,11 +30,9 @@ def db_engine():
     yield engine
     Base.metadata.drop_all(bind=engine)
 
-@pytest.fixture()
-def db_session():
-    """Fornece uma sessão de banco de dados para cada teste."""
-    session = SessionLocal()
-    try:
-        yield session
-    finally:
-        session.close()
+@pytest.fixture(autouse=True)
+def limpar_cache():
+    """Evita que respostas em cache de um teste vazem para o próximo."""
+    cache.get_cache().limpar()
+    yield
+    cache.get_cache().limpar()
@@ -0,0 +1,101 @@
+"""Testes da aplicação de doses em lote."""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import engine
+from app.HistoricoVacina.controller import HistoricoVacinalController
+from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
+from app.main import app
+from app.Relatorios.model import CoberturaPendente, DosesAplicadasDiarias
+from app.Usuario.model import Usuario
+from app.Vacina.model import Vacina
+
+client = TestClient(app)
+
+DADOS = {"data_aplicacao": "2024-06-10", "lote": "C-1", "local_aplicacao": "UBS Centro",
+         "profissional": None}
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture()
+def campanha(db_session):
+    """Três usuários com uma dose pendente cada; retorna [(usuario_id, historico_id)]."""
+    vacina = Vacina(nome="Influenza", doses=1)
+    usuarios = [Usuario(nome=f"U{i}", email=f"u{i}@example.com", senha="x") for i in range(3)]
+    db_session.add_all([vacina, *usuarios])
+    db_session.commit()
+    registros = [HistoricoVacinal(usuario_id=usuario.id, vacina_id=vacina.id, numero_dose=1)
+                 for usuario in usuarios]
+    db_session.add_all(registros)
+    db_session.commit()
+    return [(registro.usuario_id, registro.id) for registro in registros]
+
+
+def _aplicar(pares, **extras):
+    itens = [{"usuario_id": usuario_id, "historico_id": historico_id}
+             for usuario_id, historico_id in pares]
+    resposta = client.patch("/historico/aplicar", json={"itens": itens, "dados": DADOS, **extras})
+    assert resposta.status_code == 200
+    return resposta.json()
+
+
+# pylint: disable=redefined-outer-name
+class TestAplicacaoLote:
+    """Um UPDATE condicional por transação, com resultado por item."""
+
+    def test_resultados_por_item(self, db_session, campanha):
+        """Aplica as pendentes e informa as já aplicadas e as inexistentes."""
+        (u1, h1), (u2, h2), _ = campanha
+        _aplicar([(u1, h1)])
+
+        # h2 pertence a u2: o par (u1, h2) não existe
+        resposta = _aplicar([(u1, h1), (u2, h2), (u1, h2), (u2, 999)])
+
+        assert resposta["aplicadas"] == 1
+        assert [item["resultado"] for item in resposta["itens"]] == [
+            "ja_aplicada", "aplicada", "nao_encontrado", "nao_encontrado"
+        ]
+        registro = db_session.get(HistoricoVacinal, h2)
+        db_session.refresh(registro)
+        assert registro.status == StatusDose.APLICADA
+        assert (registro.lote, registro.local_aplicacao) == ("C-1", "UBS Centro")
+
+    def test_um_update_por_transacao(self, db_session, campanha):
+        """Sem divisão há um único UPDATE; com itens_por_transacao, um por bloco."""
+        comandos = []
+
+        def capturar(_conexao, _cursor, sql, *_):
+            if sql.lstrip().upper().startswith("UPDATE HISTORICO_VACINAL"):
+                comandos.append(sql)
+
+        event.listen(engine, "before_cursor_execute", capturar)
+        try:
+            _aplicar(campanha[:2])
+            assert len(comandos) == 1
+            comandos.clear()
+            HistoricoVacinalController.marcar_doses_como_aplicadas(
+                db_session, campanha, {**DADOS, "data_aplicacao": date(2024, 6, 10)},
+                por_transacao=1
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", capturar)
+        # Só o terceiro ainda estava pendente, mas cada bloco faz seu UPDATE
+        assert len(comandos) == 3
+
+    def test_repetir_nao_conta_duas_vezes(self, db_session, campanha):
+        """Reenviar o lote não altera a série diária nem a fila de cobertura."""
+        primeira = _aplicar(campanha, itens_por_transacao=2)
+        segunda = _aplicar(campanha)
+
+        assert primeira["aplicadas"] == 3
+        assert segunda["aplicadas"] == 0
+        assert db_session.query(DosesAplicadasDiarias.quantidade).scalar() == 3
+        assert db_session.query(CoberturaPendente).count() == 3
+
+    def test_valida_corpo(self, db_session):
+        """Lista vazia é rejeitada."""
+        resposta = client.patch("/historico/aplicar", json={"itens": [], "dados": DADOS})
+        assert resposta.status_code == 422
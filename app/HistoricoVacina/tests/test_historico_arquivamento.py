@@ -0,0 +1,136 @@
+"""Testes do arquivamento de registros frios do histórico."""
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select
+
+from app.HistoricoVacina.arquivamento import arquivar_historico, arquivar_lote
+from app.HistoricoVacina.model import HistoricoVacinal, HistoricoVacinalArquivado, StatusDose
+from app.main import app
+from app.Relatorios.controller import RelatoriosController
+
+client = TestClient(app)
+
+
+def _registro(db, usuario, vacina, dose, status, dias_atras=0):
+    quando = date.today() - timedelta(days=dias_atras)
+    historico = HistoricoVacinal(
+        usuario_id=usuario.id, vacina_id=vacina.id, numero_dose=dose, status=status,
+        data_aplicacao=quando if status == StatusDose.APLICADA else None,
+        created_at=quando, updated_at=quando
+    )
+    db.add(historico)
+    db.commit()
+    return historico.id
+
+
+def _ids_listados(usuario, **params):
+    resposta = client.get(f"/usuarios/{usuario.id}/historico/", params=params)
+    assert resposta.status_code == 200
+    return [item["id"] for item in resposta.json()]
+
+
+# pylint: disable=redefined-outer-name
+class TestArquivamento:
+    """Movimentação em lotes e leitura transparente do arquivo."""
+
+    def test_canceladas_saem_da_listagem_padrao(self, db_session, usuario_vacina):
+        """Canceladas vão para o arquivo e só aparecem quando pedidas."""
+        usuario, vacina = usuario_vacina
+        aplicada = _registro(db_session, usuario, vacina, 1, StatusDose.APLICADA, 10)
+        cancelada = _registro(db_session, usuario, vacina, 2, StatusDose.CANCELADA)
+        assert _ids_listados(usuario) == [aplicada, cancelada]
+
+        assert arquivar_historico(db_session) == 1
+
+        assert _ids_listados(usuario) == [aplicada]
+        assert _ids_listados(usuario, incluir_arquivados="true") == [aplicada, cancelada]
+        assert db_session.get(HistoricoVacinalArquivado, cancelada).status == StatusDose.CANCELADA
+
+    def test_retencao_arquiva_aplicadas_antigas(self, db_session, usuario_vacina):
+        """Com retenção, aplicadas antigas saem; pendentes nunca."""
+        usuario, vacina = usuario_vacina
+        antiga = _registro(db_session, usuario, vacina, 1, StatusDose.APLICADA, 400)
+        recente = _registro(db_session, usuario, vacina, 2, StatusDose.APLICADA, 5)
+        pendente = _registro(db_session, usuario, vacina, 3, StatusDose.PENDENTE, 400)
+
+        assert arquivar_lote(db_session, retencao_dias=0) == 0
+        assert arquivar_lote(db_session, retencao_dias=365) == 1
+
+        restantes = set(db_session.scalars(select(HistoricoVacinal.id)))
+        assert restantes == {recente, pendente}
+        assert db_session.get(HistoricoVacinalArquivado, antiga) is not None
+
+    def test_retomada_apos_interrupcao(self, db_session, usuario_vacina):
+        """Um registro já copiado mas não removido é concluído sem duplicar."""
+        usuario, vacina = usuario_vacina
+        ids = [_registro(db_session, usuario, vacina, dose, StatusDose.CANCELADA)
+               for dose in (1, 2, 3)]
+        linha = db_session.get(HistoricoVacinal, ids[0])
+        db_session.execute(insert(HistoricoVacinalArquivado).values(
+            **{c.name: getattr(linha, c.name) for c in HistoricoVacinal.__table__.columns}
+        ))
+        db_session.commit()
+
+        assert arquivar_lote(db_session, lote=2) == 2
+        assert arquivar_lote(db_session, lote=2) == 1
+        assert arquivar_lote(db_session, lote=2) == 0
+        assert db_session.query(HistoricoVacinalArquivado).count() == 3
+        assert db_session.query(HistoricoVacinal).count() == 0
+
+    def test_listagem_em_cache_e_invalidada(self, db_session, usuario_vacina):
+        """Arquivar invalida as respostas em cache do usuário."""
+        usuario, vacina = usuario_vacina
+        _registro(db_session, usuario, vacina, 1, StatusDose.CANCELADA)
+        assert len(_ids_listados(usuario)) == 1
+
+        arquivar_historico(db_session)
+
+        assert not _ids_listados(usuario)
+
+    def test_cobertura_conta_doses_arquivadas(self, db_session, usuario_vacina):
+        """Agregados recalculados continuam contando as doses arquivadas."""
+        usuario, vacina = usuario_vacina
+        _registro(db_session, usuario, vacina, 1, StatusDose.APLICADA, 400)
+        _registro(db_session, usuario, vacina, 2, StatusDose.APLICADA, 400)
+        arquivar_lote(db_session, retencao_dias=30)
+
+        RelatoriosController.reconstruir_cobertura(db_session)
+        RelatoriosController.reconstruir_aplicacoes(db_session)
+
+        cobertura = RelatoriosController.relatorio_cobertura(db_session)[0]
+        assert cobertura["completos"] == 1
+        aplicacoes = RelatoriosController.aplicacoes_agrupadas(db_session, agrupar=["ano"])
+        assert aplicacoes[0]["quantidade"] == 2
+
+    def test_carteira_e_estatisticas_contam_aplicadas_arquivadas(
+        self, db_session, usuario_vacina
+    ):
+        """Doses aplicadas arquivadas seguem valendo para o usuário."""
+        usuario, vacina = usuario_vacina
+        _registro(db_session, usuario, vacina, 1, StatusDose.APLICADA, 400)
+        _registro(db_session, usuario, vacina, 2, StatusDose.APLICADA, 5)
+        arquivar_lote(db_session, retencao_dias=30)
+
+        estatisticas = client.get(f"/usuarios/{usuario.id}/historico/estatisticas").json()
+        carteira = client.get(f"/usuarios/{usuario.id}/carteira").json()
+
+        assert estatisticas["doses_aplicadas"] == 2
+        assert estatisticas["vacinas_completas"] == 1
+        grupo = carteira["vacinas"][0]
+        assert [dose["numero_dose"] for dose in grupo["doses"]] == [1, 2]
+        assert grupo["completa"]
+
+    def test_dose_aplicada_arquivada_nao_e_duplicada(self, db_session, usuario_vacina):
+        """Registrar de novo uma dose aplicada que está no arquivo gera conflito."""
+        usuario, vacina = usuario_vacina
+        _registro(db_session, usuario, vacina, 1, StatusDose.APLICADA, 400)
+        arquivar_lote(db_session, retencao_dias=30)
+
+        resposta = client.post(f"/usuarios/{usuario.id}/historico/", json={
+            "vacina_id": vacina.id, "numero_dose": 1, "status": "aplicada",
+            "data_aplicacao": "2024-05-02"
+        })
+
+        assert resposta.status_code == 409
+        assert db_session.query(HistoricoVacinal).count() == 0
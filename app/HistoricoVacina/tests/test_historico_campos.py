@@ -0,0 +1,130 @@
+"""Testes de ?fields= nas listagens: colunas no SQL e forma da resposta."""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import engine
+from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
+from app.main import app
+from app.negociacao import MIDIA_COLUNAR
+from app.Usuario.model import Usuario
+from app.Vacina.model import Vacina
+
+client = TestClient(app)
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture()
+def usuario_id(db_session):
+    """Usuário com uma dose aplicada (com observações) e uma pendente."""
+    vacina = Vacina(nome="BCG", doses=2)
+    usuario = Usuario(nome="Maria", email="maria@example.com", senha="x")
+    db_session.add_all([vacina, usuario])
+    db_session.commit()
+    db_session.add_all([
+        HistoricoVacinal(usuario_id=usuario.id, vacina_id=vacina.id, numero_dose=1,
+                         status=StatusDose.APLICADA, data_aplicacao=date(2024, 1, 10),
+                         observacoes="Reação leve no local", profissional="Dra. Ana"),
+        HistoricoVacinal(usuario_id=usuario.id, vacina_id=vacina.id, numero_dose=2),
+    ])
+    db_session.commit()
+    identificador = usuario.id
+    db_session.expunge_all()
+    return identificador
+
+
+@pytest.fixture()
+def selects():
+    """SELECTs executados durante o teste."""
+    comandos = []
+
+    def capturar(_conexao, _cursor, sql, _parametros, _contexto, _executemany):
+        if sql.lstrip().upper().startswith("SELECT"):
+            comandos.append(sql)
+
+    event.listen(engine, "before_cursor_execute", capturar)
+    yield comandos
+    event.remove(engine, "before_cursor_execute", capturar)
+
+
+# pylint: disable=redefined-outer-name, unused-argument
+class TestCamposHistorico:
+    """GET /usuarios/{id}/historico/?fields=..."""
+
+    def test_forma_da_resposta(self, db_session, usuario_id):
+        """Cada item traz só os campos pedidos."""
+        resposta = client.get(
+            f"/usuarios/{usuario_id}/historico/?fields=vacina_nome,numero_dose,data_aplicacao"
+        )
+
+        assert resposta.status_code == 200
+        assert resposta.json() == [
+            {"vacina_nome": "BCG", "numero_dose": 1, "data_aplicacao": "2024-01-10"},
+            {"vacina_nome": "BCG", "numero_dose": 2, "data_aplicacao": None},
+        ]
+
+    def test_colunas_nao_pedidas_ficam_fora_do_sql(self, db_session, usuario_id, selects):
+        """observacoes e profissional não são lidos; a vacina só vem quando pedida."""
+        client.get(f"/usuarios/{usuario_id}/historico/?fields=numero_dose,status")
+        listagem = [sql for sql in selects if "FROM historico_vacinal" in sql][-1]
+        assert "observacoes" not in listagem
+        assert "profissional" not in listagem
+        assert "vacinas" not in listagem
+
+        selects.clear()
+        client.get(f"/usuarios/{usuario_id}/historico/?fields=vacina_nome")
+        listagem = [sql for sql in selects if "FROM historico_vacinal" in sql][-1]
+        assert "vacinas" in listagem
+        assert "observacoes" not in listagem
+
+    def test_sem_consulta_por_registro(self, db_session, usuario_id, selects):
+        """Campos pedidos nunca disparam carregamento adiado."""
+        client.get(f"/usuarios/{usuario_id}/historico/"
+                   "?fields=vacina_doses_totais,lote&incluir_arquivados=true")
+        por_registro = [sql for sql in selects
+                        if "FROM historico_vacinal" in sql and "WHERE historico_vacinal.id" in sql]
+        assert not por_registro
+
+    def test_cache_separado_por_campos(self, db_session, usuario_id):
+        """Resposta completa e parcial não compartilham cache nem ETag."""
+        completa = client.get(f"/usuarios/{usuario_id}/historico/")
+        parcial = client.get(f"/usuarios/{usuario_id}/historico/?fields=id")
+
+        assert "observacoes" in completa.json()[0]
+        assert set(parcial.json()[0]) == {"id"}
+        assert completa.headers["etag"] != parcial.headers["etag"]
+
+    def test_mesmos_campos_em_outra_grafia(self, db_session, usuario_id):
+        """Ordem, espaços e repetição em fields não mudam o ETag."""
+        url = f"/usuarios/{usuario_id}/historico/"
+        primeira = client.get(f"{url}?fields=lote,id")
+        segunda = client.get(f"{url}?fields= id,lote,id", headers={
+            "If-None-Match": primeira.headers["etag"]
+        })
+
+        assert segunda.status_code == 304
+
+    def test_campo_desconhecido(self, db_session, usuario_id):
+        """Campo fora do schema resulta em 400."""
+        resposta = client.get(f"/usuarios/{usuario_id}/historico/?fields=id,senha")
+        assert resposta.status_code == 400
+
+
+# pylint: disable=redefined-outer-name, unused-argument
+class TestCamposOutrasListagens:
+    """?fields= nas listagens de usuários e vacinas."""
+
+    def test_usuarios(self, db_session, usuario_id, selects):
+        """Só id e nome são lidos e devolvidos."""
+        resposta = client.get("/usuarios/?fields=id,nome")
+
+        assert resposta.json() == [{"nome": "Maria", "id": usuario_id}]
+        listagem = [sql for sql in selects if "FROM usuarios" in sql][-1]
+        assert "email" not in listagem and "senha" not in listagem
+
+    def test_vacinas_colunar(self, db_session, usuario_id):
+        """O formato colunar traz só as colunas pedidas."""
+        resposta = client.get("/vacinas/?fields=nome", headers={"Accept": MIDIA_COLUNAR})
+        assert resposta.json() == {"nome": ["BCG"]}
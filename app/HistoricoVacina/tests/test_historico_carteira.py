@@ -0,0 +1,111 @@
+"""Testes da carteira de vacinação agregada."""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import engine
+from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
+from app.main import app
+from app.Usuario.model import Usuario
+from app.Vacina.model import Vacina
+
+client = TestClient(app)
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture()
+def carteira(db_session):
+    """Usuário com a BCG completa e uma dose de três da Hepatite B; a Febre Amarela sem doses."""
+    bcg = Vacina(nome="BCG", doses=1)
+    hepatite = Vacina(nome="Hepatite B", doses=3)
+    febre = Vacina(nome="Febre Amarela", doses=1)
+    usuario = Usuario(nome="Maria", email="maria@example.com", senha="x")
+    outro = Usuario(nome="João", email="joao@example.com", senha="x")
+    db_session.add_all([bcg, hepatite, febre, usuario, outro])
+    db_session.commit()
+    db_session.add_all([
+        HistoricoVacinal(usuario_id=usuario.id, vacina_id=bcg.id, numero_dose=1,
+                         status=StatusDose.APLICADA, data_aplicacao=date(2024, 1, 10)),
+        HistoricoVacinal(usuario_id=usuario.id, vacina_id=hepatite.id, numero_dose=1,
+                         status=StatusDose.APLICADA, data_aplicacao=date(2024, 2, 1)),
+        HistoricoVacinal(usuario_id=usuario.id, vacina_id=hepatite.id, numero_dose=3,
+                         status=StatusDose.PENDENTE, data_prevista=date(2024, 9, 1)),
+        HistoricoVacinal(usuario_id=usuario.id, vacina_id=hepatite.id, numero_dose=2,
+                         status=StatusDose.PENDENTE, data_prevista=date(2024, 3, 1)),
+        HistoricoVacinal(usuario_id=outro.id, vacina_id=febre.id, numero_dose=1,
+                         status=StatusDose.APLICADA, data_aplicacao=date(2024, 1, 5)),
+    ])
+    db_session.commit()
+    usuario_id = usuario.id
+    # Sessão vazia: nada do preparo poupa consultas ao endpoint
+    db_session.expunge_all()
+    return usuario_id
+
+
+def _contar_consultas():
+    """Lista que recebe cada comando executado até o listener ser removido."""
+    comandos = []
+
+    def contar(_conexao, _cursor, sql, _parametros, _contexto, _executemany):
+        comandos.append(sql)
+
+    event.listen(engine, "before_cursor_execute", contar)
+    return comandos, lambda: event.remove(engine, "before_cursor_execute", contar)
+
+
+# pylint: disable=redefined-outer-name, unused-argument
+class TestCarteira:
+    """GET /usuarios/{id}/carteira."""
+
+    def test_agrupa_por_vacina_com_progresso(self, db_session, carteira):
+        """Todas as vacinas do catálogo, com as doses do usuário em ordem."""
+        resposta = client.get(f"/usuarios/{carteira}/carteira")
+
+        assert resposta.status_code == 200
+        corpo = resposta.json()
+        assert corpo["usuario"]["email"] == "maria@example.com"
+        vacinas = {v["vacina_nome"]: v for v in corpo["vacinas"]}
+        assert set(vacinas) == {"BCG", "Hepatite B", "Febre Amarela"}
+        assert vacinas["BCG"]["completa"] and vacinas["BCG"]["progresso"] == 1
+        hepatite = vacinas["Hepatite B"]
+        assert (hepatite["doses_aplicadas"], hepatite["completa"]) == (1, False)
+        assert hepatite["progresso"] == pytest.approx(1 / 3, abs=1e-4)
+        assert [d["numero_dose"] for d in hepatite["doses"]] == [1, 2, 3]
+        # Doses de outros usuários não entram
+        assert vacinas["Febre Amarela"]["doses"] == []
+        assert vacinas["Febre Amarela"]["progresso"] == 0
+
+    def test_estatisticas_e_proximas_doses(self, db_session, carteira):
+        """As estatísticas coincidem com as do endpoint próprio."""
+        corpo = client.get(f"/usuarios/{carteira}/carteira").json()
+        estatisticas = client.get(f"/usuarios/{carteira}/historico/estatisticas").json()
+
+        assert corpo["estatisticas"] == estatisticas
+        assert [(d["vacina_nome"], d["numero_dose"]) for d in corpo["proximas_doses"]] == [
+            ("Hepatite B", 2), ("Hepatite B", 3)
+        ]
+
+    def test_so_vacinas_do_usuario(self, db_session, carteira):
+        """Com vacinas=do_usuario, vacinas sem doses do usuário ficam de fora."""
+        corpo = client.get(f"/usuarios/{carteira}/carteira?vacinas=do_usuario").json()
+
+        assert [v["vacina_nome"] for v in corpo["vacinas"]] == ["BCG", "Hepatite B"]
+
+    @pytest.mark.parametrize("vacinas", ["todas", "do_usuario"])
+    def test_no_maximo_tres_consultas(self, db_session, carteira, vacinas):
+        """Usuário, vacinas com doses e doses arquivadas, sem carregamento por registro."""
+        comandos, parar = _contar_consultas()
+        try:
+            resposta = client.get(f"/usuarios/{carteira}/carteira?vacinas={vacinas}")
+        finally:
+            parar()
+
+        assert resposta.status_code == 200
+        assert len([sql for sql in comandos if sql.lstrip().upper().startswith("SELECT")]) == 3
+
+    def test_usuario_inexistente(self, db_session):
+        """404 quando o usuário não existe."""
+        resposta = client.get("/usuarios/999/carteira")
+        assert resposta.status_code == 404
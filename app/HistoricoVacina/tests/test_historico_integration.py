@@ -2,6 +2,7 @@
 from datetime import date
 import pytest
 from fastapi.testclient import TestClient
+from app import cache
 from app.main import app
 from app.database import get_db, SessionLocal, Base, engine
 from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
@@ -183,3 +184,92 @@ def test_deletar_historico(test_client, criar_usuario, criar_vacina, db_session)
         f"/usuarios/{criar_usuario.id}/historico/{historico.id}"
     )
     assert response.status_code == 404
+
+# pylint: disable=redefined-outer-name
+def test_listagem_em_cache_invalidada_por_escrita(test_client, criar_usuario, criar_vacina):
+    """A listagem vem do cache até que uma escrita invalide o usuário."""
+    url = f"/usuarios/{criar_usuario.id}/historico/"
+    assert test_client.get(url).json() == []
+
+    response = test_client.post(url, json={
+        "vacina_id": criar_vacina.id,
+        "numero_dose": 1,
+        "data_prevista": date.today().isoformat()
+    })
+    assert response.status_code == 201
+    historico_id = response.json()["id"]
+
+    assert len(test_client.get(url).json()) == 1
+    estatisticas = test_client.get(f"{url}estatisticas").json()
+    assert estatisticas["doses_pendentes"] == 1
+
+    test_client.patch(f"{url}{historico_id}/aplicar",
+                      json={"data_aplicacao": date.today().isoformat()})
+    assert test_client.get(url).json()[0]["status"] == "aplicada"
+    assert test_client.get(f"{url}estatisticas").json()["doses_aplicadas"] == 1
+
+    test_client.delete(f"{url}{historico_id}")
+    assert test_client.get(url).json() == []
+
+# pylint: disable=redefined-outer-name
+def test_listagem_etag_e_nao_modificado(test_client, criar_usuario, criar_vacina):
+    """O histórico responde 304 enquanto não mudar e novo ETag após escrita."""
+    url = f"/usuarios/{criar_usuario.id}/historico/"
+    response = test_client.get(url)
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = test_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = test_client.get(f"{url}?ano=2024", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    test_client.post(url, json={
+        "vacina_id": criar_vacina.id,
+        "numero_dose": 1,
+        "data_prevista": date.today().isoformat()
+    })
+    response = test_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert "last-modified" in response.headers
+
+# pylint: disable=redefined-outer-name
+def test_etag_vem_do_banco_e_muda_com_a_vacina(test_client, criar_usuario, criar_vacina):
+    """O ETag não depende do cache do processo e muda quando a vacina é renomeada."""
+    url = f"/usuarios/{criar_usuario.id}/historico/"
+    test_client.post(url, json={
+        "vacina_id": criar_vacina.id,
+        "numero_dose": 1,
+        "data_prevista": date.today().isoformat()
+    })
+    etag = test_client.get(url).headers["etag"]
+
+    cache.get_cache().limpar()
+    assert test_client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    test_client.put(f"/vacinas/{criar_vacina.id}", json={"nome": "Vacina Renomeada"})
+    response = test_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["vacina_nome"] == "Vacina Renomeada"
+
+# pylint: disable=redefined-outer-name
+def test_filtro_por_ano_e_mes(test_client, criar_usuario, criar_vacina, db_session):
+    """Ano e mês filtram por intervalo de datas, inclusive na virada do ano."""
+    for dose, aplicada_em in enumerate([date(2023, 12, 31), date(2024, 1, 1),
+                                        date(2024, 12, 31)], start=1):
+        db_session.add(HistoricoVacinal(
+            usuario_id=criar_usuario.id, vacina_id=criar_vacina.id, numero_dose=dose,
+            status=StatusDose.APLICADA, data_aplicacao=aplicada_em
+        ))
+    db_session.commit()
+    url = f"/usuarios/{criar_usuario.id}/historico/"
+
+    def datas(params):
+        return [item["data_aplicacao"] for item in test_client.get(url, params=params).json()]
+
+    assert datas({"ano": 2024}) == ["2024-12-31", "2024-01-01"]
+    assert datas({"ano": 2024, "mes": 12}) == ["2024-12-31"]
+    assert datas({"ano": 2023, "mes": 12}) == ["2023-12-31"]
+    assert datas({"mes": 12}) == ["2024-12-31", "2023-12-31"]
@@ -0,0 +1,87 @@
+"""Testes do particionamento do histórico vacinal por hash de usuário."""
+import json
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, SessionLocal, engine
+from app.HistoricoVacina.controller import HistoricoVacinalController
+from app.HistoricoVacina.particionamento import (
+    comandos_particionamento,
+    particionar_historico,
+)
+
+POSTGRES = engine.dialect.name == "postgresql"
+
+
+def test_ddl_cria_particoes_e_chave_com_usuario():
+    """O DDL gera uma partição por resto e inclui usuario_id na chave."""
+    comandos = comandos_particionamento(4, "historico_vacinal_id_seq")
+
+    assert "PARTITION BY HASH (usuario_id)" in comandos[1]
+    for resto in range(4):
+        assert (f"CREATE TABLE historico_vacinal_p{resto} PARTITION OF historico_vacinal "
+                f"FOR VALUES WITH (MODULUS 4, REMAINDER {resto})") in comandos
+    assert "ALTER TABLE historico_vacinal ADD PRIMARY KEY (id, usuario_id)" in comandos
+    assert any("REFERENCES usuarios (id)" in c for c in comandos)
+    assert any("REFERENCES vacinas (id)" in c for c in comandos)
+    # A sequência é desvinculada antes de a tabela antiga ser removida
+    assert (comandos.index("ALTER SEQUENCE historico_vacinal_id_seq OWNED BY NONE")
+            < comandos.index("DROP TABLE historico_vacinal_antigo"))
+
+
+def test_ddl_nao_altera_o_create_table_do_modelo():
+    """Gerar o DDL não tira a restrição de unicidade do CREATE TABLE do modelo.
+
+    Roda em SQLite: o DDL é gerado antes de as tabelas serem criadas.
+    """
+    comandos = comandos_particionamento(4)
+    banco = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(banco)
+
+    assert ("ALTER TABLE historico_vacinal ADD CONSTRAINT uq_historico_usuario_vacina_dose "
+            "UNIQUE (usuario_id, vacina_id, numero_dose)") in comandos
+    assert [restricao["name"] for restricao in inspect(banco).get_unique_constraints(
+        "historico_vacinal"
+    )] == ["uq_historico_usuario_vacina_dose"]
+
+
+def test_numero_de_particoes_invalido():
+    """Zero partições não é uma configuração válida para o DDL."""
+    with pytest.raises(ValueError):
+        comandos_particionamento(0)
+
+
+@pytest.mark.skipif(POSTGRES, reason="verifica o comportamento fora do Postgres")
+def test_ignorado_fora_do_postgres():
+    """Em SQLite a conversão não faz nada."""
+    assert particionar_historico(engine, 4) is False
+
+
+@pytest.mark.skipif(not POSTGRES, reason="particionamento declarativo exige Postgres")
+def test_listagem_por_usuario_le_uma_unica_particao():
+    """O plano da listagem por usuário só acessa uma partição."""
+    Base.metadata.create_all(bind=engine)
+    particionar_historico(engine, 4)
+    capturadas = []
+
+    def capturar(_conn, _cursor, statement, parameters, _context, _executemany):
+        capturadas.append((statement, parameters))
+
+    db = SessionLocal()
+    event.listen(engine, "before_cursor_execute", capturar)
+    try:
+        HistoricoVacinalController.listar_por_usuario(db, 7)
+        statement, parameters = capturadas[-1]
+        plano = db.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        ).scalar()
+    finally:
+        event.remove(engine, "before_cursor_execute", capturar)
+        db.close()
+
+    plano = json.dumps(plano if isinstance(plano, list) else json.loads(plano))
+    particoes = {f"historico_vacinal_p{resto}" for resto in range(4)}
+    acessadas = {p for p in particoes if f'"{p}"' in plano}
+    assert len(acessadas) == 1
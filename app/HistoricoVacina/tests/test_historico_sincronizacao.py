@@ -0,0 +1,144 @@
+"""Testes da sincronização incremental do histórico."""
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.HistoricoVacina import sincronizacao
+from app.HistoricoVacina.arquivamento import arquivar_historico
+from app.HistoricoVacina.controller import HistoricoVacinalController
+from app.HistoricoVacina.model import HistoricoVacinal
+from app.HistoricoVacina.sincronizacao import Posicao, codificar_token, limpar_remocoes
+from app.main import app
+from app.Usuario.model import Usuario
+from app.Vacina.model import Vacina
+
+client = TestClient(app)
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture()
+def doses(db_session):
+    """Usuário com três doses de uma vacina; retorna (usuario_id, ids)."""
+    usuario = Usuario(nome="Maria", email="maria@example.com", senha="x")
+    vacina = Vacina(nome="Hepatite B", doses=3)
+    db_session.add_all([usuario, vacina])
+    db_session.commit()
+    ids = [
+        client.put(f"/usuarios/{usuario.id}/historico/doses/{vacina.id}/{dose}",
+                   json={}).json()["id"]
+        for dose in (1, 2, 3)
+    ]
+    return usuario.id, ids
+
+
+def _sincronizar(usuario_id, token=None):
+    params = {"since": token} if token else {}
+    resposta = client.get(f"/usuarios/{usuario_id}/historico/changes", params=params)
+    assert resposta.status_code == 200
+    return resposta.json()
+
+
+# pylint: disable=redefined-outer-name
+class TestSincronizacao:
+    """Entrega apenas o que mudou desde o token."""
+
+    def test_primeira_sincronizacao_e_depois_nada(self, doses):
+        """Sem token vem tudo; com o token devolvido, nada."""
+        usuario_id, ids = doses
+        inicial = _sincronizar(usuario_id)
+        assert [item["id"] for item in inicial["alterados"]] == ids
+        assert inicial["removidos"] == []
+        assert inicial["tem_mais"] is False
+
+        seguinte = _sincronizar(usuario_id, inicial["token"])
+        assert seguinte["alterados"] == []
+        assert seguinte["removidos"] == []
+
+    def test_somente_alterados_e_removidos(self, doses):
+        """Uma atualização e uma exclusão geram exatamente dois itens."""
+        usuario_id, ids = doses
+        token = _sincronizar(usuario_id)["token"]
+
+        client.put(f"/usuarios/{usuario_id}/historico/{ids[0]}", json={"lote": "L1"})
+        client.delete(f"/usuarios/{usuario_id}/historico/{ids[1]}")
+
+        alteracoes = _sincronizar(usuario_id, token)
+        assert [(item["id"], item["lote"]) for item in alteracoes["alterados"]] == [
+            (ids[0], "L1")
+        ]
+        assert alteracoes["removidos"] == [ids[1]]
+
+    def test_arquivados_saem_como_removidos(self, db_session, doses):
+        """Registros arquivados deixam o histórico ativo e viram remoções."""
+        usuario_id, ids = doses
+        token = _sincronizar(usuario_id)["token"]
+        client.put(f"/usuarios/{usuario_id}/historico/{ids[2]}", json={"status": "cancelada"})
+        token = _sincronizar(usuario_id, token)["token"]
+
+        arquivar_historico(db_session)
+
+        assert _sincronizar(usuario_id, token)["removidos"] == [ids[2]]
+
+    def test_paginacao_por_token(self, db_session, doses):
+        """Com limite pequeno, as páginas cobrem tudo sem repetir."""
+        usuario_id, ids = doses
+        recebidos, token = [], None
+        while True:
+            pagina = HistoricoVacinalController.listar_alteracoes(
+                db_session, usuario_id, token, limite=2
+            )
+            recebidos += [registro.id for registro in pagina["alterados"]]
+            token = pagina["token"]
+            if not pagina["tem_mais"]:
+                break
+        assert recebidos == ids
+
+    def test_vacina_renomeada_reenvia_registros(self, doses):
+        """Renomear a vacina reenvia os registros do usuário com o nome novo."""
+        usuario_id, ids = doses
+        inicial = _sincronizar(usuario_id)
+        vacina_id = inicial["alterados"][0]["vacina_id"]
+
+        client.put(f"/vacinas/{vacina_id}", json={"nome": "Hepatite B (recombinante)"})
+
+        alteracoes = _sincronizar(usuario_id, inicial["token"])
+        assert [item["id"] for item in alteracoes["alterados"]] == ids
+        assert {item["vacina_nome"] for item in alteracoes["alterados"]} == {
+            "Hepatite B (recombinante)"
+        }
+        assert _sincronizar(usuario_id, alteracoes["token"])["alterados"] == []
+
+    def test_versao_gerada_pelo_banco_e_crescente(self, db_session, doses):
+        """Cada escrita recebe uma versão maior, sem depender do relógio da aplicação."""
+        usuario_id, ids = doses
+        antes = db_session.get(HistoricoVacinal, ids[2]).versao
+
+        client.put(f"/usuarios/{usuario_id}/historico/{ids[0]}", json={"lote": "L1"})
+
+        db_session.expire_all()
+        assert db_session.get(HistoricoVacinal, ids[0]).versao > antes
+
+    def test_token_invalido_e_expirado(self, db_session, doses):
+        """Token ilegível dá 400; anterior à retenção das remoções dá 410."""
+        usuario_id, _ = doses
+        url = f"/usuarios/{usuario_id}/historico/changes"
+        assert client.get(url, params={"since": "xyz"}).status_code == 400
+
+        antigo = datetime.utcnow() - timedelta(days=sincronizacao.SYNC_RETENCAO_DIAS + 1)
+        token = codificar_token(Posicao(0, 0, 0, 0, 0, antigo))
+        assert client.get(url, params={"since": token}).status_code == 410
+        assert limpar_remocoes(db_session) == 0
+
+    def test_token_de_outro_formato_e_invalido(self, doses):
+        """Um JSON que não é uma posição completa é tratado como token ilegível."""
+        usuario_id, _ = doses
+        agora = datetime.utcnow().isoformat()
+        token = base64.urlsafe_b64encode(json.dumps([agora, 1, agora, 0]).encode()).decode()
+
+        resposta = client.get(f"/usuarios/{usuario_id}/historico/changes",
+                              params={"since": token})
+
+        assert resposta.status_code == 400
@@ -0,0 +1,193 @@
+"""Testes da unicidade de (usuário, vacina, dose) e das escritas idempotentes."""
+from datetime import date
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, SessionLocal
+from app.HistoricoVacina.controller import HistoricoVacinalController
+from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
+from app.HistoricoVacina.unicidade import (
+    garantir_unicidade,
+    main,
+    possui_restricao,
+    verificar_unicidade,
+)
+from app.main import app
+from app.Relatorios.model import DosesAplicadasDiarias
+from app.Usuario.model import Usuario
+from app.Vacina.model import Vacina
+
+client = TestClient(app)
+
+
+# pylint: disable=redefined-outer-name
+class TestEscritaIdempotente:
+    """POST reenviado e PUT por dose não duplicam registros."""
+
+    @patch("app.HistoricoVacina.controller.email_service.enviar_confirmacao_vacina")
+    def test_post_repetido_atualiza_a_mesma_dose(self, mock_email, db_session, usuario_vacina):
+        """O segundo POST da mesma dose atualiza o registro e não reenvia e-mail."""
+        usuario, vacina = usuario_vacina
+        corpo = {"vacina_id": vacina.id, "numero_dose": 1, "data_prevista": "2024-05-01"}
+
+        primeira = client.post(f"/usuarios/{usuario.id}/historico/", json=corpo)
+        segunda = client.post(f"/usuarios/{usuario.id}/historico/",
+                              json={**corpo, "lote": "L-2"})
+
+        assert primeira.status_code == segunda.status_code == 201
+        assert primeira.json()["id"] == segunda.json()["id"]
+        assert segunda.json()["lote"] == "L-2"
+        assert db_session.query(HistoricoVacinal).count() == 1
+        mock_email.assert_called_once()
+        estatisticas = client.get(f"/usuarios/{usuario.id}/historico/estatisticas").json()
+        assert estatisticas["total_doses"] == 1
+
+    @patch("app.HistoricoVacina.controller.email_service.enviar_confirmacao_vacina")
+    def test_post_nao_rebaixa_dose_aplicada(self, _mock_email, db_session, usuario_vacina):
+        """Um POST pendente sobre a dose aplicada não apaga a aplicação."""
+        usuario, vacina = usuario_vacina
+        url = f"/usuarios/{usuario.id}/historico/"
+        client.post(url, json={"vacina_id": vacina.id, "numero_dose": 1, "status": "aplicada",
+                               "data_aplicacao": "2024-05-02", "lote": "L-1"})
+
+        resposta = client.post(url, json={"vacina_id": vacina.id, "numero_dose": 1,
+                                          "data_prevista": "2024-06-01"})
+
+        corpo = resposta.json()
+        assert (corpo["status"], corpo["data_aplicacao"], corpo["lote"]) == (
+            "aplicada", "2024-05-02", "L-1"
+        )
+        assert corpo["data_prevista"] == "2024-06-01"
+        assert db_session.query(DosesAplicadasDiarias.quantidade).scalar() == 1
+
+    def test_criacao_decidida_pelo_insert(self, db_session, usuario_vacina):
+        """Se outra escrita criou a dose antes do INSERT, esta é uma atualização.
+
+        A dose é criada por outra sessão entre a validação e a gravação, como
+        em duas primeiras escritas concorrentes: só a primeira conta como criada.
+        """
+        usuario, vacina = usuario_vacina
+        outra = SessionLocal()
+        try:
+            _, criada = HistoricoVacinalController.gravar_dose(
+                outra, usuario.id, vacina.id, 1,
+                {"status": "aplicada", "data_aplicacao": date(2024, 5, 2)}
+            )
+        finally:
+            outra.close()
+
+        _, criada_de_novo = HistoricoVacinalController.gravar_dose(
+            db_session, usuario.id, vacina.id, 1,
+            {"status": "aplicada", "data_aplicacao": date(2024, 5, 2)}
+        )
+
+        assert criada and not criada_de_novo
+        assert db_session.query(DosesAplicadasDiarias.quantidade).scalar() == 1
+
+    def test_put_cria_e_depois_substitui(self, db_session, usuario_vacina):
+        """PUT responde 201 ao criar e 200 ao repetir, sempre no mesmo registro."""
+        usuario, vacina = usuario_vacina
+        url = f"/usuarios/{usuario.id}/historico/doses/{vacina.id}/2"
+        corpo = {"status": "aplicada", "data_aplicacao": "2024-05-02"}
+
+        criada = client.put(url, json=corpo)
+        repetida = client.put(url, json=corpo)
+
+        assert criada.status_code == 201
+        assert repetida.status_code == 200
+        assert criada.json()["id"] == repetida.json()["id"]
+        assert db_session.query(HistoricoVacinal).count() == 1
+        # A repetição não conta a aplicação duas vezes na série diária
+        assert db_session.query(DosesAplicadasDiarias.quantidade).scalar() == 1
+
+    @patch("app.HistoricoVacina.controller.restricao_ativa", return_value=False)
+    def test_escritas_sem_restricao_no_banco(self, _restricao, db_session, usuario_vacina):
+        """Sem a restrição, POST e PUT gravam pelo caminho sem ON CONFLICT."""
+        usuario, vacina = usuario_vacina
+
+        criada = client.post(f"/usuarios/{usuario.id}/historico/",
+                             json={"vacina_id": vacina.id, "numero_dose": 1})
+        atualizada = client.put(f"/usuarios/{usuario.id}/historico/doses/{vacina.id}/1",
+                                json={"status": "aplicada", "data_aplicacao": "2024-05-02"})
+
+        assert criada.status_code == 201
+        assert atualizada.status_code == 200
+        assert criada.json()["id"] == atualizada.json()["id"]
+        assert db_session.query(HistoricoVacinal).count() == 1
+        assert db_session.query(DosesAplicadasDiarias.quantidade).scalar() == 1
+
+    def test_put_valida_dose(self, db_session, usuario_vacina):
+        """Número de dose fora do esquema da vacina é rejeitado."""
+        usuario, vacina = usuario_vacina
+        resposta = client.put(f"/usuarios/{usuario.id}/historico/doses/{vacina.id}/3",
+                              json={})
+        assert resposta.status_code == 400
+
+    def test_atualizar_para_dose_existente(self, db_session, usuario_vacina):
+        """Mudar o número para uma dose já registrada gera conflito."""
+        usuario, vacina = usuario_vacina
+        base = f"/usuarios/{usuario.id}/historico/doses/{vacina.id}"
+        client.put(f"{base}/1", json={})
+        segunda = client.put(f"{base}/2", json={}).json()["id"]
+
+        resposta = client.put(f"/usuarios/{usuario.id}/historico/{segunda}",
+                              json={"numero_dose": 1})
+
+        assert resposta.status_code == 409
+
+
+def test_base_antiga_e_deduplicada(caplog):
+    """Sem a restrição a inicialização só avisa e o relatório não altera nada.
+
+    Com ``aplicar`` as repetições são removidas e a restrição é criada.
+    """
+    banco = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(banco)
+    with banco.begin() as conexao:
+        # Recria a tabela sem a restrição, como em bases anteriores a ela
+        conexao.exec_driver_sql("ALTER TABLE historico_vacinal RENAME TO antiga")
+        conexao.exec_driver_sql("CREATE TABLE historico_vacinal AS SELECT * FROM antiga")
+        conexao.exec_driver_sql("DROP TABLE antiga")
+    assert not possui_restricao(banco)
+
+    with Session(banco) as db:
+        db.add_all([Usuario(id=1, nome="Ana", email="ana@example.com", senha="x"),
+                    Vacina(id=1, nome="HPV", doses=2)])
+        for historico_id, dose, situacao in [(1, 1, StatusDose.PENDENTE),
+                                             (2, 1, StatusDose.APLICADA),
+                                             (3, 1, StatusDose.PENDENTE),
+                                             (4, 2, StatusDose.PENDENTE),
+                                             (5, 2, StatusDose.PENDENTE)]:
+            db.add(HistoricoVacinal(
+                id=historico_id, usuario_id=1, vacina_id=1, numero_dose=dose,
+                status=situacao, created_at=date.today(), updated_at=date.today()
+            ))
+        db.commit()
+
+    assert not verificar_unicidade(banco)
+    assert "app.HistoricoVacina.unicidade" in caplog.text
+    assert garantir_unicidade(banco) == 3
+    with Session(banco) as db:
+        assert db.query(HistoricoVacinal).count() == 5
+
+    assert garantir_unicidade(banco, aplicar=True) == 3
+    assert possui_restricao(banco)
+    assert verificar_unicidade(banco)
+    assert garantir_unicidade(banco, aplicar=True) == 0
+    with Session(banco) as db:
+        assert sorted(db.query(HistoricoVacinal.id).all()) == [(2,), (4,)]
+
+
+def test_comando_relata_sem_aplicar(capsys):
+    """Sem --aplicar o comando só relata; com a restrição presente não faz nada."""
+    banco = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(banco)
+
+    with patch("app.database.engine", banco):
+        main([])
+
+    assert "já existe" in capsys.readouterr().out
@@ -0,0 +1,170 @@
+"""Unicidade de (usuario_id, vacina_id, numero_dose) no histórico vacinal.
+
+Bases criadas antes da restrição ``uq_historico_usuario_vacina_dose`` podem
+ter a mesma dose repetida (por exemplo, um POST reenviado pelo cliente). A
+migração ``0007`` cria a restrição quando não há repetições. Sem ela, a
+inicialização registra um erro e as escritas de dose usam leitura seguida de
+INSERT em vez do ``ON CONFLICT`` (veja ``restricao_ativa``). A limpeza é um
+comando de manutenção, que por padrão apenas relata quantas repetições seriam
+removidas::
+
+    python -m app.HistoricoVacina.unicidade            # relatório
+    python -m app.HistoricoVacina.unicidade --aplicar  # remove e cria a restrição
+
+Com ``--aplicar`` as repetições são removidas e a restrição é criada na
+mesma transação. Fica o registro de maior prioridade (aplicada > atrasada >
+pendente > cancelada) e, no empate, o mais antigo; os agregados dos
+relatórios são ajustados.
+"""
+import argparse
+import logging
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import and_, delete, exists, func, inspect, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.schema import AddConstraint
+
+from app import cache
+from app.HistoricoVacina.model import HistoricoVacinal, prioridade_status
+from app.HistoricoVacina.sincronizacao import registrar_remocoes
+from app.Relatorios.controller import RelatoriosController
+
+logger = logging.getLogger(__name__)
+
+# Presença da restrição por engine, verificada uma vez por processo
+_RESTRICAO_ATIVA: "WeakKeyDictionary[Engine, bool]" = WeakKeyDictionary()
+
+RESTRICAO = next(
+    restricao for restricao in HistoricoVacinal.__table__.constraints
+    if restricao.name == "uq_historico_usuario_vacina_dose"
+)
+
+
+def criterio_repetidos():
+    """Condição SQL dos registros superados por outro da mesma dose."""
+    outro = aliased(HistoricoVacinal)
+    return exists().where(
+        outro.usuario_id == HistoricoVacinal.usuario_id,
+        outro.vacina_id == HistoricoVacinal.vacina_id,
+        outro.numero_dose == HistoricoVacinal.numero_dose,
+        or_(
+            prioridade_status(outro) > prioridade_status(HistoricoVacinal),
+            and_(
+                prioridade_status(outro) == prioridade_status(HistoricoVacinal),
+                outro.id < HistoricoVacinal.id
+            )
+        )
+    )
+
+
+def remover_repetidos(db: Session) -> int:
+    """Exclui as doses repetidas, sem confirmar a transação; retorna quantas."""
+    condicao = criterio_repetidos()
+    RelatoriosController.descontar_registros(db, HistoricoVacinal, condicao)
+    registrar_remocoes(db, condicao)
+    usuarios = db.execute(
+        delete(HistoricoVacinal).where(condicao).returning(HistoricoVacinal.usuario_id),
+        execution_options={"synchronize_session": False}
+    ).scalars().all()
+    for usuario_id in set(usuarios):
+        cache.invalidar_historico(usuario_id)
+    return len(usuarios)
+
+
+def possui_restricao(engine: Engine) -> bool:
+    """Indica se o banco já tem a restrição (ou o índice único equivalente)."""
+    inspetor = inspect(engine)
+    tabela = HistoricoVacinal.__tablename__
+    if not inspetor.has_table(tabela):
+        return False
+    nomes = {restricao["name"] for restricao in inspetor.get_unique_constraints(tabela)}
+    nomes |= {indice["name"] for indice in inspetor.get_indexes(tabela)}
+    return RESTRICAO.name in nomes
+
+
+def contar_repetidos(db: Session) -> int:
+    """Quantos registros ``remover_repetidos`` excluiria."""
+    return db.scalar(
+        select(func.count()).select_from(HistoricoVacinal).where(criterio_repetidos())
+    )
+
+
+def garantir_unicidade(engine: Engine, aplicar: bool = False) -> int:
+    """Conta as repetições e, com ``aplicar``, remove-as e cria a restrição.
+
+    Retorna quantas repetições há (ou foram removidas). O SQLite não altera
+    restrições de tabelas existentes; nele é criado um índice único de mesmo
+    nome, que também serve ao ``ON CONFLICT``.
+    """
+    tabela = HistoricoVacinal.__tablename__
+    if not inspect(engine).has_table(tabela) or possui_restricao(engine):
+        return 0
+    with Session(engine) as db:
+        if not aplicar:
+            return contar_repetidos(db)
+        if engine.dialect.name == "postgresql":
+            db.execute(text(f"LOCK TABLE {tabela} IN SHARE ROW EXCLUSIVE MODE"))
+        removidos = remover_repetidos(db)
+        if engine.dialect.name == "sqlite":
+            colunas = ", ".join(coluna.name for coluna in RESTRICAO.columns)
+            db.execute(text(f"CREATE UNIQUE INDEX {RESTRICAO.name} ON {tabela} ({colunas})"))
+        else:
+            adicionar = AddConstraint(RESTRICAO, isolate_from_table=False)
+            db.execute(text(str(adicionar.compile(dialect=engine.dialect))))
+        db.commit()
+    _RESTRICAO_ATIVA.pop(engine, None)
+    if removidos:
+        logger.warning("%d doses repetidas removidas de %s", removidos, tabela)
+    return removidos
+
+
+def restricao_ativa(db: Session) -> bool:
+    """Indica se as escritas de dose podem usar ``ON CONFLICT`` na restrição.
+
+    Verificado uma vez por processo; depois de criar a restrição com o
+    comando de manutenção, reinicie a aplicação para voltar ao ``ON CONFLICT``.
+    """
+    engine = db.get_bind().engine
+    if engine not in _RESTRICAO_ATIVA:
+        _RESTRICAO_ATIVA[engine] = possui_restricao(engine)
+    return _RESTRICAO_ATIVA[engine]
+
+
+def verificar_unicidade(engine: Engine) -> bool:
+    """Na inicialização: registra um erro se a restrição faltar, sem alterar o banco."""
+    ativa = _RESTRICAO_ATIVA[engine] = (
+        not inspect(engine).has_table(HistoricoVacinal.__tablename__) or possui_restricao(engine)
+    )
+    if ativa:
+        return True
+    logger.error(
+        "Restrição %s ausente: doses repetidas não são impedidas e as escritas de dose "
+        "usam o caminho sem ON CONFLICT. Rode 'python -m app.HistoricoVacina.unicidade' "
+        "para o relatório e '--aplicar' em janela de manutenção", RESTRICAO.name
+    )
+    return False
+
+
+def main(argv=None):
+    """Relata (ou, com --aplicar, remove) as doses repetidas e cria a restrição."""
+    # pylint: disable=import-outside-toplevel
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--aplicar", action="store_true",
+                        help="remove as repetições e cria a restrição")
+    argumentos = parser.parse_args(argv)
+
+    if possui_restricao(engine):
+        print(f"Nada a fazer: a restrição {RESTRICAO.name} já existe")
+        return
+    repetidos = garantir_unicidade(engine, aplicar=argumentos.aplicar)
+    if argumentos.aplicar:
+        print(f"{repetidos} doses repetidas removidas; restrição {RESTRICAO.name} criada")
+    else:
+        print(f"{repetidos} doses repetidas seriam removidas (use --aplicar)")
+
+
+if __name__ == "__main__":
+    main()
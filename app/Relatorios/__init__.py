@@ -0,0 +1,2 @@
+# pylint: disable=invalid-name
+"""disabilita o aviso de nome invalido"""
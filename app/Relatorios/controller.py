@@ -0,0 +1,534 @@
+"""Controlador dos relatórios agregados."""
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    case, delete, extract, false, func, insert, literal, select, true, tuple_, union_all
+)
+from sqlalchemy.orm import Session
+
+from app.database import insert_com_conflito
+from app.HistoricoVacina.model import HistoricoVacinal, HistoricoVacinalArquivado, StatusDose
+from app.Relatorios.model import (
+    CoberturaPendente,
+    CoberturaUsuarioVacina,
+    CoberturaVacina,
+    DosesAplicadasDiarias,
+    SituacaoCobertura,
+)
+from app.Usuario.model import Usuario
+from app.Vacina.model import Vacina
+
+Par = Tuple[int, int]
+ChaveAplicacao = Tuple[date, int, str, str]
+
+DIMENSOES_TEMPO = ("dia", "mes", "ano")
+DIMENSOES = DIMENSOES_TEMPO + ("vacina", "local", "profissional")
+
+
+def classificar(doses_aplicadas: int, doses_vacina: int) -> SituacaoCobertura:
+    """Classifica um par com ao menos uma dose aplicada."""
+    if doses_aplicadas >= doses_vacina:
+        return SituacaoCobertura.COMPLETO
+    return SituacaoCobertura.PARCIAL
+
+
+def chave_aplicacao(historico: HistoricoVacinal) -> Optional[ChaveAplicacao]:
+    """Linha de ``doses_aplicadas_diarias`` em que o registro é contado.
+
+    Retorna None para doses não aplicadas ou sem data de aplicação.
+    """
+    if historico.status != StatusDose.APLICADA or historico.data_aplicacao is None:
+        return None
+    return (historico.data_aplicacao, historico.vacina_id,
+            historico.local_aplicacao or "", historico.profissional or "")
+
+
+def doses_aplicadas():
+    """Subconsulta com as doses aplicadas, ativas e arquivadas."""
+    def aplicadas(modelo):
+        return select(
+            modelo.id, modelo.usuario_id, modelo.vacina_id, modelo.data_aplicacao,
+            modelo.local_aplicacao, modelo.profissional
+        ).where(modelo.status == StatusDose.APLICADA)
+
+    return union_all(
+        aplicadas(HistoricoVacinal), aplicadas(HistoricoVacinalArquivado)
+    ).subquery("doses_aplicadas")
+
+
+class RelatoriosController:
+    """Manutenção e leitura dos agregados de cobertura vacinal.
+
+    As escritas no histórico apenas enfileiram o par (usuário, vacina)
+    afetado; o agendador processa a fila e ajusta os contadores por vacina
+    com a diferença entre a situação antiga e a nova de cada par.
+    """
+
+    @staticmethod
+    def marcar_pendente(db: Session, usuario_id: int, vacina_id: int):
+        """Enfileira o par para recálculo, na mesma transação da escrita."""
+        stmt = insert_com_conflito(db)(CoberturaPendente).values(
+            usuario_id=usuario_id, vacina_id=vacina_id
+        )
+        db.execute(stmt.on_conflict_do_nothing())
+
+    @staticmethod
+    def marcar_pendentes(db: Session, pares: Sequence[Par]):
+        """Enfileira vários pares com um único INSERT (escritas em lote)."""
+        if not pares:
+            return
+        stmt = insert_com_conflito(db)(CoberturaPendente).values([
+            {"usuario_id": usuario_id, "vacina_id": vacina_id}
+            for usuario_id, vacina_id in set(pares)
+        ])
+        db.execute(stmt.on_conflict_do_nothing())
+
+    @staticmethod
+    def marcar_vacina_para_reconstruir(db: Session, vacina_id: int):
+        """Pede o recálculo completo de uma vacina (ex.: mudou o nº de doses)."""
+        stmt = insert_com_conflito(db)(CoberturaVacina).values(
+            vacina_id=vacina_id, reconstruir=True
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[CoberturaVacina.vacina_id],
+            set_={"reconstruir": True}
+        ))
+
+    @staticmethod
+    def _inserir_pares(db: Session, vacina_id: Optional[int] = None):
+        """Recalcula do histórico as linhas por usuário (de uma ou todas as vacinas)."""
+        doses = doses_aplicadas()
+        aplicadas = func.count(doses.c.id)
+        consulta = select(
+            doses.c.usuario_id,
+            doses.c.vacina_id,
+            aplicadas,
+            case(
+                (aplicadas >= Vacina.doses, SituacaoCobertura.COMPLETO.value),
+                else_=SituacaoCobertura.PARCIAL.value
+            ),
+        ).join(Vacina, Vacina.id == doses.c.vacina_id)
+        if vacina_id is not None:
+            consulta = consulta.where(doses.c.vacina_id == vacina_id)
+        consulta = consulta.group_by(doses.c.usuario_id, doses.c.vacina_id, Vacina.doses)
+        db.execute(insert(CoberturaUsuarioVacina).from_select(
+            ["usuario_id", "vacina_id", "doses_aplicadas", "situacao"], consulta
+        ))
+
+    @staticmethod
+    def _inserir_totais(db: Session, *filtros):
+        """Soma as linhas por usuário em contadores por vacina."""
+        def contar(situacao):
+            return func.coalesce(func.sum(
+                case((CoberturaUsuarioVacina.situacao == situacao.value, 1), else_=0)
+            ), 0)
+
+        consulta = select(
+            Vacina.id,
+            contar(SituacaoCobertura.COMPLETO),
+            contar(SituacaoCobertura.PARCIAL),
+            false(),
+        ).outerjoin(
+            CoberturaUsuarioVacina, CoberturaUsuarioVacina.vacina_id == Vacina.id
+        ).where(*filtros).group_by(Vacina.id)
+        db.execute(insert(CoberturaVacina).from_select(
+            ["vacina_id", "completos", "parciais", "reconstruir"], consulta
+        ))
+
+    @staticmethod
+    def _reconstruir_vacina(db: Session, vacina_id: int):
+        """Recalcula do zero os agregados de uma vacina."""
+        db.execute(delete(CoberturaUsuarioVacina).where(
+            CoberturaUsuarioVacina.vacina_id == vacina_id
+        ))
+        db.execute(delete(CoberturaVacina).where(CoberturaVacina.vacina_id == vacina_id))
+        RelatoriosController._inserir_pares(db, vacina_id)
+        RelatoriosController._inserir_totais(db, Vacina.id == vacina_id)
+
+    @staticmethod
+    def _aplicar_pares(db: Session, pares: List[Par]):
+        """Recalcula os pares alterados e aplica as diferenças aos contadores."""
+        registros = doses_aplicadas()
+        aplicadas = {
+            (usuario_id, vacina_id): total
+            for usuario_id, vacina_id, total in db.query(
+                registros.c.usuario_id,
+                registros.c.vacina_id,
+                func.count(registros.c.id)
+            ).filter(
+                # O filtro simples por usuário permite descartar partições
+                registros.c.usuario_id.in_({usuario_id for usuario_id, _ in pares}),
+                tuple_(registros.c.usuario_id, registros.c.vacina_id).in_(pares)
+            ).group_by(registros.c.usuario_id, registros.c.vacina_id)
+        }
+        chave = tuple_(CoberturaUsuarioVacina.usuario_id, CoberturaUsuarioVacina.vacina_id)
+        anteriores = {
+            (usuario_id, vacina_id): situacao
+            for usuario_id, vacina_id, situacao in db.query(
+                CoberturaUsuarioVacina.usuario_id,
+                CoberturaUsuarioVacina.vacina_id,
+                CoberturaUsuarioVacina.situacao
+            ).filter(chave.in_(pares))
+        }
+        doses = dict(db.query(Vacina.id, Vacina.doses).filter(
+            Vacina.id.in_({vacina_id for _, vacina_id in pares})
+        ).all())
+
+        deltas: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        novas, removidas = [], []
+        for usuario_id, vacina_id in pares:
+            total = aplicadas.get((usuario_id, vacina_id), 0)
+            nova = None
+            if total and vacina_id in doses:
+                nova = classificar(total, doses[vacina_id]).value
+                novas.append({"usuario_id": usuario_id, "vacina_id": vacina_id,
+                              "doses_aplicadas": total, "situacao": nova})
+            else:
+                removidas.append((usuario_id, vacina_id))
+            antiga = anteriores.get((usuario_id, vacina_id))
+            if antiga != nova:
+                if antiga:
+                    deltas[vacina_id][antiga] -= 1
+                if nova:
+                    deltas[vacina_id][nova] += 1
+
+        insert_dialeto = insert_com_conflito(db)
+        if removidas:
+            db.execute(delete(CoberturaUsuarioVacina).where(chave.in_(removidas)))
+        if novas:
+            stmt = insert_dialeto(CoberturaUsuarioVacina).values(novas)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[CoberturaUsuarioVacina.usuario_id,
+                                CoberturaUsuarioVacina.vacina_id],
+                set_={"doses_aplicadas": stmt.excluded.doses_aplicadas,
+                      "situacao": stmt.excluded.situacao}
+            ))
+        for vacina_id, delta in deltas.items():
+            completos = delta[SituacaoCobertura.COMPLETO.value]
+            parciais = delta[SituacaoCobertura.PARCIAL.value]
+            if not completos and not parciais:
+                continue
+            stmt = insert_dialeto(CoberturaVacina).values(
+                vacina_id=vacina_id, completos=completos, parciais=parciais
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[CoberturaVacina.vacina_id],
+                set_={"completos": CoberturaVacina.completos + stmt.excluded.completos,
+                      "parciais": CoberturaVacina.parciais + stmt.excluded.parciais}
+            ))
+
+    @staticmethod
+    def _atualizar_totais(db: Session):
+        """Cria contadores para vacinas novas e atualiza o total de usuários."""
+        stmt = insert_com_conflito(db)(CoberturaVacina).from_select(
+            ["vacina_id"], select(Vacina.id).where(true())
+        )
+        db.execute(stmt.on_conflict_do_nothing())
+        db.query(CoberturaVacina).update({
+            "total_usuarios": select(func.count(Usuario.id)).where(
+                Usuario.excluido_em.is_(None)
+            ).scalar_subquery(),
+            "atualizado_em": datetime.utcnow(),
+        }, synchronize_session=False)
+
+    @staticmethod
+    def atualizar_cobertura(db: Session, lote: int = 1000) -> int:
+        """Processa até ``lote`` pares da fila; retorna quantos itens tratou.
+
+        Chamado periodicamente pelo agendador até retornar 0. Com vários
+        workers, ``SKIP LOCKED`` (Postgres) impede que dois processem o
+        mesmo par.
+        """
+        if db.query(CoberturaVacina.vacina_id).first() is None:
+            RelatoriosController.reconstruir_cobertura(db)
+            return 0
+
+        processados = 0
+        for (vacina_id,) in db.query(CoberturaVacina.vacina_id).filter(
+            CoberturaVacina.reconstruir.is_(True)
+        ).all():
+            RelatoriosController._reconstruir_vacina(db, vacina_id)
+            processados += 1
+
+        pares = [
+            (usuario_id, vacina_id)
+            for usuario_id, vacina_id in db.query(
+                CoberturaPendente.usuario_id, CoberturaPendente.vacina_id
+            ).limit(lote).with_for_update(skip_locked=True)
+        ]
+        if pares:
+            db.execute(delete(CoberturaPendente).where(
+                tuple_(CoberturaPendente.usuario_id, CoberturaPendente.vacina_id).in_(pares)
+            ))
+            RelatoriosController._aplicar_pares(db, pares)
+            processados += len(pares)
+
+        RelatoriosController._atualizar_totais(db)
+        db.commit()
+        return processados
+
+    @staticmethod
+    def reconstruir_cobertura(db: Session):
+        """Descarta os agregados e os recalcula a partir do histórico."""
+        db.execute(delete(CoberturaPendente))
+        db.execute(delete(CoberturaUsuarioVacina))
+        db.execute(delete(CoberturaVacina))
+        RelatoriosController._inserir_pares(db)
+        RelatoriosController._inserir_totais(db)
+        RelatoriosController._atualizar_totais(db)
+        db.commit()
+
+    @staticmethod
+    def relatorio_cobertura(db: Session) -> List[dict]:
+        """Lê os contadores por vacina, sem tocar no histórico."""
+        linhas = db.query(
+            Vacina.id,
+            Vacina.nome,
+            Vacina.doses,
+            CoberturaVacina.completos,
+            CoberturaVacina.parciais,
+            CoberturaVacina.total_usuarios,
+            CoberturaVacina.atualizado_em,
+        ).outerjoin(
+            CoberturaVacina, CoberturaVacina.vacina_id == Vacina.id
+        ).order_by(Vacina.nome).all()
+
+        # Vacinas cadastradas após a última execução ainda não têm contador
+        total_usuarios = max((linha.total_usuarios or 0 for linha in linhas), default=0)
+        return [
+            {
+                "vacina_id": linha.id,
+                "vacina_nome": linha.nome,
+                "doses": linha.doses,
+                "completos": linha.completos or 0,
+                "parciais": linha.parciais or 0,
+                "nao_iniciados": max(
+                    total_usuarios - (linha.completos or 0) - (linha.parciais or 0), 0
+                ),
+                "total_usuarios": total_usuarios,
+                "atualizado_em": linha.atualizado_em,
+            }
+            for linha in linhas
+        ]
+
+
+    @staticmethod
+    def somar_aplicacoes(db: Session, chave: ChaveAplicacao, quantidade: int):
+        """Soma ``quantidade`` (positiva ou negativa) a uma linha diária.
+
+        Para escritas em lote que contam várias doses da mesma linha de uma
+        vez; deve ser chamado na mesma transação que as grava.
+        """
+        data, vacina_id, local_aplicacao, profissional = chave
+        stmt = insert_com_conflito(db)(DosesAplicadasDiarias).values(
+            data=data, vacina_id=vacina_id, local_aplicacao=local_aplicacao,
+            profissional=profissional, quantidade=quantidade
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[DosesAplicadasDiarias.data, DosesAplicadasDiarias.vacina_id,
+                            DosesAplicadasDiarias.local_aplicacao,
+                            DosesAplicadasDiarias.profissional],
+            set_={"quantidade": DosesAplicadasDiarias.quantidade + stmt.excluded.quantidade}
+        ))
+
+    @staticmethod
+    def ajustar_aplicacoes(
+        db: Session,
+        antes: Optional[ChaveAplicacao],
+        depois: Optional[ChaveAplicacao]
+    ):
+        """Move a contagem de um registro entre linhas diárias.
+
+        Recebe o resultado de ``chave_aplicacao`` antes e depois da escrita;
+        deve ser chamado na mesma transação que a altera.
+        """
+        if antes == depois:
+            return
+        if antes is not None:
+            RelatoriosController.somar_aplicacoes(db, antes, -1)
+        if depois is not None:
+            RelatoriosController.somar_aplicacoes(db, depois, 1)
+
+    @staticmethod
+    def descontar_registros(db: Session, modelo, *filtros):
+        """Retira dos agregados os registros que serão excluídos em massa.
+
+        Deve ser chamado na mesma transação do DELETE, com os mesmos filtros,
+        para exclusões que não passam registro a registro pelo controlador.
+        """
+        linhas = db.query(
+            modelo.usuario_id,
+            modelo.vacina_id,
+            modelo.data_aplicacao,
+            modelo.local_aplicacao,
+            modelo.profissional,
+            func.count(modelo.id)
+        ).filter(modelo.status == StatusDose.APLICADA, *filtros).group_by(
+            modelo.usuario_id, modelo.vacina_id, modelo.data_aplicacao,
+            modelo.local_aplicacao, modelo.profissional
+        ).all()
+
+        pares = set()
+        for usuario_id, vacina_id, data, local_aplicacao, profissional, total in linhas:
+            pares.add((usuario_id, vacina_id))
+            if data is not None:
+                RelatoriosController.somar_aplicacoes(
+                    db, (data, vacina_id, local_aplicacao or "", profissional or ""), -total
+                )
+        for usuario_id, vacina_id in pares:
+            RelatoriosController.marcar_pendente(db, usuario_id, vacina_id)
+
+    @staticmethod
+    def descontar_removidos(db: Session, removidos):
+        """Retira dos agregados os registros que um DELETE de fato removeu.
+
+        ``removidos`` são as linhas do ``RETURNING`` do DELETE, na ordem
+        (usuario_id, vacina_id, status, data_aplicacao, local_aplicacao,
+        profissional). Duas exclusões concorrentes das mesmas linhas só
+        descontam uma vez: a segunda não as encontra mais.
+        """
+        diarias = Counter()
+        pares = set()
+        for usuario_id, vacina_id, situacao, data, local_aplicacao, profissional in removidos:
+            if situacao != StatusDose.APLICADA:
+                continue
+            pares.add((usuario_id, vacina_id))
+            if data is not None:
+                diarias[(data, vacina_id, local_aplicacao or "", profissional or "")] += 1
+        for chave, total in diarias.items():
+            RelatoriosController.somar_aplicacoes(db, chave, -total)
+        RelatoriosController.marcar_pendentes(db, list(pares))
+
+    @staticmethod
+    def transferir_vacina(db: Session, origem_id: int, destino_id: int):
+        """Soma à vacina de destino as doses diárias contadas na de origem.
+
+        Usado na mesclagem de vacinas, depois que o histórico foi reapontado;
+        a cobertura das duas vacinas é recalculada pelo agendador.
+        """
+        diarias = DosesAplicadasDiarias
+        stmt = insert_com_conflito(db)(diarias).from_select(
+            ["data", "vacina_id", "local_aplicacao", "profissional", "quantidade"],
+            select(
+                diarias.data, literal(destino_id), diarias.local_aplicacao,
+                diarias.profissional, diarias.quantidade
+            ).where(diarias.vacina_id == origem_id)
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[diarias.data, diarias.vacina_id,
+                            diarias.local_aplicacao, diarias.profissional],
+            set_={"quantidade": diarias.quantidade + stmt.excluded.quantidade}
+        ))
+        db.execute(delete(diarias).where(diarias.vacina_id == origem_id))
+        RelatoriosController.marcar_vacina_para_reconstruir(db, origem_id)
+        RelatoriosController.marcar_vacina_para_reconstruir(db, destino_id)
+
+    @staticmethod
+    def reconstruir_aplicacoes(db: Session):
+        """Recalcula a série diária inteira a partir do histórico."""
+        doses = doses_aplicadas()
+        local_aplicacao = func.coalesce(doses.c.local_aplicacao, "")
+        profissional = func.coalesce(doses.c.profissional, "")
+        consulta = select(
+            doses.c.data_aplicacao,
+            doses.c.vacina_id,
+            local_aplicacao,
+            profissional,
+            func.count(doses.c.id),
+        ).where(doses.c.data_aplicacao.isnot(None)).group_by(
+            doses.c.data_aplicacao, doses.c.vacina_id, local_aplicacao, profissional
+        )
+        db.execute(delete(DosesAplicadasDiarias))
+        db.execute(insert(DosesAplicadasDiarias).from_select(
+            ["data", "vacina_id", "local_aplicacao", "profissional", "quantidade"], consulta
+        ))
+        db.commit()
+
+    @staticmethod
+    def inicializar_aplicacoes(db: Session):
+        """Preenche a série diária na primeira execução, se houver histórico."""
+        if db.query(DosesAplicadasDiarias.data).first() is not None:
+            return
+        if db.query(HistoricoVacinal.id).filter(
+            HistoricoVacinal.status == StatusDose.APLICADA
+        ).first() is not None:
+            RelatoriosController.reconstruir_aplicacoes(db)
+
+    @staticmethod
+    def aplicacoes_agrupadas(
+        db: Session,
+        de: Optional[date] = None,
+        ate: Optional[date] = None,
+        agrupar: Sequence[str] = ("mes",)
+    ) -> List[dict]:
+        """Soma as doses aplicadas no período, agrupadas pelas dimensões pedidas.
+
+        Dimensões: ``dia``, ``mes`` ou ``ano`` (no máximo uma), ``vacina``,
+        ``local`` e ``profissional``.
+        """
+        invalidas = [d for d in agrupar if d not in DIMENSOES]
+        if invalidas:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Dimensão inválida: {', '.join(invalidas)}. "
+                       f"Use: {', '.join(DIMENSOES)}"
+            )
+        if len([d for d in agrupar if d in DIMENSOES_TEMPO]) > 1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Use apenas uma dimensão de tempo (dia, mes ou ano)"
+            )
+        if de and ate and de > ate:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="A data inicial deve ser anterior à final"
+            )
+
+        diarias = DosesAplicadasDiarias
+        colunas = []
+        if "dia" in agrupar:
+            colunas.append(diarias.data.label("dia"))
+        if "mes" in agrupar or "ano" in agrupar:
+            colunas.append(extract("year", diarias.data).label("ano"))
+        if "mes" in agrupar:
+            colunas.append(extract("month", diarias.data).label("mes"))
+        if "vacina" in agrupar:
+            colunas += [diarias.vacina_id, Vacina.nome.label("vacina_nome")]
+        if "local" in agrupar:
+            colunas.append(diarias.local_aplicacao)
+        if "profissional" in agrupar:
+            colunas.append(diarias.profissional)
+
+        query = db.query(*colunas, func.sum(diarias.quantidade).label("quantidade"))
+        if "vacina" in agrupar:
+            query = query.outerjoin(Vacina, Vacina.id == diarias.vacina_id)
+        if de:
+            query = query.filter(diarias.data >= de)
+        if ate:
+            query = query.filter(diarias.data <= ate)
+        linhas = query.group_by(*colunas).having(
+            func.sum(diarias.quantidade) > 0
+        ).order_by(*colunas).all()
+
+        resultado = []
+        for linha in linhas:
+            valores = linha._mapping  # pylint: disable=protected-access
+            item = {"quantidade": int(valores["quantidade"])}
+            if "dia" in valores:
+                item["periodo"] = valores["dia"].isoformat()
+            elif "mes" in valores:
+                item["periodo"] = f"{int(valores['ano']):04d}-{int(valores['mes']):02d}"
+            elif "ano" in valores:
+                item["periodo"] = f"{int(valores['ano']):04d}"
+            if "vacina_id" in valores:
+                item["vacina_id"] = valores["vacina_id"]
+                item["vacina_nome"] = valores["vacina_nome"]
+            if "local_aplicacao" in valores:
+                item["local_aplicacao"] = valores["local_aplicacao"] or None
+            if "profissional" in valores:
+                item["profissional"] = valores["profissional"] or None
+            resultado.append(item)
+        return resultado
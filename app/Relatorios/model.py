@@ -0,0 +1,62 @@
+"""Tabelas de agregados (rollups) usadas pelos relatórios."""
+from datetime import datetime
+import enum
+
+from sqlalchemy import Boolean, Column, Date, DateTime, Integer, String
+
+from app.database import Base
+
+
+class SituacaoCobertura(str, enum.Enum):
+    """Situação de um usuário em relação ao esquema de uma vacina."""
+    COMPLETO = "completo"
+    PARCIAL = "parcial"
+
+
+class CoberturaUsuarioVacina(Base):
+    """Doses aplicadas por usuário e vacina (só pares com ao menos uma dose).
+
+    Guarda a situação já classificada para que a atualização incremental
+    saiba o que subtrair do agregado quando o par muda.
+    """
+    __tablename__ = "cobertura_usuario_vacina"
+
+    usuario_id = Column(Integer, primary_key=True)
+    vacina_id = Column(Integer, primary_key=True, index=True)
+    doses_aplicadas = Column(Integer, nullable=False)
+    situacao = Column(String(10), nullable=False)
+
+
+class CoberturaVacina(Base):
+    """Agregado por vacina lido diretamente pelo relatório de cobertura."""
+    __tablename__ = "cobertura_vacina"
+
+    vacina_id = Column(Integer, primary_key=True)
+    completos = Column(Integer, default=0, nullable=False)
+    parciais = Column(Integer, default=0, nullable=False)
+    total_usuarios = Column(Integer, default=0, nullable=False)
+    reconstruir = Column(Boolean, default=False, nullable=False)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, nullable=True)
+
+
+class CoberturaPendente(Base):
+    """Fila de pares (usuário, vacina) alterados desde a última atualização."""
+    __tablename__ = "cobertura_pendente"
+
+    usuario_id = Column(Integer, primary_key=True)
+    vacina_id = Column(Integer, primary_key=True)
+
+
+class DosesAplicadasDiarias(Base):
+    """Doses aplicadas por dia, vacina, local e profissional.
+
+    Local e profissional ausentes são gravados como texto vazio para que
+    façam parte da chave primária.
+    """
+    __tablename__ = "doses_aplicadas_diarias"
+
+    data = Column(Date, primary_key=True)
+    vacina_id = Column(Integer, primary_key=True, index=True)
+    local_aplicacao = Column(String(200), primary_key=True, default="")
+    profissional = Column(String(200), primary_key=True, default="")
+    quantidade = Column(Integer, nullable=False, default=0)
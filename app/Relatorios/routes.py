@@ -0,0 +1,104 @@
+"""Rotas da API para relatórios administrativos."""
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.orm import Session
+
+from app.consultas_lentas import consultas_recentes
+from app.database import get_db
+from app.limites import metricas
+from app.Relatorios.controller import RelatoriosController
+from app.schemas import (
+    AplicacoesAgrupadas,
+    CoberturaVacinaResponse,
+    ConsultaLenta,
+    ErrorResponse,
+    MessageResponse,
+    MetricasLimites,
+)
+
+router = APIRouter(prefix="/relatorios", tags=["Relatórios"])
+
+@router.get(
+    "/cobertura",
+    response_model=List[CoberturaVacinaResponse],
+    status_code=status.HTTP_200_OK,
+    summary="Cobertura vacinal por vacina",
+    description="Quantos usuários completaram, iniciaram ou não iniciaram cada vacina. "
+                "Lê agregados atualizados periodicamente pelo agendador"
+)
+async def relatorio_cobertura(db: Session = Depends(get_db)):
+    """Retorna a cobertura vacinal da população a partir dos agregados."""
+    return RelatoriosController.relatorio_cobertura(db)
+
+@router.post(
+    "/cobertura/reconstruir",
+    response_model=MessageResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Reconstruir agregados de cobertura",
+    description="Recalcula todos os agregados a partir do histórico vacinal"
+)
+async def reconstruir_cobertura(db: Session = Depends(get_db)):
+    """Recalcula os agregados de cobertura do zero."""
+    RelatoriosController.reconstruir_cobertura(db)
+    return {"message": "Agregados de cobertura reconstruídos"}
+
+@router.get(
+    "/aplicacoes",
+    response_model=List[AplicacoesAgrupadas],
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    responses={400: {"model": ErrorResponse}},
+    summary="Doses aplicadas por período",
+    description="Série de doses aplicadas agregada por dia, mês ou ano e, "
+                "opcionalmente, por vacina, local e profissional"
+)
+async def relatorio_aplicacoes(
+    de: Optional[date] = Query(None, description="Data inicial (inclusiva)"),
+    ate: Optional[date] = Query(None, description="Data final (inclusiva)"),
+    agrupar: str = Query(
+        "mes",
+        description="Dimensões separadas por vírgula: dia|mes|ano, vacina, local, profissional"
+    ),
+    db: Session = Depends(get_db)
+):
+    """Retorna as doses aplicadas a partir da série diária pré-agregada."""
+    dimensoes = [d.strip() for d in agrupar.split(",") if d.strip()]
+    return RelatoriosController.aplicacoes_agrupadas(db, de, ate, dimensoes)
+
+@router.post(
+    "/aplicacoes/reconstruir",
+    response_model=MessageResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Reconstruir série de aplicações",
+    description="Recalcula a série diária de doses aplicadas a partir do histórico"
+)
+async def reconstruir_aplicacoes(db: Session = Depends(get_db)):
+    """Recalcula a série diária do zero."""
+    RelatoriosController.reconstruir_aplicacoes(db)
+    return {"message": "Série de aplicações reconstruída"}
+
+@router.get(
+    "/consultas-lentas",
+    response_model=List[ConsultaLenta],
+    status_code=status.HTTP_200_OK,
+    summary="Consultas lentas recentes",
+    description="Comandos SQL acima de CONSULTA_LENTA_MS neste processo, do mais recente "
+                "ao mais antigo; os planos ficam só em CONSULTA_LENTA_ARQUIVO"
+)
+async def listar_consultas_lentas():
+    """Retorna as consultas lentas guardadas em memória."""
+    return consultas_recentes()
+
+@router.get(
+    "/limites",
+    response_model=MetricasLimites,
+    status_code=status.HTTP_200_OK,
+    summary="Recusas por limite de taxa e sobrecarga",
+    description="Requisições recusadas com 429/503 neste processo, por motivo, e a "
+                "ocupação atual do limite de concorrência"
+)
+async def obter_metricas_limites():
+    """Retorna as métricas do limitador."""
+    return metricas()
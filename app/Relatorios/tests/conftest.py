@@ -0,0 +1,25 @@
+"""Fixtures compartilhadas pelos testes de relatórios."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.Usuario.model import Usuario
+from app.Vacina.model import Vacina
+
+
+@pytest.fixture(scope="module")
+def client():
+    """Fornece um cliente de teste para a aplicação."""
+    return TestClient(app)
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture()
+def dados(db_session):
+    """Três usuários e duas vacinas (uma de dose única, outra de três doses)."""
+    usuarios = [Usuario(nome=f"Usuario {i}", email=f"u{i}@example.com", senha="x")
+                for i in range(3)]
+    vacinas = [Vacina(nome="Febre Amarela", doses=1), Vacina(nome="Hepatite B", doses=3)]
+    db_session.add_all(usuarios + vacinas)
+    db_session.commit()
+    return usuarios, vacinas
@@ -0,0 +1,97 @@
+"""Testes de integração da série diária de doses aplicadas."""
+from app.Relatorios.controller import RelatoriosController
+
+
+def _registrar(client, usuario_id, vacina_id, **campos):
+    dados = {"vacina_id": vacina_id, "numero_dose": 1, "status": "aplicada", **campos}
+    resposta = client.post(f"/usuarios/{usuario_id}/historico/", json=dados)
+    assert resposta.status_code == 201
+    return resposta.json()["id"]
+
+
+def _aplicacoes(client, **params):
+    resposta = client.get("/relatorios/aplicacoes", params=params)
+    assert resposta.status_code == 200
+    return resposta.json()
+
+
+# pylint: disable=redefined-outer-name
+class TestAplicacoesAgrupadas:
+    """Consulta da série por período, vacina, local e profissional."""
+
+    def test_agrupa_por_mes_e_vacina(self, client, dados):
+        """Doses do mesmo mês e vacina são somadas."""
+        usuarios, (febre, hepatite) = dados
+        _registrar(client, usuarios[0].id, febre.id, data_aplicacao="2024-01-05")
+        _registrar(client, usuarios[1].id, febre.id, data_aplicacao="2024-01-20")
+        _registrar(client, usuarios[0].id, hepatite.id, data_aplicacao="2024-02-01")
+
+        resultado = _aplicacoes(client, agrupar="mes,vacina")
+
+        assert resultado == [
+            {"periodo": "2024-01", "vacina_id": febre.id,
+             "vacina_nome": "Febre Amarela", "quantidade": 2},
+            {"periodo": "2024-02", "vacina_id": hepatite.id,
+             "vacina_nome": "Hepatite B", "quantidade": 1},
+        ]
+
+    def test_filtra_periodo_e_agrupa_por_local(self, client, dados):
+        """O intervalo é inclusivo e local ausente vem como nulo."""
+        usuarios, (febre, _) = dados
+        _registrar(client, usuarios[0].id, febre.id, data_aplicacao="2024-03-01",
+                   local_aplicacao="UBS Centro")
+        _registrar(client, usuarios[1].id, febre.id, data_aplicacao="2024-03-31")
+        _registrar(client, usuarios[2].id, febre.id, data_aplicacao="2024-04-01",
+                   local_aplicacao="UBS Centro")
+
+        resultado = _aplicacoes(client, de="2024-03-01", ate="2024-03-31",
+                                agrupar="local")
+
+        assert resultado == [{"quantidade": 1}, {"local_aplicacao": "UBS Centro",
+                                                 "quantidade": 1}]
+
+    def test_transicoes_de_status_atualizam_a_serie(self, client, dados):
+        """Aplicar, alterar e excluir movem a contagem entre os dias."""
+        usuarios, (_, hepatite) = dados
+        registro = _registrar(client, usuarios[0].id, hepatite.id, status="pendente",
+                              data_prevista="2024-05-01")
+        assert not _aplicacoes(client, agrupar="dia")
+
+        client.patch(f"/usuarios/{usuarios[0].id}/historico/{registro}/aplicar",
+                     json={"data_aplicacao": "2024-05-02", "profissional": "Ana"})
+        assert _aplicacoes(client, agrupar="dia,profissional") == [
+            {"periodo": "2024-05-02", "profissional": "Ana", "quantidade": 1}
+        ]
+
+        client.put(f"/usuarios/{usuarios[0].id}/historico/{registro}",
+                   json={"data_aplicacao": "2024-05-03"})
+        assert _aplicacoes(client, agrupar="dia") == [
+            {"periodo": "2024-05-03", "quantidade": 1}
+        ]
+
+        client.delete(f"/usuarios/{usuarios[0].id}/historico/{registro}")
+        assert not _aplicacoes(client, agrupar="dia")
+
+    def test_reconstrucao_reproduz_a_serie_incremental(self, client, db_session, dados):
+        """O recálculo em lote chega aos mesmos totais."""
+        usuarios, (febre, hepatite) = dados
+        for i, usuario in enumerate(usuarios):
+            _registrar(client, usuario.id, febre.id, data_aplicacao=f"2023-12-0{i + 1}")
+            _registrar(client, usuario.id, hepatite.id, data_aplicacao="2024-01-10",
+                       profissional="Bruno")
+        incremental = _aplicacoes(client, agrupar="ano,vacina,profissional")
+
+        RelatoriosController.reconstruir_aplicacoes(db_session)
+
+        assert _aplicacoes(client, agrupar="ano,vacina,profissional") == incremental
+        assert [item["quantidade"] for item in incremental] == [3, 3]
+
+    def test_dimensoes_invalidas(self, client, dados):
+        """Dimensões desconhecidas ou duas de tempo retornam 400."""
+        assert dados
+        assert client.get("/relatorios/aplicacoes",
+                          params={"agrupar": "semana"}).status_code == 400
+        assert client.get("/relatorios/aplicacoes",
+                          params={"agrupar": "dia,mes"}).status_code == 400
+        assert client.get("/relatorios/aplicacoes",
+                          params={"de": "2024-02-01", "ate": "2024-01-01"}).status_code == 400
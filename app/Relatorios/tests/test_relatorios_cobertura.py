@@ -0,0 +1,132 @@
+"""Testes de integração do relatório de cobertura vacinal."""
+from datetime import date
+
+from app import agendador
+from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
+from app.Relatorios.controller import RelatoriosController
+from app.Relatorios.model import CoberturaPendente
+
+
+def _aplicar(client, usuario_id, vacina_id, numero_dose, status_dose="aplicada"):
+    resposta = client.post(f"/usuarios/{usuario_id}/historico/", json={
+        "vacina_id": vacina_id,
+        "numero_dose": numero_dose,
+        "status": status_dose,
+        "data_aplicacao": date(2024, 1, numero_dose).isoformat(),
+    })
+    assert resposta.status_code == 201
+    return resposta.json()["id"]
+
+
+def _relatorio(client):
+    resposta = client.get("/relatorios/cobertura")
+    assert resposta.status_code == 200
+    return {item["vacina_nome"]: item for item in resposta.json()}
+
+
+# pylint: disable=redefined-outer-name
+class TestCoberturaIncremental:
+    """Atualização incremental dos agregados a partir da fila de pares."""
+
+    def test_conta_completos_parciais_e_nao_iniciados(self, client, db_session, dados):
+        """Cada usuário é classificado conforme as doses aplicadas."""
+        usuarios, (febre, hepatite) = dados
+        RelatoriosController.atualizar_cobertura(db_session)
+
+        _aplicar(client, usuarios[0].id, febre.id, 1)
+        for dose in (1, 2, 3):
+            _aplicar(client, usuarios[0].id, hepatite.id, dose)
+        _aplicar(client, usuarios[1].id, hepatite.id, 1)
+        _aplicar(client, usuarios[2].id, hepatite.id, 2, "pendente")
+
+        assert RelatoriosController.atualizar_cobertura(db_session) == 3
+        relatorio = _relatorio(client)
+
+        assert relatorio["Febre Amarela"]["completos"] == 1
+        assert relatorio["Febre Amarela"]["nao_iniciados"] == 2
+        assert relatorio["Hepatite B"]["completos"] == 1
+        assert relatorio["Hepatite B"]["parciais"] == 1
+        assert relatorio["Hepatite B"]["nao_iniciados"] == 1
+        assert relatorio["Hepatite B"]["total_usuarios"] == 3
+
+    def test_dose_pendente_nao_enfileira(self, client, db_session, dados):
+        """Registros que não alteram doses aplicadas não geram trabalho."""
+        usuarios, (_, hepatite) = dados
+        _aplicar(client, usuarios[0].id, hepatite.id, 1, "pendente")
+        assert db_session.query(CoberturaPendente).count() == 0
+
+    def test_remover_e_aplicar_dose_ajustam_contadores(self, client, db_session, dados):
+        """Exclusão e marcação como aplicada mudam a situação do par."""
+        usuarios, (febre, hepatite) = dados
+        RelatoriosController.atualizar_cobertura(db_session)
+        registro = _aplicar(client, usuarios[0].id, febre.id, 1)
+        pendente = _aplicar(client, usuarios[1].id, hepatite.id, 1, "pendente")
+        RelatoriosController.atualizar_cobertura(db_session)
+
+        client.delete(f"/usuarios/{usuarios[0].id}/historico/{registro}")
+        client.patch(
+            f"/usuarios/{usuarios[1].id}/historico/{pendente}/aplicar",
+            json={"data_aplicacao": "2024-02-01"}
+        )
+        RelatoriosController.atualizar_cobertura(db_session)
+        relatorio = _relatorio(client)
+
+        assert relatorio["Febre Amarela"]["completos"] == 0
+        assert relatorio["Hepatite B"]["parciais"] == 1
+
+    def test_mudanca_de_doses_reconstroi_a_vacina(self, client, db_session, dados):
+        """Alterar o número de doses reclassifica todos os usuários da vacina."""
+        usuarios, (_, hepatite) = dados
+        _aplicar(client, usuarios[0].id, hepatite.id, 1)
+        RelatoriosController.atualizar_cobertura(db_session)
+        assert _relatorio(client)["Hepatite B"]["parciais"] == 1
+
+        client.put(f"/vacinas/{hepatite.id}", json={"doses": 1})
+        RelatoriosController.atualizar_cobertura(db_session)
+        relatorio = _relatorio(client)
+
+        assert relatorio["Hepatite B"]["completos"] == 1
+        assert relatorio["Hepatite B"]["parciais"] == 0
+
+    def test_incremental_igual_a_reconstrucao(self, client, db_session, dados):
+        """Os contadores incrementais coincidem com o recálculo completo."""
+        usuarios, (febre, hepatite) = dados
+        RelatoriosController.atualizar_cobertura(db_session)
+        ids = [_aplicar(client, usuario.id, hepatite.id, dose)
+               for usuario in usuarios for dose in (1, 2)]
+        _aplicar(client, usuarios[1].id, febre.id, 1)
+        client.put(f"/usuarios/{usuarios[0].id}/historico/{ids[0]}",
+                   json={"status": "cancelada"})
+        client.delete(f"/usuarios/{usuarios[2].id}/historico/{ids[5]}")
+
+        while RelatoriosController.atualizar_cobertura(db_session, lote=2):
+            pass
+        incremental = _relatorio(client)
+
+        resposta = client.post("/relatorios/cobertura/reconstruir")
+        assert resposta.status_code == 200
+
+        def contadores(relatorio):
+            return {nome: (item["completos"], item["parciais"], item["nao_iniciados"])
+                    for nome, item in relatorio.items()}
+
+        assert contadores(incremental) == contadores(_relatorio(client))
+
+    def test_primeira_execucao_reconstroi_historico_existente(self, client, db_session, dados):
+        """Dados anteriores à criação dos agregados são contabilizados."""
+        usuarios, (febre, _) = dados
+        db_session.add(HistoricoVacinal(
+            usuario_id=usuarios[0].id, vacina_id=febre.id, numero_dose=1,
+            status=StatusDose.APLICADA
+        ))
+        db_session.commit()
+
+        RelatoriosController.atualizar_cobertura(db_session)
+
+        assert _relatorio(client)["Febre Amarela"]["completos"] == 1
+
+
+def test_agendador_desligado_em_testes():
+    """O lifespan não inicia tarefas em segundo plano durante os testes."""
+    agendador.iniciar_agendador()
+    assert not agendador.agendador.running
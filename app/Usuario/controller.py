@@ -3,19 +3,40 @@
 Este módulo contém a lógica de negócio para operações CRUD de usuários,
 incluindo validação de dados e manipulação de senhas seguras.
 """
+import os
 import re
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Sequence
 
 from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from sqlalchemy import and_, bindparam, delete, func, or_, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app import cache, eventos
+from app.database import so_colunas
+from app.HistoricoVacina.model import HistoricoVacinal, HistoricoVacinalArquivado
+from app.rastreamento import rastrear_metodos
+from app.Relatorios.controller import RelatoriosController
 from app.Usuario.model import Usuario
 
+# Registros do histórico apagados por transação na purga em segundo plano
+PURGA_LOTE = int(os.getenv("USUARIO_PURGA_LOTE", "5000"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Buscas por chave montadas uma vez: cada chamada só troca os parâmetros e
+# reaproveita o SQL compilado em cache
+USUARIO_POR_ID = select(Usuario).where(
+    Usuario.id == bindparam("usuario_id"), Usuario.excluido_em.is_(None)
+).limit(1)
+USUARIO_POR_EMAIL = select(Usuario).where(
+    Usuario.email == bindparam("email"), Usuario.excluido_em.is_(None)
+).limit(1)
+
 
+@rastrear_metodos
 class UsuarioController:
     """Controlador para operações CRUD de Usuario."""
 
@@ -49,19 +70,57 @@ class UsuarioController:
         return len(senha) >= 6
 
     @staticmethod
-    def listar_todos(db: Session) -> List[Usuario]:
-        """Retorna todos os usuários cadastrados."""
-        return db.query(Usuario).all()
+    def listar_todos(db: Session, campos: Optional[Sequence[str]] = None) -> List[Usuario]:
+        """Retorna todos os usuários cadastrados (só as colunas em ``campos``, se informados)."""
+        return db.query(Usuario).options(*so_colunas(Usuario, campos)).filter(
+            Usuario.excluido_em.is_(None)
+        ).all()
+
+    @staticmethod
+    def _filtro_prefixo(db: Session, expressao, prefixo: str):
+        """Condição indexável de "expressao começa com prefixo".
+
+        No Postgres usa LIKE sobre o índice text_pattern_ops; nos demais
+        bancos usa o intervalo [prefixo, sucessor), que qualquer índice
+        B-tree atende.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            escapado = re.sub(r"([\\%_])", r"\\\1", prefixo)
+            return expressao.like(f"{escapado}%")
+        sucessor = prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+        return and_(expressao >= prefixo, expressao < sucessor)
+
+    @staticmethod
+    def pesquisar(
+        db: Session,
+        termo: str,
+        limite: int = 20,
+        apos_id: Optional[int] = None
+    ) -> List[Usuario]:
+        """Busca usuários cujo nome ou email começa com o termo.
+
+        A paginação é por keyset: ``apos_id`` é o último id da página anterior.
+        """
+        prefixo = termo.strip().lower()
+        if not prefixo:
+            return []
+        query = db.query(Usuario).filter(or_(
+            UsuarioController._filtro_prefixo(db, func.lower(Usuario.nome), prefixo),
+            UsuarioController._filtro_prefixo(db, func.lower(Usuario.email), prefixo)
+        ), Usuario.excluido_em.is_(None))
+        if apos_id is not None:
+            query = query.filter(Usuario.id > apos_id)
+        return query.order_by(Usuario.id).limit(limite).all()
 
     @staticmethod
     def buscar_por_id(db: Session, usuario_id: int) -> Optional[Usuario]:
         """Busca um usuário por ID."""
-        return db.query(Usuario).filter(Usuario.id == usuario_id).first()
+        return db.scalars(USUARIO_POR_ID, {"usuario_id": usuario_id}).first()
 
     @staticmethod
     def buscar_por_email(db: Session, email: str) -> Optional[Usuario]:
         """Busca um usuário por email."""
-        return db.query(Usuario).filter(Usuario.email == email).first()
+        return db.scalars(USUARIO_POR_EMAIL, {"email": email}).first()
 
     @staticmethod
     def criar(db: Session, nome: str, email: str, senha: str, is_admin: bool = False) -> Usuario:
@@ -186,10 +245,79 @@ class UsuarioController:
                 detail=f"Usuário com ID {usuario_id} não encontrado"
             )
 
+        # O histórico é removido pelo ON DELETE CASCADE, sem ser carregado
+        RelatoriosController.descontar_registros(
+            db, HistoricoVacinal, HistoricoVacinal.usuario_id == usuario_id
+        )
+        RelatoriosController.descontar_registros(
+            db, HistoricoVacinalArquivado, HistoricoVacinalArquivado.usuario_id == usuario_id
+        )
         db.delete(usuario)
         db.commit()
+        cache.invalidar_historico(usuario_id)
+        eventos.publicar(*eventos.eventos_sincronizar([(usuario_id, None)]))
         return True
 
+    @staticmethod
+    def marcar_exclusao(db: Session, usuario_id: int) -> Usuario:
+        """Exclui o usuário logicamente; a purga dos dados vem depois."""
+        usuario = UsuarioController.buscar_por_id(db, usuario_id)
+        if not usuario:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Usuário com ID {usuario_id} não encontrado"
+            )
+
+        usuario.excluido_em = datetime.utcnow()
+        db.commit()
+        cache.invalidar_historico(usuario_id)
+        return usuario
+
+    @staticmethod
+    def purgar(db: Session, usuario_id: int, lote: int = PURGA_LOTE) -> bool:
+        """Apaga um usuário excluído logicamente e todo o seu histórico.
+
+        O histórico é apagado em lotes, cada um em sua transação, para não
+        segurar bloqueios longos; se interrompida, a purga continua de onde
+        parou na próxima chamada. Cada lote é reservado com FOR UPDATE SKIP
+        LOCKED e os agregados descontam só o que o DELETE removeu, então
+        purgas simultâneas do mesmo usuário não descontam nada duas vezes.
+        """
+        if db.query(Usuario.id).filter(
+            Usuario.id == usuario_id, Usuario.excluido_em.isnot(None)
+        ).first() is None:
+            return False
+
+        for modelo in (HistoricoVacinal, HistoricoVacinalArquivado):
+            while True:
+                ids = db.scalars(
+                    select(modelo.id).where(modelo.usuario_id == usuario_id)
+                    .limit(lote).with_for_update(skip_locked=True)
+                ).all()
+                if not ids:
+                    break
+                removidos = db.execute(
+                    delete(modelo).where(modelo.id.in_(ids)).returning(
+                        modelo.usuario_id, modelo.vacina_id, modelo.status,
+                        modelo.data_aplicacao, modelo.local_aplicacao, modelo.profissional
+                    ),
+                    execution_options={"synchronize_session": False}
+                ).all()
+                RelatoriosController.descontar_removidos(db, removidos)
+                db.commit()
+                eventos.publicar(*eventos.eventos_sincronizar(
+                    (usuario_id, linha.local_aplicacao) for linha in removidos
+                ))
+
+        db.execute(delete(Usuario).where(Usuario.id == usuario_id))
+        db.commit()
+        return True
+
+    @staticmethod
+    def listar_excluidos(db: Session) -> List[int]:
+        """IDs dos usuários excluídos logicamente que ainda não foram purgados."""
+        return db.scalars(select(Usuario.id).where(Usuario.excluido_em.isnot(None))).all()
+
     @staticmethod
     def autenticar(db: Session, email: str, senha: str) -> Optional[Usuario]:
         """Autentica um usuário verificando email e senha."""
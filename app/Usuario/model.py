@@ -1,7 +1,7 @@
 """Módulo de modelo de dados para a entidade Usuário."""
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, func
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -18,12 +18,38 @@ class Usuario(Base):
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Exclusão assíncrona: o usuário some das consultas e é purgado depois
+    excluido_em = Column(DateTime, nullable=True)
 
-    # Relacionamento com histórico vacinal
+    # Índices funcionais para a busca por prefixo (text_pattern_ops no Postgres
+    # permite usar o índice com LIKE 'prefixo%' em qualquer collation)
+    __table_args__ = (
+        Index(
+            "ix_usuarios_email_lower",
+            func.lower(email).label("email_lower"),
+            postgresql_ops={"email_lower": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_usuarios_nome_lower",
+            func.lower(nome).label("nome_lower"),
+            postgresql_ops={"nome_lower": "text_pattern_ops"},
+        ),
+    )
+
+    # Relacionamentos com o histórico vacinal. São write-only (não podem ser
+    # carregados por inteiro) e a exclusão fica a cargo do ON DELETE CASCADE.
     historico_vacinal = relationship(
         "HistoricoVacinal",
         back_populates="usuario",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="write_only"
+    )
+    historico_arquivado = relationship(
+        "HistoricoVacinalArquivado",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="write_only"
     )
 
     def __repr__(self) -> str:
@@ -1,10 +1,20 @@
 """Módulo de rotas para gerenciamento de usuários."""
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
+from app.agendador import purgar_usuario
 from app.database import get_db
-from app.schemas import UsuarioCreate, UsuarioResponse, UsuarioUpdate, ErrorResponse
+from app.negociacao import RESPOSTAS_NEGOCIADAS, campos_pedidos, responder_lista
+from app.schemas import (
+    UsuarioCreate,
+    UsuarioResponse,
+    UsuarioUpdate,
+    ErrorResponse,
+    MessageResponse,
+    PaginaUsuarios
+)
 from app.Usuario.controller import UsuarioController
 
 
@@ -15,13 +25,41 @@ router = APIRouter(prefix="/usuarios", tags=["Usuários"])
     "/",
     response_model=List[UsuarioResponse],
     status_code=status.HTTP_200_OK,
+    responses=RESPOSTAS_NEGOCIADAS,
     summary="Listar todos os usuários",
     description="Retorna a lista completa de usuários cadastrados no sistema"
 )
-async def listar_usuarios(db: Session = Depends(get_db)):
+async def listar_usuarios(
+    request: Request,
+    fields: Optional[str] = Query(
+        None, description="Campos de cada item, separados por vírgula (padrão: todos)"
+    ),
+    db: Session = Depends(get_db)
+):
     """Lista todos os usuários cadastrados no sistema."""
-    usuarios = UsuarioController.listar_todos(db)
-    return usuarios
+    campos = campos_pedidos(fields, UsuarioResponse)
+    usuarios = UsuarioController.listar_todos(db, campos)
+    return responder_lista(request, usuarios, UsuarioResponse, campos=campos)
+
+
+@router.get(
+    "/search",
+    response_model=PaginaUsuarios,
+    status_code=status.HTTP_200_OK,
+    summary="Buscar usuários por nome ou email",
+    description="Busca por prefixo (sem diferenciar maiúsculas) no nome ou email, "
+                "com paginação por cursor"
+)
+async def pesquisar_usuarios(
+    q: str = Query(..., min_length=1, max_length=255, description="Início do nome ou email"),
+    limite: int = Query(20, ge=1, le=100, description="Tamanho da página"),
+    apos: Optional[int] = Query(None, description="Cursor retornado na página anterior"),
+    db: Session = Depends(get_db)
+):
+    """Busca usuários por prefixo do nome ou do email."""
+    usuarios = UsuarioController.pesquisar(db, q, limite + 1, apos)
+    proximo = usuarios[limite - 1].id if len(usuarios) > limite else None
+    return {"itens": usuarios[:limite], "proximo_cursor": proximo}
 
 
 @router.get(
@@ -73,12 +111,29 @@ async def atualizar_usuario(
 @router.delete(
     "/{usuario_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    responses={404: {"model": ErrorResponse}},
+    responses={
+        202: {"model": MessageResponse, "description": "Exclusão agendada"},
+        404: {"model": ErrorResponse}
+    },
     summary="Deletar usuário",
-    description="Remove um usuário do sistema"
+    description="Remove um usuário do sistema. Com assincrono=true, o usuário deixa "
+                "de existir para a API imediatamente e seus dados são apagados em "
+                "segundo plano"
 )
-async def deletar_usuario(usuario_id: int, db: Session = Depends(get_db)):
+async def deletar_usuario(
+    usuario_id: int,
+    background_tasks: BackgroundTasks,
+    assincrono: bool = Query(False, description="Agenda a purga em segundo plano"),
+    db: Session = Depends(get_db)
+):
     """Remove um usuário do sistema."""
+    if assincrono:
+        UsuarioController.marcar_exclusao(db, usuario_id)
+        background_tasks.add_task(purgar_usuario, usuario_id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"message": "Exclusão do usuário agendada"}
+        )
     UsuarioController.deletar(db, usuario_id)
     return None
 
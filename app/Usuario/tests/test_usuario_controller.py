@@ -14,7 +14,7 @@ class TestUsuarioController:
     def test_listar_todos_vazio(self):
         """Retorna lista vazia se não houver usuários."""
         db_mock = Mock()
-        db_mock.query.return_value.all.return_value = []
+        db_mock.query.return_value.options.return_value.filter.return_value.all.return_value = []
 
         resultado = UsuarioController.listar_todos(db_mock)
 
@@ -28,7 +28,8 @@ class TestUsuarioController:
             Usuario(id=1, nome="Alice", email="alice@test.com", senha="hash1"),
             Usuario(id=2, nome="Bob", email="bob@test.com", senha="hash2"),
         ]
-        db_mock.query.return_value.all.return_value = usuarios_mock
+        consulta = db_mock.query.return_value.options.return_value
+        consulta.filter.return_value.all.return_value = usuarios_mock
 
         resultado = UsuarioController.listar_todos(db_mock)
 
@@ -40,7 +41,7 @@ class TestUsuarioController:
         """Retorna usuário quando ID existe."""
         db_mock = Mock()
         usuario_mock = Usuario(id=1, nome="Alice", email="alice@test.com", senha="hash")
-        db_mock.query.return_value.filter.return_value.first.return_value = usuario_mock
+        db_mock.scalars.return_value.first.return_value = usuario_mock
 
         resultado = UsuarioController.buscar_por_id(db_mock, 1)
 
@@ -50,7 +51,7 @@ class TestUsuarioController:
     def test_buscar_por_id_nao_encontrado(self):
         """Retorna None quando ID não existe."""
         db_mock = Mock()
-        db_mock.query.return_value.filter.return_value.first.return_value = None
+        db_mock.scalars.return_value.first.return_value = None
 
         resultado = UsuarioController.buscar_por_id(db_mock, 999)
 
@@ -60,7 +61,7 @@ class TestUsuarioController:
         """Retorna usuário quando email existe."""
         db_mock = Mock()
         usuario_mock = Usuario(id=1, nome="Alice", email="alice@test.com", senha="hash")
-        db_mock.query.return_value.filter.return_value.first.return_value = usuario_mock
+        db_mock.scalars.return_value.first.return_value = usuario_mock
 
         resultado = UsuarioController.buscar_por_email(db_mock, "alice@test.com")
 
@@ -71,7 +72,7 @@ class TestUsuarioController:
     def test_criar_usuario_sucesso(self, mock_hash_senha):
         """Cria usuário com sucesso."""
         db_mock = Mock()
-        db_mock.query.return_value.filter.return_value.first.return_value = None
+        db_mock.scalars.return_value.first.return_value = None
 
         resultado = UsuarioController.criar(
             db_mock, "Alice", "alice@test.com", "senha123"
@@ -109,7 +110,7 @@ class TestUsuarioController:
         """Atualiza usuário com sucesso."""
         db_mock = Mock()
         usuario_mock = Usuario(id=1, nome="Alice", email="alice@test.com", senha="hash")
-        db_mock.query.return_value.filter.return_value.first.return_value = usuario_mock
+        db_mock.scalars.return_value.first.return_value = usuario_mock
 
         resultado = UsuarioController.atualizar(
             db_mock, 1, nome="Alice Silva", senha="nova_senha"
@@ -123,18 +124,19 @@ class TestUsuarioController:
     def test_atualizar_usuario_nao_encontrado(self):
         """Lança exceção ao atualizar usuário inexistente."""
         db_mock = Mock()
-        db_mock.query.return_value.filter.return_value.first.return_value = None
+        db_mock.scalars.return_value.first.return_value = None
 
         with pytest.raises(HTTPException) as exc_info:
             UsuarioController.atualizar(db_mock, 999, nome="Teste")
 
         assert exc_info.value.status_code == 404
 
-    def test_deletar_usuario_sucesso(self):
+    @patch("app.Usuario.controller.RelatoriosController.descontar_registros")
+    def test_deletar_usuario_sucesso(self, _mock_descontar):
         """Deleta usuário com sucesso."""
         db_mock = Mock()
         usuario_mock = Usuario(id=1, nome="Alice", email="alice@test.com", senha="hash")
-        db_mock.query.return_value.filter.return_value.first.return_value = usuario_mock
+        db_mock.scalars.return_value.first.return_value = usuario_mock
 
         resultado = UsuarioController.deletar(db_mock, 1)
 
@@ -145,7 +147,7 @@ class TestUsuarioController:
     def test_deletar_usuario_nao_encontrado(self):
         """Lança exceção ao deletar usuário inexistente."""
         db_mock = Mock()
-        db_mock.query.return_value.filter.return_value.first.return_value = None
+        db_mock.scalars.return_value.first.return_value = None
 
         with pytest.raises(HTTPException) as exc_info:
             UsuarioController.deletar(db_mock, 999)
@@ -157,7 +159,7 @@ class TestUsuarioController:
         """Autentica usuário com credenciais corretas."""
         db_mock = Mock()
         usuario_mock = Usuario(id=1, nome="Alice", email="alice@test.com", senha="hash")
-        db_mock.query.return_value.filter.return_value.first.return_value = usuario_mock
+        db_mock.scalars.return_value.first.return_value = usuario_mock
 
         resultado = UsuarioController.autenticar(db_mock, "alice@test.com", "senha123")
 
@@ -170,7 +172,7 @@ class TestUsuarioController:
         """Retorna None com senha incorreta."""
         db_mock = Mock()
         usuario_mock = Usuario(id=1, nome="Alice", email="alice@test.com", senha="hash")
-        db_mock.query.return_value.filter.return_value.first.return_value = usuario_mock
+        db_mock.scalars.return_value.first.return_value = usuario_mock
 
         resultado = UsuarioController.autenticar(db_mock, "alice@test.com", "senha_errada")
 
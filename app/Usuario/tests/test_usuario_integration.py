@@ -1,9 +1,17 @@
 """Testes de integração para o módulo de usuários."""
+from datetime import date
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event, func
 from app.main import app
 from app.database import SessionLocal, Base, engine
+from app.HistoricoVacina.model import HistoricoVacinal, HistoricoVacinalArquivado, StatusDose
+from app.Relatorios.controller import RelatoriosController
+from app.Relatorios.model import DosesAplicadasDiarias
+from app.Usuario.controller import UsuarioController
 from app.Usuario.model import Usuario
+from app.Vacina.model import Vacina
 
 client = TestClient(app)
 
@@ -310,3 +318,200 @@ class TestUsuarioIntegration:
             "/usuarios/login?email=alice@teste.com&senha=novasenha456"
         )
         assert response_login_nova.status_code == 200
+
+
+class TestUsuarioBusca:
+    """Testes de integração da busca de usuários por prefixo."""
+
+    @pytest.fixture(autouse=True)
+    def usuarios(self):
+        """Cadastra usuários diretamente no banco (sem custo de bcrypt)."""
+        db = SessionLocal()
+        db.add_all([
+            Usuario(nome="Alice Silva", email="alice@teste.com", senha="x"),
+            Usuario(nome="Alberto Souza", email="beto@teste.com", senha="x"),
+            Usuario(nome="Bruna Alves", email="bruna@teste.com", senha="x"),
+            Usuario(nome="Carla 100%", email="carla_al@teste.com", senha="x"),
+        ])
+        db.commit()
+        db.close()
+
+    def test_busca_por_prefixo_do_nome_sem_caixa(self):
+        """Deve encontrar pelo início do nome, sem diferenciar maiúsculas."""
+        response = client.get("/usuarios/search", params={"q": "AL"})
+        assert response.status_code == 200
+        nomes = [u["nome"] for u in response.json()["itens"]]
+        assert nomes == ["Alice Silva", "Alberto Souza"]
+
+    def test_busca_por_prefixo_do_email(self):
+        """Deve encontrar pelo início do email."""
+        response = client.get("/usuarios/search", params={"q": "beto@"})
+        assert [u["email"] for u in response.json()["itens"]] == ["beto@teste.com"]
+
+    def test_busca_nao_casa_meio_do_texto(self):
+        """Prefixo não encontra trechos no meio do nome."""
+        response = client.get("/usuarios/search", params={"q": "silva"})
+        assert response.json()["itens"] == []
+
+    def test_busca_trata_curingas_como_texto(self):
+        """'%' e '_' na consulta não funcionam como curingas."""
+        assert client.get("/usuarios/search", params={"q": "carla 100%"}).json()["itens"]
+        assert client.get("/usuarios/search", params={"q": "c_rla"}).json()["itens"] == []
+
+    def test_busca_paginada_por_cursor(self):
+        """Deve paginar pelo cursor até esgotar os resultados."""
+        primeira = client.get("/usuarios/search", params={"q": "a", "limite": 1}).json()
+        assert len(primeira["itens"]) == 1
+        assert primeira["proximo_cursor"] == primeira["itens"][0]["id"]
+
+        segunda = client.get("/usuarios/search", params={
+            "q": "a", "limite": 1, "apos": primeira["proximo_cursor"]
+        }).json()
+        assert segunda["itens"][0]["id"] > primeira["itens"][0]["id"]
+        assert segunda["proximo_cursor"] is None
+
+    def test_busca_usa_indices_funcionais(self):
+        """A consulta gerada deve usar os índices de lower(nome) e lower(email)."""
+        capturadas = []
+
+        def capturar(_conn, _cursor, statement, parameters, _context, _executemany):
+            capturadas.append((statement, parameters))
+
+        db = SessionLocal()
+        event.listen(engine, "before_cursor_execute", capturar)
+        try:
+            UsuarioController.pesquisar(db, "al")
+            statement, parameters = capturadas[-1]
+            plano = " ".join(
+                str(linha[-1]) for linha in
+                db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", capturar)
+            db.close()
+        assert "ix_usuarios_nome_lower" in plano
+        assert "ix_usuarios_email_lower" in plano
+
+
+class TestUsuarioExclusao:
+    """Exclusão de usuários com histórico via ON DELETE CASCADE."""
+
+    @pytest.fixture()
+    def usuario_com_historico(self):
+        """Usuário com três doses aplicadas e uma arquivada."""
+        db = SessionLocal()
+        usuario = Usuario(nome="Dora", email="dora@teste.com", senha="x")
+        vacina = Vacina(nome="Tríplice Viral", doses=3)
+        db.add_all([usuario, vacina])
+        db.commit()
+        db.add_all([
+            HistoricoVacinal(usuario_id=usuario.id, vacina_id=vacina.id, numero_dose=dose,
+                             status=StatusDose.APLICADA)
+            for dose in (1, 2, 3)
+        ])
+        db.add(HistoricoVacinalArquivado(
+            id=1000, usuario_id=usuario.id, vacina_id=vacina.id, numero_dose=1,
+            status=StatusDose.CANCELADA, created_at=date.today(), updated_at=date.today()
+        ))
+        db.commit()
+        RelatoriosController.reconstruir_cobertura(db)
+        usuario_id = usuario.id
+        db.close()
+        return usuario_id
+
+    @staticmethod
+    def _contar(modelo):
+        db = SessionLocal()
+        try:
+            return db.query(modelo).count()
+        finally:
+            db.close()
+
+    def test_exclusao_sincrona_nao_carrega_o_historico(self, usuario_com_historico):
+        """Um único DELETE do usuário; o banco apaga o histórico em cascata."""
+        comandos = []
+
+        def capturar(_conn, _cursor, statement, _parameters, _context, _executemany):
+            comandos.append(statement)
+
+        event.listen(engine, "before_cursor_execute", capturar)
+        try:
+            response = client.delete(f"/usuarios/{usuario_com_historico}")
+        finally:
+            event.remove(engine, "before_cursor_execute", capturar)
+
+        assert response.status_code == 204
+        assert not [c for c in comandos if c.startswith("DELETE FROM historico_vacinal")]
+        assert not [c for c in comandos
+                    if c.startswith("SELECT historico_vacinal.id AS historico_vacinal_id")]
+        assert self._contar(HistoricoVacinal) == 0
+        assert self._contar(HistoricoVacinalArquivado) == 0
+
+    def test_exclusao_sincrona_atualiza_cobertura(self, usuario_com_historico):
+        """As doses do usuário excluído deixam de contar na cobertura."""
+        client.delete(f"/usuarios/{usuario_com_historico}")
+
+        db = SessionLocal()
+        RelatoriosController.atualizar_cobertura(db)
+        cobertura = RelatoriosController.relatorio_cobertura(db)[0]
+        db.close()
+        assert cobertura["completos"] == 0
+        assert cobertura["total_usuarios"] == 0
+
+    def test_exclusao_assincrona(self, usuario_com_historico):
+        """Responde 202 e a purga em segundo plano remove tudo."""
+        response = client.delete(f"/usuarios/{usuario_com_historico}",
+                                 params={"assincrono": "true"})
+
+        assert response.status_code == 202
+        assert client.get(f"/usuarios/{usuario_com_historico}").status_code == 404
+        assert self._contar(Usuario) == 0
+        assert self._contar(HistoricoVacinal) == 0
+
+    def test_usuario_marcado_some_das_consultas(self, usuario_com_historico):
+        """Antes da purga o usuário já não é listado nem encontrado."""
+        db = SessionLocal()
+        UsuarioController.marcar_exclusao(db, usuario_com_historico)
+
+        assert client.get(f"/usuarios/{usuario_com_historico}").status_code == 404
+        assert client.get("/usuarios/").json() == []
+        assert client.get("/usuarios/search", params={"q": "dora"}).json()["itens"] == []
+        assert UsuarioController.listar_excluidos(db) == [usuario_com_historico]
+        db.close()
+
+    def test_purga_em_lotes(self, usuario_com_historico):
+        """A purga apaga o histórico em lotes e por fim o usuário."""
+        db = SessionLocal()
+        UsuarioController.marcar_exclusao(db, usuario_com_historico)
+
+        assert UsuarioController.purgar(db, usuario_com_historico, lote=2) is True
+        assert UsuarioController.purgar(db, usuario_com_historico) is False
+        db.close()
+        assert self._contar(Usuario) == 0
+        assert self._contar(HistoricoVacinal) == 0
+        assert self._contar(HistoricoVacinalArquivado) == 0
+
+    def test_purgas_simultaneas_descontam_uma_vez(self, usuario_com_historico):
+        """Outra purga que apaga o mesmo lote antes não faz esta descontar de novo."""
+        db = SessionLocal()
+        db.query(HistoricoVacinal).update({"data_aplicacao": date(2024, 5, 2)})
+        db.commit()
+        RelatoriosController.reconstruir_aplicacoes(db)
+        UsuarioController.marcar_exclusao(db, usuario_com_historico)
+
+        def purgar_antes(estado):
+            if estado.is_delete and not purgas:
+                purgas.append(True)
+                outra = SessionLocal()
+                UsuarioController.purgar(outra, usuario_com_historico)
+                outra.close()
+
+        purgas = []
+        event.listen(db, "do_orm_execute", purgar_antes)
+        try:
+            assert UsuarioController.purgar(db, usuario_com_historico) is True
+        finally:
+            event.remove(db, "do_orm_execute", purgar_antes)
+        total = db.query(func.sum(DosesAplicadasDiarias.quantidade)).scalar()
+        db.close()
+        assert purgas and total == 0
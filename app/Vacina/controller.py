@@ -1,12 +1,39 @@
 """Controlador para operações relacionadas a vacinas."""
 
-from typing import List, Optional
+import os
+import time
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
 
 from fastapi import HTTPException, status
+from sqlalchemy import and_, bindparam, delete, exists, func, literal, or_, select, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 
-from app.Vacina.model import Vacina
+from app import cache, eventos
+from app.database import so_colunas
+from app.HistoricoVacina.model import (
+    HistoricoVacinal,
+    HistoricoVacinalArquivado,
+    prioridade_status,
+)
+from app.HistoricoVacina.sincronizacao import registrar_remocoes
+from app.rastreamento import rastrear_metodos
+from app.Relatorios.controller import RelatoriosController
+from app.Vacina.indice import indice_vacinas, normalizar
+from app.Vacina.model import Vacina, nome_sem_acento
+
+# Acima deste tamanho de catálogo a busca usa pg_trgm em vez do índice em memória
+INDICE_MAXIMO = int(os.getenv("VACINA_INDICE_MAXIMO", "100000"))
+# Idade máxima do índice, para workers que não recebem a invalidação de outros
+INDICE_TTL = float(os.getenv("VACINA_INDICE_TTL", "60"))
+# Registros do histórico reapontados por transação na mesclagem
+MESCLAGEM_LOTE = int(os.getenv("VACINA_MESCLAGEM_LOTE", "5000"))
+
+# Buscas por chave montadas uma vez: cada chamada só troca os parâmetros e
+# reaproveita o SQL compilado em cache
+VACINA_POR_ID = select(Vacina).where(Vacina.id == bindparam("vacina_id")).limit(1)
+VACINA_POR_NOME = select(Vacina).where(Vacina.nome == bindparam("nome")).limit(1)
 
 
 class VacinaValidator:
@@ -23,23 +50,78 @@ class VacinaValidator:
         return 0 < doses <= 10
 
 
+@rastrear_metodos
 class VacinaController:
     """Controlador para operações CRUD de vacinas."""
 
     @staticmethod
-    def listar_todas(db: Session) -> List[Vacina]:
-        """Lista todas as vacinas cadastradas."""
-        return db.query(Vacina).all()
+    def listar_todas(db: Session, campos: Optional[Sequence[str]] = None) -> List[Vacina]:
+        """Lista todas as vacinas cadastradas (só as colunas em ``campos``, se informados)."""
+        return db.query(Vacina).options(*so_colunas(Vacina, campos)).all()
+
+    @staticmethod
+    def versao_catalogo(db: Session) -> Tuple:
+        """Identifica a versão atual do catálogo sem carregar as vacinas.
+
+        Retorna (total, maior id, maior ``versao``), lidos do banco: vale
+        igual em todos os workers.
+        """
+        return tuple(db.query(
+            func.count(Vacina.id), func.max(Vacina.id), func.max(Vacina.versao)
+        ).one())
 
     @staticmethod
     def buscar_por_id(db: Session, vacina_id: int) -> Optional[Vacina]:
         """Busca uma vacina pelo ID."""
-        return db.query(Vacina).filter(Vacina.id == vacina_id).first()
+        return db.scalars(VACINA_POR_ID, {"vacina_id": vacina_id}).first()
 
     @staticmethod
     def buscar_por_nome(db: Session, nome: str) -> Optional[Vacina]:
         """Busca uma vacina pelo nome."""
-        return db.query(Vacina).filter(Vacina.nome == nome).first()
+        return db.scalars(VACINA_POR_NOME, {"nome": nome}).first()
+
+    @staticmethod
+    def autocompletar(db: Session, consulta: str, limite: int = 10) -> List[Vacina]:
+        """Busca vacinas por prefixo ou aproximação, ignorando acentos e caixa.
+
+        Usa o índice em memória, reconstruído quando o catálogo muda. Catálogos
+        maiores que VACINA_INDICE_MAXIMO no Postgres são consultados via pg_trgm.
+        """
+        versao = cache.versao_catalogo()
+        desatualizado = (
+            indice_vacinas.versao != versao
+            or time.monotonic() - indice_vacinas.construido_em > INDICE_TTL
+        )
+        if desatualizado:
+            if (db.get_bind().dialect.name == "postgresql"
+                    and db.query(func.count(Vacina.id)).scalar() > INDICE_MAXIMO):
+                return VacinaController._autocompletar_trigramas(db, consulta, limite)
+            indice_vacinas.construir(
+                db.query(Vacina.id, Vacina.nome, Vacina.doses).all(), versao
+            )
+
+        return [
+            Vacina(id=vacina_id, nome=nome, doses=doses)
+            for vacina_id, nome, doses in indice_vacinas.buscar(consulta, limite)
+        ]
+
+    @staticmethod
+    def _autocompletar_trigramas(db: Session, consulta: str, limite: int) -> List[Vacina]:
+        """Busca no Postgres com o índice GIN de trigramas (pg_trgm).
+
+        Nome e consulta passam pela mesma ``sem_acento(lower(...))`` do índice
+        ``ix_vacinas_nome_sem_acento_trgm``, como na normalização em memória.
+        """
+        if not normalizar(consulta):
+            return []
+        consulta = consulta.strip()
+        nome = nome_sem_acento(Vacina.nome)
+        termo = nome_sem_acento(literal(consulta))
+        escapado = consulta.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        prefixo = nome_sem_acento(literal(escapado)).concat("%")
+        return db.query(Vacina).filter(
+            or_(nome.like(prefixo, escape="\\"), nome.op("%")(termo))
+        ).order_by(func.similarity(nome, termo).desc(), Vacina.nome).limit(limite).all()
 
     @staticmethod
     def criar(db: Session, nome: str, doses: int) -> Vacina:
@@ -70,6 +152,7 @@ class VacinaController:
             db.add(vacina)
             db.commit()
             db.refresh(vacina)
+            cache.invalidar_catalogo()
             return vacina
         except IntegrityError as e:
             db.rollback()
@@ -117,11 +200,14 @@ class VacinaController:
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Número de doses deve ser entre 1 e 10"
                 )
+            if doses != vacina.doses:
+                RelatoriosController.marcar_vacina_para_reconstruir(db, vacina_id)
             vacina.doses = doses
 
         try:
             db.commit()
             db.refresh(vacina)
+            cache.invalidar_catalogo()
             return vacina
         except IntegrityError as e:
             db.rollback()
@@ -140,10 +226,252 @@ class VacinaController:
                 detail=f"Vacina com ID {vacina_id} não encontrada"
             )
 
+        if VacinaController.possui_historico(db, vacina_id):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Vacina com ID {vacina_id} possui registros no histórico; "
+                       "use a mesclagem com outra vacina"
+            )
+
+        RelatoriosController.marcar_vacina_para_reconstruir(db, vacina_id)
         db.delete(vacina)
         db.commit()
+        cache.invalidar_catalogo()
         return True
 
+    @staticmethod
+    def possui_historico(db: Session, vacina_id: int) -> bool:
+        """Indica se algum registro, ativo ou arquivado, usa a vacina."""
+        return any(
+            db.query(modelo.id).filter(modelo.vacina_id == vacina_id).first() is not None
+            for modelo in (HistoricoVacinal, HistoricoVacinalArquivado)
+        )
+
+    @staticmethod
+    def _mesclar_lote(db: Session, origem_id: int, destino_id: int, lote: int) -> Tuple[int, int]:
+        """Reaponta até ``lote`` registros da origem; retorna (movidos, descartados).
+
+        Quando o usuário já tem a mesma dose na vacina de destino, fica o
+        registro de maior prioridade (aplicada > atrasada > pendente >
+        cancelada; no empate, o do destino) e o outro é excluído.
+        """
+        linhas = db.query(
+            HistoricoVacinal.id, HistoricoVacinal.usuario_id, HistoricoVacinal.local_aplicacao
+        ).filter(
+            HistoricoVacinal.vacina_id == origem_id
+        ).order_by(HistoricoVacinal.id).limit(lote).with_for_update().all()
+        if not linhas:
+            return 0, 0
+        ids = [historico_id for historico_id, _, _ in linhas]
+        usuarios = {usuario_id for _, usuario_id, _ in linhas}
+
+        origem = aliased(HistoricoVacinal)
+        destino_perde = and_(
+            HistoricoVacinal.vacina_id == destino_id,
+            HistoricoVacinal.usuario_id.in_(usuarios),
+            exists().where(
+                origem.id.in_(ids),
+                origem.usuario_id == HistoricoVacinal.usuario_id,
+                origem.numero_dose == HistoricoVacinal.numero_dose,
+                prioridade_status(origem) > prioridade_status(HistoricoVacinal)
+            )
+        )
+        destino = aliased(HistoricoVacinal)
+        origem_perde = and_(
+            HistoricoVacinal.id.in_(ids),
+            exists().where(
+                destino.vacina_id == destino_id,
+                destino.usuario_id == HistoricoVacinal.usuario_id,
+                destino.numero_dose == HistoricoVacinal.numero_dose
+            )
+        )
+
+        descartados = 0
+        for condicao in (destino_perde, origem_perde):
+            RelatoriosController.descontar_registros(db, HistoricoVacinal, condicao)
+            registrar_remocoes(db, condicao)
+            descartados += db.execute(
+                delete(HistoricoVacinal).where(condicao),
+                execution_options={"synchronize_session": False}
+            ).rowcount
+        movidos = db.execute(
+            update(HistoricoVacinal).where(
+                HistoricoVacinal.id.in_(ids), HistoricoVacinal.vacina_id == origem_id
+            ).values(vacina_id=destino_id, updated_at=datetime.utcnow()),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+        db.commit()
+
+        for usuario_id in usuarios:
+            cache.invalidar_historico(usuario_id)
+        eventos.publicar(*eventos.eventos_sincronizar(
+            (usuario_id, local) for _, usuario_id, local in linhas
+        ))
+        return movidos, descartados
+
+    @staticmethod
+    def _mesclar_arquivados(db: Session, origem_id: int, destino_id: int, lote: int) -> int:
+        """Reaponta até ``lote`` registros arquivados; retorna quantos moveu."""
+        linhas = db.query(
+            HistoricoVacinalArquivado.id, HistoricoVacinalArquivado.usuario_id
+        ).filter(
+            HistoricoVacinalArquivado.vacina_id == origem_id
+        ).order_by(HistoricoVacinalArquivado.id).limit(lote).all()
+        if not linhas:
+            return 0
+        db.execute(
+            update(HistoricoVacinalArquivado).where(
+                HistoricoVacinalArquivado.id.in_([historico_id for historico_id, _ in linhas])
+            ).values(vacina_id=destino_id),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        for usuario_id in {usuario_id for _, usuario_id in linhas}:
+            cache.invalidar_historico(usuario_id)
+        return len(linhas)
+
+    @staticmethod
+    def _validar_mesclagem(db: Session, origem_id: int, destino_id: int) -> Tuple[Vacina, Vacina]:
+        """Confere que origem e destino existem e são diferentes.
+
+        Recusa (409) quando o histórico da origem, ativo ou arquivado, tem doses
+        além do esquema do destino, que ficariam inválidas depois de reapontadas.
+        """
+        if origem_id == destino_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="A vacina de origem e a de destino devem ser diferentes"
+            )
+        vacinas = []
+        for vacina_id in (origem_id, destino_id):
+            vacina = VacinaController.buscar_por_id(db, vacina_id)
+            if not vacina:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Vacina com ID {vacina_id} não encontrada"
+                )
+            vacinas.append(vacina)
+        origem, destino = vacinas
+        excedentes = sum(
+            db.scalar(select(func.count()).select_from(modelo).where(
+                modelo.vacina_id == origem_id, modelo.numero_dose > destino.doses
+            ))
+            for modelo in (HistoricoVacinal, HistoricoVacinalArquivado)
+        )
+        if excedentes:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"{excedentes} registros da vacina de origem têm dose acima das "
+                       f"{destino.doses} doses da vacina de destino"
+            )
+        return origem, destino
+
+    @staticmethod
+    def agendar_mesclagem(db: Session, origem_id: int, destino_id: int) -> dict:
+        """Marca a origem para ser mesclada no destino e retorna o andamento.
+
+        A mesclagem em si é feita por ``mesclar`` em segundo plano; a marca
+        permite que o agendador conclua mesclagens interrompidas.
+        """
+        origem, destino = VacinaController._validar_mesclagem(db, origem_id, destino_id)
+        if origem.mesclar_em not in (None, destino_id) or destino.mesclar_em is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Uma das vacinas já está sendo mesclada em outra"
+            )
+        origem.mesclar_em = destino_id
+        db.commit()
+        return VacinaController.progresso_mesclagem(db, origem_id, destino_id)
+
+    @staticmethod
+    def progresso_mesclagem(db: Session, origem_id: int, destino_id: int) -> dict:
+        """Andamento da mesclagem, calculado a partir do banco.
+
+        Sem a vacina de origem a mesclagem está concluída.
+        """
+        if not VacinaController.buscar_por_id(db, destino_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Vacina com ID {destino_id} não encontrada"
+            )
+        origem = VacinaController.buscar_por_id(db, origem_id)
+        if origem is not None and origem.mesclar_em != destino_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Nenhuma mesclagem da vacina {origem_id} em {destino_id} agendada"
+            )
+        restantes = {
+            modelo: 0 if origem is None else db.scalar(
+                select(func.count()).select_from(modelo).where(modelo.vacina_id == origem_id)
+            )
+            for modelo in (HistoricoVacinal, HistoricoVacinalArquivado)
+        }
+        return {
+            "origem_id": origem_id,
+            "destino_id": destino_id,
+            "concluida": origem is None,
+            "registros_restantes": restantes[HistoricoVacinal],
+            "arquivados_restantes": restantes[HistoricoVacinalArquivado],
+        }
+
+    @staticmethod
+    def listar_mesclagens(db: Session) -> List[Tuple[int, int]]:
+        """Pares (origem, destino) das mesclagens agendadas e não concluídas."""
+        return db.execute(
+            select(Vacina.id, Vacina.mesclar_em).where(Vacina.mesclar_em.isnot(None))
+        ).all()
+
+    @staticmethod
+    def mesclar(
+        db: Session,
+        origem_id: int,
+        destino_id: int,
+        lote: int = MESCLAGEM_LOTE
+    ) -> dict:
+        """Mescla a vacina de origem na de destino e remove a origem.
+
+        O histórico é reapontado em lotes, cada um em sua transação, sem
+        carregar os registros; se a operação for interrompida, basta
+        repeti-la para concluir.
+        """
+        VacinaController._validar_mesclagem(db, origem_id, destino_id)
+
+        movidos = descartados = arquivados = 0
+        while True:
+            lote_movidos, lote_descartados = VacinaController._mesclar_lote(
+                db, origem_id, destino_id, lote
+            )
+            if not lote_movidos and not lote_descartados:
+                break
+            movidos += lote_movidos
+            descartados += lote_descartados
+        while True:
+            lote_arquivados = VacinaController._mesclar_arquivados(
+                db, origem_id, destino_id, lote
+            )
+            if not lote_arquivados:
+                break
+            arquivados += lote_arquivados
+
+        RelatoriosController.transferir_vacina(db, origem_id, destino_id)
+        db.execute(delete(Vacina).where(Vacina.id == origem_id))
+        try:
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Novos registros usaram a vacina durante a mesclagem; tente novamente"
+            ) from e
+        cache.invalidar_catalogo()
+
+        return {
+            "vacina": VacinaController.buscar_por_id(db, destino_id),
+            "registros_movidos": movidos,
+            "registros_descartados": descartados,
+            "arquivados_movidos": arquivados,
+        }
+
     @staticmethod
     def buscar_por_doses(db: Session, doses: int) -> List[Vacina]:
         """Busca vacinas pelo número de doses."""
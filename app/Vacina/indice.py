@@ -0,0 +1,152 @@
+"""Índice em memória para autocompletar nomes de vacinas.
+
+Combina índices de prefixos (listas ordenadas de nomes e de palavras
+normalizadas, consultadas com busca binária) com um índice invertido de
+trigramas para tolerar erros de digitação. A normalização remove acentos e
+ignora maiúsculas, então "hepa" e "HEPÁ" encontram "Hepatite B".
+"""
+import bisect
+import heapq
+import time
+import unicodedata
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Tuple
+
+SIMILARIDADE_MINIMA = 0.3
+
+
+def normalizar(texto: str) -> str:
+    """Remove acentos, pontuação e caixa, mantendo palavras separadas por espaço."""
+    sem_acento = "".join(
+        c for c in unicodedata.normalize("NFKD", texto)
+        if not unicodedata.combining(c)
+    )
+    return " ".join("".join(c if c.isalnum() else " " for c in sem_acento.casefold()).split())
+
+
+def trigramas(texto: str) -> set:
+    """Trigramas das palavras de um texto normalizado (com bordas, como no pg_trgm)."""
+    resultado = set()
+    for palavra in texto.split():
+        palavra = f"  {palavra} "
+        resultado.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return resultado
+
+
+class _Dados(NamedTuple):
+    """Estado imutável do índice, trocado de uma só vez na reconstrução."""
+    vacinas: Dict[int, Tuple[int, str, int]]
+    nomes: List[Tuple[str, int]]
+    palavras: List[Tuple[str, int]]
+    trigramas: Dict[str, List[int]]
+    trigramas_nome: Dict[int, FrozenSet[str]]
+    palavras_nome: Dict[int, Tuple[str, ...]]
+
+
+def _faixa(lista: list, prefixo: str) -> range:
+    """Posições da lista ordenada de (texto, id) cujo texto começa pelo prefixo."""
+    return range(bisect.bisect_left(lista, (prefixo,)),
+                 bisect.bisect_left(lista, (prefixo + "\U0010ffff",)))
+
+
+class IndiceVacinas:
+    """Índice de prefixos e trigramas sobre o catálogo de vacinas."""
+
+    def __init__(self):
+        self._dados = _Dados({}, [], [], {}, {}, {})
+        self.versao = None
+        self.construido_em = 0.0
+
+    def construir(self, vacinas: Iterable[Tuple[int, str, int]], versao=None):
+        """Reconstrói o índice a partir de tuplas (id, nome, doses)."""
+        dados = _Dados({}, [], [], {}, {}, {})
+        for vacina_id, nome, doses in vacinas:
+            dados.vacinas[vacina_id] = (vacina_id, nome, doses)
+            nome_normalizado = normalizar(nome)
+            dados.nomes.append((nome_normalizado, vacina_id))
+            palavras = tuple(set(nome_normalizado.split()))
+            dados.palavras_nome[vacina_id] = palavras
+            dados.palavras.extend((palavra, vacina_id) for palavra in palavras)
+            trigramas_nome = frozenset(trigramas(nome_normalizado))
+            dados.trigramas_nome[vacina_id] = trigramas_nome
+            for trigrama in trigramas_nome:
+                dados.trigramas.setdefault(trigrama, []).append(vacina_id)
+        dados.nomes.sort()
+        dados.palavras.sort()
+
+        self._dados = dados
+        self.versao = versao
+        self.construido_em = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._dados.vacinas)
+
+    @staticmethod
+    def _por_palavras(dados: _Dados, termos: List[str], encontrados: dict, limite: int):
+        """Acrescenta ids cujo nome tem, para cada termo, uma palavra com esse prefixo.
+
+        Percorre apenas a faixa do termo mais seletivo e confere os demais
+        termos nas palavras de cada candidato.
+        """
+        faixas = sorted(((_faixa(dados.palavras, termo), termo) for termo in set(termos)),
+                        key=lambda item: len(item[0]))
+        faixa = faixas[0][0]
+        restantes = [termo for _, termo in faixas[1:]]
+        for posicao in faixa:
+            vacina_id = dados.palavras[posicao][1]
+            if vacina_id in encontrados:
+                continue
+            palavras = dados.palavras_nome[vacina_id]
+            if not all(any(p.startswith(t) for p in palavras) for t in restantes):
+                continue
+            encontrados[vacina_id] = None
+            if len(encontrados) >= limite:
+                return
+
+    @staticmethod
+    def _similares(dados: _Dados, consulta: str, encontrados: dict, limite: int):
+        """Acrescenta ids por similaridade de trigramas, do mais similar ao menos.
+
+        Os candidatos vêm dos trigramas menos frequentes da consulta; trigramas
+        presentes em boa parte do catálogo pouco discriminam e custariam caro.
+        """
+        alvo = trigramas(consulta)
+        listas = sorted((dados.trigramas.get(t, []) for t in alvo), key=len)
+        maximo = max(1000, len(dados.vacinas) // 10)
+        raras = [lista for lista in listas if len(lista) <= maximo] or listas[:1]
+
+        pontuados = []
+        for vacina_id in set().union(*raras):
+            if vacina_id in encontrados:
+                continue
+            trigramas_nome = dados.trigramas_nome[vacina_id]
+            comuns = len(alvo & trigramas_nome)
+            similaridade = comuns / (len(alvo) + len(trigramas_nome) - comuns)
+            if similaridade >= SIMILARIDADE_MINIMA:
+                pontuados.append((-similaridade, vacina_id))
+        for _, vacina_id in heapq.nsmallest(limite - len(encontrados), pontuados):
+            encontrados[vacina_id] = None
+
+    def buscar(self, consulta: str, limite: int = 10) -> List[Tuple[int, str, int]]:
+        """Busca por prefixo e completa com resultados aproximados.
+
+        A ordem é: nomes que começam pela consulta (alfabética), nomes em que
+        cada termo é prefixo de alguma palavra e, por fim, nomes parecidos por
+        similaridade de trigramas, até atingir o limite.
+        """
+        dados = self._dados
+        consulta = normalizar(consulta)
+        if not consulta or limite < 1:
+            return []
+
+        encontrados = {}
+        for posicao in _faixa(dados.nomes, consulta)[:limite]:
+            encontrados[dados.nomes[posicao][1]] = None
+        if len(encontrados) < limite:
+            self._por_palavras(dados, consulta.split(), encontrados, limite)
+        if len(encontrados) < limite:
+            self._similares(dados, consulta, encontrados, limite)
+
+        return [dados.vacinas[i] for i in encontrados]
+
+
+indice_vacinas = IndiceVacinas()
@@ -1,9 +1,22 @@
 """Modelo de dados para representar as vacinas no sistema."""
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import DDL, BigInteger, Column, Index, Integer, String, event, func
 from sqlalchemy.orm import relationship
 
-from app.database import Base
+from app.database import Base, SequenciaAlteracao
+
+# unaccent() não é IMMUTABLE (depende do dicionário configurado), então não pode
+# entrar em um índice; este invólucro fixa o dicionário e pode
+SEM_ACENTO_DDL = (
+    "CREATE OR REPLACE FUNCTION sem_acento(text) RETURNS text "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+    "AS $$ SELECT public.unaccent('public.unaccent', $1) $$"
+)
+
+
+def nome_sem_acento(expressao):
+    """``sem_acento(lower(expressao))``, a mesma expressão do índice de trigramas."""
+    return func.sem_acento(func.lower(expressao))
 
 
 class Vacina(Base):
@@ -13,8 +26,33 @@ class Vacina(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     nome = Column(String(100), unique=True, nullable=False, index=True)
     doses = Column(Integer, nullable=False)
+    # Destino de uma mesclagem agendada; a origem é removida quando ela termina
+    mesclar_em = Column(Integer, nullable=True)
+    # Muda a cada escrita na vacina; entra nos ETags e reenvia o histórico na sincronização
+    versao = Column(
+        BigInteger,
+        nullable=False,
+        server_default="0",
+        default=SequenciaAlteracao("vacinas"),
+        onupdate=SequenciaAlteracao("vacinas")
+    )
 
-    historico_vacinal = relationship("HistoricoVacinal", back_populates="vacina")
+    historico_vacinal = relationship(
+        "HistoricoVacinal",
+        back_populates="vacina",
+        passive_deletes=True,
+        lazy="write_only"
+    )
+
+    # Índice de trigramas usado pela busca aproximada em catálogos grandes (Postgres)
+    __table_args__ = (
+        Index(
+            "ix_vacinas_nome_sem_acento_trgm",
+            nome_sem_acento(nome).label("nome_sem_acento"),
+            postgresql_using="gin",
+            postgresql_ops={"nome_sem_acento": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
 
     def __repr__(self) -> str:
         """Retorna uma representação em string do objeto Vacina."""
@@ -27,3 +65,13 @@ class Vacina(Base):
             "nome": self.nome,
             "doses": self.doses
         }
+
+
+for comando in ("CREATE EXTENSION IF NOT EXISTS pg_trgm",
+                "CREATE EXTENSION IF NOT EXISTS unaccent",
+                SEM_ACENTO_DDL):
+    event.listen(
+        Vacina.__table__,
+        "before_create",
+        DDL(comando).execute_if(dialect="postgresql")
+    )
@@ -1,12 +1,32 @@
 """Rotas da API para gerenciamento de vacinas."""
 
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, status, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 
+from app.agendador import concluir_mesclagem
+from app.condicional import (
+    CACHE_CONTROL_PUBLICO,
+    cabecalhos_condicionais,
+    etag_corresponde,
+    gerar_etag,
+    nao_modificado,
+)
 from app.database import get_db
-from app.schemas import VacinaCreate, VacinaResponse, VacinaUpdate, ErrorResponse
+from app.negociacao import (
+    RESPOSTAS_NEGOCIADAS,
+    campos_pedidos,
+    escolher_formato,
+    responder_lista,
+)
+from app.schemas import (
+    ErrorResponse,
+    MesclagemVacinaResponse,
+    VacinaCreate,
+    VacinaResponse,
+    VacinaUpdate,
+)
 from app.Vacina.controller import VacinaController
 
 router = APIRouter(prefix="/vacinas", tags=["Vacinas"])
@@ -15,13 +35,47 @@ router = APIRouter(prefix="/vacinas", tags=["Vacinas"])
     "/",
     response_model=List[VacinaResponse],
     status_code=status.HTTP_200_OK,
+    responses=RESPOSTAS_NEGOCIADAS,
     summary="Listar todas as vacinas",
     description="Retorna a lista completa de vacinas cadastradas no sistema"
 )
-async def listar_vacinas(db: Session = Depends(get_db)) -> List[VacinaResponse]:
+async def listar_vacinas(
+    request: Request,
+    fields: Optional[str] = Query(
+        None, description="Campos de cada item, separados por vírgula (padrão: todos)"
+    ),
+    db: Session = Depends(get_db)
+):
     """Lista todas as vacinas cadastradas no sistema."""
-    vacinas = VacinaController.listar_todas(db)
-    return vacinas
+    campos = campos_pedidos(fields, VacinaResponse)
+    etag = gerar_etag(
+        "vacinas",
+        VacinaController.versao_catalogo(db),
+        escolher_formato(request.headers.get("accept")),
+        campos
+    )
+    headers = cabecalhos_condicionais(etag, CACHE_CONTROL_PUBLICO)
+    if etag_corresponde(request, etag):
+        return nao_modificado(headers)
+
+    vacinas = VacinaController.listar_todas(db, campos)
+    return responder_lista(request, vacinas, VacinaResponse, headers, campos)
+
+@router.get(
+    "/search",
+    response_model=List[VacinaResponse],
+    status_code=status.HTTP_200_OK,
+    summary="Autocompletar nome de vacina",
+    description="Busca vacinas por prefixo do nome, ignorando acentos e maiúsculas, "
+                "com tolerância a erros de digitação"
+)
+async def buscar_vacinas(
+    q: str = Query(..., min_length=1, max_length=100, description="Texto digitado"),
+    limite: int = Query(10, ge=1, le=50, description="Máximo de resultados"),
+    db: Session = Depends(get_db)
+):
+    """Autocompleta nomes de vacinas a partir do índice em memória."""
+    return VacinaController.autocompletar(db, q, limite)
 
 @router.get(
     "/{vacina_id}",
@@ -85,9 +139,12 @@ async def atualizar_vacina(
 @router.delete(
     "/{vacina_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    responses={404: {"model": ErrorResponse, "description": "Vacina não encontrada"}},
+    responses={
+        404: {"model": ErrorResponse, "description": "Vacina não encontrada"},
+        409: {"model": ErrorResponse, "description": "Vacina usada no histórico"}
+    },
     summary="Deletar vacina",
-    description="Remove uma vacina do sistema"
+    description="Remove uma vacina sem registros no histórico"
 )
 async def deletar_vacina(
     vacina_id: int,
@@ -96,3 +153,45 @@ async def deletar_vacina(
     """Remove uma vacina do sistema."""
     VacinaController.deletar(db, vacina_id)
     return None
+
+@router.post(
+    "/{vacina_id}/merge-into/{destino_id}",
+    response_model=MesclagemVacinaResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        404: {"model": ErrorResponse, "description": "Vacina não encontrada"},
+        400: {"model": ErrorResponse, "description": "Origem e destino iguais"},
+        409: {"model": ErrorResponse, "description": "Vacina já em outra mesclagem"}
+    },
+    summary="Mesclar vacina duplicada",
+    description="Agenda a mesclagem: o histórico da vacina é movido para a de destino "
+                "em segundo plano, resolvendo doses repetidas, e a vacina de origem "
+                "é removida. O andamento é consultado com GET na mesma rota"
+)
+async def mesclar_vacina(
+    vacina_id: int,
+    destino_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+) -> MesclagemVacinaResponse:
+    """Agenda a mesclagem de uma vacina duplicada em outra."""
+    progresso = VacinaController.agendar_mesclagem(db, vacina_id, destino_id)
+    background_tasks.add_task(concluir_mesclagem, vacina_id, destino_id)
+    return progresso
+
+@router.get(
+    "/{vacina_id}/merge-into/{destino_id}",
+    response_model=MesclagemVacinaResponse,
+    status_code=status.HTTP_200_OK,
+    responses={404: {"model": ErrorResponse, "description": "Mesclagem não encontrada"}},
+    summary="Andamento da mesclagem",
+    description="Registros que ainda apontam para a vacina de origem; concluida=true "
+                "quando ela foi removida"
+)
+async def acompanhar_mesclagem(
+    vacina_id: int,
+    destino_id: int,
+    db: Session = Depends(get_db)
+) -> MesclagemVacinaResponse:
+    """Consulta o andamento da mesclagem de uma vacina."""
+    return VacinaController.progresso_mesclagem(db, vacina_id, destino_id)
@@ -1,6 +1,6 @@
 """Testes unitários para o controlador de Vacina."""
 
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
 from fastapi import HTTPException
@@ -15,7 +15,7 @@ class TestVacinaController:
     def test_listar_todas_vazio(self):
         """Deve retornar lista vazia quando não há vacinas."""
         db_mock = Mock()
-        db_mock.query.return_value.all.return_value = []
+        db_mock.query.return_value.options.return_value.all.return_value = []
 
         resultado = VacinaController.listar_todas(db_mock)
 
@@ -30,7 +30,7 @@ class TestVacinaController:
             Vacina(id=2, nome="Hepatite B", doses=3),
             Vacina(id=3, nome="COVID-19", doses=2)
         ]
-        db_mock.query.return_value.all.return_value = vacinas_mock
+        db_mock.query.return_value.options.return_value.all.return_value = vacinas_mock
 
         resultado = VacinaController.listar_todas(db_mock)
 
@@ -41,7 +41,7 @@ class TestVacinaController:
         """Deve retornar vacina quando ID existe."""
         db_mock = Mock()
         vacina_mock = Vacina(id=1, nome="BCG", doses=1)
-        db_mock.query.return_value.filter.return_value.first.return_value = vacina_mock
+        db_mock.scalars.return_value.first.return_value = vacina_mock
 
         resultado = VacinaController.buscar_por_id(db_mock, 1)
 
@@ -51,7 +51,7 @@ class TestVacinaController:
     def test_buscar_por_id_nao_encontrada(self):
         """Deve retornar None quando ID não existe."""
         db_mock = Mock()
-        db_mock.query.return_value.filter.return_value.first.return_value = None
+        db_mock.scalars.return_value.first.return_value = None
 
         resultado = VacinaController.buscar_por_id(db_mock, 999)
 
@@ -61,7 +61,7 @@ class TestVacinaController:
         """Deve retornar vacina quando nome existe."""
         db_mock = Mock()
         vacina_mock = Vacina(id=1, nome="BCG", doses=1)
-        db_mock.query.return_value.filter.return_value.first.return_value = vacina_mock
+        db_mock.scalars.return_value.first.return_value = vacina_mock
 
         resultado = VacinaController.buscar_por_nome(db_mock, "BCG")
 
@@ -71,7 +71,7 @@ class TestVacinaController:
     def test_criar_vacina_sucesso(self):
         """Deve criar vacina com sucesso."""
         db_mock = Mock()
-        db_mock.query.return_value.filter.return_value.first.return_value = None
+        db_mock.scalars.return_value.first.return_value = None
 
         resultado = VacinaController.criar(db_mock, "COVID-19", 2)
 
@@ -84,7 +84,7 @@ class TestVacinaController:
         """Deve lançar exceção ao criar vacina com nome duplicado."""
         db_mock = Mock()
         vacina_existente = Vacina(id=1, nome="BCG", doses=1)
-        db_mock.query.return_value.filter.return_value.first.return_value = vacina_existente
+        db_mock.scalars.return_value.first.return_value = vacina_existente
 
         with pytest.raises(HTTPException) as exc_info:
             VacinaController.criar(db_mock, "BCG", 1)
@@ -105,7 +105,7 @@ class TestVacinaController:
         """Deve atualizar vacina com sucesso."""
         db_mock = Mock()
         vacina_mock = Vacina(id=1, nome="BCG", doses=1)
-        db_mock.query.return_value.filter.return_value.first.return_value = vacina_mock
+        db_mock.scalars.return_value.first.return_value = vacina_mock
 
         resultado = VacinaController.atualizar(
             db_mock, 1, nome="BCG Atualizada", doses=2
@@ -117,28 +117,42 @@ class TestVacinaController:
     def test_atualizar_vacina_nao_encontrada(self):
         """Deve lançar exceção ao atualizar vacina inexistente."""
         db_mock = Mock()
-        db_mock.query.return_value.filter.return_value.first.return_value = None
+        db_mock.scalars.return_value.first.return_value = None
 
         with pytest.raises(HTTPException) as exc_info:
             VacinaController.atualizar(db_mock, 999, nome="Teste")
 
         assert exc_info.value.status_code == 404
 
-    def test_deletar_vacina_sucesso(self):
+    @patch.object(VacinaController, "possui_historico", return_value=False)
+    def test_deletar_vacina_sucesso(self, _mock_historico):
         """Deve deletar vacina com sucesso."""
         db_mock = Mock()
         vacina_mock = Vacina(id=1, nome="BCG", doses=1)
-        db_mock.query.return_value.filter.return_value.first.return_value = vacina_mock
+        db_mock.scalars.return_value.first.return_value = vacina_mock
 
         resultado = VacinaController.deletar(db_mock, 1)
 
         assert resultado is True
         db_mock.delete.assert_called_once()
 
+    @patch.object(VacinaController, "possui_historico", return_value=True)
+    def test_deletar_vacina_com_historico(self, _mock_historico):
+        """Deve recusar a exclusão de vacina usada no histórico."""
+        db_mock = Mock()
+        vacina_mock = Vacina(id=1, nome="BCG", doses=1)
+        db_mock.scalars.return_value.first.return_value = vacina_mock
+
+        with pytest.raises(HTTPException) as exc_info:
+            VacinaController.deletar(db_mock, 1)
+
+        assert exc_info.value.status_code == 409
+        db_mock.delete.assert_not_called()
+
     def test_deletar_vacina_nao_encontrada(self):
         """Deve lançar exceção ao deletar vacina inexistente."""
         db_mock = Mock()
-        db_mock.query.return_value.filter.return_value.first.return_value = None
+        db_mock.scalars.return_value.first.return_value = None
 
         with pytest.raises(HTTPException) as exc_info:
             VacinaController.deletar(db_mock, 999)
@@ -172,7 +186,7 @@ class TestVacinaController:
         """Testa criação com múltiplos casos."""
         db_mock = Mock()
         if valido:
-            db_mock.query.return_value.filter.return_value.first.return_value = None
+            db_mock.scalars.return_value.first.return_value = None
             resultado = VacinaController.criar(db_mock, nome, doses)
             assert resultado.nome == nome or resultado.nome == nome.strip()
         else:
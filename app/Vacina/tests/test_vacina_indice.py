@@ -0,0 +1,109 @@
+"""Testes do índice de autocompletar vacinas."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import Base, engine
+from app.main import app
+from app.Vacina.indice import IndiceVacinas, normalizar
+
+client = TestClient(app)
+
+CATALOGO = [
+    (1, "COVID-19 Pfizer", 2),
+    (2, "Pfizer COVID-19", 2),
+    (3, "Hepatite B", 3),
+    (4, "Febre Amarela", 1),
+    (5, "Hepatite A", 2),
+    (6, "Tríplice Viral", 2),
+]
+
+
+@pytest.fixture()
+def indice():
+    """Índice construído com um catálogo pequeno."""
+    novo = IndiceVacinas()
+    novo.construir(CATALOGO)
+    return novo
+
+
+def _nomes(resultado):
+    return [nome for _, nome, _ in resultado]
+
+
+def test_normalizar_remove_acentos_e_pontuacao():
+    """A normalização ignora acentos, caixa e pontuação."""
+    assert normalizar("Tríplice  VIRAL") == "triplice viral"
+    assert normalizar("COVID-19") == "covid 19"
+
+
+def test_busca_por_prefixo_ignora_acento_e_caixa(indice):  # pylint: disable=redefined-outer-name
+    """Prefixos encontram nomes independente de acento e caixa."""
+    assert _nomes(indice.buscar("hepa")) == ["Hepatite A", "Hepatite B"]
+    assert _nomes(indice.buscar("TRIPLI")) == ["Tríplice Viral"]
+    assert _nomes(indice.buscar("triplí")) == ["Tríplice Viral"]
+
+
+def test_busca_por_prefixo_de_qualquer_palavra(indice):  # pylint: disable=redefined-outer-name
+    """O prefixo pode casar com qualquer palavra; o início do nome vem antes."""
+    assert _nomes(indice.buscar("pfi")) == ["Pfizer COVID-19", "COVID-19 Pfizer"]
+    assert _nomes(indice.buscar("amarela")) == ["Febre Amarela"]
+
+
+def test_busca_com_varios_termos(indice):  # pylint: disable=redefined-outer-name
+    """Todos os termos precisam casar com alguma palavra."""
+    assert _nomes(indice.buscar("hep b", limite=1)) == ["Hepatite B"]
+
+
+def test_busca_aproximada_tolera_erro_de_digitacao(indice):  # pylint: disable=redefined-outer-name
+    """Sem prefixo exato, a busca usa similaridade de trigramas."""
+    assert _nomes(indice.buscar("febri amarella")) == ["Febre Amarela"]
+    assert indice.buscar("xyz") == []
+    assert indice.buscar("  ") == []
+
+
+def test_busca_respeita_limite(indice):  # pylint: disable=redefined-outer-name
+    """Nunca retorna mais que o limite."""
+    assert len(indice.buscar("a", limite=2)) == 2
+
+
+def test_catalogo_grande():
+    """Com milhares de vacinas as buscas seguem corretas e limitadas."""
+    grande = IndiceVacinas()
+    grande.construir((i, f"Vacina {i} Lote {i % 97}", 1) for i in range(20000))
+
+    assert grande.buscar("vacina 123")[0] == (123, "Vacina 123 Lote 26", 1)
+    assert [vacina_id for vacina_id, *_ in grande.buscar("vac", limite=3)] == [0, 1, 10]
+    assert len(grande.buscar("lote 5")) == 10
+    assert "Vacina 77 Lote 77" in _nomes(grande.buscar("vacna 77"))
+    assert not grande.buscar("xpto")
+
+
+class TestRotaBusca:
+    """Testes da rota GET /vacinas/search."""
+
+    @pytest.fixture(autouse=True)
+    def setup_database(self):
+        """Recria as tabelas para cada teste."""
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        yield
+        Base.metadata.drop_all(bind=engine)
+
+    def test_busca_reflete_escritas_no_catalogo(self):
+        """O índice é reconstruído após cadastro, alteração e exclusão."""
+        client.post("/vacinas/", json={"nome": "Hepatite B", "doses": 3})
+        assert [v["nome"] for v in client.get("/vacinas/search?q=hep").json()] == ["Hepatite B"]
+
+        vacina_id = client.post("/vacinas/", json={"nome": "Hepatite A", "doses": 2}).json()["id"]
+        assert len(client.get("/vacinas/search?q=hep").json()) == 2
+
+        client.put(f"/vacinas/{vacina_id}", json={"nome": "Sarampo"})
+        assert [v["nome"] for v in client.get("/vacinas/search?q=sar").json()] == ["Sarampo"]
+
+        client.delete(f"/vacinas/{vacina_id}")
+        assert client.get("/vacinas/search?q=sar").json() == []
+
+    def test_busca_exige_consulta(self):
+        """A consulta vazia é rejeitada na validação."""
+        assert client.get("/vacinas/search?q=").status_code == 422
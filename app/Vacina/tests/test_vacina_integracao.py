@@ -288,3 +288,27 @@ class TestVacinaIntegration:
             json={"nome": "Teste", "doses": doses_invalidas}
         )
         assert response.status_code == 422
+
+    def test_listar_vacinas_etag_nao_modificado(self):
+        """Deve responder 304 enquanto o catálogo não mudar."""
+        client.post("/vacinas/", json={"nome": "BCG", "doses": 1})
+        response = client.get("/vacinas/")
+        etag = response.headers["etag"]
+        assert response.headers["cache-control"] == "public, no-cache"
+
+        response = client.get("/vacinas/", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    def test_listar_vacinas_etag_muda_com_alteracao(self):
+        """Deve gerar novo ETag quando uma vacina é alterada."""
+        vacina_id = client.post("/vacinas/", json={"nome": "BCG", "doses": 1}).json()["id"]
+        etag = client.get("/vacinas/").headers["etag"]
+
+        client.put(f"/vacinas/{vacina_id}", json={"doses": 2})
+
+        response = client.get("/vacinas/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()[0]["doses"] == 2
@@ -0,0 +1,186 @@
+"""Testes da mesclagem de vacinas duplicadas."""
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import agendador
+from app.database import engine
+from app.HistoricoVacina.model import HistoricoVacinal, HistoricoVacinalArquivado, StatusDose
+from app.main import app
+from app.Relatorios.controller import RelatoriosController
+from app.Usuario.model import Usuario
+from app.Vacina.controller import VacinaController
+from app.Vacina.model import Vacina
+
+client = TestClient(app)
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture()
+def vacinas(db_session):
+    """Duas vacinas duplicadas e dois usuários."""
+    origem = Vacina(nome="Pfizer COVID-19", doses=2)
+    destino = Vacina(nome="COVID-19 Pfizer", doses=2)
+    usuarios = [Usuario(nome=f"U{i}", email=f"u{i}@example.com", senha="x") for i in range(2)]
+    db_session.add_all([origem, destino, *usuarios])
+    db_session.commit()
+    return origem.id, destino.id, [usuario.id for usuario in usuarios]
+
+
+def _registro(db, usuario_id, vacina_id, dose, situacao):
+    historico = HistoricoVacinal(
+        usuario_id=usuario_id, vacina_id=vacina_id, numero_dose=dose, status=situacao,
+        data_aplicacao=date(2024, 3, dose) if situacao == StatusDose.APLICADA else None
+    )
+    db.add(historico)
+    db.commit()
+    return historico.id
+
+
+def _doses(db, usuario_id):
+    return sorted(
+        (numero_dose, status.value, vacina_id)
+        for numero_dose, status, vacina_id in db.query(
+            HistoricoVacinal.numero_dose, HistoricoVacinal.status, HistoricoVacinal.vacina_id
+        ).filter(HistoricoVacinal.usuario_id == usuario_id)
+    )
+
+
+# pylint: disable=redefined-outer-name
+class TestMesclagem:
+    """Reapontamento em lotes e resolução de doses repetidas."""
+
+    def test_mescla_e_resolve_conflitos(self, db_session, vacinas):
+        """Sem conflito o registro é movido; com conflito fica o de maior prioridade."""
+        origem, destino, (ana, bia) = vacinas
+        _registro(db_session, ana, origem, 1, StatusDose.APLICADA)
+        _registro(db_session, ana, destino, 1, StatusDose.PENDENTE)
+        _registro(db_session, ana, origem, 2, StatusDose.PENDENTE)
+        _registro(db_session, ana, destino, 2, StatusDose.APLICADA)
+        _registro(db_session, bia, origem, 1, StatusDose.APLICADA)
+
+        resposta = client.post(f"/vacinas/{origem}/merge-into/{destino}")
+
+        assert resposta.status_code == 202
+        assert resposta.json() == {
+            "origem_id": origem, "destino_id": destino, "concluida": False,
+            "registros_restantes": 3, "arquivados_restantes": 0,
+        }
+        # O TestClient roda a tarefa de segundo plano antes de devolver a resposta
+        progresso = client.get(f"/vacinas/{origem}/merge-into/{destino}").json()
+        assert progresso["concluida"]
+        assert progresso["registros_restantes"] == 0
+        assert _doses(db_session, ana) == [(1, "aplicada", destino), (2, "aplicada", destino)]
+        assert _doses(db_session, bia) == [(1, "aplicada", destino)]
+        assert db_session.get(Vacina, origem) is None
+
+    def test_lotes_sem_carregar_registros(self, db_session, vacinas):
+        """Cada lote é um UPDATE em conjunto, sem SELECT de linhas completas."""
+        origem, destino, (ana, _) = vacinas
+        for vacina_id in (origem, destino):
+            db_session.get(Vacina, vacina_id).doses = 5
+        for dose in range(1, 6):
+            _registro(db_session, ana, origem, dose, StatusDose.PENDENTE)
+        comandos = []
+
+        def capturar(_conn, _cursor, statement, _parameters, _context, _executemany):
+            comandos.append(statement)
+
+        event.listen(engine, "before_cursor_execute", capturar)
+        try:
+            resultado = VacinaController.mesclar(db_session, origem, destino, lote=2)
+        finally:
+            event.remove(engine, "before_cursor_execute", capturar)
+
+        assert resultado["registros_movidos"] == 5
+        assert len([c for c in comandos if c.startswith("UPDATE historico_vacinal ")]) == 3
+        assert not [c for c in comandos if "historico_vacinal.observacoes" in c]
+
+    def test_reaponta_arquivados_e_agregados(self, db_session, vacinas):
+        """Arquivo, série diária e cobertura passam para a vacina de destino."""
+        origem, destino, (ana, _) = vacinas
+        _registro(db_session, ana, origem, 1, StatusDose.APLICADA)
+        db_session.add(HistoricoVacinalArquivado(
+            id=500, usuario_id=ana, vacina_id=origem, numero_dose=2,
+            status=StatusDose.APLICADA, data_aplicacao=date(2024, 3, 2),
+            created_at=date(2024, 3, 2), updated_at=date(2024, 3, 2)
+        ))
+        db_session.commit()
+        RelatoriosController.reconstruir_cobertura(db_session)
+        RelatoriosController.reconstruir_aplicacoes(db_session)
+
+        resultado = VacinaController.mesclar(db_session, origem, destino)
+        RelatoriosController.atualizar_cobertura(db_session)
+
+        assert resultado["arquivados_movidos"] == 1
+        assert db_session.get(HistoricoVacinalArquivado, 500).vacina_id == destino
+        cobertura = RelatoriosController.relatorio_cobertura(db_session)
+        assert [(c["vacina_id"], c["completos"]) for c in cobertura] == [(destino, 1)]
+        aplicacoes = RelatoriosController.aplicacoes_agrupadas(
+            db_session, agrupar=["vacina"]
+        )
+        assert [(a["vacina_id"], a["quantidade"]) for a in aplicacoes] == [(destino, 2)]
+
+    def test_listagem_em_cache_e_invalidada(self, db_session, vacinas):
+        """A listagem do usuário passa a mostrar a vacina de destino."""
+        origem, destino, (ana, _) = vacinas
+        _registro(db_session, ana, origem, 1, StatusDose.PENDENTE)
+        assert client.get(f"/usuarios/{ana}/historico/").json()[0]["vacina_id"] == origem
+
+        client.post(f"/vacinas/{origem}/merge-into/{destino}")
+
+        assert client.get(f"/usuarios/{ana}/historico/").json()[0]["vacina_id"] == destino
+
+    def test_validacoes(self, db_session, vacinas):
+        """Origem igual ao destino é inválida; vacina inexistente dá 404."""
+        origem, destino, _ = vacinas
+        assert client.post(f"/vacinas/{origem}/merge-into/{origem}").status_code == 400
+        assert client.post(f"/vacinas/{origem}/merge-into/9999").status_code == 404
+        assert client.post(f"/vacinas/9999/merge-into/{destino}").status_code == 404
+
+    def test_doses_alem_do_destino_recusadas(self, db_session, vacinas):
+        """Doses da origem acima do esquema do destino impedem a mesclagem."""
+        origem, destino, (ana, bia) = vacinas
+        db_session.get(Vacina, destino).doses = 1
+        _registro(db_session, ana, origem, 1, StatusDose.APLICADA)
+        _registro(db_session, bia, origem, 2, StatusDose.PENDENTE)
+
+        resposta = client.post(f"/vacinas/{origem}/merge-into/{destino}")
+
+        assert resposta.status_code == 409
+        assert "1 registros" in resposta.json()["detail"]
+        assert db_session.get(Vacina, origem).mesclar_em is None
+        assert _doses(db_session, bia) == [(2, "pendente", origem)]
+
+    def test_mesclagem_interrompida_concluida_pelo_agendador(self, db_session, vacinas):
+        """A marca da mesclagem fica no banco; concluir_mesclagens termina o trabalho."""
+        origem, destino, (ana, _) = vacinas
+        _registro(db_session, ana, origem, 1, StatusDose.PENDENTE)
+        VacinaController.agendar_mesclagem(db_session, origem, destino)
+
+        assert client.get(f"/vacinas/{origem}/merge-into/{destino}").json()[
+            "registros_restantes"
+        ] == 1
+        assert client.post(f"/vacinas/{destino}/merge-into/{origem}").status_code == 409
+        with patch.object(agendador, "SessionLocal", lambda: db_session), \
+                patch.object(db_session, "close"):
+            agendador.concluir_mesclagens()
+
+        assert VacinaController.listar_mesclagens(db_session) == []
+        assert client.get(f"/vacinas/{origem}/merge-into/{destino}").json()["concluida"]
+        assert _doses(db_session, ana) == [(1, "pendente", destino)]
+
+    def test_progresso_sem_mesclagem_agendada(self, db_session, vacinas):
+        """Consultar uma mesclagem que não foi pedida dá 404."""
+        origem, destino, _ = vacinas
+        assert client.get(f"/vacinas/{origem}/merge-into/{destino}").status_code == 404
+
+    def test_excluir_vacina_com_historico(self, db_session, vacinas):
+        """A exclusão direta de vacina usada no histórico é recusada."""
+        origem, _, (ana, _) = vacinas
+        _registro(db_session, ana, origem, 1, StatusDose.PENDENTE)
+
+        assert client.delete(f"/vacinas/{origem}").status_code == 409
@@ -14,6 +14,7 @@ client = TestClient(app)
 
 class TestVacinaRoutes:
     """Testes para as rotas de Vacina."""
+    @patch('app.Vacina.routes.VacinaController.versao_catalogo', Mock(return_value=(0, None, 0)))
     @patch('app.Vacina.routes.VacinaController.listar_todas')
     @patch('app.Vacina.routes.get_db')
     def test_listar_vacinas_vazio(self, mock_get_db, mock_listar):
@@ -30,6 +31,7 @@ class TestVacinaRoutes:
         assert response.status_code == 200
         assert response.json() == []
 
+    @patch('app.Vacina.routes.VacinaController.versao_catalogo', Mock(return_value=(0, None, 0)))
     @patch('app.Vacina.routes.VacinaController.listar_todas')
     @patch('app.Vacina.routes.get_db')
     def test_listar_vacinas_com_dados(self, mock_get_db, mock_listar):
@@ -0,0 +1,153 @@
+"""Tarefas periódicas executadas em segundo plano (APScheduler).
+
+O agendador roda em uma thread dentro de cada worker e é iniciado pelo
+lifespan da aplicação. Cada tarefa abre a própria sessão do banco. Em
+testes ele fica desligado, a menos que AGENDADOR_ATIVO=true.
+"""
+import logging
+import os
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from fastapi import HTTPException
+
+from app.database import ENV, SessionLocal
+from app.HistoricoVacina.arquivamento import arquivar_historico
+from app.HistoricoVacina.sincronizacao import limpar_remocoes
+from app.Relatorios.controller import RelatoriosController
+from app.Usuario.controller import UsuarioController
+from app.Vacina.controller import VacinaController
+
+logger = logging.getLogger(__name__)
+
+AGENDADOR_ATIVO = os.getenv(
+    "AGENDADOR_ATIVO", "false" if ENV == "test" else "true"
+).lower() == "true"
+COBERTURA_INTERVALO = int(os.getenv("COBERTURA_INTERVALO", "60"))
+ARQUIVAMENTO_INTERVALO = int(os.getenv("ARQUIVAMENTO_INTERVALO", "3600"))
+PURGA_INTERVALO = int(os.getenv("PURGA_INTERVALO", "600"))
+MESCLAGEM_INTERVALO = int(os.getenv("MESCLAGEM_INTERVALO", "600"))
+
+agendador = BackgroundScheduler(daemon=True)
+
+
+def atualizar_cobertura():
+    """Esvazia a fila de pares alterados, lote a lote."""
+    db = SessionLocal()
+    try:
+        while RelatoriosController.atualizar_cobertura(db):
+            pass
+    finally:
+        db.close()
+
+
+def arquivar():
+    """Move registros frios para o arquivo e descarta marcas de remoção vencidas."""
+    db = SessionLocal()
+    try:
+        arquivar_historico(db)
+        limpar_remocoes(db)
+    finally:
+        db.close()
+
+
+def purgar_usuario(usuario_id: int):
+    """Purga um usuário excluído logicamente (tarefa de segundo plano)."""
+    db = SessionLocal()
+    try:
+        UsuarioController.purgar(db, usuario_id)
+    finally:
+        db.close()
+
+
+def purgar_excluidos():
+    """Conclui purgas que não terminaram (ex.: worker reiniciado no meio)."""
+    db = SessionLocal()
+    try:
+        for usuario_id in UsuarioController.listar_excluidos(db):
+            UsuarioController.purgar(db, usuario_id)
+    finally:
+        db.close()
+
+
+def concluir_mesclagem(origem_id: int, destino_id: int):
+    """Mescla uma vacina agendada para mesclagem (tarefa de segundo plano)."""
+    db = SessionLocal()
+    try:
+        VacinaController.mesclar(db, origem_id, destino_id)
+    except HTTPException as erro:
+        # Registros novos na origem (409): o agendador tenta de novo depois
+        logger.warning("Mesclagem da vacina %d em %d adiada: %s",
+                       origem_id, destino_id, erro.detail)
+    finally:
+        db.close()
+
+
+def concluir_mesclagens():
+    """Conclui mesclagens que não terminaram (ex.: worker reiniciado no meio)."""
+    db = SessionLocal()
+    try:
+        pares = VacinaController.listar_mesclagens(db)
+    finally:
+        db.close()
+    for origem_id, destino_id in pares:
+        concluir_mesclagem(origem_id, destino_id)
+
+
+def inicializar_relatorios():
+    """Preenche agregados ainda vazios a partir do histórico existente."""
+    db = SessionLocal()
+    try:
+        RelatoriosController.inicializar_aplicacoes(db)
+    finally:
+        db.close()
+
+
+def iniciar_agendador():
+    """Registra as tarefas e inicia o agendador, se habilitado."""
+    if not AGENDADOR_ATIVO or agendador.running:
+        return
+    agendador.add_job(inicializar_relatorios, id="inicializar_relatorios",
+                      replace_existing=True)
+    agendador.add_job(
+        atualizar_cobertura,
+        "interval",
+        seconds=COBERTURA_INTERVALO,
+        id="atualizar_cobertura",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    agendador.add_job(
+        arquivar,
+        "interval",
+        seconds=ARQUIVAMENTO_INTERVALO,
+        id="arquivar_historico",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    agendador.add_job(
+        purgar_excluidos,
+        "interval",
+        seconds=PURGA_INTERVALO,
+        id="purgar_excluidos",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    agendador.add_job(
+        concluir_mesclagens,
+        "interval",
+        seconds=MESCLAGEM_INTERVALO,
+        id="concluir_mesclagens",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    agendador.start()
+
+
+def parar_agendador():
+    """Encerra o agendador sem esperar tarefas em andamento."""
+    if agendador.running:
+        agendador.shutdown(wait=False)
@@ -0,0 +1,220 @@
+"""Cache de respostas com backends intercambiáveis.
+
+Há dois backends: ``BackendMemoria`` (LRU no próprio processo, com TTL e
+limite de bytes) e ``BackendRedis`` (qualquer cliente que fale o protocolo
+do Redis). A invalidação é feita por um contador de versão por usuário que
+faz parte da chave: incrementá-lo torna inalcançáveis todas as entradas
+antigas daquele usuário, que expiram sozinhas pelo TTL.
+
+Com vários workers é preciso o backend Redis, para que a invalidação feita
+por um worker valha para todos: o servidor de produção (``app.servidor``)
+recusa subir mais de um worker com o backend em memória.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class BackendMemoria:
+    """LRU em memória com TTL e limite total de bytes.
+
+    Os contadores de versão ficam fora do LRU: se fossem despejados,
+    voltariam a zero e tornariam alcançáveis entradas já invalidadas.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, relogio=time.monotonic):
+        self.max_bytes = max_bytes
+        self._relogio = relogio
+        self._dados = OrderedDict()
+        self._versoes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def bytes_usados(self) -> int:
+        """Total de bytes ocupados pelas entradas."""
+        return self._bytes
+
+    def _remover(self, chave: str):
+        _, valor = self._dados.pop(chave)
+        self._bytes -= len(chave) + len(valor)
+
+    def get(self, chave: str) -> Optional[bytes]:
+        """Retorna o valor ou None se ausente/expirado."""
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em is not None and expira_em <= self._relogio():
+                self._remover(chave)
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave: str, valor: bytes, ttl: Optional[float] = None):
+        """Guarda o valor, despejando as entradas menos usadas se preciso."""
+        tamanho = len(chave) + len(valor)
+        if tamanho > self.max_bytes:
+            return
+        expira_em = self._relogio() + ttl if ttl else None
+        with self._lock:
+            if chave in self._dados:
+                self._remover(chave)
+            self._dados[chave] = (expira_em, valor)
+            self._bytes += tamanho
+            while self._bytes > self.max_bytes:
+                self._remover(next(iter(self._dados)))
+
+    def delete(self, chave: str):
+        """Remove a entrada, se existir."""
+        with self._lock:
+            if chave in self._dados:
+                self._remover(chave)
+
+    def versao(self, chave: str) -> int:
+        """Valor atual do contador (0 se nunca incrementado)."""
+        return self._versoes.get(chave, 0)
+
+    def incrementar(self, chave: str) -> int:
+        """Incrementa o contador e retorna o novo valor."""
+        with self._lock:
+            self._versoes[chave] = self._versoes.get(chave, 0) + 1
+            return self._versoes[chave]
+
+    def limpar(self):
+        """Remove todas as entradas e contadores."""
+        with self._lock:
+            self._dados.clear()
+            self._versoes.clear()
+            self._bytes = 0
+
+
+class BackendRedis:
+    """Backend sobre um cliente do protocolo Redis (GET/SET/DEL/INCR).
+
+    Erros de comunicação são tratados como cache miss, para que uma queda
+    do Redis degrade o desempenho sem derrubar a API.
+    """
+
+    def __init__(self, cliente=None, url: str = REDIS_URL, prefixo: str = "imunetrack:"):
+        if cliente is None:
+            import redis  # pylint: disable=import-outside-toplevel
+            cliente = redis.Redis.from_url(url)
+        self._cliente = cliente
+        self._prefixo = prefixo
+
+    # pylint: disable=broad-exception-caught
+    def get(self, chave: str) -> Optional[bytes]:
+        """Retorna o valor ou None se ausente/indisponível."""
+        try:
+            return self._cliente.get(self._prefixo + chave)
+        except Exception:
+            return None
+
+    def set(self, chave: str, valor: bytes, ttl: Optional[float] = None):
+        """Guarda o valor com expiração em milissegundos."""
+        try:
+            self._cliente.set(self._prefixo + chave, valor,
+                              px=int(ttl * 1000) if ttl else None)
+        except Exception:
+            pass
+
+    def delete(self, chave: str):
+        """Remove a entrada, se existir."""
+        try:
+            self._cliente.delete(self._prefixo + chave)
+        except Exception:
+            pass
+
+    def versao(self, chave: str) -> int:
+        """Valor atual do contador (0 se nunca incrementado)."""
+        try:
+            return int(self._cliente.get(self._prefixo + chave) or 0)
+        except Exception:
+            return 0
+
+    def incrementar(self, chave: str) -> int:
+        """Incrementa o contador atomicamente no servidor."""
+        try:
+            return int(self._cliente.incr(self._prefixo + chave))
+        except Exception:
+            return 0
+
+    def limpar(self):
+        """Remove todas as chaves com o prefixo deste backend."""
+        for chave in self._cliente.scan_iter(match=self._prefixo + "*"):
+            self._cliente.delete(chave)
+
+
+_backend = None  # pylint: disable=invalid-name
+
+
+def get_cache():
+    """Retorna o backend configurado por CACHE_BACKEND (criado sob demanda)."""
+    global _backend  # pylint: disable=global-statement
+    if _backend is None:
+        _backend = BackendRedis() if CACHE_BACKEND == "redis" else BackendMemoria()
+    return _backend
+
+
+def configurar_cache(backend):
+    """Substitui o backend em uso (útil em testes)."""
+    global _backend  # pylint: disable=global-statement
+    _backend = backend
+
+
+def chave_historico(usuario_id: int, recurso: str, filtros: Optional[dict] = None) -> str:
+    """Monta a chave de uma resposta do histórico de um usuário.
+
+    As versões atuais do usuário e do catálogo entram na chave, então
+    qualquer escrita no histórico dele, ou em uma vacina (cujo nome vai na
+    resposta), faz as leituras seguintes errarem o cache.
+    """
+    versao = versao_historico(usuario_id)
+    catalogo = versao_catalogo()
+    filtros_json = json.dumps(filtros or {}, sort_keys=True, default=str)
+    return f"historico:{usuario_id}:v{versao}:c{catalogo}:{recurso}:{filtros_json}"
+
+
+def versao_historico(usuario_id: int) -> int:
+    """Versão atual do histórico do usuário."""
+    return get_cache().versao(f"historico:versao:{usuario_id}")
+
+
+def invalidar_historico(usuario_id: int):
+    """Invalida todas as respostas em cache do histórico do usuário."""
+    get_cache().incrementar(f"historico:versao:{usuario_id}")
+
+
+def versao_catalogo() -> int:
+    """Versão atual do catálogo de vacinas."""
+    return get_cache().versao("vacinas:versao")
+
+
+def invalidar_catalogo():
+    """Sinaliza que o catálogo de vacinas mudou."""
+    get_cache().incrementar("vacinas:versao")
+
+
+def obter(chave: str) -> Optional[Any]:
+    """Lê e desserializa uma entrada; None em caso de miss."""
+    valor = get_cache().get(chave)
+    if valor is None:
+        return None
+    return json.loads(valor)
+
+
+def guardar(chave: str, valor: Any, ttl: Optional[float] = CACHE_TTL):
+    """Serializa e guarda uma entrada com o TTL padrão."""
+    if not ttl:
+        return
+    get_cache().set(chave, json.dumps(valor, default=str).encode("utf-8"), ttl)
@@ -0,0 +1,61 @@
+"""Requisições condicionais (ETag / If-None-Match) para listagens.
+
+O ETag é derivado de uma consulta de versão barata ao banco (contagem, maior
+id e maior ``updated_at`` ou ``versao``), sem serializar nem ler as linhas.
+Se o cliente já tem a versão atual, a rota responde 304 antes de carregar
+qualquer dado.
+"""
+import hashlib
+from datetime import date, datetime, time, timezone
+from email.utils import format_datetime
+from typing import Dict, Optional
+
+from fastapi import Request, Response, status
+
+CACHE_CONTROL_PUBLICO = "public, no-cache"
+CACHE_CONTROL_PRIVADO = "private, no-cache"
+
+
+def gerar_etag(*partes) -> str:
+    """Gera um ETag fraco a partir das partes que identificam a versão."""
+    digest = hashlib.blake2b(repr(partes).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_corresponde(request: Request, etag: str) -> bool:
+    """Indica se algum ETag de If-None-Match corresponde (comparação fraca)."""
+    cabecalho = request.headers.get("if-none-match")
+    if not cabecalho:
+        return False
+    if cabecalho.strip() == "*":
+        return True
+    alvo = etag.removeprefix("W/")
+    return any(item.strip().removeprefix("W/") == alvo for item in cabecalho.split(","))
+
+
+def data_http(valor) -> Optional[str]:
+    """Formata uma data/datetime (UTC) no formato de data HTTP."""
+    if valor is None:
+        return None
+    if not isinstance(valor, datetime) and isinstance(valor, date):
+        valor = datetime.combine(valor, time.min)
+    if valor.tzinfo is None:
+        valor = valor.replace(tzinfo=timezone.utc)
+    return format_datetime(valor, usegmt=True)
+
+
+def cabecalhos_condicionais(
+    etag: str,
+    cache_control: str,
+    ultima_modificacao=None
+) -> Dict[str, str]:
+    """Monta ETag, Cache-Control e, se houver, Last-Modified."""
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept"}
+    if ultima_modificacao is not None:
+        headers["Last-Modified"] = data_http(ultima_modificacao)
+    return headers
+
+
+def nao_modificado(headers: Dict[str, str]) -> Response:
+    """Resposta 304 sem corpo, repetindo os cabeçalhos de validação."""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
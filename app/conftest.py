@@ -0,0 +1,32 @@
+"""Fixtures compartilhadas pelos testes de todos os módulos."""
+import pytest
+
+from app.database import Base, SessionLocal, engine, get_db
+from app.main import app
+from app.Usuario.model import Usuario
+from app.Vacina.model import Vacina
+
+
+@pytest.fixture()
+def db_session():
+    """Cria as tabelas e fornece uma sessão isolada por teste, usada também pela API."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield db
+    finally:
+        app.dependency_overrides.clear()
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture()
+def usuario_vacina(db_session):
+    """Um usuário e uma vacina de duas doses."""
+    usuario = Usuario(nome="Maria", email="maria@example.com", senha="x")
+    vacina = Vacina(nome="HPV", doses=2)
+    db_session.add_all([usuario, vacina])
+    db_session.commit()
+    return usuario, vacina
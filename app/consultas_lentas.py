@@ -0,0 +1,217 @@
+"""Registro de consultas lentas, com captura de EXPLAIN no Postgres.
+
+Todo comando mais lento que CONSULTA_LENTA_MS vai para o log (nível WARNING),
+com a forma dos parâmetros (tipos, nunca valores), a rota da requisição e o
+ponto do código (de preferência o controlador) que o executou. As últimas
+ocorrências ficam em memória para ``GET /relatorios/consultas-lentas``.
+
+No Postgres, uma fração CONSULTA_LENTA_EXPLAIN dos SELECTs lentos tem o plano
+genérico capturado em uma thread à parte, em conexão própria: o comando é
+preparado com ``$1, $2...`` no lugar dos parâmetros e explicado sem ANALYZE,
+então nem é executado nem tem valores no plano. O plano vai só para
+CONSULTA_LENTA_ARQUIVO (com rotação), nunca para a resposta HTTP.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.logs import request_id, rota_atual
+
+logger = logging.getLogger(__name__)
+
+# 0 desativa o registro
+CONSULTA_LENTA_MS = float(os.getenv("CONSULTA_LENTA_MS", "500"))
+# Fração dos SELECTs lentos com o plano genérico capturado (Postgres)
+CONSULTA_LENTA_EXPLAIN = float(os.getenv("CONSULTA_LENTA_EXPLAIN", "0.1"))
+CONSULTA_LENTA_ARQUIVO = os.getenv("CONSULTA_LENTA_ARQUIVO", "consultas_lentas.log")
+CONSULTA_LENTA_HISTORICO = int(os.getenv("CONSULTA_LENTA_HISTORICO", "100"))
+# Limite de tempo do EXPLAIN e de planos aguardando execução
+EXPLAIN_TIMEOUT_MS = 10000
+EXPLAIN_PENDENTES_MAXIMO = 10
+
+_DIRETORIO_APP = os.path.dirname(os.path.abspath(__file__))
+_IGNORADOS = {os.path.abspath(__file__), os.path.join(_DIRETORIO_APP, "database.py")}
+
+_recentes: deque = deque(maxlen=CONSULTA_LENTA_HISTORICO)
+_executor: Optional[ThreadPoolExecutor] = None
+_pendentes = 0
+# Protege _executor e _pendentes, alterados pelas requisições e pela thread do EXPLAIN
+_trava = threading.Lock()
+_planos: Optional[logging.Logger] = None
+
+
+# Marcadores do psycopg2: ``%%`` (um ``%`` literal), ``%(nome)s`` e ``%s``
+_MARCADOR = re.compile(r"%%|%\(([^)]+)\)s|%s")
+
+
+def forma_parametros(parametros) -> Any:
+    """Tipos dos parâmetros, sem os valores (que podem ter dados pessoais)."""
+    if isinstance(parametros, dict):
+        return {chave: type(valor).__name__ for chave, valor in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        if parametros and isinstance(parametros[0], (dict, list, tuple)):
+            # executemany: a forma de um item e a quantidade
+            return {"itens": len(parametros), "forma": forma_parametros(parametros[0])}
+        return [type(valor).__name__ for valor in parametros]
+    return None
+
+
+def ponto_de_chamada() -> Optional[str]:
+    """Primeiro quadro da pilha dentro de um controlador (ou, na falta, do app)."""
+    quadro = sys._getframe(1)  # pylint: disable=protected-access
+    primeiro_app = None
+    while quadro is not None:
+        arquivo = quadro.f_code.co_filename
+        if arquivo.startswith(_DIRETORIO_APP) and arquivo not in _IGNORADOS:
+            local = (f"{os.path.relpath(arquivo, os.path.dirname(_DIRETORIO_APP))}:"
+                     f"{quadro.f_lineno} {quadro.f_code.co_name}")
+            if os.path.basename(arquivo) == "controller.py":
+                return local
+            primeiro_app = primeiro_app or local
+        quadro = quadro.f_back
+    return primeiro_app
+
+
+def consultas_recentes() -> List[Dict[str, Any]]:
+    """Ocorrências em memória, da mais recente para a mais antiga."""
+    return list(reversed(_recentes))
+
+
+def _gravar_plano(entrada: Dict[str, Any]):
+    """Acrescenta a ocorrência com o plano ao arquivo rotativo."""
+    global _planos  # pylint: disable=global-statement
+    if _planos is None:
+        _planos = logging.getLogger(f"{__name__}.planos")
+        _planos.propagate = False
+        _planos.setLevel(logging.INFO)
+        _planos.addHandler(RotatingFileHandler(
+            CONSULTA_LENTA_ARQUIVO, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8"
+        ))
+    _planos.info(json.dumps(entrada, ensure_ascii=False, default=str))
+
+
+def sql_generico(sql: str) -> Tuple[str, int]:
+    """Troca os marcadores do psycopg2 por ``$1, $2...``; retorna o SQL e quantos.
+
+    Um mesmo ``%(nome)s`` repetido vira sempre o mesmo ``$n``.
+    """
+    posicoes: Dict[Any, int] = {}
+
+    def trocar(marcador: re.Match) -> str:
+        if marcador.group(0) == "%%":
+            return "%"
+        chave = marcador.group(1) if marcador.group(1) is not None else len(posicoes)
+        posicoes.setdefault(chave, len(posicoes) + 1)
+        return f"${posicoes[chave]}"
+
+    return _MARCADOR.sub(trocar, sql), len(posicoes)
+
+
+def _explicar(engine: Engine, sql: str, entrada: Dict[str, Any]):
+    """Grava o plano genérico do comando, obtido em conexão própria.
+
+    Com plan_cache_mode=force_generic_plan, o plano do comando preparado não
+    depende dos argumentos, que vão nulos: nenhum valor da requisição chega
+    ao banco nem ao arquivo.
+    """
+    global _pendentes  # pylint: disable=global-statement
+    generico, quantidade = sql_generico(sql)
+    argumentos = f"({', '.join(['NULL'] * quantidade)})" if quantidade else ""
+    preparado = False
+    conexao = engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        cursor.execute(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+        cursor.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+        cursor.execute(f"PREPARE consulta_lenta AS {generico}")
+        preparado = True
+        cursor.execute(f"EXPLAIN EXECUTE consulta_lenta{argumentos}")
+        plano = "\n".join(linha[0] for linha in cursor.fetchall())
+        _gravar_plano({**entrada, "plano": plano})
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Falha ao obter o plano da consulta lenta")
+    finally:
+        conexao.rollback()
+        if preparado:
+            # O rollback não desfaz o PREPARE, e a conexão volta ao pool
+            conexao.cursor().execute("DEALLOCATE consulta_lenta")
+        conexao.close()
+        with _trava:
+            _pendentes -= 1
+
+
+def _deve_explicar(engine: Engine, sql: str) -> bool:
+    """Só SELECTs sem travas no Postgres, na fração amostrada."""
+    comando = sql.lstrip().upper()
+    return (
+        engine.dialect.name == "postgresql"
+        and comando.startswith("SELECT")
+        and " FOR UPDATE" not in comando
+        and " FOR SHARE" not in comando
+        and random.random() < CONSULTA_LENTA_EXPLAIN
+    )
+
+
+def registrar_consulta(engine: Engine, sql: str, parametros, duracao_ms: float):
+    """Registra uma consulta lenta e, se sorteada, agenda o seu EXPLAIN."""
+    global _executor, _pendentes  # pylint: disable=global-statement
+    entrada = {
+        "quando": datetime.utcnow(),
+        "duracao_ms": round(duracao_ms, 3),
+        "sql": sql,
+        "parametros": forma_parametros(parametros),
+        "rota": rota_atual(),
+        "chamada": ponto_de_chamada(),
+        "request_id": request_id.get(),
+    }
+    _recentes.append(entrada)
+    logger.warning("Consulta lenta (%.1f ms) em %s", duracao_ms, entrada["chamada"],
+                   extra={"consulta": entrada})
+    if not _deve_explicar(engine, sql):
+        return
+    with _trava:
+        if _pendentes >= EXPLAIN_PENDENTES_MAXIMO:
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        _pendentes += 1
+        executor = _executor
+    executor.submit(_explicar, engine, sql, entrada)
+
+
+def instrumentar(engine: Engine):
+    """Mede cada comando do engine e registra os mais lentos que o limite."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(_conexao, _cursor, _sql, _parametros, contexto, _executemany):
+        contexto.inicio_consulta = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(_conexao, _cursor, sql, parametros, contexto, _executemany):
+        duracao_ms = (time.perf_counter() - contexto.inicio_consulta) * 1000
+        if 0 < CONSULTA_LENTA_MS <= duracao_ms:
+            registrar_consulta(engine, sql, parametros, duracao_ms)
+
+    # Um fork herda o executor sem a sua thread
+    os.register_at_fork(after_in_child=_reiniciar)
+
+
+def _reiniciar():
+    """Descarta o executor e a trava herdados; o próximo EXPLAIN cria outro."""
+    global _executor, _pendentes, _trava  # pylint: disable=global-statement
+    _executor = None
+    _pendentes = 0
+    _trava = threading.Lock()
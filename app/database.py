@@ -1,7 +1,14 @@
 """Módulo de configuração do banco de dados."""
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from typing import Iterable, List, Optional
+
+from sqlalchemy import BigInteger, create_engine, event, inspect, literal_column
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session, declarative_base, load_only, sessionmaker
+from sqlalchemy.sql.functions import FunctionElement
+
+from app.consultas_lentas import instrumentar as registrar_consultas_lentas
 
 ENV = os.getenv("ENV", "dev")
 
@@ -18,6 +25,16 @@ else:
 connect_args = {"check_same_thread": False} if ENV == "test" else {}
 engine = create_engine(DATABASE_URL, connect_args=connect_args)
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _ativar_chaves_estrangeiras(conexao, _registro):
+        """O SQLite só aplica chaves estrangeiras (e ON DELETE) com este PRAGMA."""
+        cursor = conexao.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+registrar_consultas_lentas(engine)
+
 # pylint: disable=invalid-name
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -30,3 +47,52 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+class SequenciaAlteracao(FunctionElement):
+    """Número de alteração gerado pelo banco na escrita, usado como ``versao``.
+
+    No Postgres é o id da transação (``txid_current()``), que não depende do
+    relógio da aplicação; ``sincronizacao.horizonte_alteracoes`` diz até onde
+    todas as transações já terminaram. No SQLite (testes e desenvolvimento),
+    que tem um único escritor, é o maior valor da tabela mais um.
+    """
+    # pylint: disable=too-many-ancestors
+    type = BigInteger()
+    name = "sequencia_alteracao"
+    inherit_cache = True
+
+    def __init__(self, tabela: str):
+        # A tabela entra como cláusula para fazer parte da chave do cache de SQL
+        super().__init__(literal_column(tabela))
+
+
+@compiles(SequenciaAlteracao)
+def _sequencia_alteracao(elemento, compilador, **kw):
+    tabela = compilador.process(elemento.clauses, **kw)
+    return f"(SELECT COALESCE(MAX(versao), 0) + 1 FROM {tabela})"
+
+
+@compiles(SequenciaAlteracao, "postgresql")
+def _sequencia_alteracao_postgres(_elemento, _compilador, **_kw):
+    return "txid_current()"
+
+
+def insert_com_conflito(db: Session):
+    """Retorna o ``insert`` do dialeto em uso, com suporte a ON CONFLICT."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+def so_colunas(modelo, campos: Optional[Iterable[str]]) -> List:
+    """Opções que carregam só as colunas do modelo presentes em ``campos``.
+
+    Nomes que não são colunas (relacionamentos, campos calculados) são
+    ignorados; ``None`` carrega todas as colunas. A chave primária sempre vem.
+    """
+    if campos is None:
+        return []
+    colunas = inspect(modelo).column_attrs
+    return [load_only(*[getattr(modelo, campo) for campo in campos if campo in colunas]
+                      or [modelo.id])]
@@ -0,0 +1,94 @@
+"""Ajustes incrementais de esquema para desenvolvimento e testes.
+
+O projeto cria as tabelas com ``create_all``, que não altera tabelas já
+existentes. Este módulo compara o banco com os modelos e adiciona, de forma
+idempotente, as colunas novas anuláveis ou com valor padrão no banco, o que
+só altera o catálogo, sem reescrever a tabela. Mudanças de tipo (que
+reescrevem a tabela sob bloqueio exclusivo) ficam nas migrações.
+
+Índices também não entram aqui: em tabelas grandes, mesmo o CREATE INDEX
+bloqueia as escritas até o fim. As migrações os criam com
+``criar_indice_concorrente``.
+
+Na inicialização ele só roda com ESQUEMA_AUTOMATICO (ligado por padrão com
+ENV=dev ou test). Em produção o esquema muda pelas migrações do Alembic
+(``alembic upgrade head``), aplicadas deliberadamente pelo operador.
+"""
+import os
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+
+from app.database import ENV, Base
+
+ESQUEMA_AUTOMATICO = os.getenv(
+    "ESQUEMA_AUTOMATICO", "true" if ENV in ("dev", "test") else "false"
+).lower() == "true"
+
+
+def _adicionar_colunas(engine: Engine, inspetor) -> list:
+    """Gera ALTER TABLE ADD COLUMN para colunas ausentes anuláveis ou com padrão."""
+    comandos = []
+    for tabela in Base.metadata.sorted_tables:
+        if not inspetor.has_table(tabela.name):
+            continue
+        existentes = {coluna["name"] for coluna in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name in existentes:
+                continue
+            if not coluna.nullable and coluna.server_default is None:
+                continue
+            definicao = CreateColumn(coluna).compile(dialect=engine.dialect)
+            comandos.append(f"ALTER TABLE {tabela.name} ADD COLUMN {definicao}")
+    return comandos
+
+
+def criar_indice_concorrente(conexao: Connection, nome: str, tabela: str, definicao: str):
+    """Cria o índice, se ausente, sem bloquear escritas (usado pelas migrações).
+
+    ``definicao`` é o trecho após ``ON tabela``, como ``(vacina_id)``. No
+    Postgres usa CREATE INDEX CONCURRENTLY, que não roda em transação: a
+    conexão deve estar em autocommit. Um índice inválido, deixado por uma
+    tentativa interrompida, é refeito. Em tabela particionada o índice é
+    criado em cada partição e anexado ao da tabela pai.
+    """
+    if not inspect(conexao).has_table(tabela):
+        return
+    if conexao.dialect.name != "postgresql":
+        conexao.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} {definicao}")
+        return
+    valido = conexao.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :nome"
+    ), {"nome": nome}).scalar()
+    if valido:
+        return
+    particoes = conexao.execute(text(
+        "SELECT filha.relname FROM pg_inherits h "
+        "JOIN pg_class filha ON filha.oid = h.inhrelid "
+        "JOIN pg_class pai ON pai.oid = h.inhparent WHERE pai.relname = :tabela"
+    ), {"tabela": tabela}).scalars().all()
+    if particoes:
+        # ON ONLY cria o índice da tabela pai sem varrer as partições; ele fica
+        # válido quando o de cada partição é anexado
+        conexao.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {nome} ON ONLY {tabela} {definicao}")
+        for particao in particoes:
+            indice_particao = f"{nome}_{particao.rsplit('_', 1)[-1]}"
+            criar_indice_concorrente(conexao, indice_particao, particao, definicao)
+            conexao.exec_driver_sql(f"ALTER INDEX {nome} ATTACH PARTITION {indice_particao}")
+        return
+    if valido is not None:
+        conexao.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}")
+    conexao.exec_driver_sql(f"CREATE INDEX CONCURRENTLY {nome} ON {tabela} {definicao}")
+
+
+def sincronizar_esquema(engine: Engine) -> list:
+    """Aplica os ajustes pendentes em uma transação e retorna o DDL executado."""
+    inspetor = inspect(engine)
+    comandos = _adicionar_colunas(engine, inspetor)
+    if comandos:
+        with engine.begin() as conexao:
+            for comando in comandos:
+                conexao.exec_driver_sql(comando)
+    return comandos
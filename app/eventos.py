@@ -0,0 +1,300 @@
+"""Eventos de alteração do histórico vacinal, entregues por Server-Sent Events.
+
+As escritas do ``HistoricoVacinalController`` publicam, depois do commit, um
+evento por dose: ``criado``, ``atualizado``, ``aplicado`` ou ``removido``.
+As operações em lote (mesclagem de vacinas, arquivamento e purga de usuários)
+publicam um só ``sincronizar`` por usuário e local a cada lote, sem
+``historico_id``: o cliente busca as alterações em ``/historico/changes``.
+Cada conexão SSE tem uma ``Inscricao`` que filtra por usuário e/ou por local
+de aplicação (a clínica) e guarda os eventos em uma fila própria.
+
+Há dois barramentos: ``BarramentoLocal`` entrega só dentro do processo;
+``BarramentoPostgres`` publica com ``pg_notify`` e cada worker escuta o canal
+(LISTEN) em uma thread, entregando às suas inscrições, de modo que um evento
+gerado em um worker chega às conexões abertas em todos. Com Postgres ele é o
+padrão; EVENTOS_BACKEND=local|postgres força um deles.
+
+Não há reenvio de eventos perdidos: se a fila de uma conexão encher (ou ela
+cair), o cliente recebe ``perdidos`` e deve sincronizar por
+``/historico/changes``.
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+EVENTOS_BACKEND = os.getenv(
+    "EVENTOS_BACKEND", "postgres" if engine.dialect.name == "postgresql" else "local"
+)
+EVENTOS_CANAL = os.getenv("EVENTOS_CANAL", "historico_eventos")
+# Eventos aguardando envio por conexão; além disso são descartados
+EVENTOS_FILA_MAXIMA = int(os.getenv("EVENTOS_FILA_MAXIMA", "1000"))
+# Segundos entre comentários de keep-alive
+EVENTOS_HEARTBEAT = float(os.getenv("EVENTOS_HEARTBEAT", "15"))
+# Segundos até encerrar a conexão (o EventSource reconecta sozinho); 0 = sem limite
+EVENTOS_DURACAO_MAXIMA = float(os.getenv("EVENTOS_DURACAO_MAXIMA", "600"))
+# Espera sugerida ao cliente antes de reconectar
+EVENTOS_RETRY_MS = 3000
+
+
+def evento(
+    tipo: str,
+    usuario_id: int,
+    historico_id: Optional[int],
+    vacina_id: Optional[int] = None,
+    local_aplicacao: Optional[str] = None
+) -> Dict[str, Any]:
+    """Monta um evento de alteração de dose."""
+    return {
+        "tipo": tipo,
+        "usuario_id": usuario_id,
+        "historico_id": historico_id,
+        "vacina_id": vacina_id,
+        "local_aplicacao": local_aplicacao,
+        "quando": datetime.utcnow().isoformat(),
+    }
+
+
+def evento_do_registro(tipo: str, registro) -> Dict[str, Any]:
+    """Monta o evento a partir de um registro do histórico."""
+    return evento(tipo, registro.usuario_id, registro.id, registro.vacina_id,
+                  registro.local_aplicacao)
+
+
+def eventos_sincronizar(pares) -> List[Dict[str, Any]]:
+    """Um evento ``sincronizar`` por par (usuário, local) alterado em lote."""
+    return [evento("sincronizar", usuario_id, None, local_aplicacao=local)
+            for usuario_id, local in dict.fromkeys(pares)]
+
+
+class Inscricao:
+    """Fila de eventos de uma conexão, alimentável de qualquer thread.
+
+    Deve ser criada dentro do event loop que vai consumir a fila.
+    """
+
+    def __init__(
+        self,
+        usuario_id: Optional[int] = None,
+        local: Optional[str] = None,
+        maximo: int = EVENTOS_FILA_MAXIMA
+    ):
+        self.usuario_id = usuario_id
+        self.local = local
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=maximo)
+        self.perdidos = 0
+        self._loop = asyncio.get_running_loop()
+
+    def aceita(self, dados: Dict[str, Any]) -> bool:
+        """Indica se o evento é do usuário e do local da inscrição."""
+        return ((self.usuario_id is None or dados["usuario_id"] == self.usuario_id)
+                and (self.local is None or dados.get("local_aplicacao") == self.local))
+
+    def entregar(self, dados: Dict[str, Any]):
+        """Enfileira o evento (se aceito) no loop da conexão."""
+        if not self.aceita(dados):
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._enfileirar, dados)
+        except RuntimeError:
+            # Loop já encerrado: a conexão acabou
+            pass
+
+    def _enfileirar(self, dados: Dict[str, Any]):
+        try:
+            self.fila.put_nowait(dados)
+        except asyncio.QueueFull:
+            self.perdidos += 1
+
+
+class BarramentoLocal:
+    """Pub/sub dentro do processo."""
+
+    def __init__(self):
+        self._inscricoes = set()
+        self._lock = threading.Lock()
+
+    @property
+    def total_inscricoes(self) -> int:
+        """Conexões inscritas neste processo."""
+        return len(self._inscricoes)
+
+    def inscrever(self, inscricao: Inscricao):
+        """Passa a entregar eventos à inscrição."""
+        with self._lock:
+            self._inscricoes.add(inscricao)
+
+    def cancelar(self, inscricao: Inscricao):
+        """Deixa de entregar eventos à inscrição."""
+        with self._lock:
+            self._inscricoes.discard(inscricao)
+
+    def distribuir(self, eventos: List[Dict[str, Any]]):
+        """Entrega os eventos às inscrições deste processo."""
+        with self._lock:
+            inscricoes = list(self._inscricoes)
+        for dados in eventos:
+            for inscricao in inscricoes:
+                inscricao.entregar(dados)
+
+    def publicar(self, eventos: List[Dict[str, Any]]):
+        """Publica os eventos."""
+        self.distribuir(eventos)
+
+    def iniciar(self):
+        """Nada a iniciar no barramento local."""
+
+    def parar(self):
+        """Nada a encerrar no barramento local."""
+
+
+class BarramentoPostgres(BarramentoLocal):
+    """Pub/sub entre workers com LISTEN/NOTIFY.
+
+    ``publicar`` só faz o NOTIFY; a entrega local vem da própria escuta,
+    como nos demais workers, para que cada evento chegue uma única vez.
+    """
+
+    def __init__(self, motor: Engine = engine, canal: str = EVENTOS_CANAL):
+        super().__init__()
+        self._motor = motor
+        self._canal = canal
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publicar(self, eventos: List[Dict[str, Any]]):
+        """Envia os eventos ao canal em uma transação própria."""
+        if not eventos:
+            return
+        with self._motor.begin() as conexao:
+            conexao.execute(
+                text("SELECT pg_notify(:canal, :carga)"),
+                [{"canal": self._canal, "carga": json.dumps(dados)} for dados in eventos]
+            )
+
+    def iniciar(self):
+        """Inicia a thread que escuta o canal."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._escutar, name="eventos-listen",
+                                        daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        """Encerra a escuta."""
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _escutar(self):
+        """LISTEN em conexão dedicada, reconectando após falhas."""
+        while not self._parar.is_set():
+            conexao = None
+            try:
+                conexao = self._motor.raw_connection()
+                # Fora do pool: a conexão fica presa ao LISTEN até o fim
+                conexao.detach()
+                driver = conexao.driver_connection
+                driver.autocommit = True
+                driver.cursor().execute(f'LISTEN "{self._canal}"')
+                while not self._parar.is_set():
+                    if select.select([driver], [], [], 1.0)[0]:
+                        driver.poll()
+                        avisos = list(driver.notifies)
+                        driver.notifies.clear()
+                        self.distribuir([json.loads(aviso.payload) for aviso in avisos])
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Falha ao escutar o canal %s; reconectando", self._canal)
+                self._parar.wait(1)
+            finally:
+                if conexao is not None:
+                    conexao.close()
+
+
+_barramento = None  # pylint: disable=invalid-name
+
+
+def get_barramento() -> BarramentoLocal:
+    """Retorna o barramento configurado por EVENTOS_BACKEND (criado sob demanda)."""
+    global _barramento  # pylint: disable=global-statement
+    if _barramento is None:
+        _barramento = BarramentoPostgres() if EVENTOS_BACKEND == "postgres" else BarramentoLocal()
+    return _barramento
+
+
+def configurar_barramento(barramento: BarramentoLocal):
+    """Substitui o barramento em uso (útil em testes)."""
+    global _barramento  # pylint: disable=global-statement
+    _barramento = barramento
+
+
+def publicar(*eventos: Dict[str, Any]):
+    """Publica eventos de alteração; uma falha não desfaz a escrita já confirmada."""
+    try:
+        get_barramento().publicar(list(eventos))
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Falha ao publicar %d evento(s) do histórico", len(eventos))
+
+
+def iniciar_eventos():
+    """Inicia o barramento (a escuta do canal, no Postgres)."""
+    get_barramento().iniciar()
+
+
+def parar_eventos():
+    """Encerra o barramento."""
+    get_barramento().parar()
+
+
+def formatar_sse(nome: str, dados: Dict[str, Any]) -> bytes:
+    """Codifica uma mensagem no formato text/event-stream."""
+    return f"event: {nome}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def transmitir(
+    inscricao: Inscricao,
+    desconectado: Callable[[], Awaitable[bool]]
+) -> AsyncIterator[bytes]:
+    """Gera o fluxo SSE da inscrição até o cliente sair ou o tempo máximo passar.
+
+    Sem eventos, envia um comentário a cada EVENTOS_HEARTBEAT segundos para
+    manter a conexão aberta em proxies e detectar clientes que saíram.
+    """
+    barramento = get_barramento()
+    barramento.inscrever(inscricao)
+    loop = asyncio.get_running_loop()
+    fim = loop.time() + EVENTOS_DURACAO_MAXIMA if EVENTOS_DURACAO_MAXIMA > 0 else None
+    try:
+        yield f"retry: {EVENTOS_RETRY_MS}\n\n".encode("utf-8")
+        while True:
+            espera = EVENTOS_HEARTBEAT
+            if fim is not None:
+                espera = min(espera, fim - loop.time())
+                if espera <= 0:
+                    break
+            try:
+                dados = await asyncio.wait_for(inscricao.fila.get(), espera)
+            except asyncio.TimeoutError:
+                if await desconectado() or (fim is not None and loop.time() >= fim):
+                    break
+                yield b": ping\n\n"
+                continue
+            yield formatar_sse(dados["tipo"], dados)
+            if inscricao.perdidos:
+                yield formatar_sse("perdidos", {"quantidade": inscricao.perdidos})
+                inscricao.perdidos = 0
+    finally:
+        barramento.cancelar(inscricao)
@@ -0,0 +1,338 @@
+"""Limite de taxa e controle de admissão das requisições.
+
+Login e cadastro rodam bcrypt: uma rajada de tentativas ocupa a CPU e deixa
+o resto da API sem resposta. ``MiddlewareLimites`` recusa o excesso antes de
+qualquer trabalho:
+
+- baldes de tokens por IP e por e-mail nas rotas de autenticação e por IP
+  nas demais escritas (429 com ``Retry-After``);
+- um limite global de requisições simultâneas, com espera máxima em fila
+  (503 com ``Retry-After`` quando a fila enche ou a espera estoura).
+
+Os limites têm o formato ``capacidade/segundos``: ``10/60`` permite rajadas
+de 10 requisições e repõe 10 tokens a cada 60 s; ``0`` desativa. O estado
+fica em memória (``BackendMemoria``, por processo) ou, com
+LIMITE_BACKEND=redis, compartilhado entre workers (``BackendRedis``).
+As recusas são contadas em ``metricas()`` (``GET /relatorios/limites``).
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from app.database import ENV
+from app.logs import amostrado
+
+logger = logging.getLogger(__name__)
+
+LIMITES_ATIVOS = os.getenv(
+    "LIMITES_ATIVOS", "false" if ENV == "test" else "true"
+).lower() == "true"
+LIMITE_BACKEND = os.getenv("LIMITE_BACKEND", "memoria")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+LIMITE_AUTH_IP = os.getenv("LIMITE_AUTH_IP", "20/60")
+LIMITE_AUTH_EMAIL = os.getenv("LIMITE_AUTH_EMAIL", "5/60")
+LIMITE_ESCRITA_IP = os.getenv("LIMITE_ESCRITA_IP", "120/60")
+# Requisições simultâneas por worker (0 = sem limite), fila e espera máximas
+LIMITE_CONCORRENCIA = int(os.getenv("LIMITE_CONCORRENCIA", "64"))
+LIMITE_FILA_MAXIMA = int(os.getenv("LIMITE_FILA_MAXIMA", "128"))
+LIMITE_FILA_TIMEOUT = float(os.getenv("LIMITE_FILA_TIMEOUT", "2"))
+# Usa o primeiro IP de X-Forwarded-For (só atrás de um proxy confiável)
+LIMITE_PROXY_CONFIAVEL = os.getenv("LIMITE_PROXY_CONFIAVEL", "false").lower() == "true"
+# Baldes guardados pelo backend em memória (os mais antigos são descartados)
+LIMITE_CHAVES_MAXIMAS = 100_000
+# Corpo lido para achar o e-mail do login
+CORPO_MAXIMO = 64 * 1024
+
+# Rotas que rodam bcrypt
+ROTAS_AUTENTICACAO = {
+    ("POST", "/auth/login"),
+    ("POST", "/auth/register"),
+    ("POST", "/usuarios/login"),
+    ("POST", "/usuarios/"),
+}
+METODOS_ESCRITA = {"POST", "PUT", "PATCH", "DELETE"}
+
+_rejeicoes: Counter = Counter()
+_lock_metricas = threading.Lock()
+
+
+def ler_limite(valor: str) -> Optional[Tuple[float, float]]:
+    """Converte ``capacidade/segundos`` em (capacidade, tokens por segundo)."""
+    capacidade, _, periodo = valor.partition("/")
+    capacidade, periodo = float(capacidade), float(periodo or 1)
+    if capacidade <= 0 or periodo <= 0:
+        return None
+    return capacidade, capacidade / periodo
+
+
+class BackendMemoria:
+    """Baldes de tokens no próprio processo, com limite de chaves (LRU)."""
+
+    def __init__(self, max_chaves: int = LIMITE_CHAVES_MAXIMAS, relogio=time.monotonic):
+        self.max_chaves = max_chaves
+        self._relogio = relogio
+        self._baldes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, chave: str, capacidade: float, taxa: float) -> Tuple[bool, float]:
+        """Retira um token; retorna se havia e quantos segundos faltam para haver."""
+        agora = self._relogio()
+        with self._lock:
+            tokens, ultimo = self._baldes.pop(chave, (capacidade, agora))
+            tokens = min(capacidade, tokens + (agora - ultimo) * taxa)
+            permitido = tokens >= 1
+            if permitido:
+                tokens -= 1
+            self._baldes[chave] = (tokens, agora)
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+        return permitido, 0.0 if permitido else (1 - tokens) / taxa
+
+    def limpar(self):
+        """Esvazia todos os baldes."""
+        with self._lock:
+            self._baldes.clear()
+
+
+class BackendRedis:
+    """Baldes de tokens no Redis, atualizados atomicamente por um script Lua.
+
+    Se o Redis não responder, a requisição é admitida: a queda dele não
+    derruba a API.
+    """
+
+    SCRIPT = """
+local capacidade, taxa, agora = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local balde = redis.call('HMGET', KEYS[1], 'tokens', 'ultimo')
+local tokens = tonumber(balde[1]) or capacidade
+local ultimo = tonumber(balde[2]) or agora
+tokens = math.min(capacidade, tokens + math.max(0, agora - ultimo) * taxa)
+local permitido = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    permitido = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ultimo', tostring(agora))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidade / taxa) + 1)
+return {permitido, tostring(tokens)}
+"""
+
+    def __init__(self, cliente=None, url: str = REDIS_URL, prefixo: str = "imunetrack:limite:"):
+        if cliente is None:
+            import redis  # pylint: disable=import-outside-toplevel
+            cliente = redis.Redis.from_url(url)
+        self._script = cliente.register_script(self.SCRIPT)
+        self._prefixo = prefixo
+
+    def consumir(self, chave: str, capacidade: float, taxa: float) -> Tuple[bool, float]:
+        """Retira um token; retorna se havia e quantos segundos faltam para haver."""
+        try:
+            permitido, tokens = self._script(
+                keys=[self._prefixo + chave], args=[capacidade, taxa, time.time()]
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.warning("Redis indisponível para o limite de taxa", extra=amostrado())
+            return True, 0.0
+        if int(permitido):
+            return True, 0.0
+        return False, (1 - float(tokens)) / taxa
+
+
+_backend = None  # pylint: disable=invalid-name
+
+
+def get_backend():
+    """Retorna o backend configurado por LIMITE_BACKEND (criado sob demanda)."""
+    global _backend  # pylint: disable=global-statement
+    if _backend is None:
+        _backend = BackendRedis() if LIMITE_BACKEND == "redis" else BackendMemoria()
+    return _backend
+
+
+def configurar_backend(backend):
+    """Substitui o backend em uso (útil em testes)."""
+    global _backend  # pylint: disable=global-statement
+    _backend = backend
+
+
+def registrar_rejeicao(motivo: str):
+    """Conta uma requisição recusada."""
+    with _lock_metricas:
+        _rejeicoes[motivo] += 1
+
+
+class _Admissao:
+    """Limite de requisições simultâneas do event loop, com fila."""
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.loop = asyncio.get_running_loop()
+        self.semaforo = asyncio.Semaphore(limite)
+        self.em_andamento = 0
+        self.aguardando = 0
+
+    async def entrar(self, fila_maxima: int, timeout: float) -> bool:
+        """Ocupa uma vaga; False se a fila está cheia ou a espera estourou."""
+        if self.semaforo.locked() and self.aguardando >= fila_maxima:
+            return False
+        self.aguardando += 1
+        try:
+            await asyncio.wait_for(self.semaforo.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.aguardando -= 1
+        self.em_andamento += 1
+        return True
+
+    def sair(self):
+        """Libera a vaga."""
+        self.em_andamento -= 1
+        self.semaforo.release()
+
+
+_admissao: Optional[_Admissao] = None
+
+
+def metricas() -> Dict[str, Any]:
+    """Recusas por motivo desde o início do processo e ocupação atual."""
+    with _lock_metricas:
+        rejeicoes = dict(_rejeicoes)
+    return {
+        "rejeicoes": rejeicoes,
+        "em_andamento": _admissao.em_andamento if _admissao else 0,
+        "aguardando": _admissao.aguardando if _admissao else 0,
+        "limite_concorrencia": LIMITE_CONCORRENCIA,
+    }
+
+
+def _ip_do_cliente(scope) -> str:
+    """IP de origem (o primeiro de X-Forwarded-For atrás de proxy confiável)."""
+    if LIMITE_PROXY_CONFIAVEL:
+        encaminhado = dict(scope["headers"]).get(b"x-forwarded-for")
+        if encaminhado:
+            return encaminhado.decode("latin-1").split(",")[0].strip()
+    cliente = scope.get("client")
+    return cliente[0] if cliente else "desconhecido"
+
+
+def _email_do_corpo(corpo: bytes) -> Optional[str]:
+    """E-mail de um corpo JSON de login/cadastro, se houver."""
+    try:
+        dados = json.loads(corpo)
+    except ValueError:
+        return None
+    email = dados.get("email") if isinstance(dados, dict) else None
+    return email.strip().lower() if isinstance(email, str) else None
+
+
+async def _responder(send, codigo: int, detalhe: str, espera: float):
+    """Resposta de recusa no formato de erro da API."""
+    corpo = json.dumps({"detail": detalhe}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": codigo,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(corpo)).encode()),
+            (b"retry-after", str(max(1, math.ceil(espera))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+class MiddlewareLimites:
+    """Aplica os baldes de tokens e o limite de concorrência antes da rota."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not LIMITES_ATIVOS:
+            await self.app(scope, receive, send)
+            return
+
+        metodo, caminho = scope["method"], scope["path"]
+        ip = _ip_do_cliente(scope)
+        baldes = []
+        if (metodo, caminho) in ROTAS_AUTENTICACAO:
+            baldes.append(("auth_ip", f"auth:ip:{ip}", LIMITE_AUTH_IP))
+            receive, email = await self._email(scope, receive)
+            if email:
+                baldes.append(("auth_email", f"auth:email:{email}", LIMITE_AUTH_EMAIL))
+        elif metodo in METODOS_ESCRITA:
+            baldes.append(("escrita_ip", f"escrita:ip:{ip}", LIMITE_ESCRITA_IP))
+
+        for motivo, chave, limite in baldes:
+            parametros = ler_limite(limite)
+            if parametros is None:
+                continue
+            permitido, espera = get_backend().consumir(chave, *parametros)
+            if not permitido:
+                self._recusar(motivo, caminho, ip)
+                await _responder(send, 429, "Muitas requisições; tente novamente mais tarde",
+                                 espera)
+                return
+
+        # Fluxos longos (SSE) e sondas de saúde não ocupam vagas
+        if LIMITE_CONCORRENCIA <= 0 or caminho.startswith("/health") \
+                or caminho.endswith("/eventos"):
+            await self.app(scope, receive, send)
+            return
+
+        admissao = self._admissao()
+        if not await admissao.entrar(LIMITE_FILA_MAXIMA, LIMITE_FILA_TIMEOUT):
+            self._recusar("concorrencia", caminho, ip)
+            await _responder(send, 503, "Servidor sobrecarregado; tente novamente", 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admissao.sair()
+
+    @staticmethod
+    def _admissao() -> _Admissao:
+        """Limitador do processo, criado no loop em execução."""
+        global _admissao  # pylint: disable=global-statement
+        if (_admissao is None or _admissao.limite != LIMITE_CONCORRENCIA
+                or _admissao.loop is not asyncio.get_running_loop()):
+            _admissao = _Admissao(LIMITE_CONCORRENCIA)
+        return _admissao
+
+    @staticmethod
+    async def _email(scope, receive):
+        """Lê o e-mail da query ou do corpo JSON e devolve um receive que repete o corpo."""
+        consulta = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if consulta.get("email"):
+            return receive, consulta["email"][0].strip().lower()
+
+        mensagens, tamanho = [], 0
+        while True:
+            mensagem = await receive()
+            mensagens.append(mensagem)
+            tamanho += len(mensagem.get("body", b""))
+            if mensagem["type"] != "http.request" or not mensagem.get("more_body") \
+                    or tamanho > CORPO_MAXIMO:
+                break
+        corpo = b"".join(m.get("body", b"") for m in mensagens)
+        email = _email_do_corpo(corpo) if tamanho <= CORPO_MAXIMO else None
+
+        async def repetir():
+            if mensagens:
+                return mensagens.pop(0)
+            return await receive()
+
+        return repetir, email
+
+    @staticmethod
+    def _recusar(motivo: str, caminho: str, ip: str):
+        registrar_rejeicao(motivo)
+        logger.warning("Requisição recusada (%s) em %s", motivo, caminho,
+                       extra={"motivo": motivo, "ip": ip, **amostrado()})
@@ -0,0 +1,179 @@
+"""Logs estruturados (JSON) sem E/S na thread da requisição.
+
+Os módulos usam ``logging.getLogger(__name__)`` normalmente. O logger raiz
+tem apenas um ``QueueHandler``: a requisição só enfileira o registro, e uma
+thread do ``QueueListener`` serializa em JSON e escreve no stderr. A fila é
+limitada; se encher, registros são descartados em vez de bloquear.
+
+Cada linha leva o ``request_id`` da requisição em andamento (cabeçalho
+``X-Request-ID`` ou um gerado). Mensagens frequentes podem ser amostradas
+com ``extra=amostrado()``: só 1 a cada LOG_AMOSTRAGEM ocorrências é escrita.
+
+Use sempre a formatação preguiçosa (``logger.info("x=%s", x)``): com o nível
+desativado, a mensagem nem chega a ser montada.
+"""
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_FILA_MAXIMA = int(os.getenv("LOG_FILA_MAXIMA", "10000"))
+LOG_AMOSTRAGEM = int(os.getenv("LOG_AMOSTRAGEM", "100"))
+
+CABECALHO_REQUEST_ID = "X-Request-ID"
+
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+# Scope ASGI da requisição em andamento (após o roteamento, tem a rota casada)
+requisicao_atual: ContextVar[Optional[dict]] = ContextVar("requisicao_atual", default=None)
+
+_CAMPOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# ``log_config`` do uvicorn: sem handlers próprios, os loggers dele propagam
+# até o ``QueueHandler`` da raiz em vez de escrever direto no stderr
+UVICORN_LOG_CONFIG = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "loggers": {
+        nome: {"handlers": [], "propagate": True}
+        for nome in ("uvicorn", "uvicorn.error", "uvicorn.access")
+    },
+}
+
+
+def amostrado(taxa: int = LOG_AMOSTRAGEM) -> Dict[str, int]:
+    """``extra`` para registrar só 1 a cada ``taxa`` ocorrências da mensagem."""
+    return {"amostra": taxa}
+
+
+class FiltroContexto(logging.Filter):
+    """Anexa o request_id e aplica a amostragem, ainda na thread de origem."""
+
+    def __init__(self):
+        super().__init__()
+        self._contadores: Dict[tuple, itertools.count] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        taxa = getattr(record, "amostra", 1)
+        if taxa > 1:
+            # Mensagens com formatação preguiçosa compartilham o mesmo template
+            chave = (record.name, record.msg)
+            contador = self._contadores.setdefault(chave, itertools.count())
+            if next(contador) % taxa:
+                return False
+        record.request_id = request_id.get()
+        return True
+
+
+class FormatadorJson(logging.Formatter):
+    """Uma linha JSON por registro, com os campos de ``extra`` incluídos."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        linha = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for campo, valor in vars(record).items():
+            if campo not in _CAMPOS_PADRAO and campo not in linha and campo != "amostra":
+                linha[campo] = valor
+        if record.exc_info:
+            linha["exc"] = self.formatException(record.exc_info)
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+
+class HandlerFila(QueueHandler):
+    """``QueueHandler`` que descarta registros com a fila cheia."""
+
+    descartados = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            HandlerFila.descartados += 1
+
+
+_handler: Optional[HandlerFila] = None
+_listener: Optional[QueueListener] = None
+
+
+def _iniciar_listener():
+    """Cria uma fila nova e a thread que a esvazia."""
+    global _listener  # pylint: disable=global-statement
+    _handler.queue = queue.Queue(LOG_FILA_MAXIMA)
+    saida = logging.StreamHandler(sys.stderr)
+    saida.setFormatter(FormatadorJson())
+    _listener = QueueListener(_handler.queue, saida, respect_handler_level=True)
+    _listener.start()
+
+
+def configurar_logs(nivel: str = LOG_NIVEL):
+    """Instala o pipeline no logger raiz; chamadas repetidas não fazem nada."""
+    global _handler  # pylint: disable=global-statement
+    if _handler is not None:
+        return
+    _handler = HandlerFila(queue.Queue(LOG_FILA_MAXIMA))
+    _handler.addFilter(FiltroContexto())
+    raiz = logging.getLogger()
+    raiz.setLevel(nivel)
+    raiz.addHandler(_handler)
+    _iniciar_listener()
+    atexit.register(parar_logs)
+    # Threads não sobrevivem ao fork: cada worker precisa da sua
+    os.register_at_fork(after_in_child=_iniciar_listener)
+
+
+def parar_logs():
+    """Escreve o que restou na fila e encerra a thread de escrita."""
+    if _listener is not None and _listener._thread is not None:  # pylint: disable=protected-access
+        _listener.stop()
+
+
+def rota_atual() -> Optional[str]:
+    """Método e rota (ex.: ``GET /usuarios/{usuario_id}``) da requisição em andamento."""
+    scope = requisicao_atual.get()
+    if scope is None:
+        return None
+    rota = scope.get("route")
+    return f"{scope['method']} {rota.path if rota is not None else scope['path']}"
+
+
+class MiddlewareRequestId:
+    """Define o request_id de cada requisição e o devolve no cabeçalho."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cabecalho = CABECALHO_REQUEST_ID.lower().encode()
+        valor = dict(scope["headers"]).get(cabecalho, b"").decode("latin-1")[:128]
+        identificador = valor or uuid.uuid4().hex
+        token = request_id.set(identificador)
+        token_requisicao = requisicao_atual.set(scope)
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                mensagem["headers"] = [
+                    *mensagem.get("headers", []), (cabecalho, identificador.encode("latin-1"))
+                ]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            request_id.reset(token)
+            requisicao_atual.reset(token_requisicao)
@@ -1,34 +1,80 @@
 """Módulo principal da aplicação ImuneTrack."""
+import logging
 import os
 import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.exc import OperationalError
 from app.database import Base, engine
+from app.esquema import ESQUEMA_AUTOMATICO, sincronizar_esquema
 from app.Usuario.routes import router as usuario_router
 from app.Vacina.routes import router as vacina_router
 from app.HistoricoVacina.routes import router as historico_router
+from app.HistoricoVacina.routes import lote_router as historico_lote_router
+from app.HistoricoVacina.routes import carteira_router
+from app.HistoricoVacina.particionamento import particionar_historico
+from app.HistoricoVacina.unicidade import verificar_unicidade
 from app.Auth.routes import router as auth_router
+from app.Relatorios.routes import router as relatorios_router
+from app.agendador import iniciar_agendador, parar_agendador
+from app.eventos import iniciar_eventos, parar_eventos
+from app.saude import iniciar_aquecimento, router as saude_router
+from app.limites import MiddlewareLimites
+from app.logs import CABECALHO_REQUEST_ID, MiddlewareRequestId, configurar_logs
+from app.rastreamento import (
+    MiddlewareRastreamento,
+    configurar_rastreamento,
+    instrumentar_engine,
+)
+
+configurar_logs()
+configurar_rastreamento()
+instrumentar_engine(engine)
+logger = logging.getLogger(__name__)
 
 def criar_tabelas_com_retry(retries=10, delay=3):
     """Cria tabelas no banco de dados com retry caso o banco ainda não esteja pronto."""
     for i in range(retries):
         try:
             Base.metadata.create_all(bind=engine)
-            print("Tabelas criadas com sucesso!")
+            if ESQUEMA_AUTOMATICO:
+                sincronizar_esquema(engine)
+            verificar_unicidade(engine)
+            particionar_historico(engine, somente_vazia=True)
+            logger.info("Tabelas criadas com sucesso!")
             break
         except OperationalError:
-            print(f"[{i+1}/{retries}] Banco ainda não pronto, tentando novamente em {delay}s...")
+            logger.warning("[%d/%d] Banco ainda não pronto, tentando novamente em %ss...",
+                           i + 1, retries, delay)
             time.sleep(delay)
     else:
         raise RuntimeError("Não foi possível conectar ao banco de dados após várias tentativas.")
 
 criar_tabelas_com_retry()
 
-app = FastAPI(title="ImuneTrack API")
+@asynccontextmanager
+async def lifespan(aplicacao: FastAPI):
+    """Inicia e encerra as tarefas em segundo plano junto com a aplicação.
+
+    O aquecimento roda em uma thread: o processo já responde a /health/live
+    enquanto /health/ready aguarda o fim dele.
+    """
+    iniciar_agendador()
+    iniciar_eventos()
+    aquecimento = iniciar_aquecimento(aplicacao)
+    yield
+    parar_eventos()
+    parar_agendador()
+    if aquecimento is not None and not aquecimento.done():
+        logger.warning("Encerrando antes do fim do aquecimento")
+
+app = FastAPI(title="ImuneTrack API", lifespan=lifespan)
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
+# Mais interno que o CORS, para que as respostas 429/503 levem os seus cabeçalhos
+app.add_middleware(MiddlewareLimites)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -38,12 +84,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CABECALHO_REQUEST_ID],
 )
+app.add_middleware(MiddlewareRastreamento)
+app.add_middleware(MiddlewareRequestId)
 
 app.include_router(auth_router)
 app.include_router(usuario_router)
 app.include_router(vacina_router)
 app.include_router(historico_router, prefix="/usuarios")
+app.include_router(historico_lote_router)
+app.include_router(carteira_router)
+app.include_router(relatorios_router)
+app.include_router(saude_router)
 
 @app.get("/")
 async def root():
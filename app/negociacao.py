@@ -0,0 +1,165 @@
+"""Negociação de conteúdo para os endpoints de listagem.
+
+Além do JSON padrão, as listagens podem ser devolvidas em MessagePack ou em
+JSON colunar (um array por campo), que evitam repetir o nome de cada campo
+em todas as linhas. O formato é escolhido pelo cabeçalho ``Accept``.
+
+Com ``?fields=a,b`` o cliente escolhe os campos de cada item; só eles são
+lidos do banco (ver ``app.database.so_colunas``) e codificados.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, create_model
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependência opcional
+    msgpack = None
+
+MIDIA_JSON = "application/json"
+MIDIA_MSGPACK = "application/x-msgpack"
+MIDIA_COLUNAR = "application/vnd.imunetrack.colunar+json"
+
+_FORMATOS = {
+    "application/json": "json",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    MIDIA_COLUNAR: "colunar",
+}
+
+# Documentação OpenAPI dos formatos alternativos, para uso em ``responses``.
+RESPOSTAS_NEGOCIADAS = {
+    200: {
+        "content": {MIDIA_MSGPACK: {}, MIDIA_COLUNAR: {}},
+        "description": "Lista em JSON, MessagePack ou JSON colunar conforme o Accept",
+    }
+}
+
+
+def escolher_formato(accept: Optional[str]) -> str:
+    """Escolhe o formato de resposta a partir do cabeçalho Accept.
+
+    Retorna ``"json"``, ``"msgpack"`` ou ``"colunar"``. Curingas e tipos
+    desconhecidos resultam em JSON; em caso de empate de ``q`` vale a ordem
+    em que os tipos aparecem.
+    """
+    if not accept:
+        return "json"
+
+    melhor, melhor_q = "json", 0.0
+    for item in accept.split(","):
+        partes = item.strip().split(";")
+        formato = _FORMATOS.get(partes[0].strip().lower())
+        if formato is None:
+            continue
+        if formato == "msgpack" and msgpack is None:
+            continue
+        q = 1.0
+        for parametro in partes[1:]:
+            nome, _, valor = parametro.strip().partition("=")
+            if nome == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        if q > melhor_q:
+            melhor, melhor_q = formato, q
+    return melhor
+
+
+def campos_pedidos(fields: Optional[str], modelo) -> Optional[Tuple[str, ...]]:
+    """Campos de ``?fields=`` (separados por vírgula), na ordem do schema.
+
+    Sem o parâmetro retorna ``None`` (todos os campos); nomes que não existem
+    no schema resultam em 400.
+    """
+    pedidos = {campo.strip() for campo in (fields or "").split(",") if campo.strip()}
+    if not pedidos:
+        return None
+    desconhecidos = pedidos - set(modelo.model_fields)
+    if desconhecidos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos desconhecidos em fields: {', '.join(sorted(desconhecidos))}"
+        )
+    return tuple(campo for campo in modelo.model_fields if campo in pedidos)
+
+
+@lru_cache(maxsize=None)
+def modelo_parcial(modelo, campos: Tuple[str, ...]):
+    """Schema só com ``campos``, criado uma vez por combinação.
+
+    Validar com o schema reduzido evita ler os atributos não pedidos (que,
+    adiados no SQL, custariam uma consulta por linha).
+    """
+    return create_model(
+        f"{modelo.__name__}Parcial",
+        **{campo: (modelo.model_fields[campo].annotation, modelo.model_fields[campo])
+           for campo in campos}
+    )
+
+
+@lru_cache(maxsize=None)
+def _adaptador(modelo) -> TypeAdapter:
+    """TypeAdapter de lista do modelo, criado uma única vez."""
+    return TypeAdapter(List[modelo])
+
+
+def serializar(
+    itens: Sequence[Any],
+    modelo,
+    campos: Optional[Tuple[str, ...]] = None
+) -> List[Dict[str, Any]]:
+    """Valida os itens com o schema e converte para tipos nativos de JSON."""
+    adaptador = _adaptador(modelo_parcial(modelo, campos) if campos else modelo)
+    return adaptador.dump_python(
+        adaptador.validate_python(list(itens), from_attributes=True),
+        mode="json"
+    )
+
+
+def para_colunas(linhas: List[Dict[str, Any]], campos: Sequence[str]) -> Dict[str, list]:
+    """Transpõe a lista de linhas em um array por campo."""
+    return {campo: [linha.get(campo) for linha in linhas] for campo in campos}
+
+
+def responder(
+    request: Request,
+    linhas: List[Dict[str, Any]],
+    campos: Sequence[str],
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Codifica linhas já serializadas no formato pedido pelo cliente."""
+    headers = {**(headers or {}), "Vary": "Accept"}
+    formato = escolher_formato(request.headers.get("accept"))
+
+    if formato == "msgpack":
+        return Response(
+            content=msgpack.packb(linhas, use_bin_type=True),
+            media_type=MIDIA_MSGPACK,
+            headers=headers
+        )
+    if formato == "colunar":
+        return JSONResponse(
+            content=para_colunas(linhas, campos),
+            media_type=MIDIA_COLUNAR,
+            headers=headers
+        )
+    return JSONResponse(content=linhas, headers=headers)
+
+
+def responder_lista(
+    request: Request,
+    itens: Sequence[Any],
+    modelo,
+    headers: Optional[Dict[str, str]] = None,
+    campos: Optional[Tuple[str, ...]] = None
+) -> Response:
+    """Serializa os itens com o schema e responde no formato negociado."""
+    return responder(
+        request, serializar(itens, modelo, campos), list(campos or modelo.model_fields), headers
+    )
@@ -0,0 +1,331 @@
+"""Rastreamento leve de requisições (spans), com propagação W3C ``traceparent``.
+
+Cada requisição abre um span; dentro dele, os métodos dos controladores,
+cada comando SQL, as chamadas ao bcrypt e os envios de e-mail abrem spans
+filhos. Spans terminados vão para uma fila e uma thread os entrega aos
+exportadores, fora da thread da requisição.
+
+TRACE_EXPORTADOR escolhe os exportadores, separados por vírgula:
+``json`` grava uma linha por span em TRACE_ARQUIVO (útil offline) e ``log``
+manda os spans para o log. Outros exportadores podem ser plugados com
+``registrar_exportador``. Sem nenhum exportador, os spans não são criados e
+o custo se resume a uma verificação.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTADOR = os.getenv("TRACE_EXPORTADOR", "")
+TRACE_ARQUIVO = os.getenv("TRACE_ARQUIVO", "traces.jsonl")
+# Fração das requisições sem traceparent que são rastreadas
+TRACE_AMOSTRAGEM = float(os.getenv("TRACE_AMOSTRAGEM", "1.0"))
+TRACE_FILA_MAXIMA = int(os.getenv("TRACE_FILA_MAXIMA", "10000"))
+# Tamanho máximo do SQL guardado em cada span
+TRACE_SQL_MAXIMO = 2000
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """Um trecho cronometrado de um trace."""
+
+    __slots__ = ("trace_id", "span_id", "pai_id", "nome", "amostrado",
+                 "inicio", "fim", "atributos", "erro")
+
+    def __init__(self, nome: str, trace_id: str, pai_id: Optional[str], amostrado: bool):
+        self.nome = nome
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.pai_id = pai_id
+        self.amostrado = amostrado
+        self.inicio = time.time_ns()
+        self.fim: Optional[int] = None
+        self.atributos: Dict[str, Any] = {}
+        self.erro: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        """Cabeçalho W3C que identifica este span como pai."""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.amostrado else '00'}"
+
+    def para_dict(self) -> Dict[str, Any]:
+        """Representação exportada do span."""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "pai_id": self.pai_id,
+            "nome": self.nome,
+            "inicio": datetime.fromtimestamp(self.inicio / 1e9, timezone.utc).isoformat(),
+            "duracao_ms": round((self.fim - self.inicio) / 1e6, 3),
+            "atributos": self.atributos,
+            "erro": self.erro,
+        }
+
+
+class Exportador:
+    """Destino dos spans; subclasses implementam ``exportar``."""
+
+    def exportar(self, spans: List[Dict[str, Any]]):
+        """Recebe um lote de spans terminados."""
+        raise NotImplementedError
+
+
+class ExportadorArquivoJson(Exportador):
+    """Grava uma linha JSON por span em um arquivo local."""
+
+    def __init__(self, caminho: str = TRACE_ARQUIVO):
+        self.caminho = caminho
+
+    def exportar(self, spans: List[Dict[str, Any]]):
+        with open(self.caminho, "a", encoding="utf-8") as arquivo:
+            for item in spans:
+                arquivo.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+
+
+class ExportadorLog(Exportador):
+    """Registra cada span no log (e, portanto, no pipeline JSON dos logs)."""
+
+    def exportar(self, spans: List[Dict[str, Any]]):
+        for item in spans:
+            logger.info("span %s %.3fms", item["nome"], item["duracao_ms"],
+                        extra={"span": item})
+
+
+EXPORTADORES: Dict[str, Callable[[], Exportador]] = {
+    "json": ExportadorArquivoJson,
+    "log": ExportadorLog,
+}
+
+
+class _Processador:
+    """Fila de spans terminados e a thread que os entrega aos exportadores."""
+
+    def __init__(self):
+        self.exportadores: List[Exportador] = []
+        self.fila: queue.Queue = queue.Queue(TRACE_FILA_MAXIMA)
+        self.thread: Optional[threading.Thread] = None
+        self.descartados = 0
+        # Duas requisições não podem iniciar cada uma a sua thread
+        self.trava = threading.Lock()
+
+    def enviar(self, span: Span):
+        """Enfileira um span; descarta se a fila estiver cheia."""
+        if self.thread is None or not self.thread.is_alive():
+            with self.trava:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self._executar,
+                                                   name="rastreamento", daemon=True)
+                    self.thread.start()
+        try:
+            self.fila.put_nowait(span)
+        except queue.Full:
+            with self.trava:
+                self.descartados += 1
+
+    def _executar(self):
+        while True:
+            spans = [self.fila.get()]
+            while len(spans) < 100:
+                try:
+                    spans.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+            self._exportar([span.para_dict() for span in spans])
+            for _ in spans:
+                self.fila.task_done()
+
+    def _exportar(self, spans: List[Dict[str, Any]]):
+        for exportador in self.exportadores:
+            try:
+                exportador.exportar(spans)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Falha no exportador %s", type(exportador).__name__)
+
+    def reiniciar(self):
+        """Descarta fila, thread e trava herdadas de um fork."""
+        self.fila = queue.Queue(TRACE_FILA_MAXIMA)
+        self.thread = None
+        self.trava = threading.Lock()
+
+
+_processador = _Processador()
+_span_atual: ContextVar[Optional[Span]] = ContextVar("span_atual", default=None)
+
+os.register_at_fork(after_in_child=_processador.reiniciar)
+
+
+def registrar_exportador(exportador: Exportador):
+    """Pluga um exportador; o rastreamento fica ativo a partir daí."""
+    _processador.exportadores.append(exportador)
+
+
+def configurar_rastreamento(nomes: str = TRACE_EXPORTADOR):
+    """Registra os exportadores nomeados em TRACE_EXPORTADOR (ex.: ``json,log``)."""
+    for nome in filter(None, (parte.strip() for parte in nomes.split(","))):
+        if nome not in EXPORTADORES:
+            logger.warning("Exportador de trace desconhecido: %s", nome)
+            continue
+        registrar_exportador(EXPORTADORES[nome]())
+
+
+def ativo() -> bool:
+    """Indica se há exportadores (sem eles, nada é rastreado)."""
+    return bool(_processador.exportadores)
+
+
+def forcar_envio():
+    """Espera a entrega de todos os spans já terminados."""
+    _processador.fila.join()
+
+
+def span_atual() -> Optional[Span]:
+    """Span em andamento no contexto atual."""
+    return _span_atual.get()
+
+
+def ler_traceparent(valor: Optional[str]):
+    """Extrai (trace_id, span_id pai, amostrado) do cabeçalho; None se inválido."""
+    combinacao = _TRACEPARENT.match((valor or "").strip().lower())
+    if not combinacao:
+        return None
+    trace_id, pai_id, flags = combinacao.groups()
+    if trace_id == "0" * 32 or pai_id == "0" * 16:
+        return None
+    return trace_id, pai_id, bool(int(flags, 16) & 1)
+
+
+def abrir_span(nome: str, traceparent: Optional[str] = None, **atributos) -> Span:
+    """Cria um span filho do atual (ou do ``traceparent`` remoto), sem ativá-lo."""
+    pai = _span_atual.get()
+    if pai is not None:
+        novo = Span(nome, pai.trace_id, pai.span_id, pai.amostrado)
+    elif (remoto := ler_traceparent(traceparent)) is not None:
+        novo = Span(nome, remoto[0], remoto[1], remoto[2])
+    else:
+        novo = Span(nome, f"{random.getrandbits(128):032x}", None,
+                    random.random() < TRACE_AMOSTRAGEM)
+    novo.atributos.update(atributos)
+    return novo
+
+
+def fechar_span(aberto: Span, erro: Optional[BaseException] = None):
+    """Encerra o span e o envia aos exportadores se ele foi amostrado."""
+    aberto.fim = time.time_ns()
+    if erro is not None:
+        aberto.erro = repr(erro)
+    if aberto.amostrado:
+        _processador.enviar(aberto)
+
+
+@contextmanager
+def span(nome: str, traceparent: Optional[str] = None, **atributos):
+    """Executa o bloco dentro de um span (ou de nada, se o rastreamento estiver inativo)."""
+    if not _processador.exportadores:
+        yield None
+        return
+    aberto = abrir_span(nome, traceparent, **atributos)
+    token = _span_atual.set(aberto)
+    erro = None
+    try:
+        yield aberto
+    except BaseException as excecao:
+        erro = excecao
+        raise
+    finally:
+        _span_atual.reset(token)
+        fechar_span(aberto, erro)
+
+
+def rastreado(nome: Optional[str] = None):
+    """Decorador que executa a função dentro de um span."""
+    def decorador(funcao):
+        rotulo = nome or funcao.__qualname__
+
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not _processador.exportadores:
+                return funcao(*args, **kwargs)
+            with span(rotulo):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def rastrear_metodos(classe):
+    """Decorador de classe: um span para cada método estático do controlador."""
+    for nome, atributo in list(vars(classe).items()):
+        if isinstance(atributo, staticmethod):
+            funcao = rastreado(f"{classe.__name__}.{nome}")(atributo.__func__)
+            setattr(classe, nome, staticmethod(funcao))
+    return classe
+
+
+def instrumentar_engine(engine: Engine):
+    """Abre um span por comando SQL executado dentro de um trace."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(_conexao, _cursor, sql, _parametros, contexto, executemany):
+        pai = _span_atual.get()
+        if pai is None or not pai.amostrado:
+            return
+        contexto.span_sql = abrir_span(
+            "SQL", **{"db.statement": sql[:TRACE_SQL_MAXIMO], "db.executemany": executemany}
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(_conexao, cursor, _sql, _parametros, contexto, _executemany):
+        aberto = getattr(contexto, "span_sql", None)
+        if aberto is not None:
+            aberto.atributos["db.linhas"] = cursor.rowcount
+            fechar_span(aberto)
+            contexto.span_sql = None
+
+    @event.listens_for(engine, "handle_error")
+    def _erro(contexto_excecao):
+        contexto = contexto_excecao.execution_context
+        aberto = getattr(contexto, "span_sql", None)
+        if aberto is not None:
+            fechar_span(aberto, contexto_excecao.original_exception)
+            contexto.span_sql = None
+
+
+class MiddlewareRastreamento:
+    """Abre o span da requisição, continuando o trace do ``traceparent`` recebido."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _processador.exportadores:
+            await self.app(scope, receive, send)
+            return
+        cabecalhos = dict(scope["headers"])
+        traceparent = cabecalhos.get(b"traceparent", b"").decode("latin-1")
+        with span(f"{scope['method']} {scope['path']}", traceparent,
+                  **{"http.method": scope["method"], "http.target": scope["path"]}) as aberto:
+
+            async def enviar(mensagem):
+                if mensagem["type"] == "http.response.start":
+                    aberto.atributos["http.status_code"] = mensagem["status"]
+                await send(mensagem)
+
+            await self.app(scope, receive, enviar)
+            rota = scope.get("route")
+            if rota is not None:
+                # Nome pela rota (/usuarios/{usuario_id}/...) agrupa requisições iguais
+                aberto.nome = f"{scope['method']} {rota.path}"
@@ -0,0 +1,150 @@
+"""Aquecimento na inicialização e sondas de saúde.
+
+Logo após um deploy, as primeiras requisições pagavam trabalho feito sob
+demanda: configuração dos mappers, carga do backend do bcrypt, geração do
+schema OpenAPI, conexões novas no pool e compilação do SQL. ``aquecer`` faz
+tudo isso antes de o processo ser declarado pronto.
+
+Nos testes o aquecimento fica desligado (o processo já nasce pronto), a
+menos que AQUECIMENTO_ATIVO=true.
+
+``/health/live`` só indica que o processo responde (nunca toca o banco);
+``/health/ready`` responde 503 até o fim do aquecimento e sempre que o banco
+não responder.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from fastapi import APIRouter, FastAPI, HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import configure_mappers
+
+from app.database import ENV, SessionLocal, engine
+from app.HistoricoVacina.controller import HistoricoVacinalController
+from app.Usuario.controller import UsuarioController, pwd_context
+from app.Vacina.controller import VacinaController
+
+logger = logging.getLogger(__name__)
+
+AQUECIMENTO_ATIVO = os.getenv(
+    "AQUECIMENTO_ATIVO", "false" if ENV == "test" else "true"
+).lower() == "true"
+
+router = APIRouter(prefix="/health", tags=["Saúde"])
+
+_pronto = threading.Event()
+_etapas: Dict[str, float] = {}
+
+
+def preencher_pool(motor: Engine = engine) -> int:
+    """Abre ``pool_size`` conexões ao mesmo tempo e as devolve ao pool."""
+    tamanho = getattr(motor.pool, "size", lambda: 1)()
+    conexoes = []
+    try:
+        for _ in range(tamanho):
+            conexoes.append(motor.connect())
+    finally:
+        for conexao in conexoes:
+            conexao.close()
+    return len(conexoes)
+
+
+def _consultas_quentes():
+    """Executa as consultas mais frequentes (com ids inexistentes) para compilá-las."""
+    with SessionLocal() as db:
+        HistoricoVacinalController.listar_por_usuario(db, 0)
+        HistoricoVacinalController.listar_por_usuario(db, 0, ano=2000, mes=1)
+        HistoricoVacinalController.obter_estatisticas(db, 0)
+        UsuarioController.buscar_por_id(db, 0)
+        UsuarioController.buscar_por_email(db, "")
+        VacinaController.buscar_por_id(db, 0)
+
+
+def _catalogo():
+    """Carrega o catálogo de vacinas e o índice de autocompletar."""
+    with SessionLocal() as db:
+        VacinaController.listar_todas(db)
+        VacinaController.autocompletar(db, "a", 1)
+
+
+def aquecer(app: Optional[FastAPI] = None) -> Dict[str, float]:
+    """Executa as etapas do aquecimento e marca o processo como pronto.
+
+    Uma etapa que falha é registrada no log e não impede as demais; a
+    prontidão continua dependendo do banco responder.
+    """
+    etapas = [
+        ("mappers", configure_mappers),
+        ("pool", preencher_pool),
+        ("sql", _consultas_quentes),
+        ("catalogo", _catalogo),
+        ("bcrypt", lambda: pwd_context.verify("aquecimento", pwd_context.hash("aquecimento"))),
+    ]
+    if app is not None:
+        etapas.append(("openapi", app.openapi))
+
+    for nome, etapa in etapas:
+        inicio = time.perf_counter()
+        try:
+            etapa()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Falha na etapa %s do aquecimento", nome)
+        _etapas[nome] = round((time.perf_counter() - inicio) * 1000, 1)
+    _pronto.set()
+    logger.info("Aquecimento concluído em %.0f ms", sum(_etapas.values()),
+                extra={"etapas": dict(_etapas)})
+    return dict(_etapas)
+
+
+def iniciar_aquecimento(app: FastAPI) -> Optional[asyncio.Task]:
+    """Agenda o aquecimento em uma thread; sem ele, marca o processo como pronto."""
+    if not AQUECIMENTO_ATIVO:
+        _pronto.set()
+        return None
+    return asyncio.create_task(asyncio.to_thread(aquecer, app))
+
+
+def _banco_responde() -> bool:
+    """Executa um ``SELECT 1`` no banco."""
+    try:
+        with engine.connect() as conexao:
+            conexao.execute(text("SELECT 1"))
+        return True
+    except SQLAlchemyError:
+        return False
+
+
+@router.get(
+    "/live",
+    summary="Processo vivo",
+    description="Responde enquanto o processo atende requisições; não consulta o banco"
+)
+async def vivo():
+    """Sonda de liveness."""
+    return {"status": "ok"}
+
+
+@router.get(
+    "/ready",
+    summary="Pronto para receber tráfego",
+    description="503 até o fim do aquecimento ou se o banco não responder"
+)
+def pronto():
+    """Sonda de readiness."""
+    if not _pronto.is_set():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Aquecimento em andamento"
+        )
+    if not _banco_responde():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Banco de dados indisponível"
+        )
+    return {"status": "pronto", "aquecimento_ms": _etapas}
@@ -1,7 +1,7 @@
 """Schemas Pydantic para validação de dados da API."""
 from datetime import datetime, date
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, EmailStr, Field, validator
 from app.HistoricoVacina.model import StatusDose
 
@@ -52,6 +52,23 @@ class VacinaResponse(VacinaBase):
         from_attributes = True
 
 
+# pylint: disable=too-few-public-methods
+class MesclagemVacinaResponse(BaseModel):
+    """Andamento da mesclagem de uma vacina duplicada em outra."""
+
+    origem_id: int = Field(..., description="Vacina duplicada, removida ao final")
+    destino_id: int = Field(..., description="Vacina que permanece")
+    concluida: bool = Field(..., description="Todo o histórico foi movido e a origem removida")
+    registros_restantes: int = Field(
+        ...,
+        description="Registros do histórico que ainda apontam para a origem"
+    )
+    arquivados_restantes: int = Field(
+        ...,
+        description="Registros arquivados que ainda apontam para a origem"
+    )
+
+
 class UsuarioBase(BaseModel):
     """Schema base para Usuario."""
 
@@ -144,6 +161,16 @@ class UsuarioResponse(UsuarioBase):
         from_attributes = True
 
 
+class PaginaUsuarios(BaseModel):
+    """Página de resultados da busca de usuários (paginação por keyset)."""
+
+    itens: List[UsuarioResponse]
+    proximo_cursor: Optional[int] = Field(
+        None,
+        description="Valor para o parâmetro 'apos' da próxima página; nulo se não houver"
+    )
+
+
 # ==================== SCHEMAS DE ERRO ====================
 
 class ErrorResponse(BaseModel):
@@ -193,6 +220,18 @@ class HistoricoVacinalCreate(HistoricoVacinalBase):
     observacoes: Optional[str] = None
 
 
+class HistoricoVacinalDose(BaseModel):
+    """Schema para gravar uma dose identificada pela vacina e pelo número."""
+
+    status: StatusDoseEnum = Field(default=StatusDoseEnum.PENDENTE)
+    data_aplicacao: Optional[date] = None
+    data_prevista: Optional[date] = None
+    lote: Optional[str] = Field(None, max_length=50)
+    local_aplicacao: Optional[str] = Field(None, max_length=200)
+    profissional: Optional[str] = Field(None, max_length=200)
+    observacoes: Optional[str] = Field(None, max_length=500)
+
+
 class HistoricoVacinalUpdate(BaseModel):
     """Schema para atualizar um registro no histórico."""
 
@@ -246,6 +285,45 @@ class HistoricoVacinalCompleto(BaseModel):
         from_attributes = True
 
 
+# pylint: disable=too-few-public-methods
+class AlteracoesHistorico(BaseModel):
+    """Alterações do histórico desde o último token de sincronização."""
+
+    alterados: List[HistoricoVacinalCompleto] = Field(
+        ..., description="Registros criados ou atualizados, em ordem de atualização"
+    )
+    removidos: List[int] = Field(..., description="IDs de registros excluídos ou arquivados")
+    token: str = Field(..., description="Valor de 'since' para a próxima sincronização")
+    tem_mais: bool = Field(..., description="Há mais alterações; chame de novo com o token")
+
+
+class ResultadoAplicacao(str, Enum):
+    """Resultado de um item da aplicação em lote."""
+    APLICADA = "aplicada"
+    JA_APLICADA = "ja_aplicada"
+    NAO_ENCONTRADO = "nao_encontrado"
+
+
+class ItemAplicacaoLote(BaseModel):
+    """Dose do histórico identificada pelo usuário e pelo registro."""
+
+    usuario_id: int = Field(..., gt=0)
+    historico_id: int = Field(..., gt=0)
+
+
+class ResultadoItemAplicacao(ItemAplicacaoLote):
+    """Resultado da aplicação de um item do lote."""
+
+    resultado: ResultadoAplicacao
+
+
+class AplicacaoLoteResponse(BaseModel):
+    """Resumo da aplicação em lote."""
+
+    aplicadas: int = Field(..., description="Doses que passaram a constar como aplicadas")
+    itens: List[ResultadoItemAplicacao] = Field(..., description="Resultado de cada item")
+
+
 # pylint: disable=too-few-public-methods
 class HistoricoFiltros(BaseModel):
     """Filtros para busca no histórico vacinal."""
@@ -268,3 +346,96 @@ class EstatisticasHistorico(BaseModel):
     vacinas_completas: int
     vacinas_incompletas: int
     proximas_doses: list
+
+
+# ==================== SCHEMAS DA CARTEIRA ====================
+
+class EscopoCarteira(str, Enum):
+    """Vacinas incluídas na carteira."""
+
+    TODAS = "todas"
+    DO_USUARIO = "do_usuario"
+
+
+# pylint: disable=too-few-public-methods
+class VacinaCarteira(BaseModel):
+    """Uma vacina da carteira, com as doses do usuário e o progresso."""
+
+    vacina_id: int
+    vacina_nome: str
+    doses_totais: int
+    doses_aplicadas: int
+    completa: bool
+    progresso: float = Field(..., ge=0, le=1, description="Doses aplicadas / doses_totais")
+    doses: List[HistoricoVacinalCompleto] = Field(
+        ..., description="Doses do usuário para a vacina, em ordem de número da dose"
+    )
+
+
+# pylint: disable=too-few-public-methods
+class CarteiraResponse(BaseModel):
+    """Tudo o que a tela inicial do aplicativo precisa em uma resposta."""
+
+    usuario: UsuarioResponse
+    vacinas: List[VacinaCarteira]
+    estatisticas: EstatisticasHistorico
+    proximas_doses: List[HistoricoVacinalCompleto] = Field(
+        ..., description="Doses pendentes com data prevista, da mais próxima à mais distante"
+    )
+
+
+# ==================== SCHEMAS DE RELATÓRIOS ====================
+
+# pylint: disable=too-few-public-methods
+class CoberturaVacinaResponse(BaseModel):
+    """Cobertura da população para uma vacina."""
+
+    vacina_id: int
+    vacina_nome: str
+    doses: int
+    completos: int = Field(..., description="Usuários com todas as doses aplicadas")
+    parciais: int = Field(..., description="Usuários com parte das doses aplicadas")
+    nao_iniciados: int = Field(..., description="Usuários sem nenhuma dose aplicada")
+    total_usuarios: int
+    atualizado_em: Optional[datetime] = Field(
+        None,
+        description="Momento da última atualização dos agregados"
+    )
+
+
+# pylint: disable=too-few-public-methods
+class AplicacoesAgrupadas(BaseModel):
+    """Total de doses aplicadas em um grupo do relatório de aplicações.
+
+    Só vêm preenchidos os campos das dimensões pedidas em ``agrupar``.
+    """
+
+    periodo: Optional[str] = Field(None, description="AAAA-MM-DD, AAAA-MM ou AAAA")
+    vacina_id: Optional[int] = None
+    vacina_nome: Optional[str] = None
+    local_aplicacao: Optional[str] = None
+    profissional: Optional[str] = None
+    quantidade: int
+
+
+class ConsultaLenta(BaseModel):
+    """Comando SQL que excedeu o limite de tempo."""
+
+    quando: datetime
+    duracao_ms: float
+    sql: str
+    parametros: Any = Field(None, description="Tipos dos parâmetros (sem os valores)")
+    rota: Optional[str] = Field(None, description="Rota da requisição que executou o comando")
+    chamada: Optional[str] = Field(None, description="Arquivo, linha e função de origem")
+    request_id: str
+
+
+class MetricasLimites(BaseModel):
+    """Recusas do limite de taxa e da admissão neste processo."""
+
+    rejeicoes: Dict[str, int] = Field(
+        ..., description="Recusas por motivo: auth_ip, auth_email, escrita_ip, concorrencia"
+    )
+    em_andamento: int = Field(..., description="Requisições ocupando vagas agora")
+    aguardando: int = Field(..., description="Requisições na fila por uma vaga")
+    limite_concorrencia: int
@@ -0,0 +1,233 @@
+"""Servidor de produção com pré-fork de workers.
+
+O processo mestre importa e aquece a aplicação uma única vez (mappers do
+SQLAlchemy e schema OpenAPI), congela o heap com ``gc.freeze()`` e faz fork
+dos workers, que compartilham essa memória por copy-on-write e sobem sem
+repetir o trabalho de importação. Nenhuma conexão com o banco é mantida
+aberta no mestre, para que os workers não herdem sockets do pool.
+
+Uso::
+
+    python -m app.servidor
+"""
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import time
+
+import uvicorn
+from sqlalchemy.orm import configure_mappers
+
+from app.logs import UVICORN_LOG_CONFIG, configurar_logs, parar_logs
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "0"))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", "0"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+# Espera máxima antes de substituir um worker que cai logo ao subir
+REINICIO_ESPERA_MAXIMA = float(os.getenv("REINICIO_ESPERA_MAXIMA", "30"))
+REINICIO_ESPERA_INICIAL = 0.5
+# Worker que encerra antes disso conta como queda na subida
+VIDA_MINIMA_WORKER = 10.0
+
+
+def aquecer_aplicacao():
+    """Importa a aplicação e pré-computa o que os workers usariam sob demanda."""
+    # pylint: disable=import-outside-toplevel
+    from app.database import engine
+    from app.main import app
+
+    configure_mappers()
+    app.openapi()
+    # A criação das tabelas abre conexões; elas não podem ser herdadas no fork.
+    engine.dispose()
+    return app
+
+
+def limite_requisicoes(maximo: int = MAX_REQUESTS, jitter: int = MAX_REQUESTS_JITTER):
+    """Sorteia o limite de requisições de um worker (None = sem reciclagem).
+
+    O jitter evita que todos os workers sejam reciclados ao mesmo tempo.
+    """
+    if maximo <= 0:
+        return None
+    return maximo + random.randint(0, max(jitter, 0))
+
+
+def espera_reinicio(
+    quedas: int,
+    inicial: float = REINICIO_ESPERA_INICIAL,
+    maxima: float = REINICIO_ESPERA_MAXIMA
+) -> float:
+    """Segundos de espera antes de substituir um worker após ``quedas`` seguidas.
+
+    Dobra a cada queda, até ``maxima``; sem quedas a substituição é imediata.
+    """
+    if quedas <= 0:
+        return 0.0
+    return min(maxima, inicial * 2 ** (quedas - 1))
+
+
+def verificar_cache(workers: int = WORKERS):
+    """Recusa o cache em memória com mais de um worker.
+
+    Cada worker teria o próprio cache, e a invalidação feita em um deles não
+    chegaria aos outros, que serviriam respostas antigas até o TTL.
+    """
+    # pylint: disable=import-outside-toplevel
+    from app import cache
+
+    if workers > 1 and cache.CACHE_BACKEND != "redis":
+        raise SystemExit(
+            f"CACHE_BACKEND={cache.CACHE_BACKEND} não é compartilhado entre os "
+            f"{workers} workers; use CACHE_BACKEND=redis ou WEB_CONCURRENCY=1"
+        )
+
+
+def criar_socket(host: str = HOST, port: int = PORT) -> socket.socket:
+    """Cria o socket de escuta compartilhado por todos os workers."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Mestre:
+    """Processo mestre: faz fork dos workers e os substitui quando terminam."""
+
+    def __init__(self, app, sock: socket.socket, workers: int = WORKERS):
+        self.app = app
+        self.sock = sock
+        self.num_workers = max(workers, 1)
+        self.workers = {}
+        self.quedas = 0
+        self.encerrando = False
+
+    def _executar_worker(self):
+        """Corpo do processo filho; nunca retorna."""
+        # pylint: disable=import-outside-toplevel
+        from app.database import engine
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        gc.enable()
+        engine.dispose(close=False)
+
+        config = uvicorn.Config(
+            self.app,
+            lifespan="on",
+            log_config=UVICORN_LOG_CONFIG,
+            limit_max_requests=limite_requisicoes(),
+            timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        )
+        codigo = 0
+        try:
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except Exception:  # pylint: disable=broad-exception-caught
+            codigo = 1
+        finally:
+            # os._exit não roda o atexit: esvazia a fila de logs antes
+            parar_logs()
+            os._exit(codigo)  # pylint: disable=protected-access
+
+    def _criar_worker(self):
+        """Faz o fork de um novo worker."""
+        pid = os.fork()
+        if pid == 0:
+            self._executar_worker()
+        self.workers[pid] = time.monotonic()
+        logger.info("Worker %d iniciado", pid)
+
+    def _sinal_encerrar(self, signum, _frame):
+        """Inicia o encerramento gracioso de todos os workers."""
+        self.encerrando = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.workers.pop(pid, None)
+        logger.info("Sinal %d recebido, drenando %d worker(s)...", signum, len(self.workers))
+
+    def _aguardar_encerramento(self):
+        """Espera os workers drenarem; mata os que excederem o timeout."""
+        prazo = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while self.workers and time.monotonic() < prazo:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self.workers.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def _substituir(self, pid: int):
+        """Substitui o worker encerrado, esperando mais a cada queda seguida na subida.
+
+        Um worker que não consegue subir (banco fora, configuração errada)
+        não vira um laço de fork: a espera dobra até REINICIO_ESPERA_MAXIMA.
+        """
+        iniciado = self.workers.pop(pid, None)
+        if self.encerrando:
+            return
+        if iniciado is not None and time.monotonic() - iniciado < VIDA_MINIMA_WORKER:
+            self.quedas += 1
+        else:
+            self.quedas = 0
+        espera = espera_reinicio(self.quedas)
+        logger.warning("Worker %d encerrado, substituindo em %.1fs...", pid, espera)
+        prazo = time.monotonic() + espera
+        # Em passos curtos, para atender ao SIGTERM durante a espera
+        while not self.encerrando and time.monotonic() < prazo:
+            time.sleep(max(0.0, min(0.1, prazo - time.monotonic())))
+        if not self.encerrando:
+            self._criar_worker()
+
+    def executar(self):
+        """Sobe os workers e os substitui até receber SIGTERM/SIGINT."""
+        signal.signal(signal.SIGTERM, self._sinal_encerrar)
+        signal.signal(signal.SIGINT, self._sinal_encerrar)
+
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.num_workers):
+            self._criar_worker()
+
+        while not self.encerrando:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self._substituir(pid)
+
+        self._aguardar_encerramento()
+        self.sock.close()
+
+
+def main():
+    """Ponto de entrada do servidor de produção."""
+    configurar_logs()
+    verificar_cache()
+    gc.disable()
+    app = aquecer_aplicacao()
+    sock = criar_socket()
+    logger.info("Servindo em http://%s:%d com %d worker(s)", HOST, PORT, WORKERS)
+    Mestre(app, sock).executar()
+
+
+if __name__ == "__main__":
+    main()
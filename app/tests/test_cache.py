@@ -0,0 +1,155 @@
+"""Testes do cache de respostas e seus backends."""
+import fnmatch
+
+import pytest
+
+from app import cache
+from app.cache import BackendMemoria, BackendRedis
+
+
+class RelogioFalso:
+    """Relógio controlado manualmente para testar o TTL."""
+
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+class RedisFalso:
+    """Substituto local de um cliente Redis com os comandos usados."""
+
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        """GET"""
+        return self.dados.get(chave)
+
+    def set(self, chave, valor, px=None):  # pylint: disable=unused-argument
+        """SET com PX ignorado."""
+        self.dados[chave] = valor
+
+    def delete(self, chave):
+        """DEL"""
+        self.dados.pop(chave, None)
+
+    def incr(self, chave):
+        """INCR"""
+        self.dados[chave] = int(self.dados.get(chave, 0)) + 1
+        return self.dados[chave]
+
+    def scan_iter(self, match):
+        """SCAN com MATCH."""
+        return [c for c in list(self.dados) if fnmatch.fnmatch(c, match)]
+
+
+@pytest.fixture(params=["memoria", "redis"])
+def backend(request):
+    """Executa o teste com cada backend configurado como global."""
+    anterior = cache.get_cache()
+    novo = BackendMemoria() if request.param == "memoria" else BackendRedis(RedisFalso())
+    cache.configurar_cache(novo)
+    yield novo
+    cache.configurar_cache(anterior)
+
+
+def test_memoria_expira_pelo_ttl():
+    """Entradas expiradas não são retornadas e liberam espaço."""
+    relogio = RelogioFalso()
+    backend_memoria = BackendMemoria(relogio=relogio)
+    backend_memoria.set("a", b"1", ttl=10)
+
+    relogio.agora = 9
+    assert backend_memoria.get("a") == b"1"
+    relogio.agora = 10
+    assert backend_memoria.get("a") is None
+    assert backend_memoria.bytes_usados == 0
+
+
+def test_memoria_despeja_menos_usado_pelo_limite_de_bytes():
+    """Ao passar do limite de bytes, a entrada menos usada sai primeiro."""
+    backend_memoria = BackendMemoria(max_bytes=25)
+    backend_memoria.set("a", b"x" * 9)
+    backend_memoria.set("b", b"x" * 9)
+    backend_memoria.get("a")
+    backend_memoria.set("c", b"x" * 9)
+
+    assert backend_memoria.get("a") is not None
+    assert backend_memoria.get("b") is None
+    assert backend_memoria.get("c") is not None
+    assert backend_memoria.bytes_usados <= 25
+
+
+def test_memoria_ignora_valor_maior_que_limite():
+    """Um valor maior que o limite total não é guardado."""
+    backend_memoria = BackendMemoria(max_bytes=10)
+    backend_memoria.set("a", b"x" * 20)
+    assert backend_memoria.get("a") is None
+
+
+def test_memoria_versoes_nao_sao_despejadas():
+    """Contadores de versão sobrevivem ao despejo do LRU."""
+    backend_memoria = BackendMemoria(max_bytes=10)
+    backend_memoria.incrementar("v")
+    backend_memoria.set("a", b"x" * 8)
+    backend_memoria.set("b", b"x" * 8)
+    assert backend_memoria.versao("v") == 1
+
+
+# pylint: disable=unused-argument, redefined-outer-name
+def test_guardar_e_obter(backend):
+    """Valores são serializados em JSON e lidos de volta."""
+    cache.guardar("k", [{"id": 1, "nome": "BCG"}])
+    assert cache.obter("k") == [{"id": 1, "nome": "BCG"}]
+    assert cache.obter("inexistente") is None
+
+
+# pylint: disable=unused-argument, redefined-outer-name
+def test_chave_por_usuario_e_filtros(backend):
+    """A chave muda com o usuário e com os filtros, não com a ordem deles."""
+    base = cache.chave_historico(1, "lista", {"ano": 2024, "mes": 1})
+    assert base == cache.chave_historico(1, "lista", {"mes": 1, "ano": 2024})
+    assert base != cache.chave_historico(2, "lista", {"ano": 2024, "mes": 1})
+    assert base != cache.chave_historico(1, "lista", {"ano": 2023, "mes": 1})
+
+
+# pylint: disable=unused-argument, redefined-outer-name
+def test_invalidar_historico(backend):
+    """Invalidar um usuário torna suas entradas inalcançáveis, e só as dele."""
+    chave_1 = cache.chave_historico(1, "lista")
+    chave_2 = cache.chave_historico(2, "lista")
+    cache.guardar(chave_1, ["antigo"])
+    cache.guardar(chave_2, ["outro"])
+
+    cache.invalidar_historico(1)
+
+    assert cache.obter(cache.chave_historico(1, "lista")) is None
+    assert cache.obter(cache.chave_historico(2, "lista")) == ["outro"]
+
+
+# pylint: disable=unused-argument, redefined-outer-name
+def test_catalogo_alterado_invalida_historico(backend):
+    """O nome da vacina vai na resposta: mudar o catálogo invalida o histórico."""
+    cache.guardar(cache.chave_historico(1, "lista"), ["nome antigo"])
+
+    cache.invalidar_catalogo()
+
+    assert cache.obter(cache.chave_historico(1, "lista")) is None
+
+
+def test_redis_indisponivel_vira_miss():
+    """Erros do cliente Redis são tratados como ausência de cache."""
+    class RedisQuebrado:  # pylint: disable=too-few-public-methods
+        """Cliente cujos comandos sempre falham."""
+
+        def __getattr__(self, nome):
+            def falhar(*args, **kwargs):
+                raise ConnectionError("sem redis")
+            return falhar
+
+    backend_redis = BackendRedis(RedisQuebrado())
+    backend_redis.set("a", b"1", ttl=1)
+    assert backend_redis.get("a") is None
+    assert backend_redis.versao("v") == 0
@@ -0,0 +1,41 @@
+"""Testes dos utilitários de requisições condicionais."""
+from datetime import date, datetime
+
+from starlette.requests import Request
+
+from app.condicional import data_http, etag_corresponde, gerar_etag
+
+
+def _request(if_none_match=None):
+    """Cria uma requisição mínima com o cabeçalho If-None-Match."""
+    headers = []
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request({"type": "http", "headers": headers})
+
+
+def test_gerar_etag_deterministico():
+    """Mesmas partes geram o mesmo ETag fraco; partes diferentes, outro."""
+    etag = gerar_etag("vacinas", (3, 10, 0), "json")
+    assert etag.startswith('W/"')
+    assert etag == gerar_etag("vacinas", (3, 10, 0), "json")
+    assert etag != gerar_etag("vacinas", (3, 10, 0), "msgpack")
+
+
+def test_etag_corresponde():
+    """If-None-Match aceita lista, curinga e comparação fraca."""
+    etag = gerar_etag("x")
+    forte = etag.removeprefix("W/")
+    assert not etag_corresponde(_request(), etag)
+    assert etag_corresponde(_request(etag), etag)
+    assert etag_corresponde(_request(forte), etag)
+    assert etag_corresponde(_request(f'"outro", {etag}'), etag)
+    assert etag_corresponde(_request("*"), etag)
+    assert not etag_corresponde(_request('"outro"'), etag)
+
+
+def test_data_http():
+    """Datas e datetimes ingênuos são formatados como UTC."""
+    assert data_http(date(2024, 3, 5)) == "Tue, 05 Mar 2024 00:00:00 GMT"
+    assert data_http(datetime(2024, 3, 5, 10, 30)) == "Tue, 05 Mar 2024 10:30:00 GMT"
+    assert data_http(None) is None
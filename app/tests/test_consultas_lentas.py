@@ -0,0 +1,130 @@
+"""Testes do registro de consultas lentas."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import consultas_lentas
+from app.consultas_lentas import forma_parametros, sql_generico
+from app.main import app
+from app.Usuario.model import Usuario
+
+client = TestClient(app)
+
+
+@pytest.fixture()
+def tudo_lento(monkeypatch):
+    """Limite mínimo (todo comando é lento) e histórico vazio."""
+    monkeypatch.setattr(consultas_lentas, "CONSULTA_LENTA_MS", 1e-9)
+    consultas_lentas._recentes.clear()  # pylint: disable=protected-access
+    yield
+    consultas_lentas._recentes.clear()  # pylint: disable=protected-access
+
+
+# pylint: disable=redefined-outer-name, unused-argument
+def test_registra_rota_chamada_e_forma(db_session, tudo_lento):
+    """A ocorrência traz a rota casada, o controlador e os tipos dos parâmetros."""
+    usuario = Usuario(nome="Maria", email="maria@example.com", senha="x")
+    db_session.add(usuario)
+    db_session.commit()
+    consultas_lentas._recentes.clear()  # pylint: disable=protected-access
+
+    client.get(f"/usuarios/{usuario.id}/historico/estatisticas",
+               headers={"X-Request-ID": "req-lenta"})
+
+    resposta = client.get("/relatorios/consultas-lentas")
+    assert resposta.status_code == 200
+    ocorrencias = [item for item in resposta.json() if item["request_id"] == "req-lenta"]
+    assert ocorrencias
+    assert {item["rota"] for item in ocorrencias} == {
+        "GET /usuarios/{usuario_id}/historico/estatisticas"
+    }
+    assert all("HistoricoVacina/controller.py" in item["chamada"] for item in ocorrencias)
+    assert all("maria" not in str(item["parametros"]) for item in ocorrencias)
+    # O plano nunca vai para a resposta
+    assert all("plano" not in item for item in ocorrencias)
+
+
+def test_abaixo_do_limite_nada_e_registrado(db_session, monkeypatch):
+    """Com o limite padrão, consultas rápidas não são registradas."""
+    monkeypatch.setattr(consultas_lentas, "CONSULTA_LENTA_MS", 60_000)
+    consultas_lentas._recentes.clear()  # pylint: disable=protected-access
+    db_session.query(Usuario).count()
+    assert not consultas_lentas.consultas_recentes()
+
+
+def test_forma_parametros():
+    """Só os tipos dos parâmetros, inclusive em executemany."""
+    assert forma_parametros({"email": "a@b.c", "id": 1}) == {"email": "str", "id": "int"}
+    assert forma_parametros((1, "x")) == ["int", "str"]
+    assert forma_parametros([(1,), (2,)]) == {"itens": 2, "forma": ["int"]}
+
+
+def test_sql_generico():
+    """Marcadores do psycopg2 viram $n; o mesmo nome reaproveita a posição."""
+    assert sql_generico(
+        "SELECT * FROM usuarios WHERE email = %(email)s AND nome LIKE 'a%%' "
+        "OR id = %(id)s OR email = %(email)s"
+    ) == ("SELECT * FROM usuarios WHERE email = $1 AND nome LIKE 'a%' "
+          "OR id = $2 OR email = $1", 2)
+    assert sql_generico("SELECT %s, %s") == ("SELECT $1, $2", 2)
+
+
+class CursorFalso:
+    """Guarda os comandos e devolve um plano fixo."""
+
+    def __init__(self, comandos):
+        self.comandos = comandos
+
+    def execute(self, sql, *parametros):
+        """Registra o comando; parâmetros nunca devem ser enviados."""
+        assert not parametros
+        self.comandos.append(sql)
+
+    def fetchall(self):
+        """Plano genérico, com $1 no lugar do valor."""
+        return [("Index Scan using ix_usuarios_email_lower on usuarios",),
+                ("  Index Cond: (lower(email) = $1)",)]
+
+
+class ConexaoFalsa:
+    """Conexão crua que só registra o que recebe."""
+
+    def __init__(self):
+        self.comandos = []
+
+    def cursor(self):
+        """Cursor que escreve em ``comandos``."""
+        return CursorFalso(self.comandos)
+
+    def rollback(self):
+        """Registra o rollback."""
+        self.comandos.append("ROLLBACK")
+
+    def close(self):
+        """Nada a fechar."""
+
+
+def test_plano_generico_sem_valores(monkeypatch):
+    """O plano é preparado e explicado sem ANALYZE e com argumentos nulos.
+
+    Só o arquivo recebe o plano; a ocorrência em memória fica sem ele.
+    """
+    conexao = ConexaoFalsa()
+    gravados = []
+    monkeypatch.setattr(consultas_lentas, "_gravar_plano", gravados.append)
+    monkeypatch.setattr(consultas_lentas, "_pendentes", 1)
+    engine_falso = type("EngineFalso", (), {"raw_connection": lambda self: conexao})()
+    entrada = {"sql": "SELECT id FROM usuarios WHERE lower(email) = %(email)s"}
+
+    # pylint: disable=protected-access
+    consultas_lentas._explicar(engine_falso, entrada["sql"], entrada)
+
+    assert conexao.comandos[2:] == [
+        "PREPARE consulta_lenta AS SELECT id FROM usuarios WHERE lower(email) = $1",
+        "EXPLAIN EXECUTE consulta_lenta(NULL)",
+        "ROLLBACK",
+        "DEALLOCATE consulta_lenta",
+    ]
+    assert "plan_cache_mode = force_generic_plan" in conexao.comandos[1]
+    assert gravados[0]["plano"].endswith("(lower(email) = $1)")
+    assert "plano" not in entrada
+    assert consultas_lentas._pendentes == 0
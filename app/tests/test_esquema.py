@@ -0,0 +1,22 @@
+"""Testes da sincronização incremental do esquema."""
+from sqlalchemy import create_engine, inspect
+
+from app.esquema import sincronizar_esquema
+from app.Usuario import model as _usuario  # pylint: disable=unused-import
+
+
+def test_adiciona_coluna_anulavel_ausente():
+    """Uma tabela antiga ganha a coluna nova e a segunda execução não faz nada."""
+    banco = create_engine("sqlite://")
+    with banco.begin() as conexao:
+        conexao.exec_driver_sql(
+            "CREATE TABLE usuarios (id INTEGER PRIMARY KEY, nome VARCHAR(100), "
+            "email VARCHAR(100), senha VARCHAR(255))"
+        )
+
+    comandos = sincronizar_esquema(banco)
+
+    assert any("ADD COLUMN excluido_em" in comando for comando in comandos)
+    colunas = {coluna["name"] for coluna in inspect(banco).get_columns("usuarios")}
+    assert "excluido_em" in colunas
+    assert sincronizar_esquema(banco) == []
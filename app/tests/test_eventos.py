@@ -0,0 +1,184 @@
+"""Testes dos eventos do histórico e do fluxo SSE."""
+import asyncio
+import json
+import threading
+import time
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import eventos
+from app.eventos import BarramentoLocal, Inscricao, evento
+from app.HistoricoVacina.arquivamento import arquivar_historico
+from app.HistoricoVacina.controller import HistoricoVacinalController
+from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
+from app.main import app
+from app.Usuario.controller import UsuarioController
+from app.Usuario.model import Usuario
+from app.Vacina.controller import VacinaController
+from app.Vacina.model import Vacina
+
+client = TestClient(app)
+
+
+@pytest.fixture()
+def barramento():
+    """Barramento local novo por teste."""
+    novo = BarramentoLocal()
+    eventos.configurar_barramento(novo)
+    yield novo
+    eventos.configurar_barramento(None)
+
+
+def _esvaziar(fila: asyncio.Queue) -> list:
+    itens = []
+    while not fila.empty():
+        itens.append(fila.get_nowait())
+    return itens
+
+
+# pylint: disable=redefined-outer-name
+def test_inscricao_filtra_por_usuario_e_local(barramento):
+    """Cada inscrição só recebe os eventos do seu usuário e do seu local."""
+    async def cenario():
+        do_usuario = Inscricao(usuario_id=1)
+        da_clinica = Inscricao(local="UBS Centro")
+        barramento.inscrever(do_usuario)
+        barramento.inscrever(da_clinica)
+        barramento.publicar([evento("aplicado", 1, 10, 3, "UBS Norte"),
+                             evento("criado", 2, 11, 3, "UBS Centro")])
+        await asyncio.sleep(0)
+        return _esvaziar(do_usuario.fila), _esvaziar(da_clinica.fila)
+
+    do_usuario, da_clinica = asyncio.run(cenario())
+    assert [e["historico_id"] for e in do_usuario] == [10]
+    assert [e["historico_id"] for e in da_clinica] == [11]
+
+
+def test_entrega_de_outra_thread_e_fila_cheia(barramento):
+    """Publicar de outra thread funciona; além do máximo, os eventos viram perdidos."""
+    async def cenario():
+        inscricao = Inscricao(maximo=2)
+        barramento.inscrever(inscricao)
+        publicador = threading.Thread(target=barramento.publicar,
+                                      args=([evento("criado", 1, i) for i in range(5)],))
+        publicador.start()
+        publicador.join()
+        await asyncio.sleep(0.05)
+        return inscricao.fila.qsize(), inscricao.perdidos
+
+    assert asyncio.run(cenario()) == (2, 3)
+
+
+def test_escritas_do_controlador_publicam(db_session, barramento):
+    """Criar, aplicar e remover uma dose gera um evento de cada tipo."""
+    vacina = Vacina(nome="BCG", doses=2)
+    usuario = Usuario(nome="Maria", email="maria@example.com", senha="x")
+    db_session.add_all([vacina, usuario])
+    db_session.commit()
+
+    async def cenario():
+        inscricao = Inscricao(usuario_id=usuario.id)
+        barramento.inscrever(inscricao)
+        registro, _ = HistoricoVacinalController.registrar_dose(
+            db_session, usuario.id, vacina.id, 1, {"data_prevista": date(2024, 5, 1)}
+        )
+        HistoricoVacinalController.marcar_dose_como_aplicada(
+            db_session, registro.id, usuario.id, date(2024, 5, 2), local_aplicacao="UBS Centro"
+        )
+        HistoricoVacinalController.atualizar_registro(
+            db_session, registro.id, usuario.id, {"lote": "L-2"}
+        )
+        HistoricoVacinalController.deletar_registro(db_session, registro.id, usuario.id)
+        await asyncio.sleep(0)
+        return registro.id, _esvaziar(inscricao.fila)
+
+    historico_id, recebidos = asyncio.run(cenario())
+    assert [e["tipo"] for e in recebidos] == ["criado", "aplicado", "atualizado", "removido"]
+    assert {e["historico_id"] for e in recebidos} == {historico_id}
+    assert recebidos[1]["local_aplicacao"] == "UBS Centro"
+
+
+def test_aplicacao_em_lote_publica(db_session, barramento):
+    """Cada dose aplicada no lote gera um evento com o local da campanha."""
+    vacina = Vacina(nome="Influenza", doses=1)
+    usuario = Usuario(nome="Maria", email="maria@example.com", senha="x")
+    db_session.add_all([vacina, usuario])
+    db_session.commit()
+    registro = HistoricoVacinal(usuario_id=usuario.id, vacina_id=vacina.id, numero_dose=1,
+                                status=StatusDose.PENDENTE)
+    db_session.add(registro)
+    db_session.commit()
+
+    async def cenario():
+        inscricao = Inscricao(local="UBS Centro")
+        barramento.inscrever(inscricao)
+        HistoricoVacinalController.marcar_doses_como_aplicadas(
+            db_session, [(usuario.id, registro.id)],
+            {"data_aplicacao": date(2024, 6, 1), "lote": None,
+             "local_aplicacao": "UBS Centro", "profissional": None}
+        )
+        await asyncio.sleep(0)
+        return _esvaziar(inscricao.fila)
+
+    recebidos = asyncio.run(cenario())
+    assert [(e["tipo"], e["vacina_id"]) for e in recebidos] == [("aplicado", vacina.id)]
+
+
+def test_operacoes_em_lote_publicam_sincronizar(db_session, barramento):
+    """Mesclagem, arquivamento e purga avisam o usuário e a clínica afetados."""
+    origem, destino = Vacina(nome="HPV", doses=2), Vacina(nome="HPV 4v", doses=2)
+    usuario = Usuario(nome="Maria", email="maria@example.com", senha="x")
+    db_session.add_all([origem, destino, usuario])
+    db_session.commit()
+    for dose, situacao in [(1, StatusDose.APLICADA), (2, StatusDose.CANCELADA)]:
+        db_session.add(HistoricoVacinal(usuario_id=usuario.id, vacina_id=origem.id,
+                                        numero_dose=dose, status=situacao,
+                                        local_aplicacao="UBS Centro"))
+    db_session.commit()
+
+    async def cenario():
+        do_usuario = Inscricao(usuario_id=usuario.id)
+        da_clinica = Inscricao(local="UBS Centro")
+        barramento.inscrever(do_usuario)
+        barramento.inscrever(da_clinica)
+        VacinaController.mesclar(db_session, origem.id, destino.id)
+        arquivar_historico(db_session)
+        UsuarioController.marcar_exclusao(db_session, usuario.id)
+        UsuarioController.purgar(db_session, usuario.id)
+        await asyncio.sleep(0)
+        return _esvaziar(do_usuario.fila), _esvaziar(da_clinica.fila)
+
+    do_usuario, da_clinica = asyncio.run(cenario())
+    # Um por lote: mesclagem, arquivamento e as duas tabelas da purga
+    assert [e["tipo"] for e in do_usuario] == ["sincronizar"] * 4
+    assert {e["historico_id"] for e in do_usuario} == {None}
+    assert len(da_clinica) == 4
+
+
+def test_fluxo_sse(barramento, monkeypatch):
+    """O endpoint envia o retry, os eventos do usuário e encerra no tempo máximo."""
+    monkeypatch.setattr(eventos, "EVENTOS_DURACAO_MAXIMA", 0.5)
+
+    def publicar_quando_inscrito():
+        limite = time.monotonic() + 2
+        while not barramento.total_inscricoes and time.monotonic() < limite:
+            time.sleep(0.01)
+        barramento.publicar([evento("criado", 8, 1), evento("aplicado", 7, 2, 3, "UBS")])
+
+    publicador = threading.Thread(target=publicar_quando_inscrito)
+    publicador.start()
+    resposta = client.get("/usuarios/7/historico/eventos")
+    publicador.join()
+
+    assert resposta.status_code == 200
+    assert resposta.headers["content-type"].startswith("text/event-stream")
+    mensagens = [bloco for bloco in resposta.text.split("\n\n") if bloco]
+    assert mensagens[0] == f"retry: {eventos.EVENTOS_RETRY_MS}"
+    nome, dados = mensagens[1].split("\n")
+    assert nome == "event: aplicado"
+    assert json.loads(dados.removeprefix("data: "))["historico_id"] == 2
+    assert len(mensagens) == 2
+    # A inscrição é cancelada ao fim da conexão
+    assert barramento.total_inscricoes == 0
@@ -0,0 +1,137 @@
+"""Testes do limite de taxa e do controle de admissão."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import limites
+from app.limites import BackendMemoria, MiddlewareLimites, ler_limite
+from app.main import app
+from app.Usuario.controller import UsuarioController
+
+client = TestClient(app)
+
+
+@pytest.fixture()
+def limites_ativos(monkeypatch):
+    """Liga os limites com baldes e métricas zerados."""
+    monkeypatch.setattr(limites, "LIMITES_ATIVOS", True)
+    limites.configurar_backend(BackendMemoria())
+    limites._rejeicoes.clear()  # pylint: disable=protected-access
+    yield
+    limites.configurar_backend(None)
+    limites._rejeicoes.clear()  # pylint: disable=protected-access
+
+
+def test_ler_limite():
+    """capacidade/segundos vira (capacidade, tokens por segundo); 0 desativa."""
+    assert ler_limite("10/60") == (10, 10 / 60)
+    assert ler_limite("5") == (5, 5)
+    assert ler_limite("0") is None
+
+
+def test_balde_de_tokens():
+    """Permite a rajada, recusa o excesso com a espera e repõe com o tempo."""
+    agora = [0.0]
+    backend = BackendMemoria(relogio=lambda: agora[0])
+
+    assert [backend.consumir("ip", 2, 1 / 30)[0] for _ in range(3)] == [True, True, False]
+    assert backend.consumir("ip", 2, 1 / 30)[1] == pytest.approx(30)
+    assert backend.consumir("outro", 2, 1 / 30)[0]
+
+    agora[0] = 30.0
+    assert backend.consumir("ip", 2, 1 / 30)[0]
+    assert not backend.consumir("ip", 2, 1 / 30)[0]
+
+
+def test_backend_memoria_limita_chaves():
+    """Os baldes mais antigos são descartados acima do máximo."""
+    backend = BackendMemoria(max_chaves=2)
+    for chave in ("a", "b", "c"):
+        backend.consumir(chave, 1, 1)
+    assert list(backend._baldes) == ["b", "c"]  # pylint: disable=protected-access
+
+
+# pylint: disable=redefined-outer-name, unused-argument
+def test_login_limitado_por_email(db_session, limites_ativos, monkeypatch):
+    """O balde por e-mail recusa com 429 e Retry-After, sem afetar outros e-mails."""
+    monkeypatch.setattr(limites, "LIMITE_AUTH_EMAIL", "2/60")
+    UsuarioController.criar(db_session, "Maria", "maria@example.com", "segredo1")
+
+    respostas = [client.post("/auth/login", json={"email": "Maria@example.com",
+                                                  "password": "errada"})
+                 for _ in range(3)]
+
+    assert [r.status_code for r in respostas] == [401, 401, 429]
+    assert int(respostas[2].headers["retry-after"]) >= 1
+    # O corpo lido pelo middleware chega inteiro à rota
+    outro = client.post("/auth/login", json={"email": "joao@example.com", "password": "x"})
+    assert outro.status_code == 401
+    assert limites.metricas()["rejeicoes"] == {"auth_email": 1}
+
+
+def test_login_por_query_limitado_por_ip(db_session, limites_ativos, monkeypatch):
+    """Em /usuarios/login o e-mail vem da query; o balde por IP vale para todos."""
+    monkeypatch.setattr(limites, "LIMITE_AUTH_IP", "2/60")
+
+    codigos = [client.post("/usuarios/login", params={"email": f"u{i}@example.com",
+                                                      "senha": "x"}).status_code
+               for i in range(3)]
+
+    assert codigos == [401, 401, 429]
+    assert limites.metricas()["rejeicoes"] == {"auth_ip": 1}
+
+
+def test_escritas_limitadas_e_leituras_livres(db_session, limites_ativos, monkeypatch):
+    """Escritas têm o próprio balde; leituras não são limitadas."""
+    monkeypatch.setattr(limites, "LIMITE_ESCRITA_IP", "1/60")
+
+    assert client.post("/vacinas/", json={"nome": "BCG", "doses": 1}).status_code == 201
+    assert client.post("/vacinas/", json={"nome": "Hepatite B", "doses": 3}).status_code == 429
+    assert all(client.get("/vacinas/").status_code == 200 for _ in range(3))
+
+
+def test_concorrencia_recusa_com_503(limites_ativos, monkeypatch):
+    """Sem vaga dentro da espera máxima, a requisição é recusada antes da rota."""
+    monkeypatch.setattr(limites, "LIMITE_CONCORRENCIA", 1)
+    monkeypatch.setattr(limites, "LIMITE_FILA_TIMEOUT", 0.05)
+    executadas = []
+
+    async def rota(_scope, _receive, send):
+        executadas.append(1)
+        await asyncio.sleep(0.2)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = MiddlewareLimites(rota)
+
+    async def requisitar():
+        enviados = []
+
+        async def enviar(mensagem):
+            enviados.append(mensagem)
+
+        async def receber():
+            return {"type": "http.request", "body": b""}
+
+        escopo = {"type": "http", "method": "GET", "path": "/vacinas/", "headers": [],
+                  "query_string": b"", "client": ("10.0.0.1", 1)}
+        await middleware(escopo, receber, enviar)
+        return enviados[0]["status"]
+
+    async def cenario():
+        return await asyncio.gather(requisitar(), requisitar())
+
+    assert sorted(asyncio.run(cenario())) == [200, 503]
+    assert len(executadas) == 1
+    assert limites.metricas()["rejeicoes"] == {"concorrencia": 1}
+
+
+def test_metricas_endpoint(limites_ativos):
+    """GET /relatorios/limites expõe as recusas."""
+    limites.registrar_rejeicao("auth_ip")
+
+    resposta = client.get("/relatorios/limites")
+
+    assert resposta.status_code == 200
+    assert resposta.json()["rejeicoes"] == {"auth_ip": 1}
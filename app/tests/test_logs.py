@@ -0,0 +1,82 @@
+"""Testes do pipeline de logs estruturados."""
+import json
+import logging
+import queue
+
+import uvicorn
+from fastapi.testclient import TestClient
+
+from app.logs import (
+    UVICORN_LOG_CONFIG,
+    FiltroContexto,
+    FormatadorJson,
+    HandlerFila,
+    amostrado,
+    request_id,
+)
+from app.main import app
+
+client = TestClient(app)
+
+
+def _registro(msg="Dose %s aplicada", args=(1,), **extra):
+    registro = logging.makeLogRecord({"name": "teste", "levelname": "INFO",
+                                      "levelno": logging.INFO, "msg": msg, "args": args})
+    for campo, valor in extra.items():
+        setattr(registro, campo, valor)
+    return registro
+
+
+def test_linha_json_com_request_id_e_extras():
+    """A linha tem a mensagem formatada, o request_id e os campos extras."""
+    token = request_id.set("abc123")
+    try:
+        registro = _registro(vacina_id=7)
+        assert FiltroContexto().filter(registro)
+    finally:
+        request_id.reset(token)
+
+    linha = json.loads(FormatadorJson().format(registro))
+
+    assert linha["msg"] == "Dose 1 aplicada"
+    assert linha["request_id"] == "abc123"
+    assert linha["vacina_id"] == 7
+    assert linha["nivel"] == "INFO"
+
+
+def test_amostragem_por_template():
+    """Com taxa N, só 1 a cada N ocorrências da mesma mensagem passa."""
+    filtro = FiltroContexto()
+    passaram = sum(filtro.filter(_registro(args=(i,), **amostrado(10))) for i in range(30))
+    assert passaram == 3
+    # Mensagens sem amostragem não são afetadas
+    assert all(filtro.filter(_registro()) for _ in range(5))
+
+
+def test_fila_cheia_descarta_sem_bloquear():
+    """Com a fila cheia, o registro é descartado e contado."""
+    handler = HandlerFila(queue.Queue(1))
+    antes = HandlerFila.descartados
+    handler.handle(_registro())
+    handler.handle(_registro())
+    assert handler.queue.qsize() == 1
+    assert HandlerFila.descartados == antes + 1
+
+
+def test_request_id_no_cabecalho():
+    """O X-Request-ID recebido é devolvido; sem ele, um novo é gerado."""
+    assert client.get("/", headers={"X-Request-ID": "req-1"}).headers["X-Request-ID"] == "req-1"
+    gerado = client.get("/").headers["X-Request-ID"]
+    assert gerado and gerado != "req-1"
+
+
+def test_uvicorn_propaga_para_a_raiz():
+    """Com o log_config do servidor, os loggers do uvicorn não escrevem sozinhos."""
+    uvicorn.Config(app)
+    assert logging.getLogger("uvicorn.access").handlers
+
+    uvicorn.Config(app, log_config=UVICORN_LOG_CONFIG)
+
+    for nome in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        assert not logging.getLogger(nome).handlers
+        assert logging.getLogger(nome).propagate
@@ -0,0 +1,116 @@
+"""Testes das migrações do Alembic (no SQLite)."""
+import os
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, insert, inspect
+
+from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture()
+def banco(tmp_path):
+    """Banco SQLite vazio e a configuração do Alembic apontando para ele."""
+    url = f"sqlite:///{tmp_path / 'migracoes.db'}"
+    config = Config(os.path.join(RAIZ, "alembic.ini"))
+    config.set_main_option("sqlalchemy.url", url)
+    motor = create_engine(url)
+    yield motor, config
+    motor.dispose()
+
+
+# pylint: disable=redefined-outer-name
+def test_base_antiga_ganha_coluna_e_repetir_nao_faz_nada(banco):
+    """Uma base anterior às migrações é atualizada; aplicar de novo não altera nada."""
+    motor, config = banco
+    with motor.begin() as conexao:
+        conexao.exec_driver_sql(
+            "CREATE TABLE usuarios (id INTEGER PRIMARY KEY, nome VARCHAR(100), "
+            "email VARCHAR(255), senha VARCHAR(255))"
+        )
+
+    command.upgrade(config, "head")
+    command.downgrade(config, "base")
+    command.upgrade(config, "head")
+
+    colunas = {coluna["name"] for coluna in inspect(motor).get_columns("usuarios")}
+    assert "excluido_em" in colunas
+
+
+def test_indices_criados_nas_tabelas_existentes(banco):
+    """Os índices só são criados nas tabelas presentes; repetir não falha."""
+    motor, config = banco
+    with motor.begin() as conexao:
+        conexao.exec_driver_sql(
+            "CREATE TABLE usuarios (id INTEGER PRIMARY KEY, nome VARCHAR(100), "
+            "email VARCHAR(255), senha VARCHAR(255), excluido_em DATETIME)"
+        )
+        conexao.exec_driver_sql(
+            "CREATE TABLE vacinas (id INTEGER PRIMARY KEY, nome VARCHAR(100), doses INTEGER)"
+        )
+
+    command.upgrade(config, "head")
+    command.downgrade(config, "0001")
+    command.upgrade(config, "head")
+
+    with motor.connect() as conexao:
+        # O inspetor do SQLite ignora índices de expressão
+        indices = conexao.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'usuarios'"
+        ).scalars().all()
+    assert sorted(indices) == ["ix_usuarios_email_lower", "ix_usuarios_nome_lower"]
+    colunas = {coluna["name"] for coluna in inspect(motor).get_columns("vacinas")}
+    assert {"mesclar_em", "versao"} <= colunas
+
+
+def test_base_vazia(banco):
+    """Sem tabelas (o create_all vem depois), as migrações só registram a versão."""
+    motor, config = banco
+
+    command.upgrade(config, "head")
+
+    assert inspect(motor).get_table_names() == ["alembic_version"]
+
+
+def _historico_sem_restricao(motor, doses):
+    """Tabela do histórico como nas bases anteriores à restrição única."""
+    with motor.begin() as conexao:
+        HistoricoVacinal.__table__.create(conexao)
+        # Recria a tabela sem a restrição
+        conexao.exec_driver_sql("ALTER TABLE historico_vacinal RENAME TO antiga")
+        conexao.exec_driver_sql("CREATE TABLE historico_vacinal AS SELECT * FROM antiga")
+        conexao.exec_driver_sql("DROP TABLE antiga")
+        conexao.execute(insert(HistoricoVacinal), [
+            {"id": historico_id, "usuario_id": 1, "vacina_id": 1, "numero_dose": dose,
+             "status": StatusDose.PENDENTE}
+            for historico_id, dose in enumerate(doses, start=1)
+        ])
+
+
+def _indices_historico(motor):
+    return {indice["name"] for indice in inspect(motor).get_indexes("historico_vacinal")}
+
+
+def test_restricao_unica_criada_sem_repeticoes(banco):
+    """Sem doses repetidas a migração cria o índice único; o downgrade o remove."""
+    motor, config = banco
+    _historico_sem_restricao(motor, [1, 2])
+
+    command.upgrade(config, "head")
+    assert "uq_historico_usuario_vacina_dose" in _indices_historico(motor)
+
+    command.downgrade(config, "0006")
+    assert "uq_historico_usuario_vacina_dose" not in _indices_historico(motor)
+
+
+def test_restricao_unica_adiada_com_repeticoes(banco):
+    """Com doses repetidas a migração não falha nem cria a restrição."""
+    motor, config = banco
+    _historico_sem_restricao(motor, [1, 1])
+
+    command.upgrade(config, "head")
+
+    assert "uq_historico_usuario_vacina_dose" not in _indices_historico(motor)
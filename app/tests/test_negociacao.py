@@ -0,0 +1,115 @@
+"""Testes da negociação de conteúdo das listagens."""
+import msgpack
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.negociacao import (
+    MIDIA_COLUNAR,
+    MIDIA_MSGPACK,
+    campos_pedidos,
+    escolher_formato,
+    para_colunas,
+    serializar,
+)
+from app.schemas import VacinaResponse
+from app.Vacina.model import Vacina
+
+client = TestClient(app)
+
+
+def test_escolher_formato_padrao_json():
+    """Sem Accept, com curinga ou tipo desconhecido o formato é JSON."""
+    assert escolher_formato(None) == "json"
+    assert escolher_formato("*/*") == "json"
+    assert escolher_formato("text/html") == "json"
+
+
+def test_escolher_formato_alternativos():
+    """MessagePack e JSON colunar são escolhidos quando pedidos."""
+    assert escolher_formato(MIDIA_MSGPACK) == "msgpack"
+    assert escolher_formato("application/msgpack") == "msgpack"
+    assert escolher_formato(MIDIA_COLUNAR) == "colunar"
+
+
+def test_escolher_formato_respeita_q():
+    """O tipo com maior q vence; q=0 nunca é escolhido."""
+    assert escolher_formato(f"{MIDIA_MSGPACK};q=0.5, application/json") == "json"
+    assert escolher_formato(f"application/json;q=0.5, {MIDIA_MSGPACK}") == "msgpack"
+    assert escolher_formato(f"{MIDIA_COLUNAR};q=0") == "json"
+
+
+def test_serializar_e_colunas():
+    """Objetos ORM viram dicionários e depois um array por campo."""
+    linhas = serializar([Vacina(id=1, nome="BCG", doses=1),
+                         Vacina(id=2, nome="Hepatite B", doses=3)], VacinaResponse)
+
+    assert linhas == [{"nome": "BCG", "doses": 1, "id": 1},
+                      {"nome": "Hepatite B", "doses": 3, "id": 2}]
+    assert para_colunas(linhas, ["id", "nome"]) == {
+        "id": [1, 2], "nome": ["BCG", "Hepatite B"]
+    }
+
+
+def test_para_colunas_lista_vazia():
+    """Lista vazia mantém os campos com arrays vazios."""
+    assert para_colunas([], ["id", "nome"]) == {"id": [], "nome": []}
+
+
+def test_listar_vacinas_msgpack(monkeypatch):
+    """GET /vacinas/ responde em MessagePack quando pedido."""
+    monkeypatch.setattr(
+        "app.Vacina.routes.VacinaController.listar_todas",
+        lambda db, campos=None: [Vacina(id=1, nome="BCG", doses=1)]
+    )
+    monkeypatch.setattr(
+        "app.Vacina.routes.VacinaController.versao_catalogo",
+        lambda db: (1, 1, 0)
+    )
+
+    response = client.get("/vacinas/", headers={"Accept": MIDIA_MSGPACK})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == MIDIA_MSGPACK
+    assert "Accept" in response.headers["vary"]
+    assert msgpack.unpackb(response.content) == [{"nome": "BCG", "doses": 1, "id": 1}]
+
+
+def test_listar_vacinas_colunar(monkeypatch):
+    """GET /vacinas/ responde em JSON colunar quando pedido."""
+    monkeypatch.setattr(
+        "app.Vacina.routes.VacinaController.listar_todas",
+        lambda db, campos=None: [Vacina(id=1, nome="BCG", doses=1)]
+    )
+    monkeypatch.setattr(
+        "app.Vacina.routes.VacinaController.versao_catalogo",
+        lambda db: (1, 1, 0)
+    )
+
+    response = client.get("/vacinas/", headers={"Accept": MIDIA_COLUNAR})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(MIDIA_COLUNAR)
+    assert response.json() == {"nome": ["BCG"], "doses": [1], "id": [1]}
+
+
+def test_campos_pedidos_na_ordem_do_schema():
+    """?fields= é normalizado para a ordem do schema; vazio significa todos."""
+    assert campos_pedidos(None, VacinaResponse) is None
+    assert campos_pedidos(" , ", VacinaResponse) is None
+    assert campos_pedidos("id, nome", VacinaResponse) == ("nome", "id")
+
+
+def test_campos_pedidos_desconhecidos():
+    """Campo fora do schema resulta em 400 com os nomes inválidos."""
+    with pytest.raises(HTTPException) as erro:
+        campos_pedidos("nome,senha", VacinaResponse)
+    assert erro.value.status_code == 400
+    assert "senha" in erro.value.detail
+
+
+def test_serializar_so_campos_pedidos():
+    """Com campos, só eles são lidos e codificados."""
+    vacina = Vacina(id=1, nome="BCG", doses=1)
+    assert serializar([vacina], VacinaResponse, ("nome",)) == [{"nome": "BCG"}]
@@ -0,0 +1,227 @@
+"""Regressão dos planos de execução das consultas mais frequentes.
+
+Uma base representativa é populada e analisada; o SQL que cada consulta
+gera é capturado e passado pelo EXPLAIN do banco. O resumo de cada plano
+(tabela -> índice usado ou SCAN, e se há ordenação) é comparado ao retrato
+em ``planos/<dialeto>.json``: o teste falha se uma tabela que era lida por
+índice passar a ser varrida inteira ou se surgir uma ordenação.
+
+Depois de uma mudança intencional (novo índice, consulta nova), atualize o
+retrato com::
+
+    ENV=test ATUALIZAR_PLANOS=1 python -m pytest app/tests/test_planos.py
+"""
+import itertools
+import json
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, insert, text
+
+from app.database import Base, SessionLocal, engine
+from app.HistoricoVacina.controller import HistoricoVacinalController
+from app.HistoricoVacina.model import HistoricoVacinal, HistoricoVacinalArquivado, StatusDose
+from app.Usuario.controller import UsuarioController
+from app.Usuario.model import Usuario
+from app.Vacina.controller import VacinaController
+from app.Vacina.model import Vacina
+
+RETRATO = Path(__file__).parent / "planos" / f"{engine.dialect.name}.json"
+ATUALIZAR = os.getenv("ATUALIZAR_PLANOS") == "1"
+
+USUARIOS = 300
+VACINAS = 20
+# Usuário consultado; os demais dão volume às tabelas
+USUARIO_ID = 7
+
+_ACESSO_SQLITE = re.compile(
+    r"^(SEARCH|SCAN) (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+)"
+    r"| USING (?:INTEGER )?PRIMARY KEY)?"
+)
+_NO_INDICE_PG = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+
+
+def resumir_plano_sqlite(conexao, sql, parametros):
+    """Resumo do EXPLAIN QUERY PLAN: acessos por tabela e ordenação."""
+    acessos, ordena = set(), False
+    for *_, detalhe in conexao.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", parametros):
+        if detalhe.startswith("USE TEMP B-TREE"):
+            ordena = True
+        combinacao = _ACESSO_SQLITE.match(detalhe)
+        if combinacao:
+            tipo, tabela, indice = combinacao.groups()
+            if indice:
+                acessos.add((tabela, indice))
+            elif "PRIMARY KEY" in detalhe:
+                acessos.add((tabela, "PK"))
+            else:
+                acessos.add((tabela, "SCAN" if tipo == "SCAN" else "?"))
+    return {"acessos": sorted(list(a) for a in acessos), "ordena": ordena}
+
+
+def resumir_plano_postgresql(conexao, sql, parametros):
+    """Resumo do EXPLAIN (FORMAT JSON): acessos por tabela e ordenação."""
+    plano = conexao.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", parametros).scalar()
+    acessos, ordena = set(), False
+    pendentes = [plano[0]["Plan"]]
+    while pendentes:
+        no = pendentes.pop()
+        pendentes.extend(no.get("Plans", []))
+        if no["Node Type"] in ("Sort", "Incremental Sort"):
+            ordena = True
+        elif no["Node Type"] == "Seq Scan":
+            acessos.add((no["Relation Name"], "SCAN"))
+        elif no["Node Type"] in _NO_INDICE_PG:
+            acessos.add((no.get("Relation Name", "?"), no["Index Name"]))
+    return {"acessos": sorted(list(a) for a in acessos), "ordena": ordena}
+
+
+RESUMIDORES = {"sqlite": resumir_plano_sqlite, "postgresql": resumir_plano_postgresql}
+
+
+@contextmanager
+def capturar_selects():
+    """Coleta (sql, parâmetros) dos SELECTs executados no bloco."""
+    comandos = []
+
+    def capturar(_conexao, _cursor, sql, parametros, _contexto, _executemany):
+        if sql.lstrip().upper().startswith("SELECT"):
+            comandos.append((sql, parametros))
+
+    event.listen(engine, "before_cursor_execute", capturar)
+    try:
+        yield comandos
+    finally:
+        event.remove(engine, "before_cursor_execute", capturar)
+
+
+def popular(db):
+    """Base com vários usuários, vacinas, doses ativas e arquivadas."""
+    agora = datetime(2024, 6, 1)
+    db.execute(insert(Vacina), [{"id": v, "nome": f"Vacina {v}", "doses": 3}
+                                for v in range(1, VACINAS + 1)])
+    db.execute(insert(Usuario), [{"id": u, "nome": f"Usuario {u}", "email": f"u{u}@example.com",
+                                  "senha": "x"} for u in range(1, USUARIOS + 1)])
+    situacoes = list(StatusDose)
+    linhas, arquivadas = [], []
+    for usuario_id, vacina_id in itertools.product(range(1, USUARIOS + 1), range(1, 11)):
+        for dose in (1, 2):
+            situacao = situacoes[(usuario_id + vacina_id + dose) % len(situacoes)]
+            data = agora - timedelta(days=(usuario_id * 7 + vacina_id * 31 + dose * 90) % 900)
+            linha = {
+                "usuario_id": usuario_id, "vacina_id": vacina_id, "numero_dose": dose,
+                "status": situacao,
+                "data_aplicacao": data.date() if situacao == StatusDose.APLICADA else None,
+                "data_prevista": data.date(), "created_at": data, "updated_at": data,
+            }
+            linhas.append(linha)
+        arquivadas.append({**linha, "id": len(linhas) + 100000, "numero_dose": 3,
+                           "status": StatusDose.CANCELADA, "arquivado_em": agora})
+    db.execute(insert(HistoricoVacinal), linhas)
+    db.execute(insert(HistoricoVacinalArquivado), arquivadas)
+    db.commit()
+    db.execute(text("ANALYZE"))
+
+
+def combinacoes_filtros():
+    """Todas as combinações dos filtros de ``FiltrosHistorico``."""
+    valores = {"ano": 2024, "mes": 3, "vacina_id": 2, "status_filtro": StatusDose.APLICADA,
+               "incluir_arquivados": True}
+    for quantidade in range(len(valores) + 1):
+        for nomes in itertools.combinations(valores, quantidade):
+            yield "listar_por_usuario[" + ",".join(nomes) + "]", {n: valores[n] for n in nomes}
+
+
+def casos():
+    """Nome e chamada de cada consulta monitorada."""
+    for nome, filtros in combinacoes_filtros():
+        yield nome, lambda db, f=filtros: HistoricoVacinalController.listar_por_usuario(
+            db, USUARIO_ID, **f
+        )
+    yield "obter_estatisticas", lambda db: HistoricoVacinalController.obter_estatisticas(
+        db, USUARIO_ID
+    )
+    yield "buscar_por_email", lambda db: UsuarioController.buscar_por_email(
+        db, f"u{USUARIO_ID}@example.com"
+    )
+    yield "buscar_por_nome", lambda db: VacinaController.buscar_por_nome(db, "Vacina 3")
+
+
+@pytest.fixture(scope="module")
+def planos():
+    """Resumo dos planos de todos os casos sobre a base populada."""
+    if engine.dialect.name not in RESUMIDORES:
+        pytest.skip(f"EXPLAIN não suportado em {engine.dialect.name}")
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    try:
+        with SessionLocal() as db:
+            popular(db)
+        resumir = RESUMIDORES[engine.dialect.name]
+        resultado = {}
+        for nome, chamada in casos():
+            # Sessão nova por caso: objetos já carregados esconderiam consultas
+            with SessionLocal() as db, capturar_selects() as comandos:
+                chamada(db)
+            with engine.connect() as conexao:
+                resultado[nome] = [resumir(conexao, sql, parametros)
+                                   for sql, parametros in comandos]
+        yield resultado
+    finally:
+        Base.metadata.drop_all(bind=engine)
+
+
+# pylint: disable=redefined-outer-name
+def test_planos_sem_regressao(planos):
+    """Nenhum índice trocado por varredura e nenhuma ordenação nova."""
+    if ATUALIZAR or not RETRATO.exists():
+        RETRATO.parent.mkdir(exist_ok=True)
+        RETRATO.write_text(json.dumps(planos, indent=2, ensure_ascii=False) + "\n")
+        if not ATUALIZAR:
+            pytest.fail(f"Retrato criado em {RETRATO}; revise e versione o arquivo")
+        return
+
+    retrato = json.loads(RETRATO.read_text())
+    problemas = []
+    for nome, comandos in planos.items():
+        if nome not in retrato or len(retrato[nome]) != len(comandos):
+            problemas.append(f"{nome}: consultas diferentes do retrato (atualize-o)")
+            continue
+        for posicao, (atual, anterior) in enumerate(zip(comandos, retrato[nome])):
+            indexadas = {tabela for tabela, acesso in anterior["acessos"] if acesso != "SCAN"}
+            for tabela, acesso in atual["acessos"]:
+                if acesso == "SCAN" and tabela in indexadas:
+                    problemas.append(f"{nome}#{posicao}: {tabela} passou a ser varrida (SCAN)")
+            if atual["ordena"] and not anterior["ordena"]:
+                problemas.append(f"{nome}#{posicao}: ordenação nova no plano")
+    assert not problemas, "\n".join(problemas)
+
+
+def test_consultas_quentes_usam_indice(planos):
+    """A tabela do histórico nunca é varrida inteira pelas consultas monitoradas."""
+    varridas = [
+        nome for nome, comandos in planos.items()
+        if any(acesso == ["historico_vacinal", "SCAN"]
+               for comando in comandos for acesso in comando["acessos"])
+    ]
+    assert not varridas
+
+
+def test_listagem_sem_ordenacao(planos):
+    """A listagem e o filtro por período saem na ordem do índice, sem ordenar."""
+    for filtros in ("", "ano", "ano,mes", "status_filtro"):
+        comando = planos[f"listar_por_usuario[{filtros}]"][0]
+        assert ["historico_vacinal", "ix_historico_vacinal_usuario_aplicacao"] in comando["acessos"]
+        assert not comando["ordena"], filtros
+
+
+def test_estatisticas_sem_consulta_por_vacina(planos):
+    """As estatísticas carregam as vacinas junto com o histórico (sem N+1).
+
+    Uma consulta para as próximas doses e uma para cada tabela do histórico.
+    """
+    assert len(planos["obter_estatisticas"]) == 3
@@ -0,0 +1,128 @@
+"""Testes do rastreamento de requisições."""
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import rastreamento
+from app.main import app
+from app.rastreamento import (
+    Exportador,
+    ExportadorArquivoJson,
+    forcar_envio,
+    ler_traceparent,
+    registrar_exportador,
+    span,
+)
+
+client = TestClient(app)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PAI_ID = "00f067aa0ba902b7"
+
+
+class ExportadorMemoria(Exportador):
+    """Guarda os spans exportados em uma lista."""
+
+    def __init__(self):
+        self.spans = []
+
+    def exportar(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture()
+def exportador(monkeypatch):
+    """Ativa o rastreamento com um exportador em memória."""
+    memoria = ExportadorMemoria()
+    # pylint: disable=protected-access
+    monkeypatch.setattr(rastreamento._processador, "exportadores", [])
+    registrar_exportador(memoria)
+    return memoria
+
+
+# pylint: disable=redefined-outer-name
+def test_spans_da_requisicao_ao_sql(usuario_vacina, exportador):
+    """A requisição continua o trace recebido e agrupa controlador e SQL."""
+    usuario, vacina = usuario_vacina
+
+    resposta = client.put(f"/usuarios/{usuario.id}/historico/doses/{vacina.id}/1", json={},
+                          headers={"traceparent": f"00-{TRACE_ID}-{PAI_ID}-01"})
+    assert resposta.status_code == 201
+    forcar_envio()
+
+    por_nome = {item["nome"]: item for item in exportador.spans}
+    requisicao = por_nome["PUT /usuarios/{usuario_id}/historico/doses/{vacina_id}/{numero_dose}"]
+    registrar = por_nome["HistoricoVacinalController.registrar_dose"]
+    assert {item["trace_id"] for item in exportador.spans} == {TRACE_ID}
+    assert requisicao["pai_id"] == PAI_ID
+    assert requisicao["atributos"]["http.status_code"] == 201
+    assert registrar["pai_id"] == requisicao["span_id"]
+
+    ids = {item["span_id"] for item in exportador.spans}
+    sql = [item for item in exportador.spans if item["nome"] == "SQL"]
+    assert sql and all(item["pai_id"] in ids for item in sql)
+
+
+def test_inativo_sem_exportador(monkeypatch):
+    """Sem exportadores, nenhum span é criado."""
+    # pylint: disable=protected-access
+    monkeypatch.setattr(rastreamento._processador, "exportadores", [])
+    with span("nada") as aberto:
+        assert aberto is None
+
+
+def test_erro_fica_no_span_e_arquivo_json(tmp_path, monkeypatch):
+    """O exportador de arquivo grava uma linha por span, com o erro."""
+    # pylint: disable=protected-access
+    monkeypatch.setattr(rastreamento._processador, "exportadores", [])
+    arquivo = tmp_path / "traces.jsonl"
+    registrar_exportador(ExportadorArquivoJson(str(arquivo)))
+
+    with pytest.raises(ValueError):
+        with span("externo"):
+            with span("interno"):
+                raise ValueError("falhou")
+    forcar_envio()
+
+    interno, externo = [json.loads(linha) for linha in arquivo.read_text().splitlines()]
+    assert interno["pai_id"] == externo["span_id"]
+    assert "falhou" in interno["erro"]
+
+
+def test_traceparent_invalido_e_ignorado():
+    """Cabeçalhos malformados ou com ids zerados não são aceitos."""
+    assert ler_traceparent(f"00-{TRACE_ID}-{PAI_ID}-01") == (TRACE_ID, PAI_ID, True)
+    assert ler_traceparent(f"00-{'0' * 32}-{PAI_ID}-01") is None
+    assert ler_traceparent("lixo") is None
+
+
+def test_uma_unica_thread_com_envios_concorrentes(monkeypatch):
+    """Requisições simultâneas sem thread ativa iniciam só uma."""
+    # pylint: disable=protected-access
+    processador = rastreamento._Processador()
+    iniciadas = []
+    barreira = threading.Barrier(8)
+
+    class ThreadContada(threading.Thread):
+        """Conta as threads de entrega iniciadas."""
+
+        def start(self):
+            iniciadas.append(self)
+            super().start()
+
+    def enviar():
+        terminado = rastreamento.Span("concorrente", TRACE_ID, None, True)
+        terminado.fim = terminado.inicio
+        barreira.wait()
+        processador.enviar(terminado)
+
+    envios = [threading.Thread(target=enviar) for _ in range(8)]
+    monkeypatch.setattr(rastreamento.threading, "Thread", ThreadContada)
+    for envio in envios:
+        envio.start()
+    for envio in envios:
+        envio.join()
+
+    assert len(iniciadas) == 1
@@ -0,0 +1,55 @@
+"""Testes do aquecimento e das sondas de saúde."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import saude
+from app.database import Base, engine
+from app.main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture()
+def tabelas(monkeypatch):
+    """Cria as tabelas e começa com o processo ainda não aquecido."""
+    monkeypatch.setattr(saude, "_pronto", saude.threading.Event())
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+# pylint: disable=redefined-outer-name, unused-argument
+def test_pronto_somente_apos_aquecimento(tabelas):
+    """/health/ready dá 503 antes do aquecimento e 200 depois."""
+    assert client.get("/health/ready").status_code == 503
+
+    etapas = saude.aquecer(app)
+
+    assert set(etapas) == {"mappers", "pool", "sql", "catalogo", "bcrypt", "openapi"}
+    resposta = client.get("/health/ready")
+    assert resposta.status_code == 200
+    assert resposta.json()["status"] == "pronto"
+
+
+def test_banco_fora_nao_esta_pronto(tabelas, monkeypatch):
+    """Com o banco sem responder, a prontidão cai e a liveness continua."""
+    saude.aquecer()
+    monkeypatch.setattr(saude, "_banco_responde", lambda: False)
+
+    assert client.get("/health/ready").status_code == 503
+    assert client.get("/health/live").json() == {"status": "ok"}
+
+
+def test_pool_preenchido(tabelas):
+    """O pool fica com pool_size conexões abertas."""
+    assert saude.preencher_pool() == engine.pool.size()
+    assert engine.pool.checkedin() >= engine.pool.size()
+
+
+def test_live_nao_usa_banco(monkeypatch):
+    """/health/live responde mesmo sem conexão com o banco."""
+    def sem_banco():
+        raise AssertionError("liveness não deve abrir conexões")
+
+    monkeypatch.setattr(engine, "connect", sem_banco)
+    assert client.get("/health/live").status_code == 200
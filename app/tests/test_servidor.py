@@ -0,0 +1,83 @@
+"""Testes do servidor de produção com pré-fork."""
+import socket
+import time
+
+import pytest
+
+from app import cache, servidor
+from app.servidor import (
+    Mestre,
+    aquecer_aplicacao,
+    criar_socket,
+    espera_reinicio,
+    limite_requisicoes,
+    verificar_cache,
+)
+
+
+def test_limite_requisicoes_desativado():
+    """Sem MAX_REQUESTS os workers não são reciclados."""
+    assert limite_requisicoes(0, 100) is None
+
+
+def test_limite_requisicoes_com_jitter():
+    """O limite sorteado fica entre o máximo e o máximo + jitter."""
+    limites = {limite_requisicoes(1000, 50) for _ in range(200)}
+    assert min(limites) >= 1000
+    assert max(limites) <= 1050
+    assert len(limites) > 1
+
+
+def test_aquecer_aplicacao_sem_conexoes_abertas():
+    """O aquecimento gera o OpenAPI e não deixa conexões no pool."""
+    from app.database import engine  # pylint: disable=import-outside-toplevel
+
+    app = aquecer_aplicacao()
+
+    assert app.openapi_schema is not None
+    assert engine.pool.checkedout() == 0
+
+
+def test_criar_socket_herdavel():
+    """O socket de escuta precisa ser herdado pelos workers."""
+    sock = criar_socket("127.0.0.1", 0)
+    try:
+        assert sock.get_inheritable()
+        assert sock.type == socket.SOCK_STREAM
+    finally:
+        sock.close()
+
+
+def test_espera_reinicio_dobra_ate_o_maximo():
+    """Quedas seguidas na subida dobram a espera, limitada ao máximo."""
+    assert espera_reinicio(0, 0.5, 30) == 0
+    assert [espera_reinicio(n, 0.5, 30) for n in range(1, 5)] == [0.5, 1, 2, 4]
+    assert espera_reinicio(20, 0.5, 30) == 30
+
+
+def test_worker_que_cai_na_subida_espera_antes_de_ser_substituido(monkeypatch):
+    """Uma queda logo após o fork conta para o backoff; um worker longevo zera a contagem."""
+    mestre = Mestre(app=None, sock=None, workers=1)
+    esperas, criados = [], []
+    monkeypatch.setattr(servidor, "espera_reinicio", lambda quedas: esperas.append(quedas) or 0)
+    monkeypatch.setattr(mestre, "_criar_worker", lambda: criados.append(1))
+
+    mestre.workers = {10: time.monotonic(), 11: time.monotonic()}
+    mestre._substituir(10)  # pylint: disable=protected-access
+    mestre._substituir(11)  # pylint: disable=protected-access
+    mestre.workers = {12: time.monotonic() - servidor.VIDA_MINIMA_WORKER - 1}
+    mestre._substituir(12)  # pylint: disable=protected-access
+
+    assert esperas == [1, 2, 0]
+    assert len(criados) == 3
+
+
+def test_cache_em_memoria_recusado_com_varios_workers(monkeypatch):
+    """Com mais de um worker o cache precisa ser compartilhado (Redis)."""
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "memoria")
+    verificar_cache(1)
+    with pytest.raises(SystemExit, match="CACHE_BACKEND=redis"):
+        verificar_cache(4)
+
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "redis")
+    verificar_cache(4)
@@ -0,0 +1,84 @@
+"""Benchmark do custo em Python das buscas por chave.
+
+Compara, por chamada, a forma antiga (``db.query(...).filter(...).first()``,
+que monta e gera a chave de cache da consulta a cada vez) com os comandos
+``select()`` montados uma única vez nos controladores. Usa SQLite em memória
+para que o tempo medido seja quase todo do SQLAlchemy. Uso::
+
+    python benchmarks/bench_consultas.py [repeticoes]
+"""
+import sys
+import timeit
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.HistoricoVacina.controller import HISTORICO_DO_USUARIO
+from app.HistoricoVacina.model import HistoricoVacinal, StatusDose
+from app.Usuario.controller import USUARIO_POR_EMAIL, USUARIO_POR_ID
+from app.Usuario.model import Usuario
+from app.Vacina.controller import VACINA_POR_ID
+from app.Vacina.model import Vacina
+
+
+def preparar():
+    """Banco em memória com um usuário, uma vacina e uma dose."""
+    motor = create_engine("sqlite://")
+    Base.metadata.create_all(bind=motor)
+    db = sessionmaker(bind=motor)()
+    db.add_all([
+        Usuario(id=1, nome="Maria", email="maria@example.com", senha="x"),
+        Vacina(id=1, nome="BCG", doses=1),
+        HistoricoVacinal(id=1, usuario_id=1, vacina_id=1, numero_dose=1,
+                         status=StatusDose.PENDENTE),
+    ])
+    db.commit()
+    return db
+
+
+def main():
+    """Executa o benchmark e imprime uma tabela com os resultados."""
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    db = preparar()
+
+    consultas = {
+        "usuario por id": (
+            lambda: db.query(Usuario).filter(
+                Usuario.id == 1, Usuario.excluido_em.is_(None)
+            ).first(),
+            lambda: db.scalars(USUARIO_POR_ID, {"usuario_id": 1}).first(),
+        ),
+        "usuario por email": (
+            lambda: db.query(Usuario).filter(
+                Usuario.email == "maria@example.com", Usuario.excluido_em.is_(None)
+            ).first(),
+            lambda: db.scalars(USUARIO_POR_EMAIL, {"email": "maria@example.com"}).first(),
+        ),
+        "vacina por id": (
+            lambda: db.query(Vacina).filter(Vacina.id == 1).first(),
+            lambda: db.scalars(VACINA_POR_ID, {"vacina_id": 1}).first(),
+        ),
+        "dose do usuario": (
+            lambda: db.query(HistoricoVacinal).filter(
+                HistoricoVacinal.id == 1, HistoricoVacinal.usuario_id == 1
+            ).first(),
+            lambda: db.scalars(
+                HISTORICO_DO_USUARIO, {"historico_id": 1, "usuario_id": 1}
+            ).first(),
+        ),
+    }
+
+    print(f"{repeticoes} chamadas por consulta (SQLite em memória)")
+    print(f"{'consulta':<20}{'antes (µs)':>12}{'depois (µs)':>13}{'ganho':>8}")
+    for nome, (antes, depois) in consultas.items():
+        antes(), depois()
+        tempo_antes = timeit.timeit(antes, number=repeticoes) / repeticoes * 1e6
+        tempo_depois = timeit.timeit(depois, number=repeticoes) / repeticoes * 1e6
+        print(f"{nome:<20}{tempo_antes:>12.1f}{tempo_depois:>13.1f}"
+              f"{tempo_antes / tempo_depois:>7.2f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark de tamanho e tempo de codificação dos formatos de listagem.
+
+Compara JSON, JSON colunar e MessagePack para um histórico vacinal sintético
+no formato de ``HistoricoVacinalCompleto``. Uso::
+
+    python benchmarks/bench_negociacao.py [linhas]
+"""
+import gzip
+import json
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+import msgpack
+
+from app.negociacao import para_colunas
+from app.schemas import HistoricoVacinalCompleto
+
+
+def gerar_historico(total: int) -> list:
+    """Gera linhas de histórico já serializadas (tipos nativos de JSON)."""
+    base = date(2020, 1, 1)
+    linhas = []
+    for i in range(total):
+        dia = base + timedelta(days=i % 1500)
+        linhas.append({
+            "id": i + 1,
+            "usuario_id": 42,
+            "vacina_id": i % 20 + 1,
+            "vacina_nome": f"Vacina {i % 20 + 1}",
+            "vacina_doses_totais": 3,
+            "numero_dose": i % 3 + 1,
+            "status": "aplicada" if i % 4 else "pendente",
+            "data_aplicacao": dia.isoformat() if i % 4 else None,
+            "data_prevista": dia.isoformat(),
+            "lote": f"L{i:06d}",
+            "local_aplicacao": "UBS Centro",
+            "profissional": "Dra. Maria Souza",
+            "observacoes": None,
+            "created_at": datetime(2024, 1, 1, 12).isoformat(),
+            "updated_at": datetime(2024, 1, 1, 12).isoformat(),
+        })
+    return linhas
+
+
+def main():
+    """Executa o benchmark e imprime uma tabela com os resultados."""
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    linhas = gerar_historico(total)
+    campos = list(HistoricoVacinalCompleto.model_fields)
+
+    formatos = {
+        "json": lambda: json.dumps(linhas, ensure_ascii=False,
+                                   separators=(",", ":")).encode("utf-8"),
+        "json colunar": lambda: json.dumps(para_colunas(linhas, campos), ensure_ascii=False,
+                                           separators=(",", ":")).encode("utf-8"),
+        "msgpack": lambda: msgpack.packb(linhas, use_bin_type=True),
+    }
+
+    print(f"{total} linhas de histórico")
+    print(f"{'formato':<14}{'bytes':>10}{'gzip':>10}{'encode (ms)':>14}")
+    for nome, codificar in formatos.items():
+        corpo = codificar()
+        repeticoes = 20
+        tempo = timeit.timeit(codificar, number=repeticoes) / repeticoes * 1000
+        print(f"{nome:<14}{len(corpo):>10}{len(gzip.compress(corpo)):>10}{tempo:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Ambiente do Alembic: migra o banco configurado da aplicação.
+
+A URL vem de ``sqlalchemy.url`` (se definida na configuração) ou de
+DATABASE_URL, como em ``app.database``. Cada migração roda na sua própria
+transação, para que as que criam índices com CONCURRENTLY possam sair dela.
+"""
+from alembic import context
+from sqlalchemy import create_engine
+
+from app.database import DATABASE_URL, Base
+# Registram as tabelas no metadata (usado pelo --autogenerate)
+from app.HistoricoVacina import model as _historico  # pylint: disable=unused-import
+from app.Relatorios import model as _relatorios  # pylint: disable=unused-import
+from app.Usuario import model as _usuario  # pylint: disable=unused-import
+from app.Vacina import model as _vacina  # pylint: disable=unused-import
+
+config = context.config
+URL = config.get_main_option("sqlalchemy.url") or DATABASE_URL
+
+
+def migrar_offline():
+    """Gera o SQL das migrações sem conectar ao banco (``--sql``)."""
+    context.configure(url=URL, target_metadata=Base.metadata, literal_binds=True,
+                      transaction_per_migration=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def migrar_online():
+    """Aplica as migrações no banco."""
+    motor = create_engine(URL)
+    try:
+        with motor.connect() as conexao:
+            context.configure(connection=conexao, target_metadata=Base.metadata,
+                              transaction_per_migration=True)
+            with context.begin_transaction():
+                context.run_migrations()
+    finally:
+        motor.dispose()
+
+
+if context.is_offline_mode():
+    migrar_offline()
+else:
+    migrar_online()
@@ -0,0 +1,59 @@
+"""Exclusão de usuários em cascata: coluna excluido_em e ON DELETE CASCADE.
+
+As chaves ``usuario_id`` do histórico (ativo e arquivado) são recriadas com
+ON DELETE CASCADE como NOT VALID, o que só troca o catálogo, e validadas
+depois fora daquela transação: o VALIDATE percorre a tabela sob SHARE UPDATE
+EXCLUSIVE, sem bloquear leituras nem escritas. No SQLite, que não altera
+restrições de tabelas existentes, só a coluna é adicionada.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (tabela, coluna, tabela referenciada)
+CHAVES = [
+    ("historico_vacinal", "usuario_id", "usuarios"),
+    ("historico_vacinal_arquivado", "usuario_id", "usuarios"),
+]
+
+
+def upgrade():
+    """Adiciona a coluna e troca a ação ON DELETE das chaves que ainda não cascateiam."""
+    conexao = op.get_bind()
+    inspetor = sa.inspect(conexao)
+    if inspetor.has_table("usuarios") and "excluido_em" not in {
+        coluna["name"] for coluna in inspetor.get_columns("usuarios")
+    }:
+        op.add_column("usuarios", sa.Column("excluido_em", sa.DateTime(), nullable=True))
+    if conexao.dialect.name != "postgresql":
+        return
+
+    validar = []
+    for tabela, coluna, referencia in CHAVES:
+        if not inspetor.has_table(tabela):
+            continue
+        for chave in inspetor.get_foreign_keys(tabela):
+            if chave["constrained_columns"] != [coluna]:
+                continue
+            if (chave["options"].get("ondelete") or "").upper() == "CASCADE":
+                continue
+            op.drop_constraint(chave["name"], tabela, type_="foreignkey")
+            op.execute(f"ALTER TABLE {tabela} ADD CONSTRAINT {chave['name']} "
+                       f"FOREIGN KEY ({coluna}) REFERENCES {referencia} (id) "
+                       "ON DELETE CASCADE NOT VALID")
+            validar.append((tabela, chave["name"]))
+    with op.get_context().autocommit_block():
+        for tabela, nome in validar:
+            op.execute(f"ALTER TABLE {tabela} VALIDATE CONSTRAINT {nome}")
+
+
+def downgrade():
+    """Sem volta: a cascata e a coluna anulável não quebram versões anteriores."""
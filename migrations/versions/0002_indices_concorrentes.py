@@ -0,0 +1,53 @@
+"""Índices das buscas, da listagem e da mesclagem, criados sem bloquear escritas.
+
+Cada índice é criado com CREATE INDEX CONCURRENTLY (no Postgres) fora de
+transação; se a migração for interrompida, repeti-la refaz o que ficou
+inválido.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+from app.esquema import criar_indice_concorrente
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# (nome, tabela, definição no Postgres, definição nos demais bancos ou None)
+INDICES = [
+    ("ix_historico_vacinal_vacina_id", "historico_vacinal", "(vacina_id)", "(vacina_id)"),
+    ("ix_historico_vacinal_arquivado_vacina_id", "historico_vacinal_arquivado",
+     "(vacina_id)", "(vacina_id)"),
+    ("ix_historico_vacinal_usuario_aplicacao", "historico_vacinal",
+     "(usuario_id, data_aplicacao DESC NULLS LAST, created_at DESC)",
+     "(usuario_id, data_aplicacao DESC, created_at DESC)"),
+    ("ix_usuarios_email_lower", "usuarios", "(lower(email) text_pattern_ops)", "(lower(email))"),
+    ("ix_usuarios_nome_lower", "usuarios", "(lower(nome) text_pattern_ops)", "(lower(nome))"),
+    ("ix_vacinas_nome_trgm", "vacinas", "USING gin (nome gin_trgm_ops)", None),
+]
+
+
+def upgrade():
+    """Cria os índices ausentes."""
+    with op.get_context().autocommit_block():
+        conexao = op.get_bind()
+        postgres = conexao.dialect.name == "postgresql"
+        if postgres:
+            conexao.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for nome, tabela, definicao_postgres, definicao in INDICES:
+            if postgres:
+                criar_indice_concorrente(conexao, nome, tabela, definicao_postgres)
+            elif definicao is not None:
+                criar_indice_concorrente(conexao, nome, tabela, definicao)
+
+
+def downgrade():
+    """Remove os índices."""
+    with op.get_context().autocommit_block():
+        concorrente = "CONCURRENTLY " if op.get_bind().dialect.name == "postgresql" else ""
+        for nome, *_ in INDICES:
+            op.execute(f"DROP INDEX {concorrente}IF EXISTS {nome}")
@@ -0,0 +1,33 @@
+"""Mesclagem de vacinas em segundo plano: coluna vacinas.mesclar_em.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def _possui_coluna() -> bool:
+    inspetor = sa.inspect(op.get_bind())
+    return inspetor.has_table("vacinas") and "mesclar_em" in {
+        coluna["name"] for coluna in inspetor.get_columns("vacinas")
+    }
+
+
+def upgrade():
+    """Adiciona a coluna, se ainda não existir."""
+    if sa.inspect(op.get_bind()).has_table("vacinas") and not _possui_coluna():
+        op.add_column("vacinas", sa.Column("mesclar_em", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    """Remove a coluna."""
+    if _possui_coluna():
+        with op.batch_alter_table("vacinas") as tabela:
+            tabela.drop_column("mesclar_em")
@@ -0,0 +1,38 @@
+"""Versão persistida das vacinas: coluna vacinas.versao.
+
+A coluna entra com DEFAULT 0, o que no Postgres só altera o catálogo (sem
+reescrever a tabela); cada escrita posterior grava o número de alteração.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def _possui_coluna() -> bool:
+    inspetor = sa.inspect(op.get_bind())
+    return inspetor.has_table("vacinas") and "versao" in {
+        coluna["name"] for coluna in inspetor.get_columns("vacinas")
+    }
+
+
+def upgrade():
+    """Adiciona a coluna, se ainda não existir."""
+    if sa.inspect(op.get_bind()).has_table("vacinas") and not _possui_coluna():
+        op.add_column("vacinas", sa.Column(
+            "versao", sa.BigInteger(), nullable=False, server_default="0"
+        ))
+
+
+def downgrade():
+    """Remove a coluna."""
+    if _possui_coluna():
+        with op.batch_alter_table("vacinas") as tabela:
+            tabela.drop_column("versao")
@@ -0,0 +1,84 @@
+"""Sincronização por versão gerada no banco e datas do histórico com hora.
+
+- ``created_at``/``updated_at`` do histórico (ativo e arquivado) passam de
+  DATE a TIMESTAMP no Postgres. A conversão reescreve a tabela sob bloqueio
+  exclusivo: aplique em janela de manutenção. No SQLite as datas já gravadas
+  são lidas como meia-noite e nada muda.
+- Coluna ``versao`` (DEFAULT 0, só altera o catálogo) no histórico ativo,
+  arquivado e nas marcas de remoção.
+- Índices por (usuario_id, versao) da sincronização, criados sem bloquear
+  escritas, no lugar dos índices por data.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.esquema import criar_indice_concorrente
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+DATAS = [
+    ("historico_vacinal", "created_at"),
+    ("historico_vacinal", "updated_at"),
+    ("historico_vacinal_arquivado", "created_at"),
+    ("historico_vacinal_arquivado", "updated_at"),
+]
+VERSOES = ["historico_vacinal", "historico_vacinal_arquivado", "historico_vacinal_removido"]
+# (nome, tabela, definição)
+INDICES = [
+    ("ix_historico_vacinal_usuario_versao", "historico_vacinal", "(usuario_id, versao, id)"),
+    ("ix_historico_removido_usuario_versao", "historico_vacinal_removido",
+     "(usuario_id, versao, historico_id)"),
+]
+INDICES_ANTIGOS = ["ix_historico_vacinal_usuario_updated_at",
+                   "ix_historico_removido_usuario_removido_em"]
+
+
+def _colunas(inspetor, tabela: str) -> dict:
+    if not inspetor.has_table(tabela):
+        return {}
+    return {coluna["name"]: coluna["type"] for coluna in inspetor.get_columns(tabela)}
+
+
+def upgrade():
+    """Converte as datas, adiciona as versões e troca os índices."""
+    conexao = op.get_bind()
+    postgres = conexao.dialect.name == "postgresql"
+    inspetor = sa.inspect(conexao)
+    for tabela, coluna in DATAS:
+        tipo = _colunas(inspetor, tabela).get(coluna)
+        if postgres and isinstance(tipo, sa.Date) and not isinstance(tipo, sa.DateTime):
+            op.execute(f"ALTER TABLE {tabela} ALTER COLUMN {coluna} "
+                       f"TYPE TIMESTAMP WITHOUT TIME ZONE USING {coluna}::timestamp")
+    for tabela in VERSOES:
+        colunas = _colunas(inspetor, tabela)
+        if colunas and "versao" not in colunas:
+            op.add_column(tabela, sa.Column(
+                "versao", sa.BigInteger(), nullable=False, server_default="0"
+            ))
+
+    with op.get_context().autocommit_block():
+        for nome, tabela, definicao in INDICES:
+            criar_indice_concorrente(conexao, nome, tabela, definicao)
+        concorrente = "CONCURRENTLY " if postgres else ""
+        for nome in INDICES_ANTIGOS:
+            op.execute(f"DROP INDEX {concorrente}IF EXISTS {nome}")
+
+
+def downgrade():
+    """Remove os índices por versão e as colunas; as datas ficam com hora."""
+    with op.get_context().autocommit_block():
+        concorrente = "CONCURRENTLY " if op.get_bind().dialect.name == "postgresql" else ""
+        for nome, *_ in INDICES:
+            op.execute(f"DROP INDEX {concorrente}IF EXISTS {nome}")
+    inspetor = sa.inspect(op.get_bind())
+    for tabela in VERSOES:
+        if "versao" in _colunas(inspetor, tabela):
+            with op.batch_alter_table(tabela) as lote:
+                lote.drop_column("versao")
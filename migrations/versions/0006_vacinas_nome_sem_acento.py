@@ -0,0 +1,52 @@
+"""Busca por trigramas sem acento: índice sobre sem_acento(lower(nome)).
+
+A busca no Postgres compara ``sem_acento(lower(...))`` do nome e da consulta,
+como o índice em memória. ``sem_acento`` é um invólucro IMMUTABLE de
+``unaccent`` (que não pode entrar em índice). O índice novo é criado sem
+bloquear escritas e o antigo, sobre o nome cru, é removido em seguida.
+Só se aplica ao Postgres.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+from app.esquema import criar_indice_concorrente
+from app.Vacina.model import SEM_ACENTO_DDL
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+INDICE = "ix_vacinas_nome_sem_acento_trgm"
+INDICE_ANTIGO = "ix_vacinas_nome_trgm"
+
+
+def upgrade():
+    """Cria a função e o índice novo e remove o antigo."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        conexao = op.get_bind()
+        conexao.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        conexao.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS unaccent")
+        conexao.exec_driver_sql(SEM_ACENTO_DDL)
+        criar_indice_concorrente(
+            conexao, INDICE, "vacinas", "USING gin (sem_acento(lower(nome)) gin_trgm_ops)"
+        )
+        conexao.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {INDICE_ANTIGO}")
+
+
+def downgrade():
+    """Volta ao índice sobre o nome cru."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        conexao = op.get_bind()
+        criar_indice_concorrente(
+            conexao, INDICE_ANTIGO, "vacinas", "USING gin (nome gin_trgm_ops)"
+        )
+        conexao.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {INDICE}")
+        conexao.exec_driver_sql("DROP FUNCTION IF EXISTS sem_acento(text)")
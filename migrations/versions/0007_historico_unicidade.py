@@ -0,0 +1,70 @@
+"""Restrição única de (usuário, vacina, dose) no histórico vacinal.
+
+Cria ``uq_historico_usuario_vacina_dose`` em bases anteriores a ela, desde
+que não haja doses repetidas. No Postgres o índice único é criado sem
+bloquear escritas e depois promovido a restrição; no SQLite, que não altera
+restrições de tabelas existentes, fica o índice único de mesmo nome. Com
+repetições a migração só avisa: a limpeza é o comando de manutenção
+``python -m app.HistoricoVacina.unicidade --aplicar``.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+import logging
+
+from alembic import op
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from app.HistoricoVacina.unicidade import RESTRICAO, contar_repetidos, possui_restricao
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+TABELA = "historico_vacinal"
+COLUNAS = ", ".join(coluna.name for coluna in RESTRICAO.columns)
+
+
+def upgrade():
+    """Cria a restrição se a tabela existir sem ela e sem doses repetidas."""
+    conexao = op.get_bind()
+    if not inspect(conexao).has_table(TABELA) or possui_restricao(conexao):
+        return
+    repetidos = contar_repetidos(Session(bind=conexao))
+    if repetidos:
+        logger.warning(
+            "%d doses repetidas em %s: restrição %s não criada. Rode "
+            "'python -m app.HistoricoVacina.unicidade --aplicar' e repita a migração",
+            repetidos, TABELA, RESTRICAO.name
+        )
+        return
+    if conexao.dialect.name != "postgresql":
+        op.create_index(RESTRICAO.name, TABELA, [c.name for c in RESTRICAO.columns], unique=True)
+        return
+    particionada = conexao.exec_driver_sql(
+        f"SELECT relkind = 'p' FROM pg_class WHERE relname = '{TABELA}'"
+    ).scalar()
+    if particionada:
+        # USING INDEX não vale para tabelas particionadas
+        op.create_unique_constraint(RESTRICAO.name, TABELA, [c.name for c in RESTRICAO.columns])
+        return
+    with op.get_context().autocommit_block():
+        conexao.exec_driver_sql(
+            f"CREATE UNIQUE INDEX CONCURRENTLY {RESTRICAO.name} ON {TABELA} ({COLUNAS})"
+        )
+    conexao.exec_driver_sql(
+        f"ALTER TABLE {TABELA} ADD CONSTRAINT {RESTRICAO.name} UNIQUE USING INDEX {RESTRICAO.name}"
+    )
+
+
+def downgrade():
+    """Remove a restrição (ou o índice único, no SQLite)."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.execute(f"DROP INDEX IF EXISTS {RESTRICAO.name}")
+        return
+    op.execute(f"ALTER TABLE {TABELA} DROP CONSTRAINT IF EXISTS {RESTRICAO.name}")